@@ -33,6 +33,7 @@ from allianceauth.eveonline.models import (
 from allianceauth.eveonline.tasks import update_character
 from allianceauth.hooks import get_hooks
 from allianceauth.services.hooks import ServicesHook
+from allianceauth.services.revalidation import ServiceRevalidationAdminMixin
 
 from .app_settings import (
     AUTHENTICATION_ADMIN_USERS_MAX_CHARS,
@@ -48,11 +49,7 @@ def make_service_hooks_update_groups_action(service):
     :return: fn to update services groups for the selected users
     """
     def update_service_groups(modeladmin, request, queryset):
-        if hasattr(service, 'update_groups_bulk'):
-            service.update_groups_bulk(queryset)
-        else:
-            for user in queryset:  # queryset filtering doesn't work here?
-                service.update_groups(user)
+        service.update_groups_bulk(queryset)
 
     update_service_groups.__name__ = str(f'update_{slugify(service.name)}_groups')
     update_service_groups.short_description = f"Sync groups for selected {service.title} accounts"
@@ -447,7 +444,7 @@ class UserAdmin(BaseUserAdmin):
 
 
 @admin.register(State)
-class StateAdmin(admin.ModelAdmin):
+class StateAdmin(ServiceRevalidationAdminMixin, admin.ModelAdmin):
     list_select_related = True
     list_display = ('name', 'priority', '_user_count')
 
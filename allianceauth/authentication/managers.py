@@ -5,6 +5,8 @@ from django.db.models import Manager, QuerySet, Q
 
 from allianceauth.eveonline.models import EveCharacter
 
+from .state_index import StateIndex, state_index
+
 logger = logging.getLogger(__name__)
 
 
@@ -65,12 +67,54 @@ class StateManager(Manager):
         return self.get_queryset().available_to_user(user)
 
     def get_for_character(self, character):
-        states = self.get_queryset().available_to_character(character)
-        if states.exists():
-            return states[0]
+        index = state_index.get()
+        if index is not None:
+            state = StateIndex.lookup(
+                index,
+                character.character_id,
+                character.corporation_id,
+                character.alliance_id,
+                character.faction_id,
+            )
+            if state:
+                return state
         else:
-            from allianceauth.authentication.models import get_guest_state
-            return get_guest_state()
+            states = self.get_queryset().available_to_character(character)
+            if states.exists():
+                return states[0]
+        from allianceauth.authentication.models import get_guest_state
+        return get_guest_state()
 
     def get_for_user(self, user):
-        return self.get_queryset().get_for_user(user)
+        if user.profile.main_character:
+            return self.get_for_character(user.profile.main_character)
+        from allianceauth.authentication.models import get_guest_state
+        return get_guest_state()
+
+    def get_for_users(self, users) -> dict:
+        """Return the states for many users at once.
+
+        :param users: User queryset
+        :return: dict of states keyed by user pk
+        """
+        from allianceauth.authentication.models import get_guest_state
+        index = state_index.get() or StateIndex.build()
+        rows = users.values_list(
+            'pk',
+            'profile__main_character__character_id',
+            'profile__main_character__corporation_id',
+            'profile__main_character__alliance_id',
+            'profile__main_character__faction_id',
+        )
+        guest_state = None
+        result = {}
+        for user_pk, character_id, corporation_id, alliance_id, faction_id in rows:
+            state = None
+            if character_id:
+                state = StateIndex.lookup(index, character_id, corporation_id, alliance_id, faction_id)
+            if not state:
+                if not guest_state:
+                    guest_state = get_guest_state()
+                state = guest_state
+            result[user_pk] = state
+        return result
@@ -118,22 +118,25 @@ class UserProfile(models.Model):
             if commit:
                 logger.info(f'Updating {self.user} state to {self.state}')
                 self.save(update_fields=['state'])
-                notify(
-                    self.user,
-                    _('State changed to: %s' % state),
-                    _('Your user\'s state is now: %(state)s')
-                    % ({'state': state}),
-                    'info'
-                )
-                from allianceauth.authentication.signals import state_changed
-
                 # We need to ensure we get up to date perms here as they will have just changed.
                 # Clear all attribute caches and reload the model that will get passed to the signals!
                 self.refresh_from_db()
-
-                state_changed.send(
-                    sender=self.__class__, user=self.user, state=self.state
-                )
+                self.send_state_changed()
+
+    def send_state_changed(self):
+        """Notify the user about the current state and send the state_changed signal."""
+        notify(
+            self.user,
+            _('State changed to: %s' % self.state),
+            _('Your user\'s state is now: %(state)s')
+            % ({'state': self.state}),
+            'info'
+        )
+        from allianceauth.authentication.signals import state_changed
+
+        state_changed.send(
+            sender=self.__class__, user=self.user, state=self.state
+        )
 
     def __str__(self):
         return str(self.user)
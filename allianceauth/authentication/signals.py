@@ -1,4 +1,5 @@
 import logging
+from functools import partial
 
 from .models import (
     CharacterOwnership,
@@ -7,34 +8,75 @@ from .models import (
     State,
     OwnershipRecord)
 from django.contrib.auth.models import User
+from django.db import transaction
 from django.db.models import Q
-from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed, post_migrate
 from django.dispatch import receiver, Signal
 from esi.models import Token
 
-from allianceauth.eveonline.models import EveCharacter
+from allianceauth.eveonline.models import EveCharacter, EveCorporationInfo, EveAllianceInfo, EveFactionInfo
+from allianceauth.eveonline.signals import characters_changed
+
+from .state_index import state_index
 
 logger = logging.getLogger(__name__)
 
 state_changed = Signal()
 
+# sent with user_pks after group memberships have been changed in bulk without m2m_changed signals
+users_groups_changed = Signal()
+
+# sent with user_pks after states have been changed in bulk without post_save signals
+users_states_changed = Signal()
+
+STATE_CHANGE_BATCH_SIZE = 100
+
 
 def trigger_state_check(state):
     # evaluate all current members to ensure they still have access
-    for profile in state.userprofile_set.all():
-        profile.assign_state()
-
-    # we may now be available to others with lower states
-    check_states = State.objects.filter(priority__lt=state.priority)
-    for profile in UserProfile.objects.filter(state__in=check_states):
-        if state.available_to_user(profile.user):
-            profile.assign_state(state)
+    # and members of lower states, as we may now be available to them
+    profiles = list(
+        UserProfile.objects
+        .filter(Q(state=state) | Q(state__priority__lt=state.priority))
+        .only('pk', 'user_id', 'state_id')
+    )
+    new_states = State.objects.get_for_users(
+        User.objects.filter(profile__in=[profile.pk for profile in profiles])
+    )
+    changed_profiles = []
+    for profile in profiles:
+        new_state = new_states[profile.user_id]
+        if profile.state_id == new_state.pk:
+            continue
+        if profile.state_id == state.pk or new_state.pk == state.pk:
+            profile.state_id = new_state.pk
+            changed_profiles.append(profile)
+    if not changed_profiles:
+        return
+
+    logger.info(f'Updating states of {len(changed_profiles)} users after changes to state {state}')
+    _update_states(changed_profiles)
+
+
+def _update_states(changed_profiles):
+    """Save the new states of profiles in bulk and send the signals for them."""
+    UserProfile.objects.bulk_update(changed_profiles, ['state'], batch_size=500)
+    user_pks = [profile.user_id for profile in changed_profiles]
+    users_states_changed.send(sender=UserProfile, user_pks=user_pks)
+
+    # notifications and state_changed receivers are processed outside of this request
+    from .tasks import send_state_changes
+    for i in range(0, len(user_pks), STATE_CHANGE_BATCH_SIZE):
+        transaction.on_commit(
+            partial(send_state_changes.delay, user_pks[i:i + STATE_CHANGE_BATCH_SIZE])
+        )
 
 
 @receiver(m2m_changed, sender=State.member_characters.through)
 def state_member_characters_changed(sender, instance, action, *args, **kwargs):
     if action.startswith('post_'):
         logger.debug(f'State {instance} member characters changed. Re-evaluating membership.')
+        state_index.invalidate()
         trigger_state_check(instance)
 
 
@@ -42,6 +84,7 @@ def state_member_characters_changed(sender, instance, action, *args, **kwargs):
 def state_member_corporations_changed(sender, instance, action, *args, **kwargs):
     if action.startswith('post_'):
         logger.debug(f'State {instance} member corporations changed. Re-evaluating membership.')
+        state_index.invalidate()
         trigger_state_check(instance)
 
 
@@ -49,20 +92,39 @@ def state_member_corporations_changed(sender, instance, action, *args, **kwargs)
 def state_member_alliances_changed(sender, instance, action, *args, **kwargs):
     if action.startswith('post_'):
         logger.debug(f'State {instance} member alliances changed. Re-evaluating membership.')
+        state_index.invalidate()
         trigger_state_check(instance)
 
 @receiver(m2m_changed, sender=State.member_factions.through)
 def state_member_factions_changed(sender, instance, action, *args, **kwargs):
     if action.startswith('post_'):
         logger.debug(f'State {instance} member factions changed. Re-evaluating membership.')
+        state_index.invalidate()
         trigger_state_check(instance)
 
 @receiver(post_save, sender=State)
 def state_saved(sender, instance, *args, **kwargs):
     logger.debug(f'State {instance} saved. Re-evaluating membership.')
+    state_index.invalidate()
     trigger_state_check(instance)
 
 
+@receiver(post_delete, sender=State)
+@receiver(post_delete, sender=EveCharacter)
+@receiver(post_delete, sender=EveCorporationInfo)
+@receiver(post_delete, sender=EveAllianceInfo)
+@receiver(post_delete, sender=EveFactionInfo)
+def invalidate_state_index_on_delete(sender, instance, *args, **kwargs):
+    # deleting states or their members removes memberships without m2m_changed
+    state_index.invalidate()
+
+
+@receiver(post_migrate)
+def invalidate_state_index_on_migrate(sender, *args, **kwargs):
+    # states may have been changed by migrations or a database flush
+    state_index.invalidate()
+
+
 # Is there a smarter way to intercept pre_save with a diff main_character or state?
 @receiver(post_save, sender=UserProfile)
 def reassess_on_profile_save(sender, instance, created, *args, **kwargs):
@@ -152,6 +214,31 @@ def check_state_on_character_update(sender, instance, *args, **kwargs):
         pass
 
 
+@receiver(characters_changed, sender=EveCharacter)
+def check_state_on_characters_update(sender, characters, *args, **kwargs):
+    # check states of all users whose main character has been updated in bulk
+    logger.debug(f"{len(characters)} characters have been updated. Assessing owners' states for changes.")
+    profiles = list(
+        UserProfile.objects
+        .filter(main_character__in=characters)
+        .only('pk', 'user_id', 'state_id')
+    )
+    if not profiles:
+        return
+    new_states = State.objects.get_for_users(
+        User.objects.filter(profile__in=[profile.pk for profile in profiles])
+    )
+    changed_profiles = []
+    for profile in profiles:
+        new_state = new_states[profile.user_id]
+        if profile.state_id != new_state.pk:
+            profile.state_id = new_state.pk
+            changed_profiles.append(profile)
+    if changed_profiles:
+        logger.info(f'Updating states of {len(changed_profiles)} users after bulk character updates')
+        _update_states(changed_profiles)
+
+
 @receiver(post_save, sender=CharacterOwnership)
 def ownership_record_creation(sender, instance, created, *args, **kwargs):
     if created:
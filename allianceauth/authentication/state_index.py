@@ -0,0 +1,133 @@
+"""Precomputed index of the states available to characters."""
+
+import logging
+import threading
+from typing import Optional
+
+from django.core.cache import cache as default_cache
+
+from allianceauth.utils.cache import CacheGeneration
+
+logger = logging.getLogger(__name__)
+
+
+class StateIndex:
+    """Maps character, corporation, alliance and faction IDs to the state
+    with the highest priority available to them.
+
+    The index is built from the database in one pass and shared between processes
+    through Django's cache. Each process keeps a copy in memory until the generation
+    changes. It is invalidated whenever a state or its members change.
+    Until an invalidation has been committed, the invalidating thread does not use
+    the index, so states are never resolved from data of another transaction.
+
+    Args:
+        - cache: A Django cache backend. Will use the default cache by default
+    """
+
+    CACHE_KEY = "allianceauth-authentication-state-index"
+    CACHE_TIMEOUT = 3600
+
+    def __init__(self, cache=None) -> None:
+        self._cache = cache or default_cache
+        self._generation = CacheGeneration(f"{self.CACHE_KEY}-generation", cache=self._cache)
+        self._lock = threading.Lock()
+        self._local_index = None
+        self._local_generation = None
+
+    @property
+    def available(self) -> bool:
+        """Whether the index can be used by the current thread."""
+        return not self._generation.pending
+
+    def invalidate(self):
+        """Discard the index. To be called whenever states or their members change."""
+        with self._lock:
+            self._local_index = None
+        self._generation.invalidate()
+
+    def get(self) -> Optional[dict]:
+        """Return the current index or None when it can not be used."""
+        if not self.available:
+            return None
+        generation = self._generation.get()
+        with self._lock:
+            if self._local_index is not None and self._local_generation == generation:
+                return self._local_index
+        entry = self._cache.get(self.CACHE_KEY)
+        if entry and entry[0] == generation:
+            index = entry[1]
+        else:
+            logger.debug("Rebuilding state index")
+            index = self.build()
+            self._cache.set(self.CACHE_KEY, (generation, index), self.CACHE_TIMEOUT)
+        with self._lock:
+            self._local_index = index
+            self._local_generation = generation
+        return index
+
+    @staticmethod
+    def build() -> dict:
+        """Build the index from the database."""
+        from .models import State
+
+        states = {state.pk: state for state in State.objects.all()}
+        index = {
+            "states": states,
+            "public": None,
+            "character": {},
+            "corporation": {},
+            "alliance": {},
+            "faction": {},
+        }
+
+        def add(mapping, entity_id, state_pk):
+            current = mapping.get(entity_id)
+            if current is None or states[state_pk].priority > states[current].priority:
+                mapping[entity_id] = state_pk
+
+        for state in states.values():
+            if state.public and (
+                index["public"] is None
+                or state.priority > states[index["public"]].priority
+            ):
+                index["public"] = state.pk
+
+        members = (
+            ("character", State.member_characters.through, "evecharacter__character_id"),
+            ("corporation", State.member_corporations.through, "evecorporationinfo__corporation_id"),
+            ("alliance", State.member_alliances.through, "eveallianceinfo__alliance_id"),
+            ("faction", State.member_factions.through, "evefactioninfo__faction_id"),
+        )
+        for name, through, id_field in members:
+            for state_pk, entity_id in through.objects.values_list("state_id", id_field):
+                add(index[name], entity_id, state_pk)
+        return index
+
+    @staticmethod
+    def lookup(
+        index: dict,
+        character_id: int = None,
+        corporation_id: int = None,
+        alliance_id: int = None,
+        faction_id: int = None
+    ):
+        """Return the state with the highest priority available to a character
+        or None if no state is available.
+        """
+        candidates = [index["public"]]
+        if character_id:
+            candidates.append(index["character"].get(character_id))
+        if corporation_id:
+            candidates.append(index["corporation"].get(corporation_id))
+        if alliance_id:
+            candidates.append(index["alliance"].get(alliance_id))
+        if faction_id:
+            candidates.append(index["faction"].get(faction_id))
+        states = [index["states"][pk] for pk in candidates if pk is not None]
+        if not states:
+            return None
+        return max(states, key=lambda state: state.priority)
+
+
+state_index = StateIndex()
@@ -4,7 +4,7 @@ from esi.errors import TokenExpiredError, TokenInvalidError, IncompleteResponseE
 from esi.models import Token
 from celery import shared_task
 
-from allianceauth.authentication.models import CharacterOwnership
+from allianceauth.authentication.models import CharacterOwnership, UserProfile
 
 logger = logging.getLogger(__name__)
 
@@ -41,3 +41,14 @@ def check_character_ownership(owner_hash):
 def check_all_character_ownership():
     for c in CharacterOwnership.objects.all().only('owner_hash'):
         check_character_ownership.delay(c.owner_hash)
+
+
+@shared_task
+def send_state_changes(user_pks):
+    """Notify users about their new states and send state_changed for each of them."""
+    profiles = UserProfile.objects.filter(user_id__in=user_pks).select_related('user', 'state')
+    for profile in profiles:
+        try:
+            profile.send_state_changed()
+        except Exception:
+            logger.exception(f'Failed to process state change of {profile.user} to {profile.state}')
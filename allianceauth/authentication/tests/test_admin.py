@@ -802,10 +802,10 @@ class TestMakeServicesHooksActions(TestCaseWithTestData):
 
     def test_service_has_update_groups_only(self):
         service = self.MyServicesHookTypeA()
-        mock_service = MagicMock(spec=service)
-        action = make_service_hooks_update_groups_action(mock_service)
-        action(MagicMock(), MagicMock(), [self.user_1])
-        self.assertTrue(mock_service.update_groups.called)
+        with patch.object(service, 'update_groups') as mock_update_groups:
+            action = make_service_hooks_update_groups_action(service)
+            action(MagicMock(), MagicMock(), [self.user_1])
+        mock_update_groups.assert_called_once_with(self.user_1)
 
     def test_service_has_update_groups_bulk(self):
         service = self.MyServicesHookTypeB()
@@ -1,4 +1,6 @@
 from allianceauth.authentication.models import User, UserProfile
+from allianceauth.authentication.signals import state_changed, users_states_changed
+from allianceauth.eveonline.signals import characters_changed
 from allianceauth.eveonline.models import (
     EveCharacter,
     EveCorporationInfo,
@@ -92,3 +94,147 @@ class TestUserProfileSignals(TestCase):
         self.assertTrue = create_required_models.called
         self.assertEqual(create_required_models.call_count, 0)
         self.assertIsNot(UserProfile.objects.get(user=self.member), False)
+
+
+class TestTriggerStateCheck(TestCase):
+    def setUp(self):
+        self.member_state = AuthUtils.get_member_state()
+        self.guest_state = AuthUtils.get_guest_state()
+        self.corp = EveCorporationInfo.objects.create(
+            corporation_id='2345',
+            corporation_name='corp name',
+            corporation_ticker='TIKK',
+            member_count=10,
+        )
+        self.users = []
+        for i in range(3):
+            user = AuthUtils.create_user(f'test user {i}', disconnect_signals=True)
+            AuthUtils.add_main_character_2(user, f'test character {i}', 1000 + i, corp_id='2345', disconnect_signals=True)
+            self.users.append(user)
+        self.other_user = AuthUtils.create_user('other user', disconnect_signals=True)
+        AuthUtils.add_main_character_2(self.other_user, 'other character', 1100, corp_id='2346', disconnect_signals=True)
+        self.received = []
+        users_states_changed.connect(self._receiver)
+
+    def tearDown(self):
+        users_states_changed.disconnect(self._receiver)
+
+    def _receiver(self, sender, user_pks, **kwargs):
+        self.received.append(set(user_pks))
+
+    def _states(self):
+        return {
+            profile.user_id: profile.state
+            for profile in UserProfile.objects.select_related('state')
+        }
+
+    @patch('.tasks.send_state_changes')
+    def test_should_update_states_in_bulk(self, send_state_changes):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member_state.member_corporations.add(self.corp)
+
+        states = self._states()
+        for user in self.users:
+            self.assertEqual(states[user.pk], self.member_state)
+        self.assertEqual(states[self.other_user.pk], self.guest_state)
+        user_pks = {user.pk for user in self.users}
+        self.assertListEqual(self.received, [user_pks])
+        self.assertEqual(send_state_changes.delay.call_count, 1)
+        args, _ = send_state_changes.delay.call_args
+        self.assertSetEqual(set(args[0]), user_pks)
+
+    @patch('.tasks.send_state_changes')
+    def test_should_demote_members_in_bulk(self, send_state_changes):
+        self.member_state.member_corporations.add(self.corp)
+        self.received.clear()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member_state.member_corporations.remove(self.corp)
+
+        states = self._states()
+        for user in self.users:
+            self.assertEqual(states[user.pk], self.guest_state)
+        self.assertListEqual(self.received, [{user.pk for user in self.users}])
+
+    @patch('.signals.STATE_CHANGE_BATCH_SIZE', 2)
+    @patch('.tasks.send_state_changes')
+    def test_should_process_state_changes_in_batches(self, send_state_changes):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member_state.member_corporations.add(self.corp)
+
+        self.assertEqual(send_state_changes.delay.call_count, 2)
+
+    @patch('.tasks.send_state_changes')
+    def test_should_do_nothing_when_no_state_changes(self, send_state_changes):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member_state.save()
+
+        self.assertListEqual(self.received, [])
+        self.assertFalse(send_state_changes.delay.called)
+
+    @patch('.models.notify')
+    def test_should_send_state_changed(self, notify):
+        receiver = Mock()
+        state_changed.connect(receiver)
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.member_state.member_corporations.add(self.corp)
+        finally:
+            state_changed.disconnect(receiver)
+
+        self.assertEqual(receiver.call_count, 3)
+        self.assertEqual(notify.call_count, 3)
+        users = {call[1]['user'] for call in receiver.call_args_list}
+        self.assertSetEqual(users, set(self.users))
+
+
+class TestCheckStateOnCharactersUpdate(TestCase):
+    def setUp(self):
+        self.member_state = AuthUtils.get_member_state()
+        self.corp = EveCorporationInfo.objects.create(
+            corporation_id='2345',
+            corporation_name='corp name',
+            corporation_ticker='TIKK',
+            member_count=10,
+        )
+        self.member_state.member_corporations.add(self.corp)
+        self.users = []
+        for i in range(3):
+            user = AuthUtils.create_user(f'test user {i}', disconnect_signals=True)
+            AuthUtils.add_main_character_2(user, f'test character {i}', 1000 + i, corp_id='2346', disconnect_signals=True)
+            self.users.append(user)
+        self.received = []
+        users_states_changed.connect(self._receiver)
+
+    def tearDown(self):
+        users_states_changed.disconnect(self._receiver)
+
+    def _receiver(self, sender, user_pks, **kwargs):
+        self.received.append(set(user_pks))
+
+    @patch('.tasks.send_state_changes')
+    def test_should_update_states_in_bulk(self, send_state_changes):
+        characters = list(EveCharacter.objects.filter(character_id__in=[1000, 1001]))
+        for character in characters:
+            character.corporation_id = 2345
+        EveCharacter.objects.bulk_update(characters, ['corporation_id'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            characters_changed.send(sender=EveCharacter, characters=characters)
+
+        user_pks = {self.users[0].pk, self.users[1].pk}
+        for profile in UserProfile.objects.filter(user__in=self.users):
+            expected = self.member_state if profile.user_id in user_pks else AuthUtils.get_guest_state()
+            self.assertEqual(profile.state, expected)
+        self.assertListEqual(self.received, [user_pks])
+        self.assertEqual(send_state_changes.delay.call_count, 1)
+
+    @patch('.tasks.send_state_changes')
+    def test_should_do_nothing_when_no_state_changes(self, send_state_changes):
+        characters = list(EveCharacter.objects.filter(character_id__in=[1000, 1001]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            characters_changed.send(sender=EveCharacter, characters=characters)
+
+        self.assertListEqual(self.received, [])
+        self.assertFalse(send_state_changes.delay.called)
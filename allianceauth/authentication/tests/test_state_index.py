@@ -0,0 +1,231 @@
+import threading
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from allianceauth.eveonline.models import EveCharacter, EveCorporationInfo, \
+    EveAllianceInfo, EveFactionInfo
+from allianceauth.tests.auth_utils import AuthUtils
+
+from ..models import State, get_guest_state
+from ..state_index import StateIndex
+
+MODULE_PATH = 'allianceauth.authentication'
+
+
+class TestStateIndex(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        AuthUtils.disconnect_signals()
+        cls.guest_state = get_guest_state()
+        cls.character = EveCharacter.objects.create(
+            character_id=1001,
+            character_name='Test Character',
+            corporation_id=2001,
+            corporation_name='Test Corp',
+            corporation_ticker='TEST',
+            alliance_id=3001,
+            alliance_name='Test Alliance',
+            faction_id=500001,
+            faction_name='Test Faction',
+        )
+        cls.corporation = EveCorporationInfo.objects.create(
+            corporation_id=2001, corporation_name='Test Corp', corporation_ticker='TEST', member_count=1
+        )
+        cls.alliance = EveAllianceInfo.objects.create(
+            alliance_id=3001, alliance_name='Test Alliance', alliance_ticker='TEST', executor_corp_id=2001
+        )
+        cls.faction = EveFactionInfo.objects.create(faction_id=500001, faction_name='Test Faction')
+        cls.blue_state = State.objects.create(name='Test Blue', priority=60)
+        cls.blue_state.member_alliances.add(cls.alliance)
+        cls.blue_state.member_factions.add(cls.faction)
+        cls.member_state = State.objects.create(name='Test Member', priority=150)
+        cls.member_state.member_corporations.add(cls.corporation)
+        cls.director_state = State.objects.create(name='Test Director', priority=200)
+        cls.director_state.member_characters.add(cls.character)
+        AuthUtils.connect_signals()
+
+    def setUp(self):
+        self.cache = LocMemCache('state-index-test', {})
+        self.cache.clear()
+
+    def test_should_return_state_with_highest_priority(self):
+        index = StateIndex.build()
+
+        self.assertEqual(StateIndex.lookup(index, 1001, 2001, 3001, 500001), self.director_state)
+        self.assertEqual(StateIndex.lookup(index, 1002, 2001, 3001, 500001), self.member_state)
+        self.assertEqual(StateIndex.lookup(index, 1002, 2002, 3001, None), self.blue_state)
+        self.assertEqual(StateIndex.lookup(index, 1002, 2002, None, 500001), self.blue_state)
+
+    def test_should_return_public_state_as_fallback(self):
+        index = StateIndex.build()
+
+        self.assertEqual(StateIndex.lookup(index, 1002, 2002, None, None), self.guest_state)
+
+    def test_should_return_none_when_no_state_is_available(self):
+        AuthUtils.disconnect_signals()
+        self.guest_state.public = False
+        self.guest_state.save()
+        AuthUtils.connect_signals()
+
+        index = StateIndex.build()
+
+        self.assertIsNone(StateIndex.lookup(index, 1002, 2002, None, None))
+
+    def test_should_cache_index(self):
+        state_index = StateIndex(cache=self.cache)
+        state_index.get()
+
+        with self.assertNumQueries(0):
+            index = state_index.get()
+
+        self.assertEqual(StateIndex.lookup(index, 1001), self.director_state)
+
+    def test_should_keep_index_in_process(self):
+        state_index = StateIndex(cache=self.cache)
+        state_index.get()
+
+        with mock.patch.object(self.cache, 'get', wraps=self.cache.get) as spy_get:
+            index = state_index.get()
+
+        spy_get.assert_called_once_with(f'{StateIndex.CACHE_KEY}-generation')
+        self.assertEqual(StateIndex.lookup(index, 1001), self.director_state)
+
+    def test_should_reload_index_when_invalidated_by_other_process(self):
+        state_index = StateIndex(cache=self.cache)
+        index = state_index.get()
+
+        StateIndex(cache=self.cache).invalidate()
+
+        self.assertIsNot(state_index.get(), index)
+
+    def test_should_rebuild_index_after_invalidation(self):
+        state_index = StateIndex(cache=self.cache)
+        state_index.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            AuthUtils.disconnect_signals()
+            self.director_state.member_characters.remove(self.character)
+            AuthUtils.connect_signals()
+            state_index.invalidate()
+            self.assertIsNone(state_index.get())
+
+        index = state_index.get()
+        self.assertEqual(StateIndex.lookup(index, 1001, 2001), self.member_state)
+
+    def test_should_not_use_index_before_invalidation_is_committed(self):
+        state_index = StateIndex(cache=self.cache)
+        state_index.invalidate()
+
+        self.assertFalse(state_index.available)
+        self.assertIsNone(state_index.get())
+
+
+class TestStateIndexTransactions(TransactionTestCase):
+    def setUp(self):
+        self.cache = LocMemCache('state-index-test', {})
+        self.cache.clear()
+
+    def test_should_use_index_again_after_rollback(self):
+        state_index = StateIndex(cache=self.cache)
+
+        try:
+            with transaction.atomic():
+                state_index.invalidate()
+                self.assertFalse(state_index.available)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertTrue(state_index.available)
+        self.assertIsNotNone(state_index.get())
+
+    def test_should_use_index_again_after_savepoint_rollback(self):
+        state_index = StateIndex(cache=self.cache)
+
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    state_index.invalidate()
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+
+            self.assertFalse(state_index.available)  # until the outer transaction ends
+
+        self.assertTrue(state_index.available)
+
+    def test_should_use_index_again_after_commit(self):
+        state_index = StateIndex(cache=self.cache)
+
+        with transaction.atomic():
+            state_index.invalidate()
+
+        self.assertTrue(state_index.available)
+        self.assertIsNotNone(state_index.get())
+
+    def test_should_use_index_in_other_threads_during_invalidation(self):
+        state_index = StateIndex(cache=self.cache)
+        result = []
+
+        with transaction.atomic():
+            state_index.invalidate()
+            thread = threading.Thread(target=lambda: result.append(state_index.available))
+            thread.start()
+            thread.join()
+
+        self.assertEqual(result, [True])
+
+
+class TestStateManagerWithIndex(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AuthUtils.create_user('test_user', disconnect_signals=True)
+        AuthUtils.add_main_character_2(cls.user, 'Test Character', 1001, corp_id=2001, disconnect_signals=True)
+        cls.user_2 = AuthUtils.create_user('test_user_2', disconnect_signals=True)
+        AuthUtils.add_main_character_2(cls.user_2, 'Test Character 2', 1002, corp_id=2002, disconnect_signals=True)
+        cls.user_3 = AuthUtils.create_user('test_user_3', disconnect_signals=True)
+        cls.corporation = EveCorporationInfo.objects.create(
+            corporation_id=2001, corporation_name='Test Corp', corporation_ticker='TEST', member_count=1
+        )
+        AuthUtils.disconnect_signals()
+        cls.guest_state = get_guest_state()
+        cls.member_state = State.objects.create(name='Test Member', priority=150)
+        cls.member_state.member_corporations.add(cls.corporation)
+        AuthUtils.connect_signals()
+
+    def setUp(self):
+        cache = LocMemCache('state-index-test', {})
+        cache.clear()
+        patcher = mock.patch(MODULE_PATH + '.managers.state_index', StateIndex(cache=cache))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_get_for_user(self):
+        self.assertEqual(State.objects.get_for_user(self.user), self.member_state)
+        self.assertEqual(State.objects.get_for_user(self.user_2), self.guest_state)
+        self.assertEqual(State.objects.get_for_user(self.user_3), self.guest_state)
+
+    def test_get_for_character_from_index(self):
+        character = EveCharacter.objects.get(character_id=1001)
+        State.objects.get_for_character(character)
+
+        with self.assertNumQueries(0):
+            state = State.objects.get_for_character(character)
+
+        self.assertEqual(state, self.member_state)
+
+    def test_get_for_users(self):
+        result = State.objects.get_for_users(User.objects.all())
+
+        self.assertDictEqual(
+            result,
+            {
+                self.user.pk: self.member_state,
+                self.user_2.pk: self.guest_state,
+                self.user_3.pk: self.guest_state,
+            }
+        )
@@ -1,10 +1,20 @@
+from datetime import timedelta
+
 from django.db import models
+from django.utils import timezone
 import logging
 
 logger = logging.getLogger(__name__)
 
+# ESI caches the member list of a corporation for one hour
+MEMBERS_CACHE_TIMEOUT = 3600
+
 
 class CorpStatsQuerySet(models.QuerySet):
+    def expired(self):
+        """Corp stats whose member data may have changed on ESI since the last update."""
+        return self.filter(last_update__lte=timezone.now() - timedelta(seconds=MEMBERS_CACHE_TIMEOUT))
+
     def visible_to(self, user):
         # superusers get all visible
         if user.is_superuser:
@@ -46,3 +56,6 @@ class CorpStatsManager(models.Manager):
 
     def visible_to(self, user):
         return self.get_queryset().visible_to(user)
+
+    def expired(self):
+        return self.get_queryset().expired()
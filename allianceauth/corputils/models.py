@@ -1,15 +1,18 @@
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 
 from allianceauth.authentication.models import CharacterOwnership, UserProfile
 from bravado.exception import HTTPForbidden
 from django.db import models
+from django.utils import timezone
 from esi.errors import TokenError
 from esi.models import Token
 from allianceauth.eveonline.models import EveCorporationInfo, EveCharacter, EveAllianceInfo
 from allianceauth.notifications import notify
 
-from allianceauth.corputils.managers import CorpStatsManager
+from allianceauth.corputils.managers import CorpStatsManager, MEMBERS_CACHE_TIMEOUT
 
 SWAGGER_SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'swagger.json')
 """
@@ -25,6 +28,9 @@ post_universe_names
 
 logger = logging.getLogger(__name__)
 
+# max number of concurrent requests for resolving member names
+NAME_WORKERS = 4
+
 
 class CorpStats(models.Model):
     token = models.ForeignKey(Token, on_delete=models.CASCADE)
@@ -52,22 +58,29 @@ class CorpStats(models.Model):
             member_ids = c.Corporation.get_corporations_corporation_id_members(
                 corporation_id=self.corp.corporation_id).result()
 
+            # only new members need their names resolved and to be created
+            existing_ids = set(self.members.values_list('character_id', flat=True))
+            missing_members = [m_id for m_id in set(member_ids) if m_id not in existing_ids]
+
             # requesting too many ids per call results in a HTTP400
             # the swagger spec doesn't have a maxItems count
             # manual testing says we can do over 350, but let's not risk it
-            member_id_chunks = [member_ids[i:i + 255] for i in range(0, len(member_ids), 255)]
-            member_name_chunks = [c.Universe.post_universe_names(ids=id_chunk).result() for id_chunk in member_id_chunks]
+            member_id_chunks = [missing_members[i:i + 255] for i in range(0, len(missing_members), 255)]
+            member_name_chunks = self._fetch_names(c, member_id_chunks)
             member_list = {}
             for name_chunk in member_name_chunks:
                 member_list.update({m['id']: m['name'] for m in name_chunk})
 
             # bulk create new member models
-            missing_members = [m_id for m_id in member_ids if not CorpMember.objects.filter(corpstats=self, character_id=m_id).exists()]
             CorpMember.objects.bulk_create(
-                [CorpMember(character_id=m_id, character_name=member_list[m_id], corpstats=self) for m_id in missing_members])
+                [CorpMember(character_id=m_id, character_name=member_list[m_id], corpstats=self) for m_id in missing_members],
+                batch_size=500
+            )
 
             # purge old members
-            self.members.exclude(character_id__in=member_ids).delete()
+            old_members = existing_ids.difference(member_ids)
+            if old_members:
+                self.members.filter(character_id__in=old_members).delete()
 
             # update the timer
             self.save()
@@ -93,21 +106,39 @@ class CorpStats(models.Model):
                     message="%s cannot update with your ESI token as you have left corp." % self, level="error")
             self.delete()
 
+    @staticmethod
+    def _fetch_names(client, id_chunks):
+        if len(id_chunks) <= 1:
+            return [client.Universe.post_universe_names(ids=id_chunk).result() for id_chunk in id_chunks]
+        with ThreadPoolExecutor(max_workers=min(NAME_WORKERS, len(id_chunks))) as executor:
+            return list(executor.map(
+                lambda id_chunk: client.Universe.post_universe_names(ids=id_chunk).result(),
+                id_chunks
+            ))
+
+    @property
+    def is_expired(self):
+        """Whether the member data may have changed on ESI since the last update."""
+        return self.last_update <= timezone.now() - timedelta(seconds=MEMBERS_CACHE_TIMEOUT)
+
     @property
     def member_count(self):
         return self.members.count()
 
     @property
     def user_count(self):
-        return len({m.main_character for m in self.members.all() if m.main_character})
+        return UserProfile.objects.filter(
+            main_character__isnull=False,
+            user__character_ownerships__character__character_id__in=self.members.values('character_id')
+        ).values('main_character').distinct().count()
 
     @property
     def registered_member_count(self):
-        return len(self.registered_members)
+        return self.registered_members.count()
 
     @property
     def registered_members(self):
-        return self.members.filter(pk__in=[m.pk for m in self.members.all() if m.registered])
+        return self.members.filter(character_id__in=self._registered_character_ids())
 
     @property
     def unregistered_member_count(self):
@@ -115,15 +146,23 @@ class CorpStats(models.Model):
 
     @property
     def unregistered_members(self):
-        return self.members.filter(pk__in=[m.pk for m in self.members.all() if not m.registered])
+        return self.members.exclude(character_id__in=self._registered_character_ids())
 
     @property
     def main_count(self):
-        return len(self.mains)
+        return self.mains.count()
 
     @property
     def mains(self):
-        return self.members.filter(pk__in=[m.pk for m in self.members.all() if m.main_character and int(m.main_character.character_id) == int(m.character_id)])
+        return self.members.filter(
+            character_id__in=CharacterOwnership.objects.filter(
+                user__profile__main_character=models.F('character')
+            ).values('character__character_id')
+        )
+
+    @staticmethod
+    def _registered_character_ids():
+        return CharacterOwnership.objects.values('character__character_id')
 
     def visible_to(self, user):
         return CorpStats.objects.filter(pk=self.pk).visible_to(user).exists()
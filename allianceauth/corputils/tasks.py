@@ -1,14 +1,40 @@
+import logging
+
 from celery import shared_task
+from allianceauth.corputils.managers import MEMBERS_CACHE_TIMEOUT
 from allianceauth.corputils.models import CorpStats
 
+logger = logging.getLogger(__name__)
+
+TASK_PRIORITY = 7
+
 
 @shared_task
-def update_corpstats(pk):
-    cs = CorpStats.objects.get(pk=pk)
+def update_corpstats(pk, force=False):
+    try:
+        cs = CorpStats.objects.get(pk=pk)
+    except CorpStats.DoesNotExist:
+        logger.info("CorpStats %s no longer exists. Skipping update.", pk)
+        return
+    if not force and not cs.is_expired:
+        logger.debug("%s has been updated within the ESI cache window. Skipping update.", cs)
+        return
     cs.update()
 
 
 @shared_task
 def update_all_corpstats():
-    for cs in CorpStats.objects.all():
-        update_corpstats.delay(cs.pk)
+    """Update all corp stats with expired member data.
+
+    Updates are spread evenly across the ESI cache window of the member list,
+    so that not all corp stats hit ESI at the same time.
+    """
+    pks = list(CorpStats.objects.expired().order_by('last_update').values_list('pk', flat=True))
+    if not pks:
+        return
+    logger.info("Scheduling updates for %d corp stats", len(pks))
+    interval = MEMBERS_CACHE_TIMEOUT / len(pks)
+    for num, pk in enumerate(pks):
+        update_corpstats.apply_async(
+            args=[pk], countdown=int(num * interval), priority=TASK_PRIORITY
+        )
@@ -1,8 +1,12 @@
+from datetime import timedelta
 from unittest import mock
 
 from django.test import TestCase
+from django.utils import timezone
 from allianceauth.tests.auth_utils import AuthUtils
+from .managers import MEMBERS_CACHE_TIMEOUT
 from .models import CorpStats, CorpMember
+from .tasks import update_all_corpstats, update_corpstats
 from allianceauth.eveonline.models import EveCorporationInfo, EveAllianceInfo, EveCharacter
 from esi.models import Token
 from esi.errors import TokenError
@@ -99,6 +103,24 @@ class CorpStatsUpdateTestCase(TestCase):
         self.corpstats.update()
         self.assertFalse(CorpMember.objects.filter(character_id='2', corpstats=self.corpstats).exists())
 
+    @mock.patch('esi.clients.SwaggerClient')
+    def test_update_only_adds_new_members(self, SwaggerClient):
+        CorpMember.objects.create(character_id=1, character_name='test character', corpstats=self.corpstats)
+        CorpMember.objects.create(character_id=2, character_name='old test character', corpstats=self.corpstats)
+        member_ids = list(range(1, 301))
+        SwaggerClient.from_spec.return_value.Character.get_characters_character_id.return_value.result.return_value = {'corporation_id': 2}
+        SwaggerClient.from_spec.return_value.Corporation.get_corporations_corporation_id_members.return_value.result.return_value = member_ids[:1] + member_ids[2:]
+        post_universe_names = SwaggerClient.from_spec.return_value.Universe.post_universe_names
+        post_universe_names.side_effect = lambda ids: mock.Mock(**{'result.return_value': [{'id': m_id, 'name': f'character {m_id}'} for m_id in ids]})
+
+        with self.assertNumQueries(4):
+            self.corpstats.update()
+
+        requested_ids = {m_id for call in post_universe_names.call_args_list for m_id in call[1]['ids']}
+        self.assertSetEqual(requested_ids, set(member_ids[2:]))
+        self.assertEqual(self.corpstats.members.count(), 299)
+        self.assertFalse(self.corpstats.members.filter(character_id=2).exists())
+
     @mock.patch('allianceauth.corputils.models.notify')
     @mock.patch('esi.clients.SwaggerClient')
     def test_update_deleted_token(self, SwaggerClient, notify):
@@ -278,3 +300,74 @@ class CorpMemberTestCase(TestCase):
         self.assertEqual(self.member.portrait_url(size=32), self.member.portrait_url_32)
         self.assertEqual(self.member.portrait_url(size=64), self.member.portrait_url_64)
         self.assertEqual(self.member.portrait_url(size=128), self.member.portrait_url_128)
+
+
+class CorpStatsTasksTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AuthUtils.create_user('test')
+        AuthUtils.add_main_character(cls.user, 'test character', '1', corp_id=2, corp_name='test_corp', corp_ticker='TEST', alliance_id=3, alliance_name='TEST')
+        cls.token = Token.objects.create(user=cls.user, access_token='a', character_id=1, character_name='test character', character_owner_hash='z')
+        cls.corpstats = []
+        for corp_id in range(10, 14):
+            corp = EveCorporationInfo.objects.create(corporation_id=corp_id, corporation_name=f'test corp {corp_id}', corporation_ticker='TEST', member_count=1)
+            cls.corpstats.append(CorpStats.objects.create(token=cls.token, corp=corp))
+
+    def _expire(self, corpstats):
+        CorpStats.objects.filter(pk__in=[cs.pk for cs in corpstats]).update(
+            last_update=timezone.now() - timedelta(seconds=MEMBERS_CACHE_TIMEOUT + 1)
+        )
+
+    @mock.patch('allianceauth.corputils.tasks.update_corpstats')
+    def test_update_all_corpstats_spreads_expired_updates(self, update_corpstats):
+        self._expire(self.corpstats[:3])
+
+        update_all_corpstats()
+
+        self.assertEqual(update_corpstats.apply_async.call_count, 3)
+        pks = [call[1]['args'][0] for call in update_corpstats.apply_async.call_args_list]
+        self.assertSetEqual(set(pks), {cs.pk for cs in self.corpstats[:3]})
+        countdowns = [call[1]['countdown'] for call in update_corpstats.apply_async.call_args_list]
+        self.assertListEqual(countdowns, [0, 1200, 2400])
+
+    @mock.patch('allianceauth.corputils.tasks.update_corpstats')
+    def test_update_all_corpstats_skips_up_to_date(self, update_corpstats):
+        update_all_corpstats()
+
+        self.assertFalse(update_corpstats.apply_async.called)
+
+    @mock.patch('allianceauth.corputils.models.CorpStats.update')
+    def test_update_corpstats_skips_up_to_date(self, update):
+        update_corpstats(self.corpstats[0].pk)
+
+        self.assertFalse(update.called)
+
+    @mock.patch('allianceauth.corputils.models.CorpStats.update')
+    def test_update_corpstats_updates_expired(self, update):
+        self._expire(self.corpstats[:1])
+
+        update_corpstats(self.corpstats[0].pk)
+
+        self.assertTrue(update.called)
+
+    @mock.patch('allianceauth.corputils.models.CorpStats.update')
+    def test_update_corpstats_forced(self, update):
+        update_corpstats(self.corpstats[0].pk, force=True)
+
+        self.assertTrue(update.called)
+
+    @mock.patch('allianceauth.corputils.models.CorpStats.update')
+    def test_update_corpstats_deleted(self, update):
+        update_corpstats(0)
+
+        self.assertFalse(update.called)
+
+    def test_fetch_names_in_chunks(self):
+        client = mock.Mock()
+        client.Universe.post_universe_names.side_effect = lambda ids: mock.Mock(**{'result.return_value': [{'id': m_id} for m_id in ids]})
+        id_chunks = [[1, 2], [3], [4, 5], [6], [7]]
+
+        result = CorpStats._fetch_names(client, id_chunks)
+
+        self.assertListEqual(result, [[{'id': 1}, {'id': 2}], [{'id': 3}], [{'id': 4}, {'id': 5}], [{'id': 6}], [{'id': 7}]])
+        self.assertEqual(client.Universe.post_universe_names.call_count, 5)
@@ -0,0 +1,48 @@
+from django.conf import settings
+
+
+def _clean_setting(
+    name: str,
+    default_value: object,
+    min_value: int = None,
+    max_value: int = None,
+    required_type: type = None
+):
+    """cleans the input for a custom setting
+
+    Will use `default_value` if settings does not exit or has the wrong type
+    or is outside define boundaries (for int only)
+
+    Need to define `required_type` if `default_value` is `None`
+
+    Will assume `min_value` of 0 for int (can be overriden)
+
+    Returns cleaned value for setting
+    """
+    if default_value is None and not required_type:
+        raise ValueError('You must specify a required_type for None defaults')
+
+    if not required_type:
+        required_type = type(default_value)
+
+    if min_value is None and required_type == int:
+        min_value = 0
+
+    if (hasattr(settings, name)
+        and isinstance(getattr(settings, name), required_type)
+        and (min_value is None or getattr(settings, name) >= min_value)
+        and (max_value is None or getattr(settings, name) <= max_value)
+    ):
+        return getattr(settings, name)
+    else:
+        return default_value
+
+
+# Only schedule updates for corporations and alliances that changed
+# or have not been updated within EVEONLINE_MODEL_UPDATE_MAX_AGE
+EVEONLINE_MODEL_UPDATE_INCREMENTAL = \
+    _clean_setting('EVEONLINE_MODEL_UPDATE_INCREMENTAL', False)
+
+# Max seconds between full updates of an entity in incremental mode
+EVEONLINE_MODEL_UPDATE_MAX_AGE = \
+    _clean_setting('EVEONLINE_MODEL_UPDATE_MAX_AGE', 24 * 3600, min_value=3600)
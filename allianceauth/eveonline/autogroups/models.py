@@ -1,9 +1,12 @@
 import logging
+from collections import defaultdict
+
 from django.db import models, transaction
 from django.contrib.auth.models import Group, User
 from django.core.exceptions import ObjectDoesNotExist
 
 from allianceauth.authentication.models import State
+from allianceauth.authentication.signals import users_groups_changed
 from allianceauth.eveonline.models import EveCorporationInfo, EveAllianceInfo
 
 logger = logging.getLogger(__name__)
@@ -22,12 +25,96 @@ class AutogroupsConfigManager(models.Manager):
         :param state: State to update for
         :return:
         """
-        users = get_users_for_state(state)
-        for config in self.filter(states=state):
-            logger.debug("in state loop")
-            for user in users:
-                logger.debug(f"in user loop for {user}")
-                config.update_group_membership_for_user(user)
+        self.update_groups_for_users(get_users_for_state(state))
+
+    @transaction.atomic
+    def update_groups_for_users(self, users: models.QuerySet) -> set:
+        """
+        Update the Group memberships of all configs for the given users in bulk.
+
+        The desired memberships are computed in one pass from the users
+        main characters and compared against the current memberships.
+        Only the difference is written to the database.
+        Instead of m2m_changed signals, one users_groups_changed signal
+        is sent for all affected users.
+        :param users: User queryset to update for
+        :return: pks of users whose memberships changed
+        """
+        rows = list(users.values_list(
+            'pk',
+            'profile__state_id',
+            'profile__main_character__corporation_id',
+            'profile__main_character__alliance_id',
+        ))
+        corps = EveCorporationInfo.objects.in_bulk(
+            {row[2] for row in rows if row[2]}, field_name='corporation_id'
+        )
+        alliances = EveAllianceInfo.objects.in_bulk(
+            {row[3] for row in rows if row[3]}, field_name='alliance_id'
+        )
+        desired = set()
+        skipped_user_pks = set()
+        for config in self.prefetch_related('states'):
+            state_pks = {state.pk for state in config.states.all()}
+            corp_groups = {}
+            alliance_groups = {}
+            for user_pk, state_pk, corp_id, alliance_id in rows:
+                if state_pk not in state_pks:
+                    continue
+                try:
+                    if config.corp_groups and corp_id:
+                        if corp_id not in corp_groups:
+                            if corp_id not in corps:
+                                logger.debug(f'Corporation {corp_id} does not exist in the database. Creating.')
+                                corps[corp_id] = EveCorporationInfo.objects.create_corporation(corp_id)
+                            corp_groups[corp_id] = config.get_corp_group(corps[corp_id]).pk
+                        desired.add((user_pk, corp_groups[corp_id]))
+                    if config.alliance_groups and alliance_id:
+                        if alliance_id not in alliance_groups:
+                            if alliance_id not in alliances:
+                                logger.debug(f'Alliance {alliance_id} does not exist in the database. Creating.')
+                                alliances[alliance_id] = EveAllianceInfo.objects.create_alliance(alliance_id)
+                            alliance_groups[alliance_id] = config.get_alliance_group(alliances[alliance_id]).pk
+                        desired.add((user_pk, alliance_groups[alliance_id]))
+                except Exception:
+                    logger.exception(f'Failed to resolve autogroups for user {user_pk}. Group membership not updated')
+                    skipped_user_pks.add(user_pk)
+
+        managed_group_pks = set(
+            ManagedCorpGroup.objects.values_list('group_id', flat=True)
+        ) | set(
+            ManagedAllianceGroup.objects.values_list('group_id', flat=True)
+        )
+        through = User.groups.through
+        current = set(
+            through.objects
+            .filter(user__in=users, group_id__in=managed_group_pks)
+            .values_list('user_id', 'group_id')
+        )
+        desired = {pair for pair in desired if pair[0] not in skipped_user_pks}
+        current = {pair for pair in current if pair[0] not in skipped_user_pks}
+        to_add = desired - current
+        to_remove = current - desired
+
+        if to_add:
+            through.objects.bulk_create(
+                [through(user_id=user_pk, group_id=group_pk) for user_pk, group_pk in to_add],
+                ignore_conflicts=True
+            )
+        remove_by_group = defaultdict(set)
+        for user_pk, group_pk in to_remove:
+            remove_by_group[group_pk].add(user_pk)
+        for group_pk, user_pks in remove_by_group.items():
+            through.objects.filter(group_id=group_pk, user_id__in=user_pks).delete()
+
+        changed_user_pks = {pair[0] for pair in to_add | to_remove}
+        logger.debug(
+            f'Added {len(to_add)} and removed {len(to_remove)} autogroup memberships '
+            f'for {len(changed_user_pks)} users'
+        )
+        if changed_user_pks:
+            users_groups_changed.send(sender=self.model, user_pks=changed_user_pks)
+        return changed_user_pks
 
     def update_groups_for_user(self, user: User, state: State = None):
         """
@@ -90,10 +177,12 @@ class AutogroupsConfig(models.Model):
         return 'States: ' + (' '.join(list(self.states.all().values_list('name', flat=True))) if self.pk else str(None))
 
     def update_all_states_group_membership(self):
-        list(map(self.update_group_membership_for_state, self.states.all()))
+        AutogroupsConfig.objects.update_groups_for_users(
+            User.objects.filter(profile__state__in=self.states.all())
+        )
 
     def update_group_membership_for_state(self, state: State):
-        list(map(self.update_group_membership_for_user, get_users_for_state(state)))
+        AutogroupsConfig.objects.update_groups_for_state(state)
 
     @transaction.atomic
     def update_group_membership_for_user(self, user: User):
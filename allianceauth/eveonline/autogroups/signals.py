@@ -1,8 +1,11 @@
 import logging
 from django.dispatch import receiver
+from django.contrib.auth.models import User
 from django.db.models.signals import pre_save, post_save, pre_delete, m2m_changed
 from allianceauth.authentication.models import UserProfile, State
+from allianceauth.authentication.signals import users_states_changed
 from allianceauth.eveonline.models import EveCharacter
+from allianceauth.eveonline.signals import characters_changed
 
 from .models import AutogroupsConfig
 
@@ -49,6 +52,14 @@ def check_groups_on_profile_update(sender, instance, created, *args, **kwargs):
     AutogroupsConfig.objects.update_groups_for_user(instance.user)
 
 
+@receiver(users_states_changed)
+def check_groups_on_states_update(sender, user_pks, *args, **kwargs):
+    """
+    Trigger check for all users whose states have been changed in bulk.
+    """
+    AutogroupsConfig.objects.update_groups_for_users(User.objects.filter(pk__in=user_pks))
+
+
 @receiver(m2m_changed, sender=AutogroupsConfig.states.through)
 def autogroups_states_changed(sender, instance, action, reverse, model, pk_set, *args, **kwargs):
     """
@@ -73,3 +84,13 @@ def check_groups_on_character_update(sender, instance, created, *args, **kwargs)
             AutogroupsConfig.objects.update_groups_for_user(profile.user)
         except UserProfile.DoesNotExist:
             pass
+
+
+@receiver(characters_changed, sender=EveCharacter)
+def check_groups_on_characters_update(sender, characters, *args, **kwargs):
+    """
+    Trigger check for all users whose main character has been updated in bulk.
+    """
+    AutogroupsConfig.objects.update_groups_for_users(
+        User.objects.filter(profile__main_character__in=characters)
+    )
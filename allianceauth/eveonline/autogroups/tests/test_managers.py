@@ -1,8 +1,12 @@
+from django.contrib.auth.models import Group, User
 from django.test import TestCase
+
+from allianceauth.authentication.signals import users_groups_changed
+from allianceauth.eveonline.models import EveAllianceInfo, EveCorporationInfo
 from allianceauth.tests.auth_utils import AuthUtils
 
 from ..models import AutogroupsConfig
-from . import patch
+from . import patch, connect_signals, disconnect_signals
 
 
 class AutogroupsConfigManagerTestCase(TestCase):
@@ -12,13 +16,12 @@ class AutogroupsConfigManagerTestCase(TestCase):
         obj = AutogroupsConfig.objects.create()
         obj.states.add(member.profile.state)
 
-        with patch('.models.AutogroupsConfig.update_group_membership_for_user') as update_group_membership_for_user:
+        with patch('.models.AutogroupsConfigManager.update_groups_for_users') as update_groups_for_users:
             AutogroupsConfig.objects.update_groups_for_state(member.profile.state)
 
-            self.assertTrue(update_group_membership_for_user.called)
-            self.assertEqual(update_group_membership_for_user.call_count, 1)
-            args, kwargs = update_group_membership_for_user.call_args
-            self.assertEqual(args[0], member)
+            self.assertEqual(update_groups_for_users.call_count, 1)
+            args, kwargs = update_groups_for_users.call_args
+            self.assertIn(member, args[0])
 
     def test_update_groups_for_user(self):
         member = AuthUtils.create_member('test member')
@@ -73,3 +76,88 @@ class AutogroupsConfigManagerTestCase(TestCase):
         AutogroupsConfig.objects.update_groups_for_user(member)
 
         self.assertTrue(update_groups.called)
+
+
+class TestUpdateGroupsForUsers(TestCase):
+    def setUp(self):
+        disconnect_signals()
+        self.alliance = EveAllianceInfo.objects.create(
+            alliance_id=3456,
+            alliance_name='alliance name',
+            alliance_ticker='TIKR',
+            executor_corp_id=2345,
+        )
+        self.corp = EveCorporationInfo.objects.create(
+            corporation_id=2345,
+            corporation_name='corp name',
+            corporation_ticker='TIKK',
+            member_count=10,
+            alliance=self.alliance,
+        )
+        self.member = AuthUtils.create_member('test member')
+        AuthUtils.add_main_character_2(
+            self.member, 'test character', 1234, corp_id=2345, alliance_id=3456, disconnect_signals=True
+        )
+        self.member_2 = AuthUtils.create_member('test member 2')
+        AuthUtils.add_main_character_2(
+            self.member_2, 'test character 2', 1235, corp_id=2345, alliance_id=3456, disconnect_signals=True
+        )
+        self.guest = AuthUtils.create_user('test guest', disconnect_signals=True)
+        self.config = AutogroupsConfig.objects.create(corp_groups=True, alliance_groups=True)
+        self.config.states.add(self.member.profile.state)
+        self.received = []
+        users_groups_changed.connect(self._receiver)
+
+    def tearDown(self):
+        users_groups_changed.disconnect(self._receiver)
+        connect_signals()
+
+    def _receiver(self, sender, user_pks, **kwargs):
+        self.received.append(set(user_pks))
+
+    def test_should_add_users_to_groups(self):
+        AutogroupsConfig.objects.update_groups_for_users(User.objects.all())
+
+        corp_group = self.config.get_corp_group(self.corp)
+        alliance_group = self.config.get_alliance_group(self.alliance)
+        for user in [self.member, self.member_2]:
+            self.assertIn(corp_group, user.groups.all())
+            self.assertIn(alliance_group, user.groups.all())
+        self.assertEqual(self.guest.groups.count(), 0)
+        self.assertListEqual(self.received, [{self.member.pk, self.member_2.pk}])
+
+    def test_should_remove_users_from_groups_of_other_states(self):
+        corp_group = self.config.get_corp_group(self.corp)
+        other_group = Group.objects.create(name='not managed')
+        self.guest.groups.add(corp_group, other_group)
+
+        AutogroupsConfig.objects.update_groups_for_users(User.objects.filter(pk=self.guest.pk))
+
+        self.assertQuerysetEqual(self.guest.groups.all(), [other_group])
+        self.assertListEqual(self.received, [{self.guest.pk}])
+
+    def test_should_only_apply_difference(self):
+        AutogroupsConfig.objects.update_groups_for_users(User.objects.all())
+        self.received.clear()
+
+        changed = AutogroupsConfig.objects.update_groups_for_users(User.objects.all())
+
+        self.assertSetEqual(changed, set())
+        self.assertListEqual(self.received, [])
+
+    def test_should_create_missing_corporation(self):
+        corp = self.corp
+        corp.delete()
+
+        with patch('.models.EveCorporationInfo.objects.create_corporation') as create_corporation:
+            create_corporation.side_effect = lambda corp_id: EveCorporationInfo.objects.create(
+                corporation_id=corp_id,
+                corporation_name=corp.corporation_name,
+                corporation_ticker=corp.corporation_ticker,
+                member_count=10,
+            )
+            AutogroupsConfig.objects.update_groups_for_users(User.objects.all())
+
+        self.assertEqual(create_corporation.call_count, 1)
+        corp = EveCorporationInfo.objects.get(corporation_id=2345)
+        self.assertIn(self.config.get_corp_group(corp), self.member.groups.all())
@@ -4,6 +4,9 @@ from django.contrib.auth.models import User
 from allianceauth.tests.auth_utils import AuthUtils
 
 from allianceauth.eveonline.models import EveCharacter, EveCorporationInfo, EveAllianceInfo
+from allianceauth.authentication.models import UserProfile
+from allianceauth.authentication.signals import users_states_changed
+from allianceauth.eveonline.signals import characters_changed
 
 from ..models import AutogroupsConfig
 
@@ -99,6 +102,41 @@ class SignalsTestCase(TestCase):
         member = User.objects.get(pk=self.member.pk)
         self.assertEqual(member.profile.state, AuthUtils.get_member_state())
 
+    @patch('.models.AutogroupsConfigManager.update_groups_for_users')
+    def test_check_groups_on_characters_update(self, update_groups_for_users):
+        """
+        Test update_groups_for_users is called once when main characters
+        are updated in bulk.
+        """
+        other_char = EveCharacter.objects.create(
+            character_id='1267',
+            character_name='test character3',
+            corporation_id='2345',
+            corporation_name='test corp',
+            corporation_ticker='tickr',
+        )
+
+        # Trigger signal
+        characters_changed.send(
+            sender=EveCharacter, characters=[self.member.profile.main_character, other_char]
+        )
+
+        self.assertEqual(update_groups_for_users.call_count, 1)
+        args, kwargs = update_groups_for_users.call_args
+        self.assertQuerysetEqual(args[0], [self.member])
+
+    @patch('.models.AutogroupsConfigManager.update_groups_for_users')
+    def test_check_groups_on_states_update(self, update_groups_for_users):
+        """
+        Test update_groups_for_users is called when states
+        are changed in bulk.
+        """
+        users_states_changed.send(sender=UserProfile, user_pks=[self.member.pk])
+
+        self.assertEqual(update_groups_for_users.call_count, 1)
+        args, kwargs = update_groups_for_users.call_args
+        self.assertQuerysetEqual(args[0], [self.member])
+
     @patch('.models.AutogroupsConfig.delete_corp_managed_groups')
     @patch('.models.AutogroupsConfig.delete_alliance_managed_groups')
     def test_pre_save_config_deletes_alliance_groups(self, delete_alliance_managed_groups, delete_corp_managed_groups):
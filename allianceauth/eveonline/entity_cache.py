@@ -0,0 +1,159 @@
+"""Two tier cache for entities fetched from ESI."""
+
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from redis import Redis, RedisError
+
+from allianceauth.utils.cache import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class EntityCache:
+    """A cache for entities fetched from ESI, e.g. corporations and alliances.
+
+    Entries are keyed by entity type and ID and stored in two tiers:
+    A small LRU cache in process memory and a cache shared by all processes in Redis.
+    Entities which do not exist on ESI can be cached too (negative caching).
+
+    Redis is used when it is the configured Django cache backend,
+    otherwise only the in-process tier is used.
+
+    Args:
+        - maxsize: Max number of entries in the in-process tier
+        - redis: A Redis client. Will use AA's cache client by default
+    """
+
+    CACHE_KEY_BASE = "allianceauth-eveonline-entity"
+    DEFAULT_TIMEOUT = 3600
+    NOT_FOUND_TIMEOUT = 3600
+    MINIMUM_TIMEOUT = 60
+    _NOT_FOUND = "not-found"
+
+    MISS = object()
+    """Returned by :meth:`get` when there is no entry for an entity."""
+
+    NOT_FOUND = object()
+    """Returned by :meth:`get` when an entity is cached as not found."""
+
+    def __init__(self, maxsize: int = 2000, redis: Optional[Redis] = None) -> None:
+        self._maxsize = int(maxsize)
+        self._redis = redis
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def redis(self) -> Optional[Redis]:
+        if self._redis is None:
+            redis = get_redis_client()
+            self._redis = redis if isinstance(redis, Redis) else False
+        return self._redis or None
+
+    def _cache_key(self, type_name: str, obj_id: int) -> str:
+        return f"{self.CACHE_KEY_BASE}-{type_name}-{int(obj_id)}"
+
+    def get(self, type_name: str, obj_id: int):
+        """Return the cached data for an entity.
+
+        :return: the data, :attr:`NOT_FOUND` or :attr:`MISS`
+        """
+        key = self._cache_key(type_name, obj_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                value, expires_at = entry
+                if expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    return self.NOT_FOUND if value == self._NOT_FOUND else value
+                del self._entries[key]
+
+        if self.redis:
+            try:
+                with self.redis.pipeline() as pipe:
+                    raw, pttl = pipe.get(key).pttl(key).execute()
+            except RedisError:
+                logger.warning("Failed to read %s from Redis", key, exc_info=True)
+                raw = None
+            if raw is not None and pttl and pttl > 0:
+                value = json.loads(raw)
+                self._set_local(key, value, pttl / 1000)
+                return self.NOT_FOUND if value == self._NOT_FOUND else value
+
+        return self.MISS
+
+    def set(self, type_name: str, obj_id: int, data: dict, timeout: float = None):
+        """Cache data for an entity.
+
+        Args:
+            - timeout: Seconds until the entry expires, e.g. from :func:`timeout_from_headers`
+        """
+        self._set(self._cache_key(type_name, obj_id), data, timeout)
+
+    def set_not_found(self, type_name: str, obj_id: int, timeout: float = None):
+        """Cache an entity as not found."""
+        self._set(
+            self._cache_key(type_name, obj_id),
+            self._NOT_FOUND,
+            timeout if timeout is not None else self.NOT_FOUND_TIMEOUT
+        )
+
+    def delete(self, type_name: str, obj_id: int):
+        """Remove an entity from the cache."""
+        key = self._cache_key(type_name, obj_id)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.redis:
+            try:
+                self.redis.delete(key)
+            except RedisError:
+                logger.warning("Failed to delete %s from Redis", key, exc_info=True)
+
+    def clear(self):
+        """Remove all entities from the cache."""
+        with self._lock:
+            self._entries.clear()
+        if self.redis:
+            try:
+                keys = list(self.redis.scan_iter(f"{self.CACHE_KEY_BASE}-*"))
+                if keys:
+                    self.redis.delete(*keys)
+            except RedisError:
+                logger.warning("Failed to clear entities from Redis", exc_info=True)
+
+    def _set(self, key: str, value, timeout: Optional[float]):
+        if timeout is None:
+            timeout = self.DEFAULT_TIMEOUT
+        timeout = max(timeout, self.MINIMUM_TIMEOUT)
+        self._set_local(key, value, timeout)
+        if self.redis:
+            try:
+                self.redis.set(key, json.dumps(value), px=int(timeout * 1000))
+            except RedisError:
+                logger.warning("Failed to write %s to Redis", key, exc_info=True)
+
+    def _set_local(self, key: str, value, timeout: float):
+        with self._lock:
+            self._entries[key] = (value, time.time() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+
+def timeout_from_headers(headers) -> Optional[float]:
+    """Return seconds until expiry from the Expires header of an ESI response
+    or None if it can not be determined.
+    """
+    try:
+        expires = parsedate_to_datetime(headers["Expires"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return (expires - datetime.now(timezone.utc)).total_seconds()
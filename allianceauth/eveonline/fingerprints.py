@@ -0,0 +1,88 @@
+"""Fingerprints for detecting changes of entities between model updates."""
+
+import hashlib
+import json
+import time
+from typing import Dict, Iterable, Optional, Set
+
+from redis import Redis
+
+from allianceauth.utils.cache import get_redis_client
+
+
+class FingerprintStore:
+    """Stores fingerprints of entities of one type and when they were last updated.
+
+    A fingerprint is a hash of the attributes of an entity that matter
+    for a model update, e.g. its name and affiliations.
+
+    Args:
+        - type_name: Type of the entities, e.g. "corporation"
+        - redis: A Redis client. Will use AA's cache client by default
+    """
+
+    CACHE_KEY_BASE = "allianceauth-eveonline-fingerprint"
+
+    def __init__(self, type_name: str, redis: Optional[Redis] = None) -> None:
+        self._type_name = str(type_name)
+        self._redis = get_redis_client() if not redis else redis
+
+    @property
+    def _cache_key(self) -> str:
+        return f"{self.CACHE_KEY_BASE}-{self._type_name}"
+
+    @staticmethod
+    def fingerprint(*values) -> str:
+        """Return fingerprint for given attribute values."""
+        return hashlib.md5(json.dumps(values).encode("utf-8")).hexdigest()
+
+    def stale_ids(self, fingerprints: Dict[int, str], max_age: float) -> Set[int]:
+        """Return IDs of entities whose fingerprint has changed since the last update
+        or which have not been updated for more then max_age seconds.
+        """
+        obj_ids = list(fingerprints.keys())
+        if not obj_ids:
+            return set()
+        stored = self._redis.hmget(self._cache_key, obj_ids)
+        oldest = time.time() - max_age
+        stale = set()
+        for obj_id, raw in zip(obj_ids, stored):
+            if raw is None:
+                stale.add(obj_id)
+                continue
+            fingerprint, checked_at = json.loads(raw)
+            if fingerprint != fingerprints[obj_id] or checked_at < oldest:
+                stale.add(obj_id)
+        return stale
+
+    def update(self, fingerprints: Dict[int, str]):
+        """Store fingerprints of entities which have just been updated."""
+        if fingerprints:
+            now = time.time()
+            self._redis.hset(
+                self._cache_key,
+                mapping={
+                    obj_id: json.dumps([fingerprint, now])
+                    for obj_id, fingerprint in fingerprints.items()
+                }
+            )
+
+    def delete(self, obj_ids: Iterable[int]):
+        """Remove stored fingerprints, so the entities are updated on next check."""
+        obj_ids = list(obj_ids)
+        if obj_ids:
+            self._redis.hdel(self._cache_key, *obj_ids)
+
+    def prune(self, valid_ids: Iterable[int]):
+        """Remove stored fingerprints of all entities not in valid_ids."""
+        valid_ids = {str(obj_id) for obj_id in valid_ids}
+        obsolete_ids = [
+            obj_id for obj_id in self._redis.hkeys(self._cache_key)
+            if (obj_id.decode() if isinstance(obj_id, bytes) else obj_id) not in valid_ids
+        ]
+        if obsolete_ids:
+            self._redis.hdel(self._cache_key, *obsolete_ids)
+
+    def clear(self):
+        """Remove all stored fingerprints of this type."""
+        self._redis.delete(self._cache_key)
@@ -1,5 +1,7 @@
 import logging
 import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from bravado.exception import HTTPNotFound, HTTPUnprocessableEntity, HTTPError
 from jsonschema.exceptions import RefResolutionError
@@ -10,6 +12,8 @@ from esi.clients import esi_client_factory
 from allianceauth import __version__
 from allianceauth.utils.django import StartupCommand
 
+from .entity_cache import EntityCache, timeout_from_headers
+
 
 SWAGGER_SPEC_PATH = os.path.join(os.path.dirname(
     os.path.abspath(__file__)), 'swagger.json'
@@ -27,6 +31,13 @@ ESI_OPERATIONS=[
     'post_universe_names',
 ]
 
+# max number of IDs ESI accepts in one request to the bulk endpoints
+# post_universe_names and post_characters_affiliation
+ESI_MAX_IDS_PER_REQUEST = 1000
+
+# max number of concurrent requests when fetching entities without a bulk endpoint
+ESI_MAX_WORKERS = 10
+
 
 logger = logging.getLogger(__name__)
 
@@ -173,9 +184,27 @@ class EveProvider:
         """
         raise NotImplementedError()
 
+    def get_alliances(self, alliance_ids):
+        """
+        :return: a dict of Alliance objects for the given IDs keyed by ID
+        """
+        raise NotImplementedError()
+
+    def get_corps(self, corp_ids):
+        """
+        :return: a dict of Corporation objects for the given IDs keyed by ID
+        """
+        raise NotImplementedError()
+
+    def get_characters(self, character_ids):
+        """
+        :return: a dict of Character objects for the given IDs keyed by ID
+        """
+        raise NotImplementedError()
+
 
 class EveSwaggerProvider(EveProvider):
-    def __init__(self, token=None, adapter=None):
+    def __init__(self, token=None, adapter=None, cache=None):
         if settings.DEBUG or StartupCommand().is_management_command:
             self._client = None
             logger.info('ESI client will be loaded on-demand')
@@ -197,6 +226,9 @@ class EveSwaggerProvider(EveProvider):
         self._token = token
         self.adapter = adapter or self
         self._faction_list = None  # what are the odds this will change? could cache forever!
+        self.cache = cache if cache is not None else EntityCache()
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
 
     @property
     def client(self):
@@ -210,38 +242,72 @@ class EveSwaggerProvider(EveProvider):
         return 'esi'
 
     def get_alliance(self, alliance_id: int) -> Alliance:
-        """Fetch alliance from ESI."""
-        try:
-            data = self.client.Alliance.get_alliances_alliance_id(alliance_id=alliance_id).result()
-            corps = self.client.Alliance.get_alliances_alliance_id_corporations(alliance_id=alliance_id).result()
-            model = Alliance(
-                id=alliance_id,
-                name=data['name'],
-                ticker=data['ticker'],
-                corp_ids=corps,
-                executor_corp_id=data['executor_corporation_id'] if 'executor_corporation_id' in data else None,
-                faction_id=data['faction_id'] if 'faction_id' in data else None,
-            )
-            return model
-        except HTTPNotFound:
-            raise ObjectNotFound(alliance_id, 'alliance')
+        """Fetch alliance from cache or ESI."""
+        return Alliance(**self._get_cached('alliance', alliance_id, self._fetch_alliance_data))
+
+    def _fetch_alliance_data(self, alliance_id: int) -> tuple:
+        data, timeout = self._result_with_timeout(
+            self.client.Alliance.get_alliances_alliance_id(alliance_id=alliance_id)
+        )
+        corps, corps_timeout = self._result_with_timeout(
+            self.client.Alliance.get_alliances_alliance_id_corporations(alliance_id=alliance_id)
+        )
+        if timeout is None or (corps_timeout is not None and corps_timeout < timeout):
+            timeout = corps_timeout
+        model_data = {
+            'id': alliance_id,
+            'name': data['name'],
+            'ticker': data['ticker'],
+            'corp_ids': corps,
+            'executor_corp_id': data['executor_corporation_id'] if 'executor_corporation_id' in data else None,
+            'faction_id': data['faction_id'] if 'faction_id' in data else None,
+        }
+        return model_data, timeout
 
     def get_corp(self, corp_id: int) -> Corporation:
-        """Fetch corporation from ESI."""
-        try:
-            data = self.client.Corporation.get_corporations_corporation_id(corporation_id=corp_id).result()
-            model = Corporation(
-                id=corp_id,
-                name=data['name'],
-                ticker=data['ticker'],
-                ceo_id=data['ceo_id'],
-                members=data['member_count'],
-                alliance_id=data['alliance_id'] if 'alliance_id' in data else None,
-                faction_id=data['faction_id'] if 'faction_id' in data else None,
-            )
-            return model
-        except HTTPNotFound:
-            raise ObjectNotFound(corp_id, 'corporation')
+        """Fetch corporation from cache or ESI."""
+        return Corporation(**self._get_cached('corporation', corp_id, self._fetch_corp_data))
+
+    def _fetch_corp_data(self, corp_id: int) -> tuple:
+        data, timeout = self._result_with_timeout(
+            self.client.Corporation.get_corporations_corporation_id(corporation_id=corp_id)
+        )
+        model_data = {
+            'id': corp_id,
+            'name': data['name'],
+            'ticker': data['ticker'],
+            'ceo_id': data['ceo_id'],
+            'members': data['member_count'],
+            'alliance_id': data['alliance_id'] if 'alliance_id' in data else None,
+            'faction_id': data['faction_id'] if 'faction_id' in data else None,
+        }
+        return model_data, timeout
+
+    def _get_cached(self, type_name: str, obj_id: int, fetcher) -> dict:
+        """Return data for an entity from the cache or fetch and cache it.
+
+        Raises ObjectNotFound also for entities cached as not found.
+        """
+        data = self.cache.get(type_name, obj_id)
+        if data is EntityCache.NOT_FOUND:
+            raise ObjectNotFound(obj_id, type_name)
+        if data is EntityCache.MISS:
+            try:
+                data, timeout = fetcher(obj_id)
+            except HTTPNotFound as ex:
+                self.cache.set_not_found(
+                    type_name, obj_id, timeout_from_headers(getattr(ex.response, 'headers', None))
+                )
+                raise ObjectNotFound(obj_id, type_name)
+            self.cache.set(type_name, obj_id, data, timeout)
+        return data
+
+    @staticmethod
+    def _result_with_timeout(operation) -> tuple:
+        """Return result of an ESI operation and seconds until it expires."""
+        operation.request_config.also_return_response = True
+        data, response = operation.result()
+        return data, timeout_from_headers(response.headers)
 
     def get_character(self, character_id: int) -> Character:
         """Fetch character from ESI."""
@@ -271,6 +337,164 @@ class EveSwaggerProvider(EveProvider):
             raise ObjectNotFound(character_id, 'character')
         return character["name"]
 
+    def get_alliances(self, alliance_ids) -> dict:
+        """Fetch many alliances from ESI.
+
+        Alliances are fetched concurrently and IDs already being fetched
+        by another thread are not requested again.
+
+        :return: dict of Alliance objects keyed by ID. Unknown IDs are omitted.
+        """
+        return self._fetch_coalesced(
+            'alliance', alliance_ids, self._fetch_alliances
+        )
+
+    def get_corps(self, corp_ids) -> dict:
+        """Fetch many corporations from ESI.
+
+        Corporations are fetched concurrently and IDs already being fetched
+        by another thread are not requested again.
+
+        :return: dict of Corporation objects keyed by ID. Unknown IDs are omitted.
+        """
+        return self._fetch_coalesced('corporation', corp_ids, self._fetch_corps)
+
+    def get_characters(self, character_ids) -> dict:
+        """Fetch many characters incl. their corporations and alliances from ESI.
+
+        Names and affiliations are fetched in chunks of the largest size
+        ESI accepts. The corporations and alliances of all characters
+        are fetched once each and attached to the returned characters,
+        so accessing ``corp`` or ``alliance`` does not trigger additional requests.
+
+        :return: dict of Character objects keyed by ID. Unknown IDs are omitted.
+        """
+        characters = self._fetch_coalesced(
+            'character', character_ids, self._fetch_characters
+        )
+        corps = self.get_corps({c.corp_id for c in characters.values()})
+        alliance_ids = {c.alliance_id for c in characters.values() if c.alliance_id}
+        alliance_ids |= {c.alliance_id for c in corps.values() if c.alliance_id}
+        alliances = self.get_alliances(alliance_ids)
+        for corp in corps.values():
+            if corp.alliance_id in alliances:
+                corp._alliance = alliances[corp.alliance_id]
+        for character in characters.values():
+            if character.corp_id in corps:
+                character._corp = corps[character.corp_id]
+            if character.alliance_id in alliances:
+                character._alliance = alliances[character.alliance_id]
+        return characters
+
+    def _fetch_coalesced(self, type_name: str, ids, fetcher) -> dict:
+        """Fetch objects for given IDs with fetcher, coalescing concurrent requests.
+
+        IDs which are currently fetched by another thread are not requested
+        again, instead the result of the ongoing request is awaited.
+        """
+        ids = list(dict.fromkeys(int(obj_id) for obj_id in ids))
+        owned_futures = {}
+        other_futures = {}
+        with self._in_flight_lock:
+            for obj_id in ids:
+                key = (type_name, obj_id)
+                if key in self._in_flight:
+                    other_futures[obj_id] = self._in_flight[key]
+                else:
+                    owned_futures[obj_id] = self._in_flight[key] = Future()
+
+        try:
+            results = fetcher(list(owned_futures.keys())) if owned_futures else {}
+        except Exception as ex:
+            for future in owned_futures.values():
+                future.set_exception(ex)
+            raise
+        else:
+            for obj_id, future in owned_futures.items():
+                future.set_result(results.get(obj_id))
+        finally:
+            with self._in_flight_lock:
+                for obj_id in owned_futures.keys():
+                    self._in_flight.pop((type_name, obj_id), None)
+
+        for obj_id, future in other_futures.items():
+            obj = future.result()
+            if obj is not None:
+                results[obj_id] = obj
+        return results
+
+    def _fetch_alliances(self, alliance_ids: list) -> dict:
+        return self._fetch_concurrently(self.get_alliance, alliance_ids)
+
+    def _fetch_corps(self, corp_ids: list) -> dict:
+        return self._fetch_concurrently(self.get_corp, corp_ids)
+
+    @staticmethod
+    def _fetch_concurrently(get_func, ids: list) -> dict:
+        """Fetch objects from an endpoint without bulk support concurrently."""
+        def _get(obj_id):
+            try:
+                return get_func(obj_id)
+            except ObjectNotFound:
+                return None
+
+        if len(ids) == 1:
+            objs = [_get(ids[0])]
+        else:
+            with ThreadPoolExecutor(max_workers=ESI_MAX_WORKERS) as executor:
+                objs = list(executor.map(_get, ids))
+        return {obj.id: obj for obj in objs if obj is not None}
+
+    def _fetch_characters(self, character_ids: list) -> dict:
+        names = {}
+        affiliations = {}
+        for i in range(0, len(character_ids), ESI_MAX_IDS_PER_REQUEST):
+            chunk = character_ids[i:i + ESI_MAX_IDS_PER_REQUEST]
+            names.update({
+                x['id']: x['name']
+                for x in self._post_bulk(self.client.Universe.post_universe_names, 'ids', chunk)
+                if x['category'] == 'character'
+            })
+            affiliations.update({
+                x['character_id']: x
+                for x in self._post_bulk(
+                    self.client.Character.post_characters_affiliation,
+                    'characters',
+                    [obj_id for obj_id in chunk if obj_id in names]
+                )
+            })
+        return {
+            character_id: Character(
+                id=character_id,
+                name=names[character_id],
+                corp_id=affiliation['corporation_id'],
+                alliance_id=affiliation.get('alliance_id'),
+                faction_id=affiliation.get('faction_id'),
+            )
+            for character_id, affiliation in affiliations.items()
+            if character_id in names
+        }
+
+    @classmethod
+    def _post_bulk(cls, operation, param: str, ids: list) -> list:
+        """Call a bulk ESI endpoint for the given IDs.
+
+        ESI rejects the whole request if any of the IDs is invalid,
+        so the IDs are bisected until the invalid ones are isolated and dropped.
+        """
+        if not ids:
+            return []
+        try:
+            return operation(**{param: ids}).result()
+        except (HTTPNotFound, HTTPUnprocessableEntity):
+            if len(ids) == 1:
+                return []
+            middle = len(ids) // 2
+            return (
+                cls._post_bulk(operation, param, ids[:middle])
+                + cls._post_bulk(operation, param, ids[middle:])
+            )
+
     def get_all_factions(self):
         """Fetch all factions from ESI."""
         if not self._faction_list:
@@ -0,0 +1,13 @@
+from django.dispatch import Signal
+
+characters_changed = Signal()
+"""Sent after characters have been updated in bulk, e.g. by update_character_chunk.
+
+Model signals are not sent for these updates.
+
+Args:
+    - sender: EveCharacter
+    - characters: list of the changed EveCharacter objects
+    - changed_fields: dict of the names of the changed fields by character pk.
+      Optional, receivers must assume all fields changed when it is missing.
+"""
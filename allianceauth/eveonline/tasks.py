@@ -2,7 +2,14 @@ import logging
 
 from celery import shared_task
 
+from .app_settings import (
+    EVEONLINE_MODEL_UPDATE_INCREMENTAL,
+    EVEONLINE_MODEL_UPDATE_MAX_AGE,
+)
+from .fingerprints import FingerprintStore
 from .models import EveAllianceInfo, EveCharacter, EveCorporationInfo
+from .providers import EveSwaggerProvider
+from .signals import characters_changed
 from . import providers
 
 
@@ -11,6 +18,19 @@ logger = logging.getLogger(__name__)
 TASK_PRIORITY = 7
 CHUNK_SIZE = 500
 
+# character fields updated in bulk by update_character_chunk
+UPDATE_FIELDS = [
+    'character_name',
+    'corporation_id',
+    'corporation_name',
+    'corporation_ticker',
+    'alliance_id',
+    'alliance_name',
+    'alliance_ticker',
+    'faction_id',
+    'faction_name',
+]
+
 
 def chunks(lst, n):
     """Yield successive n-sized chunks from lst."""
@@ -19,15 +39,25 @@ def chunks(lst, n):
 
 
 @shared_task
-def update_corp(corp_id):
-    """Update given corporation from ESI"""
+def update_corp(corp_id, fingerprint=None):
+    """Update given corporation from ESI
+
+    The fingerprint from an incremental check is stored once the update succeeded.
+    """
     EveCorporationInfo.objects.update_corporation(corp_id)
+    if fingerprint:
+        FingerprintStore('corporation').update({corp_id: fingerprint})
 
 
 @shared_task
-def update_alliance(alliance_id):
-    """Update given alliance from ESI"""
+def update_alliance(alliance_id, fingerprint=None):
+    """Update given alliance from ESI
+
+    The fingerprint from an incremental check is stored once the update succeeded.
+    """
     EveAllianceInfo.objects.update_alliance(alliance_id).populate_alliance()
+    if fingerprint:
+        FingerprintStore('alliance').update({alliance_id: fingerprint})
 
 
 @shared_task
@@ -39,6 +69,9 @@ def update_character(character_id: int) -> None:
 @shared_task
 def run_model_update():
     """Update all alliances, corporations and characters from ESI"""
+    if EVEONLINE_MODEL_UPDATE_INCREMENTAL:
+        _run_incremental_model_update()
+        return
 
     #update existing corp models
     for corp in EveCorporationInfo.objects.all().values('corporation_id'):
@@ -49,6 +82,29 @@ def run_model_update():
         update_alliance.apply_async(args=[alliance['alliance_id']], priority=TASK_PRIORITY)
 
     # update existing character models
+    _schedule_character_chunks()
+
+
+def _run_incremental_model_update():
+    """Check all entities in bulk and only schedule updates for changed ones."""
+    corp_ids = list(EveCorporationInfo.objects.values_list('corporation_id', flat=True))
+    FingerprintStore('corporation').prune(corp_ids)
+    for corp_ids_chunk in chunks(corp_ids, CHUNK_SIZE):
+        check_corporation_chunk.apply_async(
+            args=[corp_ids_chunk], priority=TASK_PRIORITY
+        )
+
+    alliance_ids = list(EveAllianceInfo.objects.values_list('alliance_id', flat=True))
+    FingerprintStore('alliance').prune(alliance_ids)
+    for alliance_ids_chunk in chunks(alliance_ids, CHUNK_SIZE):
+        check_alliance_chunk.apply_async(
+            args=[alliance_ids_chunk], priority=TASK_PRIORITY
+        )
+
+    _schedule_character_chunks()
+
+
+def _schedule_character_chunks():
     character_ids = EveCharacter.objects.all().values_list('character_id', flat=True)
     for character_ids_chunk in chunks(character_ids, CHUNK_SIZE):
         update_character_chunk.apply_async(
@@ -56,6 +112,108 @@ def run_model_update():
         )
 
 
+@shared_task
+def check_corporation_chunk(corp_ids_chunk: list):
+    """Schedule updates for corporations which changed or are due for an update.
+
+    The fingerprint of a corporation is made from its name
+    and the alliance and faction its CEO is affiliated with.
+    """
+    corps = EveCorporationInfo.objects\
+        .filter(corporation_id__in=corp_ids_chunk)\
+        .values_list('corporation_id', 'ceo_id')
+    ceo_ids = {corp_id: ceo_id for corp_id, ceo_id in corps}
+    store = FingerprintStore('corporation')
+    store.delete(set(corp_ids_chunk) - set(ceo_ids.keys()))  # deleted meanwhile
+    try:
+        names = _fetch_names(list(ceo_ids.keys()))
+        # closed and NPC corporations can have CEOs ESI rejects, which are dropped
+        affiliations = {
+            affiliation['character_id']: affiliation
+            for affiliation in EveSwaggerProvider._post_bulk(
+                providers.provider.client.Character.post_characters_affiliation,
+                'characters',
+                [ceo_id for ceo_id in ceo_ids.values() if ceo_id]
+            )
+        }
+    except OSError:
+        logger.info("Failed to bulk check corporations. Scheduling updates for all")
+        names, affiliations = {}, {}
+
+    fingerprints = {}
+    for corp_id, ceo_id in ceo_ids.items():
+        affiliation = affiliations.get(ceo_id)
+        if (
+            corp_id in names
+            and affiliation
+            and affiliation.get('corporation_id') == corp_id
+        ):
+            fingerprints[corp_id] = FingerprintStore.fingerprint(
+                names[corp_id],
+                affiliation.get('alliance_id'),
+                affiliation.get('faction_id'),
+            )
+        else:
+            fingerprints[corp_id] = None  # can not be determined, always update
+
+    stale_ids = store.stale_ids(
+        {corp_id: fp for corp_id, fp in fingerprints.items() if fp},
+        EVEONLINE_MODEL_UPDATE_MAX_AGE
+    )
+    stale_ids |= {corp_id for corp_id, fp in fingerprints.items() if not fp}
+    for corp_id in stale_ids:
+        update_corp.apply_async(
+            args=[corp_id],
+            kwargs={'fingerprint': fingerprints[corp_id]},
+            priority=TASK_PRIORITY
+        )
+
+
+@shared_task
+def check_alliance_chunk(alliance_ids_chunk: list):
+    """Schedule updates for alliances which changed or are due for an update.
+
+    The fingerprint of an alliance is made from its name only,
+    so other changes are picked up once the max age is reached.
+    """
+    alliance_ids = list(
+        EveAllianceInfo.objects
+        .filter(alliance_id__in=alliance_ids_chunk)
+        .values_list('alliance_id', flat=True)
+    )
+    store = FingerprintStore('alliance')
+    store.delete(set(alliance_ids_chunk) - set(alliance_ids))  # deleted meanwhile
+    try:
+        names = _fetch_names(alliance_ids)
+    except OSError:
+        logger.info("Failed to bulk check alliances. Scheduling updates for all")
+        names = {}
+
+    fingerprints = {
+        alliance_id: FingerprintStore.fingerprint(names[alliance_id])
+        for alliance_id in alliance_ids
+        if alliance_id in names
+    }
+    stale_ids = store.stale_ids(fingerprints, EVEONLINE_MODEL_UPDATE_MAX_AGE)
+    stale_ids |= set(alliance_ids) - set(fingerprints.keys())
+    for alliance_id in stale_ids:
+        update_alliance.apply_async(
+            args=[alliance_id],
+            kwargs={'fingerprint': fingerprints.get(alliance_id)},
+            priority=TASK_PRIORITY
+        )
+
+
+def _fetch_names(ids: list) -> dict:
+    """Fetch names for given IDs from ESI in bulk. IDs ESI rejects are left out."""
+    return {
+        obj['id']: obj['name']
+        for obj in EveSwaggerProvider._post_bulk(
+            providers.provider.client.Universe.post_universe_names, 'ids', ids
+        )
+    }
+
+
 @shared_task
 def update_character_chunk(character_ids_chunk: list):
     """Update a list of character from ESI"""
@@ -66,10 +224,7 @@ def update_character_chunk(character_ids_chunk: list):
             .post_universe_names(ids=character_ids_chunk).result()
     except OSError:
         logger.info("Failed to bulk update characters. Attempting single updates")
-        for character_id in character_ids_chunk:
-            update_character.apply_async(
-                args=[character_id], priority=TASK_PRIORITY
-            )
+        _schedule_single_character_updates(character_ids_chunk)
         return
 
     affiliations = {
@@ -83,29 +238,105 @@ def update_character_chunk(character_ids_chunk: list):
             affiliations[character_id]['name'] = character.get('name')
 
     # fetch current characters
-    characters = EveCharacter.objects.filter(character_id__in=character_ids_chunk)\
-        .values('character_id', 'corporation_id', 'alliance_id', 'character_name')
+    characters = EveCharacter.objects.filter(character_id__in=character_ids_chunk)
 
+    changed_characters = []
     for character in characters:
-        character_id = character.get('character_id')
-        if character_id in affiliations:
-            affiliation = affiliations[character_id]
+        if character.character_id in affiliations:
+            affiliation = affiliations[character.character_id]
 
-            corp_changed = (
-                character.get('corporation_id') != affiliation.get('corporation_id')
-            )
+            corp_changed = character.corporation_id != affiliation.get('corporation_id')
 
-            alliance_id = character.get('alliance_id')
+            alliance_id = character.alliance_id
             if not alliance_id:
                 alliance_id = None
             alliance_changed = alliance_id != affiliation.get('alliance_id')
 
+            faction_changed = (character.faction_id or None) != affiliation.get('faction_id')
+
             name_changed = False
             fetched_name = affiliation.get('name', False)
             if fetched_name:
-                name_changed = character.get('character_name') != fetched_name
+                name_changed = character.character_name != fetched_name
+
+            if corp_changed or alliance_changed or faction_changed or name_changed:
+                changed_characters.append(character)
+
+    if changed_characters:
+        _bulk_update_characters(changed_characters, affiliations)
+
 
-            if corp_changed or alliance_changed or name_changed:
-                update_character.apply_async(
-                    args=[character.get('character_id')], priority=TASK_PRIORITY
-                )
+def _bulk_update_characters(characters: list, affiliations: dict):
+    """Update given characters from affiliations with one query
+    and send a single characters_changed signal.
+    """
+    try:
+        corps = providers.provider.get_corps(
+            {affiliations[c.character_id]['corporation_id'] for c in characters}
+        )
+        alliances = providers.provider.get_alliances({
+            affiliations[c.character_id]['alliance_id']
+            for c in characters
+            if affiliations[c.character_id].get('alliance_id')
+        })
+    except OSError:
+        logger.info("Failed to bulk resolve corporations and alliances. Attempting single updates")
+        _schedule_single_character_updates([c.character_id for c in characters])
+        return
+
+    updated_characters = []
+    changed_fields = {}
+    failed_character_ids = []
+    for character in characters:
+        affiliation = affiliations[character.character_id]
+        corp = corps.get(affiliation['corporation_id'])
+        alliance_id = affiliation.get('alliance_id')
+        alliance = alliances.get(alliance_id) if alliance_id else None
+        try:
+            faction = (
+                providers.provider.get_faction(affiliation['faction_id'])
+                if affiliation.get('faction_id') else None
+            )
+        except (OSError, providers.ObjectNotFound):
+            failed_character_ids.append(character.character_id)
+            continue
+        if not corp or (alliance_id and not alliance):
+            failed_character_ids.append(character.character_id)
+            continue
+
+        old_values = {field: getattr(character, field) for field in UPDATE_FIELDS}
+        character.character_name = affiliation.get('name', character.character_name)
+        character.corporation_id = corp.id
+        character.corporation_name = corp.name
+        character.corporation_ticker = corp.ticker
+        character.alliance_id = alliance.id if alliance else None
+        character.alliance_name = alliance.name if alliance else None
+        character.alliance_ticker = alliance.ticker if alliance else None
+        character.faction_id = faction.id if faction else None
+        character.faction_name = faction.name if faction else None
+        changed_fields[character.pk] = {
+            field for field, value in old_values.items() if getattr(character, field) != value
+        }
+        updated_characters.append(character)
+
+    if updated_characters:
+        EveCharacter.objects.bulk_update(updated_characters, fields=UPDATE_FIELDS)
+        logger.info("Updated %d characters in bulk", len(updated_characters))
+        for character in updated_characters:
+            if character.is_biomassed:
+                character._remove_tokens_of_biomassed_character()
+        characters_changed.send(
+            sender=EveCharacter,
+            characters=updated_characters,
+            changed_fields=changed_fields,
+        )
+
+    if failed_character_ids:
+        _schedule_single_character_updates(failed_character_ids)
+
+
+def _schedule_single_character_updates(character_ids: list):
+    for character_id in character_ids:
+        update_character.apply_async(
+            args=[character_id], priority=TASK_PRIORITY
+        )
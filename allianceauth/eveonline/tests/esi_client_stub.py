@@ -163,6 +163,8 @@ class EsiClientStub:
                 {"category": "character", "id": 1666, "name": "Hal Jordan"},
                 {"category": "corporation", "id": 2001, "name": "Wayne Technologies"},
                 {"category": "corporation","id": 2002, "name": "Wayne Food"},
+                {"category": "corporation","id": 2003, "name": "Wayne Energy"},
                 {"category": "corporation","id": 1000001, "name": "Doomheim"},
+                {"category": "alliance", "id": 3001, "name": "Wayne Enterprises"},
             ]
             return BravadoOperationStub([x for x in data if x['id'] in ids])
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from unittest.mock import MagicMock, patch
+
+from django.test import TestCase
+from redis import Redis, RedisError
+
+from ..entity_cache import EntityCache, timeout_from_headers
+
+MODULE_PATH = 'allianceauth.eveonline.entity_cache'
+
+
+class TestEntityCache(TestCase):
+
+    def setUp(self):
+        self.cache = EntityCache(maxsize=2)
+        self.cache.clear()
+
+    def test_should_return_miss_for_unknown_entity(self):
+        self.assertIs(self.cache.get('corporation', 2001), EntityCache.MISS)
+
+    def test_should_return_cached_data(self):
+        self.cache.set('corporation', 2001, {'id': 2001, 'name': 'Wayne Technologies'})
+        self.assertEqual(
+            self.cache.get('corporation', 2001), {'id': 2001, 'name': 'Wayne Technologies'}
+        )
+        self.assertIs(self.cache.get('alliance', 2001), EntityCache.MISS)
+
+    def test_should_return_not_found(self):
+        self.cache.set_not_found('corporation', 2999)
+        self.assertIs(self.cache.get('corporation', 2999), EntityCache.NOT_FOUND)
+
+    def test_should_share_entries_between_processes(self):
+        self.cache.set('corporation', 2001, {'id': 2001})
+        self.assertEqual(EntityCache().get('corporation', 2001), {'id': 2001})
+
+    def test_should_evict_least_recently_used_entries_from_process(self):
+        self.cache.set('corporation', 2001, {'id': 2001})
+        self.cache.set('corporation', 2002, {'id': 2002})
+        self.cache.get('corporation', 2001)
+        self.cache.set('corporation', 2003, {'id': 2003})
+        self.assertNotIn(
+            self.cache._cache_key('corporation', 2002), self.cache._entries
+        )
+        self.assertIn(self.cache._cache_key('corporation', 2001), self.cache._entries)
+
+    def test_should_expire_entries_in_process(self):
+        redis = MagicMock(spec=Redis)
+        redis.pipeline.return_value.__enter__.return_value.get.return_value\
+            .pttl.return_value.execute.return_value = [None, -2]
+        cache = EntityCache(redis=redis)
+        with patch(MODULE_PATH + '.time.time') as mock_time:
+            mock_time.return_value = 1000
+            cache.set('corporation', 2001, {'id': 2001}, timeout=60)
+            mock_time.return_value = 1059
+            self.assertEqual(cache.get('corporation', 2001), {'id': 2001})
+            mock_time.return_value = 1061
+            self.assertIs(cache.get('corporation', 2001), EntityCache.MISS)
+
+    def test_should_expire_entries_in_redis(self):
+        redis = MagicMock(spec=Redis)
+        cache = EntityCache(redis=redis)
+        cache.set('corporation', 2001, {'id': 2001}, timeout=120)
+        redis.set.assert_called_once_with(
+            cache._cache_key('corporation', 2001), '{"id": 2001}', px=120000
+        )
+
+    def test_should_clear_process_entries_when_redis_fails(self):
+        redis = MagicMock(spec=Redis)
+        redis.scan_iter.side_effect = RedisError
+        cache = EntityCache(redis=redis)
+        cache.set('corporation', 2001, {'id': 2001})
+        cache.clear()
+        self.assertDictEqual(dict(cache._entries), {})
+
+    def test_should_delete_entry(self):
+        self.cache.set('corporation', 2001, {'id': 2001})
+        self.cache.delete('corporation', 2001)
+        self.assertIs(self.cache.get('corporation', 2001), EntityCache.MISS)
+        self.assertIs(EntityCache().get('corporation', 2001), EntityCache.MISS)
+
+
+class TestTimeoutFromHeaders(TestCase):
+
+    def test_should_return_seconds_until_expires(self):
+        expires = datetime.now(timezone.utc) + timedelta(seconds=300)
+        timeout = timeout_from_headers({'Expires': format_datetime(expires, usegmt=True)})
+        self.assertAlmostEqual(timeout, 300, delta=2)
+
+    def test_should_return_none_when_header_missing(self):
+        self.assertIsNone(timeout_from_headers({}))
+        self.assertIsNone(timeout_from_headers(None))
+
+    def test_should_return_none_when_header_invalid(self):
+        self.assertIsNone(timeout_from_headers({'Expires': 'invalid'}))
@@ -0,0 +1,58 @@
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from ..fingerprints import FingerprintStore
+
+MODULE_PATH = 'allianceauth.eveonline.fingerprints'
+
+
+class TestFingerprintStore(TestCase):
+
+    def setUp(self):
+        self.store = FingerprintStore('corporation')
+        self.store.clear()
+
+    def test_fingerprint_depends_on_values(self):
+        self.assertEqual(
+            FingerprintStore.fingerprint('Wayne Technologies', 3001),
+            FingerprintStore.fingerprint('Wayne Technologies', 3001),
+        )
+        self.assertNotEqual(
+            FingerprintStore.fingerprint('Wayne Technologies', 3001),
+            FingerprintStore.fingerprint('Wayne Technologies', None),
+        )
+
+    def test_unknown_entities_are_stale(self):
+        self.assertSetEqual(self.store.stale_ids({2001: 'abc'}, 3600), {2001})
+
+    def test_only_changed_entities_are_stale(self):
+        self.store.update({2001: 'abc', 2002: 'def'})
+        self.assertSetEqual(
+            self.store.stale_ids({2001: 'abc', 2002: 'xyz'}, 3600), {2002}
+        )
+
+    def test_entities_are_stale_after_max_age(self):
+        with patch(MODULE_PATH + '.time.time', return_value=1000):
+            self.store.update({2001: 'abc'})
+        with patch(MODULE_PATH + '.time.time', return_value=5000):
+            self.assertSetEqual(self.store.stale_ids({2001: 'abc'}, 3600), {2001})
+            self.assertSetEqual(self.store.stale_ids({2001: 'abc'}, 7200), set())
+
+    def test_deleted_entities_are_stale(self):
+        self.store.update({2001: 'abc'})
+        self.store.delete([2001])
+        self.assertSetEqual(self.store.stale_ids({2001: 'abc'}, 3600), {2001})
+
+    def test_stores_are_separated_by_type(self):
+        self.store.update({2001: 'abc'})
+        alliances = FingerprintStore('alliance')
+        alliances.clear()
+        self.assertSetEqual(alliances.stale_ids({2001: 'abc'}, 3600), {2001})
+
+    def test_prune_removes_entities_not_in_valid_ids(self):
+        self.store.update({2001: 'abc', 2002: 'def'})
+        self.store.prune([2001])
+        self.assertSetEqual(
+            self.store.stale_ids({2001: 'abc', 2002: 'def'}, 3600), {2002}
+        )
@@ -8,7 +8,7 @@ from allianceauth.tests.auth_utils import AuthUtils
 
 from ..evelinks import eveimageserver
 from ..models import EveAllianceInfo, EveCharacter, EveCorporationInfo, EveFactionInfo
-from ..providers import Alliance, Character, Corporation
+from ..providers import Alliance, Character, Corporation, provider
 from .esi_client_stub import EsiClientStub
 
 
@@ -595,6 +595,9 @@ class EveCorporationTestCase(TestCase):
 @patch('allianceauth.eveonline.providers.esi_client_factory')
 @patch("allianceauth.eveonline.models.notify")
 class TestCharacterUpdate(TestCase):
+    def setUp(self):
+        provider.cache.clear()
+
     def test_should_update_normal_character(self, mock_notify, mock_esi_client_factory):
         # given
         mock_esi_client_factory.return_value = EsiClientStub()
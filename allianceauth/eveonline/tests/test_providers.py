@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import Future
 from unittest.mock import Mock, patch
 
 from bravado.exception import HTTPNotFound
@@ -7,7 +8,8 @@ from jsonschema.exceptions import RefResolutionError
 from django.test import TestCase
 
 from . import set_logger
-from .esi_client_stub import EsiClientStub
+from .esi_client_stub import BravadoOperationStub, EsiClientStub
+from ..entity_cache import EntityCache
 from ..providers import (
     ObjectNotFound,
     Entity,
@@ -454,6 +456,12 @@ class TestEveProvider(TestCase):
 
 class TestEveSwaggerProvider(TestCase):
 
+    def setUp(self):
+        EntityCache().clear()
+
+    def tearDown(self):
+        EntityCache().clear()
+
     @staticmethod
     def esi_get_alliances_alliance_id(alliance_id):
         alliances = {
@@ -467,10 +475,8 @@ class TestEveSwaggerProvider(TestCase):
                 'ticker': 'DA2'
             }
         }
-        mock_result = Mock()
         if alliance_id in alliances:
-            mock_result.result.return_value = alliances[alliance_id]
-            return mock_result
+            return BravadoOperationStub(alliances[alliance_id])
         else:
             raise HTTPNotFound(Mock())
 
@@ -480,10 +486,8 @@ class TestEveSwaggerProvider(TestCase):
             3001: [2001, 2002, 2003],
             3002: [2004, 2005]
         }
-        mock_result = Mock()
         if alliance_id in alliances:
-            mock_result.result.return_value = alliances[alliance_id]
-            return mock_result
+            return BravadoOperationStub(alliances[alliance_id])
         else:
             raise HTTPNotFound(Mock())
 
@@ -504,10 +508,8 @@ class TestEveSwaggerProvider(TestCase):
                 'member_count': 5
             }
         }
-        mock_result = Mock()
         if corporation_id in corporations:
-            mock_result.result.return_value = corporations[corporation_id]
-            return mock_result
+            return BravadoOperationStub(corporations[corporation_id])
         else:
             raise HTTPNotFound(Mock())
 
@@ -631,6 +633,44 @@ class TestEveSwaggerProvider(TestCase):
         with self.assertRaises(ObjectNotFound):
             my_provider.get_corp(2999)
 
+    @patch(MODULE_PATH + '.esi_client_factory')
+    def test_get_corp_from_cache(self, mock_esi_client_factory):
+        mock_esi_client_factory.return_value \
+            .Corporation.get_corporations_corporation_id \
+            = Mock(side_effect=TestEveSwaggerProvider.esi_get_corporations_corporation_id)
+        my_provider = EveSwaggerProvider()
+
+        my_provider.get_corp(2001)
+        my_corp = my_provider.get_corp(2001)
+        # shared tier is used by other providers
+        my_corp_2 = EveSwaggerProvider().get_corp(2001)
+
+        self.assertEqual(my_corp.name, 'Dummy Corp 1')
+        self.assertEqual(my_corp_2.name, 'Dummy Corp 1')
+        self.assertEqual(
+            mock_esi_client_factory.return_value
+            .Corporation.get_corporations_corporation_id.call_count,
+            1
+        )
+
+    @patch(MODULE_PATH + '.esi_client_factory')
+    def test_get_corp_not_found_from_cache(self, mock_esi_client_factory):
+        mock_esi_client_factory.return_value \
+            .Corporation.get_corporations_corporation_id \
+            = Mock(side_effect=TestEveSwaggerProvider.esi_get_corporations_corporation_id)
+        my_provider = EveSwaggerProvider()
+
+        with self.assertRaises(ObjectNotFound):
+            my_provider.get_corp(2999)
+        with self.assertRaises(ObjectNotFound):
+            my_provider.get_corp(2999)
+
+        self.assertEqual(
+            mock_esi_client_factory.return_value
+            .Corporation.get_corporations_corporation_id.call_count,
+            1
+        )
+
     @patch(MODULE_PATH + '.esi_client_factory')
     def test_get_character(self, mock_esi_client_factory):
         mock_esi_client_factory.return_value = EsiClientStub()
@@ -652,6 +692,93 @@ class TestEveSwaggerProvider(TestCase):
         with self.assertRaises(ObjectNotFound):
             my_provider.get_character(1999)
 
+    @patch(MODULE_PATH + '.esi_client_factory')
+    def test_get_characters(self, mock_esi_client_factory):
+        mock_esi_client_factory.return_value = EsiClientStub()
+        my_provider = EveSwaggerProvider()
+
+        characters = my_provider.get_characters([1001, 1011, 1999, 1001])
+
+        self.assertSetEqual(set(characters.keys()), {1001, 1011})
+        my_character = characters[1001]
+        self.assertEqual(my_character.name, 'Bruce Wayne')
+        self.assertEqual(my_character.corp_id, 2001)
+        self.assertEqual(my_character.alliance_id, 3001)
+        self.assertEqual(my_character._corp.name, 'Wayne Technologies')
+        self.assertEqual(my_character._alliance.name, 'Wayne Enterprises')
+        self.assertIs(my_character._corp._alliance, my_character._alliance)
+        my_character = characters[1011]
+        self.assertEqual(my_character.name, 'Lex Luthor')
+        self.assertEqual(my_character._corp.name, 'LexCorp')
+        self.assertIsNone(my_character.alliance_id)
+
+    @patch(MODULE_PATH + '.ESI_MAX_IDS_PER_REQUEST', 2)
+    @patch(MODULE_PATH + '.esi_client_factory')
+    def test_get_characters_chunks_and_drops_invalid_ids(
+        self, mock_esi_client_factory
+    ):
+        def post_universe_names(ids):
+            if 1999 in ids:
+                raise HTTPNotFound(Mock())
+            return EsiClientStub.Universe.post_universe_names(ids)
+
+        mock_esi_client_factory.return_value = EsiClientStub()
+        mock_esi_client_factory.return_value.Universe = Mock()
+        mock_esi_client_factory.return_value.Universe.post_universe_names\
+            .side_effect = post_universe_names
+        my_provider = EveSwaggerProvider()
+
+        characters = my_provider.get_characters([1001, 1002, 1011, 1999])
+
+        self.assertSetEqual(set(characters.keys()), {1001, 1002, 1011})
+        requested_ids = [
+            call.kwargs['ids']
+            for call in mock_esi_client_factory.return_value.Universe
+            .post_universe_names.call_args_list
+        ]
+        self.assertIn([1001, 1002], requested_ids)
+        self.assertIn([1011, 1999], requested_ids)
+        self.assertIn([1011], requested_ids)
+        self.assertIn([1999], requested_ids)
+
+    @patch(MODULE_PATH + '.esi_client_factory')
+    def test_get_corps(self, mock_esi_client_factory):
+        mock_esi_client_factory.return_value = EsiClientStub()
+        my_provider = EveSwaggerProvider()
+
+        corps = my_provider.get_corps([2001, 2011, 2999])
+
+        self.assertSetEqual(set(corps.keys()), {2001, 2011})
+        self.assertEqual(corps[2001].name, 'Wayne Technologies')
+        self.assertEqual(corps[2011].name, 'LexCorp')
+
+    @patch(MODULE_PATH + '.esi_client_factory')
+    def test_get_alliances(self, mock_esi_client_factory):
+        mock_esi_client_factory.return_value = EsiClientStub()
+        my_provider = EveSwaggerProvider()
+
+        alliances = my_provider.get_alliances([3001, 3999])
+
+        self.assertSetEqual(set(alliances.keys()), {3001})
+        self.assertEqual(alliances[3001].name, 'Wayne Enterprises')
+        self.assertListEqual(alliances[3001].corp_ids, [2001, 2002, 2003])
+
+    @patch(MODULE_PATH + '.esi_client_factory')
+    def test_get_corps_waits_for_ids_in_flight(self, mock_esi_client_factory):
+        my_provider = EveSwaggerProvider()
+        in_flight = Future()
+        my_provider._in_flight[('corporation', 2001)] = in_flight
+        in_flight.set_result(Corporation(id=2001, name='Wayne Technologies'))
+        mock_fetch = Mock(return_value={})
+
+        with patch.object(my_provider, '_fetch_corps', mock_fetch):
+            corps = my_provider.get_corps([2001, 2002])
+
+        mock_fetch.assert_called_once_with([2002])
+        self.assertEqual(corps[2001].name, 'Wayne Technologies')
+        self.assertNotIn(2002, corps)
+        self.assertNotIn(('corporation', 2002), my_provider._in_flight)
+
     @patch(MODULE_PATH + '.esi_client_factory')
     def test_get_itemtype(self, mock_esi_client_factory):
         mock_esi_client_factory.return_value \
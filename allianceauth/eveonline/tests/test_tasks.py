@@ -1,20 +1,30 @@
 from unittest.mock import patch
 
+from bravado.exception import HTTPNotFound
+
 from django.test import TestCase, TransactionTestCase, override_settings
 
 from ..models import EveAllianceInfo, EveCharacter, EveCorporationInfo
+from ..fingerprints import FingerprintStore
 from ..tasks import (
+    check_alliance_chunk,
+    check_corporation_chunk,
     run_model_update,
     update_alliance,
     update_character,
     update_character_chunk,
     update_corp,
 )
-from .esi_client_stub import EsiClientStub
+from ..providers import EveSwaggerProvider, provider
+from ..signals import characters_changed
+from .esi_client_stub import BravadoResponseStub, EsiClientStub
 
 
 @patch('allianceauth.eveonline.providers.esi_client_factory')
 class TestUpdateTasks(TestCase):
+    def setUp(self):
+        provider.cache.clear()
+
     def test_should_update_alliance(self, mock_esi_client_factory):
         # given
         mock_esi_client_factory.return_value = EsiClientStub()
@@ -70,6 +80,39 @@ class TestUpdateTasks(TestCase):
         my_corporation.refresh_from_db()
         self.assertEqual(my_corporation.alliance.alliance_id, 3001)
 
+    def test_should_store_fingerprint_after_update(self, mock_esi_client_factory):
+        # given
+        mock_esi_client_factory.return_value = EsiClientStub()
+        store = FingerprintStore('alliance')
+        store.clear()
+        EveAllianceInfo.objects.create(
+            alliance_id=3001,
+            alliance_name="Wayne Enterprises",
+            alliance_ticker="WYE",
+            executor_corp_id=2003
+        )
+        # when
+        update_alliance(3001, fingerprint='abc')
+        # then
+        self.assertSetEqual(store.stale_ids({3001: 'abc'}, 3600), set())
+
+    def test_should_not_store_fingerprint_when_update_failed(
+        self, mock_esi_client_factory
+    ):
+        # given
+        mock_esi_client_factory.return_value = EsiClientStub()
+        store = FingerprintStore('corporation')
+        store.clear()
+        # when
+        with patch(
+            'allianceauth.eveonline.tasks.EveCorporationInfo.objects.update_corporation',
+            side_effect=OSError
+        ):
+            with self.assertRaises(OSError):
+                update_corp(2003, fingerprint='abc')
+        # then
+        self.assertSetEqual(store.stale_ids({2003: 'abc'}, 3600), {2003})
+
     # @patch('allianceauth.eveonline.tasks.EveCharacter')
     # def test_update_character(self, mock_EveCharacter):
     #     update_character(42)
@@ -86,10 +129,13 @@ class TestUpdateTasks(TestCase):
 @patch('allianceauth.eveonline.tasks.providers')
 @patch('allianceauth.eveonline.tasks.CHUNK_SIZE', 2)
 class TestRunModelUpdate(TransactionTestCase):
+    def setUp(self):
+        provider.cache.clear()
+
     def test_should_run_updates(self, mock_providers, mock_esi_client_factory):
         # given
-        mock_providers.provider.client = EsiClientStub()
         mock_esi_client_factory.return_value = EsiClientStub()
+        mock_providers.provider = EveSwaggerProvider()
         EveCorporationInfo.objects.create(
             corporation_id=2001,
             corporation_name="Wayne Technologies",
@@ -135,12 +181,190 @@ class TestRunModelUpdate(TransactionTestCase):
         )
 
 
+@patch('allianceauth.eveonline.tasks.EVEONLINE_MODEL_UPDATE_INCREMENTAL', True)
+@patch('allianceauth.eveonline.tasks.update_character_chunk')
+@patch('allianceauth.eveonline.tasks.update_alliance')
+@patch('allianceauth.eveonline.tasks.update_corp')
+@patch('allianceauth.eveonline.tasks.providers')
+class TestIncrementalModelUpdate(TestCase):
+    def setUp(self):
+        FingerprintStore('corporation').clear()
+        FingerprintStore('alliance').clear()
+        EveAllianceInfo.objects.create(
+            alliance_id=3001,
+            alliance_name="Wayne Enterprises",
+            alliance_ticker="WYE",
+            executor_corp_id=2001
+        )
+        EveCorporationInfo.objects.create(
+            corporation_id=2001,
+            corporation_name="Wayne Technologies",
+            corporation_ticker="WTE",
+            member_count=10,
+            ceo_id=1001,
+        )
+        EveCorporationInfo.objects.create(
+            corporation_id=2003,
+            corporation_name="Wayne Energy",
+            corporation_ticker="WEG",
+            member_count=99,
+            ceo_id=None,
+        )
+
+    @staticmethod
+    def _scheduled_ids(spy_task) -> set:
+        return {x[1]["args"][0] for x in spy_task.apply_async.call_args_list}
+
+    @staticmethod
+    def _complete_updates(spy_task, type_name):
+        """Store fingerprints like the scheduled update tasks do on success."""
+        FingerprintStore(type_name).update({
+            x[1]["args"][0]: x[1]["kwargs"]["fingerprint"]
+            for x in spy_task.apply_async.call_args_list
+            if x[1]["kwargs"]["fingerprint"]
+        })
+
+    def test_should_update_all_entities_on_first_run(
+        self, mock_providers, spy_update_corp, spy_update_alliance, spy_update_character_chunk
+    ):
+        # given
+        mock_providers.provider.client = EsiClientStub()
+        # when
+        run_model_update()
+        # then
+        self.assertSetEqual(self._scheduled_ids(spy_update_corp), {2001, 2003})
+        self.assertSetEqual(self._scheduled_ids(spy_update_alliance), {3001})
+
+    def test_should_only_update_changed_entities_on_next_run(
+        self, mock_providers, spy_update_corp, spy_update_alliance, spy_update_character_chunk
+    ):
+        # given
+        mock_providers.provider.client = EsiClientStub()
+        check_corporation_chunk([2001, 2003])
+        check_alliance_chunk([3001])
+        self._complete_updates(spy_update_corp, 'corporation')
+        self._complete_updates(spy_update_alliance, 'alliance')
+        spy_update_corp.reset_mock()
+        spy_update_alliance.reset_mock()
+        # when
+        run_model_update()
+        # then
+        self.assertSetEqual(self._scheduled_ids(spy_update_corp), {2003})
+        self.assertSetEqual(self._scheduled_ids(spy_update_alliance), set())
+
+    def test_should_update_entities_with_changed_fingerprint(
+        self, mock_providers, spy_update_corp, spy_update_alliance, spy_update_character_chunk
+    ):
+        # given
+        mock_providers.provider.client = EsiClientStub()
+        FingerprintStore('corporation').update(
+            {2001: FingerprintStore.fingerprint("Wayne Technologies", None, None)}
+        )
+        # when
+        check_corporation_chunk([2001])
+        # then
+        self.assertSetEqual(self._scheduled_ids(spy_update_corp), {2001})
+
+    @patch('allianceauth.eveonline.tasks.EVEONLINE_MODEL_UPDATE_MAX_AGE', 0)
+    def test_should_update_entities_when_max_age_is_reached(
+        self, mock_providers, spy_update_corp, spy_update_alliance, spy_update_character_chunk
+    ):
+        # given
+        mock_providers.provider.client = EsiClientStub()
+        check_alliance_chunk([3001])
+        self._complete_updates(spy_update_alliance, 'alliance')
+        spy_update_alliance.reset_mock()
+        # when
+        check_alliance_chunk([3001])
+        # then
+        self.assertSetEqual(self._scheduled_ids(spy_update_alliance), {3001})
+
+    def test_should_update_entities_again_when_scheduled_update_did_not_complete(
+        self, mock_providers, spy_update_corp, spy_update_alliance, spy_update_character_chunk
+    ):
+        # given
+        mock_providers.provider.client = EsiClientStub()
+        check_alliance_chunk([3001])
+        spy_update_alliance.reset_mock()
+        # when
+        check_alliance_chunk([3001])
+        # then
+        self.assertSetEqual(self._scheduled_ids(spy_update_alliance), {3001})
+
+    def test_should_remove_fingerprints_of_deleted_entities(
+        self, mock_providers, spy_update_corp, spy_update_alliance, spy_update_character_chunk
+    ):
+        # given
+        mock_providers.provider.client = EsiClientStub()
+        store = FingerprintStore('corporation')
+        store.update({2001: 'abc', 2002: 'def', 2003: 'ghi'})
+        EveCorporationInfo.objects.filter(corporation_id=2003).delete()
+        # when
+        run_model_update()
+        check_corporation_chunk([2001, 2003])
+        # then
+        self.assertSetEqual(store.stale_ids({2001: 'abc'}, 3600), set())
+        self.assertSetEqual(
+            store.stale_ids({2002: 'def', 2003: 'ghi'}, 3600), {2002, 2003}
+        )
+
+    def test_should_fingerprint_corporations_when_some_ceos_are_rejected(
+        self, mock_providers, spy_update_corp, spy_update_alliance, spy_update_character_chunk
+    ):
+        # given
+        mock_providers.provider.client = EsiClientStub()
+        EveCorporationInfo.objects.create(
+            corporation_id=2002,
+            corporation_name="Wayne Food",
+            corporation_ticker="WYF",
+            member_count=0,
+            ceo_id=1,  # closed corporation
+        )
+        post_characters_affiliation = EsiClientStub.Character.post_characters_affiliation
+
+        def reject_invalid_ids(characters):
+            if 1 in characters:
+                raise HTTPNotFound(BravadoResponseStub(404, "Invalid character ID"))
+            return post_characters_affiliation(characters=characters)
+
+        # when
+        with patch.object(
+            EsiClientStub.Character,
+            'post_characters_affiliation',
+            side_effect=reject_invalid_ids
+        ):
+            check_corporation_chunk([2001, 2002])
+        # then
+        fingerprints = {
+            x[1]["args"][0]: x[1]["kwargs"]["fingerprint"]
+            for x in spy_update_corp.apply_async.call_args_list
+        }
+        self.assertSetEqual(set(fingerprints.keys()), {2001, 2002})
+        self.assertIsNotNone(fingerprints[2001])
+        self.assertIsNone(fingerprints[2002])
+
+    def test_should_update_all_entities_when_bulk_check_failed(
+        self, mock_providers, spy_update_corp, spy_update_alliance, spy_update_character_chunk
+    ):
+        # given
+        mock_providers.provider.client.Universe.post_universe_names\
+            .side_effect = OSError
+        # when
+        run_model_update()
+        # then
+        self.assertSetEqual(self._scheduled_ids(spy_update_corp), {2001, 2003})
+        self.assertSetEqual(self._scheduled_ids(spy_update_alliance), {3001})
+
+
 @override_settings(CELERY_ALWAYS_EAGER=True)
 @patch('allianceauth.eveonline.tasks.update_character', wraps=update_character)
 @patch('allianceauth.eveonline.providers.esi_client_factory')
 @patch('allianceauth.eveonline.tasks.providers')
 @patch('allianceauth.eveonline.tasks.CHUNK_SIZE', 2)
 class TestUpdateCharacterChunk(TestCase):
+    def setUp(self):
+        provider.cache.clear()
+
     @staticmethod
     def _updated_character_ids(spy_update_character) -> set:
         """Character IDs passed to update_character task for update."""
@@ -152,8 +376,8 @@ class TestUpdateCharacterChunk(TestCase):
         self, mock_providers, mock_esi_client_factory, spy_update_character
     ):
         # given
-        mock_providers.provider.client = EsiClientStub()
         mock_esi_client_factory.return_value = EsiClientStub()
+        mock_providers.provider = EveSwaggerProvider()
         character_1001 = EveCharacter.objects.create(
             character_id=1001,
             character_name="Bruce Wayne",
@@ -181,14 +405,15 @@ class TestUpdateCharacterChunk(TestCase):
         # then
         character_1001.refresh_from_db()
         self.assertEqual(character_1001.corporation_id, 2001)
-        self.assertSetEqual(self._updated_character_ids(spy_update_character), {1001})
+        self.assertEqual(character_1001.corporation_name, "Wayne Technologies")
+        self.assertSetEqual(self._updated_character_ids(spy_update_character), set())
 
     def test_should_update_name_change(
         self, mock_providers, mock_esi_client_factory, spy_update_character
     ):
         # given
-        mock_providers.provider.client = EsiClientStub()
         mock_esi_client_factory.return_value = EsiClientStub()
+        mock_providers.provider = EveSwaggerProvider()
         character_1001 = EveCharacter.objects.create(
             character_id=1001,
             character_name="Batman",
@@ -204,14 +429,14 @@ class TestUpdateCharacterChunk(TestCase):
         # then
         character_1001.refresh_from_db()
         self.assertEqual(character_1001.character_name, "Bruce Wayne")
-        self.assertSetEqual(self._updated_character_ids(spy_update_character), {1001})
+        self.assertSetEqual(self._updated_character_ids(spy_update_character), set())
 
     def test_should_update_alliance_change(
         self, mock_providers, mock_esi_client_factory, spy_update_character
     ):
         # given
-        mock_providers.provider.client = EsiClientStub()
         mock_esi_client_factory.return_value = EsiClientStub()
+        mock_providers.provider = EveSwaggerProvider()
         character_1001 = EveCharacter.objects.create(
             character_id=1001,
             character_name="Bruce Wayne",
@@ -225,14 +450,16 @@ class TestUpdateCharacterChunk(TestCase):
         # then
         character_1001.refresh_from_db()
         self.assertEqual(character_1001.alliance_id, 3001)
-        self.assertSetEqual(self._updated_character_ids(spy_update_character), {1001})
+        self.assertEqual(character_1001.alliance_name, "Wayne Enterprises")
+        self.assertEqual(character_1001.alliance_ticker, "WYE")
+        self.assertSetEqual(self._updated_character_ids(spy_update_character), set())
 
     def test_should_not_update_when_not_changed(
         self, mock_providers, mock_esi_client_factory, spy_update_character
     ):
         # given
-        mock_providers.provider.client = EsiClientStub()
         mock_esi_client_factory.return_value = EsiClientStub()
+        mock_providers.provider = EveSwaggerProvider()
         character_1001 = EveCharacter.objects.create(
             character_id=1001,
             character_name="Bruce Wayne",
@@ -269,3 +496,76 @@ class TestUpdateCharacterChunk(TestCase):
         update_character_chunk([character_1001.character_id])
         # then
         self.assertSetEqual(self._updated_character_ids(spy_update_character), {1001})
+
+    def test_should_send_one_signal_for_all_changed_characters(
+        self, mock_providers, mock_esi_client_factory, spy_update_character
+    ):
+        # given
+        mock_esi_client_factory.return_value = EsiClientStub()
+        mock_providers.provider = EveSwaggerProvider()
+        EveCharacter.objects.create(
+            character_id=1001,
+            character_name="Batman",
+            corporation_id=2001,
+            corporation_name="Wayne Technologies",
+            corporation_ticker="WTE",
+            alliance_id=3001,
+            alliance_name="Wayne Enterprises",
+            alliance_ticker="WYE",
+        )
+        character_1002 = EveCharacter.objects.create(
+            character_id=1002,
+            character_name="Peter Parker",
+            corporation_id=2011,
+            corporation_name="LexCorp",
+            corporation_ticker="LC",
+        )
+        EveCharacter.objects.create(
+            character_id=1011,
+            character_name="Lex Luthor",
+            corporation_id=2011,
+            corporation_name="LexCorp",
+            corporation_ticker="LC",
+        )
+        received = []
+        changed_fields = {}
+
+        def receiver(sender, characters, **kwargs):
+            received.append({c.character_id for c in characters})
+            changed_fields.update({
+                c.character_id: kwargs['changed_fields'][c.pk] for c in characters
+            })
+
+        characters_changed.connect(receiver, sender=EveCharacter)
+        try:
+            # when
+            update_character_chunk([1001, 1002, 1011])
+        finally:
+            characters_changed.disconnect(receiver, sender=EveCharacter)
+        # then
+        self.assertListEqual(received, [{1001, 1002}])
+        self.assertIn('character_name', changed_fields[1001])
+        self.assertNotIn('corporation_id', changed_fields[1001])
+        self.assertIn('corporation_id', changed_fields[1002])
+        character_1002.refresh_from_db()
+        self.assertEqual(character_1002.corporation_id, 2001)
+        self.assertEqual(character_1002.alliance_id, 3001)
+
+    def test_should_fall_back_to_single_updates_when_corp_not_found(
+        self, mock_providers, mock_esi_client_factory, spy_update_character
+    ):
+        # given
+        mock_esi_client_factory.return_value = EsiClientStub()
+        mock_providers.provider = EveSwaggerProvider()
+        EveCharacter.objects.create(
+            character_id=1666,
+            character_name="Hal Jordan",
+            corporation_id=2011,
+            corporation_name="LexCorp",
+            corporation_ticker="LC",
+        )
+        # when
+        with patch.object(mock_providers.provider, "get_corps", return_value={}):
+            update_character_chunk([1666])
+        # then
+        self.assertSetEqual(self._updated_character_ids(spy_update_character), {1666})
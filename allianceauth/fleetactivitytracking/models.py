@@ -7,7 +7,7 @@ from allianceauth.framework.api.user import get_sentinel_user
 
 
 class Fatlink(models.Model):
-    fatdatetime = models.DateTimeField(default=timezone.now)
+    fatdatetime = models.DateTimeField(default=timezone.now, db_index=True)
     duration = models.PositiveIntegerField()
     fleet = models.CharField(max_length=254)
     hash = models.CharField(max_length=254, unique=True)
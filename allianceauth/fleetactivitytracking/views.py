@@ -2,12 +2,13 @@ import datetime
 import logging
 import os
 
-from allianceauth.authentication.models import CharacterOwnership
+from allianceauth.authentication.models import CharacterOwnership, UserProfile
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.decorators import permission_required
-from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.core.exceptions import ValidationError
+from django.db.models import Count
+from django.db.models.functions import ExtractMonth
 from django.shortcuts import render, redirect, get_object_or_404, Http404
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -37,13 +38,32 @@ logger = logging.getLogger(__name__)
 
 
 class CorpStat:
-    def __init__(self, corp_id, start_of_month, start_of_next_month, corp=None):
+    def __init__(self, corp_id, start_of_month, start_of_next_month, corp=None, n_fats=None):
         if corp:
             self.corp = corp
         else:
             self.corp = EveCorporationInfo.objects.get(corporation_id=corp_id)
-        self.n_fats = Fat.objects.filter(character__corporation_id=self.corp.corporation_id).filter(
-            fatlink__fatdatetime__gte=start_of_month).filter(fatlink__fatdatetime__lte=start_of_next_month).count()
+        if n_fats is not None:
+            self.n_fats = n_fats
+        else:
+            self.n_fats = Fat.objects.filter(character__corporation_id=self.corp.corporation_id).filter(
+                fatlink__fatdatetime__gte=start_of_month).filter(fatlink__fatdatetime__lte=start_of_next_month).count()
+
+    @classmethod
+    def for_corps(cls, corps, start_of_month, start_of_next_month):
+        """Create stats for many corporations with one aggregate query."""
+        fat_counts = dict(
+            Fat.objects.filter(fatlink__fatdatetime__gte=start_of_month)
+            .filter(fatlink__fatdatetime__lte=start_of_next_month)
+            .values('character__corporation_id')
+            .annotate(n_fats=Count('id'))
+            .values_list('character__corporation_id', 'n_fats')
+        )
+        return [
+            cls(corp.corporation_id, start_of_month, start_of_next_month, corp=corp,
+                n_fats=fat_counts.get(corp.corporation_id, 0))
+            for corp in corps
+        ]
 
     @property
     def avg_fat(self):
@@ -54,18 +74,55 @@ class CorpStat:
 
 
 class MemberStat:
-    def __init__(self, member, start_of_month, start_of_next_month, mainchid=None):
+    def __init__(self, member, start_of_month, start_of_next_month, mainchid=None, mainchar=None, n_chars=None, n_fats=None):
         if mainchid:
             self.mainchid = mainchid
         else:
             self.mainchid = member.profile.main_character.character_id if member.profile.main_character else None
-        self.mainchar = EveCharacter.objects.get(character_id=self.mainchid)
-        nchars = 0
-        for alliance in EveAllianceInfo.objects.all():
-            nchars += EveCharacter.objects.filter(character_ownership__user=member).filter(alliance_id=alliance.alliance_id).count()
-        self.n_chars = nchars
-        self.n_fats = Fat.objects.filter(user_id=member.pk).filter(
-            fatlink__fatdatetime__gte=start_of_month).filter(fatlink__fatdatetime__lte=start_of_next_month).count()
+        self.mainchar = mainchar if mainchar else EveCharacter.objects.get(character_id=self.mainchid)
+        if n_chars is not None:
+            self.n_chars = n_chars
+        else:
+            self.n_chars = EveCharacter.objects.filter(character_ownership__user=member).filter(
+                alliance_id__in=EveAllianceInfo.objects.values('alliance_id')).count()
+        if n_fats is not None:
+            self.n_fats = n_fats
+        else:
+            self.n_fats = Fat.objects.filter(user_id=member.pk).filter(
+                fatlink__fatdatetime__gte=start_of_month).filter(fatlink__fatdatetime__lte=start_of_next_month).count()
+
+    @classmethod
+    def for_users(cls, user_ids, start_of_month, start_of_next_month):
+        """Create stats for many users with one aggregate query per statistic.
+        Users without a main character are skipped.
+        """
+        char_counts = dict(
+            EveCharacter.objects.filter(character_ownership__user_id__in=user_ids)
+            .filter(alliance_id__in=EveAllianceInfo.objects.values('alliance_id'))
+            .values('character_ownership__user_id')
+            .annotate(n_chars=Count('id'))
+            .values_list('character_ownership__user_id', 'n_chars')
+        )
+        fat_counts = dict(
+            Fat.objects.filter(user_id__in=user_ids)
+            .filter(fatlink__fatdatetime__gte=start_of_month)
+            .filter(fatlink__fatdatetime__lte=start_of_next_month)
+            .values('user_id')
+            .annotate(n_fats=Count('id'))
+            .values_list('user_id', 'n_fats')
+        )
+        profiles = UserProfile.objects.filter(user_id__in=user_ids, main_character__isnull=False)\
+            .select_related('user', 'main_character')
+        return [
+            cls(
+                profile.user, start_of_month, start_of_next_month,
+                mainchid=profile.main_character.character_id,
+                mainchar=profile.main_character,
+                n_chars=char_counts.get(profile.user_id, 0),
+                n_fats=fat_counts.get(profile.user_id, 0),
+            )
+            for profile in profiles
+        ]
 
     @property
     def avg_fat(self):
@@ -121,17 +178,10 @@ def fatlink_statistics_corp_view(request, corpid, year=None, month=None):
     start_of_month = datetime.datetime(year, month, 1)
     start_of_next_month = first_day_of_next_month(year, month)
     start_of_previous_month = first_day_of_previous_month(year, month)
-    fat_stats = {}
-    corp_members = CharacterOwnership.objects.filter(character__corporation_id=corpid).order_by('user_id').values('user_id').distinct()
+    corp_members = CharacterOwnership.objects.filter(character__corporation_id=corpid).values('user_id').distinct()
+    stat_list = MemberStat.for_users(corp_members, start_of_month, start_of_next_month)
 
-    for member in corp_members:
-        try:
-            fat_stats[member['user_id']] = MemberStat(User.objects.get(pk=member['user_id']), start_of_month, start_of_next_month)
-        except ObjectDoesNotExist:
-            continue
-
-    # collect and sort stats
-    stat_list = [fat_stats[x] for x in fat_stats]
+    # sort stats
     stat_list.sort(key=lambda stat: stat.mainchar.character_name)
     stat_list.sort(key=lambda stat: (stat.n_fats, stat.avg_fat), reverse=True)
 
@@ -151,21 +201,10 @@ def fatlink_statistics_view(request, year=datetime.date.today().year, month=date
     start_of_next_month = first_day_of_next_month(year, month)
     start_of_previous_month = first_day_of_previous_month(year, month)
 
-    fat_stats = {}
-
-    for corp in EveCorporationInfo.objects.all():
-        fat_stats[corp.corporation_id] = CorpStat(corp.corporation_id, start_of_month, start_of_next_month)
-
-    # get FAT stats for corps without models
-    fats_in_span = Fat.objects.filter(fatlink__fatdatetime__gte=start_of_month).filter(
-        fatlink__fatdatetime__lt=start_of_next_month).exclude(character__corporation_id__in=fat_stats)
+    # FATs of corps without models are not shown, as their member count is unknown
+    stat_list = CorpStat.for_corps(EveCorporationInfo.objects.all(), start_of_month, start_of_next_month)
 
-    for fat in fats_in_span.exclude(character__corporation_id__in=fat_stats):
-        if EveCorporationInfo.objects.filter(corporation_id=fat.character.corporation_id).exists():
-            fat_stats[fat.character.corporation_id] = CorpStat(fat.character.corporation_id, start_of_month, start_of_next_month)
-
-    # collect and sort stats
-    stat_list = [fat_stats[x] for x in fat_stats]
+    # sort stats
     stat_list.sort(key=lambda stat: stat.corp.corporation_name)
     stat_list.sort(key=lambda stat: (stat.n_fats, stat.avg_fat), reverse=True)
 
@@ -184,14 +223,18 @@ def fatlink_personal_statistics_view(request, year=datetime.date.today().year):
     user = request.user
     logger.debug("fatlink_personal_statistics_view called by user %s" % request.user)
 
-    personal_fats = Fat.objects.select_related('fatlink').filter(user=user).order_by('id')
-
-    monthlystats = [0 for i in range(1, 13)]
-
-    for fat in personal_fats:
-        fatdate = fat.fatlink.fatdatetime
-        if fatdate.year == year:
-            monthlystats[fatdate.month - 1] += 1
+    start_of_year = datetime.datetime(year, 1, 1, tzinfo=datetime.timezone.utc)
+    start_of_next_year = datetime.datetime(year + 1, 1, 1, tzinfo=datetime.timezone.utc)
+    fat_counts = dict(
+        Fat.objects.filter(user=user)
+        .filter(fatlink__fatdatetime__gte=start_of_year)
+        .filter(fatlink__fatdatetime__lt=start_of_next_year)
+        .annotate(month=ExtractMonth('fatlink__fatdatetime', tzinfo=datetime.timezone.utc))
+        .values('month')
+        .annotate(n_fats=Count('id'))
+        .values_list('month', 'n_fats')
+    )
+    monthlystats = [fat_counts.get(i, 0) for i in range(1, 13)]
 
     monthlystats = [(i + 1, datetime.date(year, i + 1, 1).strftime("%h"), monthlystats[i]) for i in range(12)]
 
@@ -227,13 +270,12 @@ def fatlink_monthly_personal_statistics_view(request, year, month, char_id=None)
     personal_fats = Fat.objects.filter(user=user)\
         .filter(fatlink__fatdatetime__gte=start_of_month).filter(fatlink__fatdatetime__lt=start_of_next_month)
 
-    ship_statistics = dict()
-    n_fats = 0
-    for fat in personal_fats:
-        ship_statistics[fat.shiptype] = ship_statistics.setdefault(fat.shiptype, 0) + 1
-        n_fats += 1
+    ship_statistics = list(
+        personal_fats.values('shiptype').annotate(n_fats=Count('id')).order_by('shiptype').values_list('shiptype', 'n_fats')
+    )
+    n_fats = sum(n for _, n in ship_statistics)
     context = {
-        'user': user, 'shipStats': sorted(ship_statistics.items()), 'month': start_of_month.strftime("%h"),
+        'user': user, 'shipStats': ship_statistics, 'month': start_of_month.strftime("%h"),
         'year': year, 'n_fats': n_fats, 'char_id': char_id, 'previous_month': start_of_previous_month,
         'next_month': start_of_next_month
     }
@@ -13,6 +13,8 @@ from django.db.models.signals import (
 )
 from django.dispatch import receiver
 
+from allianceauth.services.revalidation import ServiceRevalidationAdminMixin
+
 from .forms import GroupAdminForm, ReservedGroupNameAdminForm
 from .models import AuthGroup, GroupRequest, ReservedGroupName
 from .tasks import remove_users_not_matching_states_from_group
@@ -105,7 +107,7 @@ class HasLeaderFilter(admin.SimpleListFilter):
         return queryset
 
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(ServiceRevalidationAdminMixin, admin.ModelAdmin):
     form = GroupAdminForm
     ordering = ('name',)
     list_display = (
@@ -81,7 +81,8 @@ class TestCheckGroupsOnStateChange(TestCase):
         self.user.groups.add(internal_state_group)
 
         # user changes state back to guest
-        self.test_state_1.member_corporations.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_state_1.member_corporations.clear()
 
         # assert
         self._refresh_user()
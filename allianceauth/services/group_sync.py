@@ -0,0 +1,69 @@
+"""Queue for coalescing service group syncs."""
+
+from typing import Iterable, List, Optional
+
+from redis import Redis
+
+from allianceauth.utils.cache import get_redis_client
+
+
+class GroupSyncQueue:
+    """A process safe queue of users waiting for their groups to be synced to services.
+
+    Users are deduplicated, so a user queued many times within one debounce window
+    is synced only once.
+
+    Args:
+        - debounce: Seconds to wait for more users before the queue is drained
+        - redis: A Redis client. Will use AA's cache client by default
+    """
+
+    CACHE_KEY_BASE = "allianceauth-services-group-sync"
+    LOCK_GRACE_TIME = 60
+
+    def __init__(self, debounce: int, redis: Optional[Redis] = None) -> None:
+        self._debounce = int(debounce)
+        self._redis = get_redis_client() if not redis else redis
+
+    @property
+    def _queue_key(self) -> str:
+        return f"{self.CACHE_KEY_BASE}-queue"
+
+    @property
+    def _drain_key(self) -> str:
+        return f"{self.CACHE_KEY_BASE}-drain-scheduled"
+
+    def add(self, user_pks: Iterable[int]) -> bool:
+        """Add users to the queue.
+
+        Returns True when the caller needs to schedule draining the queue,
+        i.e. no drain has been scheduled for the current window yet.
+        """
+        user_pks = [int(pk) for pk in user_pks]
+        if not user_pks:
+            return False
+        with self._redis.pipeline() as pipe:
+            pipe.sadd(self._queue_key, *user_pks)
+            pipe.set(
+                self._drain_key, 1, nx=True, ex=self._debounce + self.LOCK_GRACE_TIME
+            )
+            _, drain_scheduled = pipe.execute()
+        return bool(drain_scheduled)
+
+    def start_drain(self):
+        """Mark the start of draining.
+        Users added from now on will require a new drain to be scheduled.
+        """
+        self._redis.delete(self._drain_key)
+
+    def pop(self, count: int) -> List[int]:
+        """Remove and return up to count users from the queue."""
+        return [int(pk) for pk in self._redis.spop(self._queue_key, count) or []]
+
+    def size(self) -> int:
+        """Return the number of users in the queue."""
+        return self._redis.scard(self._queue_key)
+
+    def clear(self):
+        """Remove all users from the queue."""
+        self._redis.delete(self._queue_key, self._drain_key)
@@ -1,9 +1,10 @@
-from string import Formatter
 from django.urls import include, re_path
 from typing import Iterable, Optional
 
 from django.conf import settings
+from django.contrib.auth.models import Permission, User
 from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
 from django.template.loader import render_to_string
 from django.urls import include, re_path
 from django.utils.functional import cached_property
@@ -15,7 +16,7 @@ from django.urls import include, re_path
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils.functional import cached_property
 
-from .models import NameFormatConfig
+from .name_formats import name_format_index, render_format
 
 
 def get_extension_logger(name):
@@ -81,6 +82,16 @@ class ServicesHook:
     def validate_user(self, user):
         pass
 
+    def validate_users_bulk(self, users):
+        """
+        Validate the service accounts of many users at once.
+        Services should override this with a batched implementation.
+        :param users: list of django.contrib.auth.models.User
+        :return: None
+        """
+        for user in users:
+            self.validate_user(user)
+
     def sync_nickname(self, user):
         """
         Sync the users nickname
@@ -97,6 +108,16 @@ class ServicesHook:
         """
         pass
 
+    def update_groups_bulk(self, users):
+        """
+        Update the group membership of many users at once.
+        Services should override this with a batched implementation.
+        :param users: list of django.contrib.auth.models.User
+        :return: None
+        """
+        for user in users:
+            self.update_groups(user)
+
     def update_all_groups(self):
         """
         Iterate through and update all users groups
@@ -107,6 +128,25 @@ class ServicesHook:
     def service_active_for_user(self, user):
         pass
 
+    def users_without_access(self, users):
+        """
+        Find the users who do not have the access permission of this service
+        with a single query, instead of calling has_perm for every user.
+        Mirrors the permission sources of the StateBackend:
+        user, group and state permissions.
+        :param users: list of django.contrib.auth.models.User
+        :return: QuerySet of django.contrib.auth.models.User
+        """
+        app_label, codename = self.access_perm.split('.', 1)
+        perms = Permission.objects.filter(content_type__app_label=app_label, codename=codename)
+        users_with_access = User.objects.filter(is_active=True).filter(
+            Q(is_superuser=True)
+            | Q(user_permissions__in=perms)
+            | Q(groups__permissions__in=perms)
+            | Q(profile__state__permissions__in=perms)
+        )
+        return User.objects.filter(pk__in=[user.pk for user in users]).exclude(pk__in=users_with_access)
+
     def show_service_ctrl(self, user):
         """
         Whether the service control should be displayed to the given user
@@ -197,7 +237,7 @@ class NameFormatter:
         :return: str Generated name
         """
         format_data = self.get_format_data()
-        return Formatter().vformat(self.string_formatter, args=[], kwargs=format_data).strip()
+        return render_format(self.string_formatter, format_data).strip()
 
     def get_format_data(self):
         try:
@@ -242,12 +282,7 @@ class NameFormatter:
 
     @cached_property
     def formatter_config(self):
-        format_config = NameFormatConfig.objects.filter(service_name=self.service.name,
-                                                        states__pk=self.user.profile.state.pk)
-
-        if format_config.exists():
-            return format_config[0]
-        return None
+        return name_format_index.lookup(self.service.name, self.user.profile.state_id)
 
     @cached_property
     def string_formatter(self):
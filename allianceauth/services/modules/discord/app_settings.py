@@ -22,5 +22,8 @@ DISCORD_TASKS_MAX_RETRIES = clean_setting('DISCORD_TASKS_MAX_RETRIES', 3)
 DISCORD_TASKS_RETRY_PAUSE = clean_setting('DISCORD_TASKS_RETRY_PAUSE', 60)
 """Pause in seconds until next retry for tasks after the API returned an error."""
 
+DISCORD_NON_BLOCKING_BACKOFF = clean_setting('DISCORD_NON_BLOCKING_BACKOFF', False)
+"""Reschedule tasks instead of waiting when the API rate limit resets soon."""
+
 DISCORD_SYNC_NAMES = clean_setting('DISCORD_SYNC_NAMES', False)
 """Automatically sync Discord users names to user's main character name when created."""
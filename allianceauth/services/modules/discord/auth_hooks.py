@@ -104,12 +104,16 @@ class DiscordService(ServicesHook):
         if DISCORD_SYNC_NAMES:
             logger.debug('Syncing %s nickname for user %s', self.name, user)
             if self.user_has_account(user):
+                nickname = user_formatted_nick(user)
+                if not user.discord.is_nickname_outdated(nickname):
+                    logger.debug('Nickname for user %s is unchanged', user)
+                    return
                 tasks.update_nickname.apply_async(
                     kwargs={
                         'user_pk': user.pk,
                         # since the new nickname is not yet in the DB we need to
                         # provide it manually to the task
-                        'nickname': user_formatted_nick(user)
+                        'nickname': nickname
                     },
                     priority=SINGLE_TASK_PRIORITY
                 )
@@ -165,6 +169,19 @@ class DiscordService(ServicesHook):
         if self.user_has_account(user) and not self.service_active_for_user(user):
             self.delete_user(user, notify_user=True)
 
+    def validate_users_bulk(self, users: list):
+        """Validates the accounts for a list of users in bulk.
+        Preferred over validate_user(), because it checks permissions with one query
+        """
+        logger.debug(
+            'Validating %s accounts in bulk for %d users', self.name, len(users)
+        )
+        users_with_account = User.objects.filter(
+            pk__in=[user.pk for user in users], discord__isnull=False
+        )
+        for user in self.users_without_access(users_with_account):
+            self.delete_user(user, notify_user=True)
+
 
 @hooks.register('services_hook')
 def register_service():
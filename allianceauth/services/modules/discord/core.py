@@ -1,7 +1,7 @@
 """Core functionality of the Discord service not directly related to models."""
 
 import logging
-from typing import List, Optional, Tuple
+from typing import Iterable, List, Optional, Tuple
 
 from requests.exceptions import HTTPError
 
@@ -11,8 +11,11 @@ from allianceauth.groupmanagement.models import ReservedGroupName
 from allianceauth.services.hooks import NameFormatter
 
 from . import __title__
-from .app_settings import DISCORD_BOT_TOKEN, DISCORD_GUILD_ID
-from .discord_client import DiscordClient, RolesSet, Role
+from .app_settings import (
+    DISCORD_BOT_TOKEN, DISCORD_GUILD_ID, DISCORD_NON_BLOCKING_BACKOFF
+)
+from .discord_client import DiscordClient, GuildMember, RolesSet, Role
+from .discord_client.client import get_session
 from .discord_client.exceptions import DiscordClientException
 from .utils import LoggerAddTag
 
@@ -22,13 +25,20 @@ logger = LoggerAddTag(logging.getLogger(__name__), __title__)
 def create_bot_client(is_rate_limited: bool = True) -> DiscordClient:
     """Create new bot client for accessing the configured Discord server.
 
+    All bot clients of a process share one pool of keep-alive connections.
+
     Args:
         is_rate_limited: Set to False to turn off rate limiting (use with care).
 
     Return:
         Discord client instance
     """
-    return DiscordClient(DISCORD_BOT_TOKEN, is_rate_limited=is_rate_limited)
+    return DiscordClient(
+        DISCORD_BOT_TOKEN,
+        is_rate_limited=is_rate_limited,
+        is_non_blocking=DISCORD_NON_BLOCKING_BACKOFF,
+        session=get_session()
+    )
 
 
 def calculate_roles_for_user(
@@ -36,11 +46,18 @@ def calculate_roles_for_user(
     client: DiscordClient,
     discord_uid: int,
     state_name: str = None,
+    member: GuildMember = None,
+    reserved_role_names: Iterable[str] = None,
 ) -> Tuple[RolesSet, Optional[bool]]:
     """Calculate current Discord roles for an Auth user.
 
     Takes into account reserved groups and existing managed roles (e.g. nitro).
 
+    Args:
+        member: Guild member if already fetched, e.g. from the member list.
+            Will be fetched from the API if not provided.
+        reserved_role_names: Names of reserved groups if already fetched.
+
     Returns:
         - Discord roles, changed flag:
             - True when roles have changed,
@@ -52,14 +69,18 @@ def calculate_roles_for_user(
         role_names=_user_group_names(user=user, state_name=state_name),
     )
     logger.debug("Calculated roles for user %s: %s", user, roles_calculated.ids())
-    roles_current = client.guild_member_roles(
-        guild_id=DISCORD_GUILD_ID, user_id=discord_uid
-    )
+    if member:
+        roles_current = client.member_roles(guild_id=DISCORD_GUILD_ID, member=member)
+    else:
+        roles_current = client.guild_member_roles(
+            guild_id=DISCORD_GUILD_ID, user_id=discord_uid, use_cache=True
+        )
     if roles_current is None:
         logger.debug("User %s is not a member of the guild.", user)
         return roles_calculated, None
     logger.debug("Current roles user %s: %s", user, roles_current.ids())
-    reserved_role_names = ReservedGroupName.objects.values_list("name", flat=True)
+    if reserved_role_names is None:
+        reserved_role_names = ReservedGroupName.objects.values_list("name", flat=True)
     roles_reserved = roles_current.subset(role_names=reserved_role_names)
     roles_managed = roles_current.subset(managed_only=True)
     roles_persistent = roles_managed.union(roles_reserved)
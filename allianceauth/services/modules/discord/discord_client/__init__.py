@@ -4,6 +4,7 @@ from .exceptions import (  # noqa
     DiscordApiBackoff,
     DiscordClientException,
     DiscordRateLimitExhausted,
+    DiscordRetryAt,
     DiscordTooManyRequestsError,
 )
 from .helpers import RolesSet  # noqa
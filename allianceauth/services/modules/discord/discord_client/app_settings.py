@@ -25,6 +25,16 @@ DISCORD_API_TIMEOUT_READ = clean_setting(
 )
 """Low level read timeout for requests to the Discord API in seconds."""
 
+DISCORD_API_POOL_SIZE = clean_setting(
+    'DISCORD_API_POOL_SIZE', 10
+)
+"""Max number of keep-alive connections to the Discord API per process."""
+
+DISCORD_API_MAX_RETRIES = clean_setting(
+    'DISCORD_API_MAX_RETRIES', 3
+)
+"""Max retries for failed connection attempts to the Discord API."""
+
 DISCORD_OAUTH_BASE_URL = clean_setting(
     'DISCORD_OAUTH_BASE_URL', 'https://discord.com/api/oauth2/authorize'
 )
@@ -42,6 +52,13 @@ DISCORD_GUILD_NAME_CACHE_MAX_AGE = clean_setting(
 are caches locally in seconds.
 """
 
+DISCORD_GUILD_MEMBERS_CACHE_MAX_AGE = clean_setting(
+    'DISCORD_GUILD_MEMBERS_CACHE_MAX_AGE', 3600 * 1
+)
+"""How long Discord guild members incl. their roles and nicknames
+are mirrored locally in seconds.
+"""
+
 DISCORD_ROLES_CACHE_MAX_AGE = clean_setting(
     'DISCORD_ROLES_CACHE_MAX_AGE', 3600 * 1
 )
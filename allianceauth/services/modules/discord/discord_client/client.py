@@ -2,17 +2,22 @@
 
 import json
 import logging
+import os
+import re
+import threading
 from enum import IntEnum
 from hashlib import md5
 from http import HTTPStatus
 from time import sleep
-from typing import Iterable, List, Optional, Set, Tuple
+from typing import Callable, Iterable, Iterator, List, Optional, Set, Tuple
 from urllib.parse import urljoin
 from uuid import uuid1
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import HTTPError
 from redis import Redis
+from urllib3.util.retry import Retry
 
 from allianceauth.utils.cache import get_redis_client
 
@@ -23,23 +28,33 @@ from .. import __title__
 from ..utils import LoggerAddTag
 from .app_settings import (
     DISCORD_API_BASE_URL,
+    DISCORD_API_MAX_RETRIES,
+    DISCORD_API_POOL_SIZE,
     DISCORD_API_TIMEOUT_CONNECT,
     DISCORD_API_TIMEOUT_READ,
     DISCORD_DISABLE_ROLE_CREATION,
+    DISCORD_GUILD_MEMBERS_CACHE_MAX_AGE,
     DISCORD_GUILD_NAME_CACHE_MAX_AGE,
     DISCORD_ROLES_CACHE_MAX_AGE,
 )
-from .exceptions import DiscordRateLimitExhausted, DiscordTooManyRequestsError
+from .exceptions import (
+    DiscordRateLimitExhausted,
+    DiscordRetryAt,
+    DiscordTooManyRequestsError,
+)
 from .helpers import RolesSet
 from .models import Guild, GuildMember, Role, User
 
 logger = LoggerAddTag(logging.getLogger(__name__), __title__)
 
-# max requests that can be executed until reset
-RATE_LIMIT_MAX_REQUESTS = 5
+# max requests that can be executed until reset (global rate limit)
+RATE_LIMIT_MAX_REQUESTS = 50
+
+# Time until remaining requests are reset (global rate limit)
+RATE_LIMIT_RESETS_AFTER = 1000
 
-# Time until remaining requests are reset
-RATE_LIMIT_RESETS_AFTER = 5000
+# Time in seconds we remember which rate limit bucket a route belongs to
+ROUTE_BUCKET_CACHE_MAX_AGE = 3600 * 24
 
 # Delay used for API backoff in case no info returned from API on 429s
 DEFAULT_BACKOFF_DELAY = 5000
@@ -62,6 +77,65 @@ MINIMUM_BLOCKING_WAIT = 50
 # but must fail after x tries to avoid an infinite loop
 RATE_LIMIT_RETRIES = 1000
 
+# max number of guild members the API returns per request
+GUILD_MEMBERS_PAGE_SIZE = 1000
+
+
+# Top level resources of the API. Their IDs are part of a rate limit bucket.
+_MAJOR_PARAMETER_REGEX = re.compile(r"^(guilds|channels|webhooks)/(\d+)")
+
+# IDs in a route which are not major parameters
+_MINOR_PARAMETER_REGEX = re.compile(r"/\d+")
+
+
+_session = None
+_session_pid = None
+_session_lock = threading.Lock()
+
+
+def create_session(
+    pool_size: int = DISCORD_API_POOL_SIZE, max_retries: int = DISCORD_API_MAX_RETRIES
+) -> requests.Session:
+    """Create a new HTTP session with a pool of keep-alive connections.
+
+    Failed connection attempts are retried, but requests that may have reached
+    the API are never sent again.
+
+    Args:
+        pool_size: Max number of connections kept alive
+        max_retries: Max retries for failed connection attempts
+    """
+    retry = Retry(
+        total=max_retries,
+        connect=max_retries,
+        read=0,
+        status=0,
+        redirect=0,
+        backoff_factor=0.1,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the shared HTTP session of the current process.
+
+    A new session is created after a fork, e.g. in celery workers,
+    so connections are never shared between processes.
+    """
+    global _session, _session_pid
+    pid = os.getpid()
+    with _session_lock:
+        if _session is None or _session_pid != pid:
+            _session = create_session()
+            _session_pid = pid
+        return _session
+
 
 class DiscordApiStatusCode(IntEnum):
     """Status code returned from the Discord API."""
@@ -75,8 +149,16 @@ class DiscordClient:
     This means it is able to ensure the API rate limit is not violated,
     even when used concurrently, e.g. with multiple parallel celery tasks.
 
+    Next to the global rate limit the client respects the per-route rate limits
+    of the API. Which bucket a route belongs to is learned from the
+    response headers, so requests to different buckets do not throttle each other.
+
     In addition the client support proper API backoff.
 
+    A non-blocking client never waits for a rate limit or backoff to expire.
+    Instead it raises DiscordRetryAt with the time the request can be retried,
+    e.g. to reschedule a celery task without blocking the worker.
+
     Synchronization of rate limit infos across multiple processes
     is implemented with Redis and thus requires Redis as Django cache backend.
 
@@ -92,26 +174,36 @@ class DiscordClient:
         is_rate_limited: Set to False to turn off rate limiting (use with care).
             If not specified will try to use the Redis instance
             from the default Django cache backend.
+        is_non_blocking: Set to True to raise DiscordRetryAt instead of waiting.
+        session: HTTP session used for all requests, e.g. to reuse connections.
+            Will open a new connection for every request if not specified.
 
     Raises:
         ValueError: No access token provided
     """
     _KEY_GLOBAL_BACKOFF_UNTIL = 'DISCORD_GLOBAL_BACKOFF_UNTIL'
     _KEY_GLOBAL_RATE_LIMIT_REMAINING = 'DISCORD_GLOBAL_RATE_LIMIT_REMAINING'
+    _KEYPREFIX_GUILD_MEMBER = 'DISCORD_GUILD_MEMBER'
     _KEYPREFIX_GUILD_NAME = 'DISCORD_GUILD_NAME'
     _KEYPREFIX_GUILD_ROLES = 'DISCORD_GUILD_ROLES'
     _KEYPREFIX_ROLE_NAME = 'DISCORD_ROLE_NAME'
+    _KEYPREFIX_ROUTE_BUCKET = 'DISCORD_ROUTE_BUCKET'
+    _KEYPREFIX_BUCKET_REMAINING = 'DISCORD_BUCKET_REMAINING'
 
     def __init__(
         self,
         access_token: str,
         redis: Redis = None,
-        is_rate_limited: bool = True
+        is_rate_limited: bool = True,
+        is_non_blocking: bool = False,
+        session: requests.Session = None
     ) -> None:
         if not access_token:
             raise ValueError('You must provide an access token.')
         self._access_token = str(access_token)
         self._is_rate_limited = bool(is_rate_limited)
+        self._is_non_blocking = bool(is_non_blocking)
+        self._session = session
         if not redis:
             self._redis = get_redis_client()
             if not isinstance(self._redis, Redis):
@@ -140,6 +232,25 @@ class DiscordClient:
         """
         self.__redis_script_set_longer = self._redis.register_script(lua_2)
 
+        lua_3 = """
+            if redis.call("exists", KEYS[1]) == 0 then
+                return nil
+            end
+            local remaining = redis.call("decr", KEYS[1])
+            return {remaining, redis.call("pttl", KEYS[1])}
+        """
+        self.__redis_script_decr_if_exists = self._redis.register_script(lua_3)
+
+        lua_4 = """
+            local current = redis.call("get", KEYS[1])
+            if current and tonumber(current) <= tonumber(ARGV[1]) then
+                return tonumber(current)
+            end
+            redis.call("set", KEYS[1], ARGV[1], 'px', ARGV[2])
+            return tonumber(ARGV[1])
+        """
+        self.__redis_script_set_if_lower = self._redis.register_script(lua_4)
+
     @property
     def access_token(self) -> str:
         """Discord access token."""
@@ -150,6 +261,11 @@ class DiscordClient:
         """Wether this instance is rate limited."""
         return self._is_rate_limited
 
+    @property
+    def is_non_blocking(self) -> bool:
+        """Wether this instance raises DiscordRetryAt instead of waiting."""
+        return self._is_non_blocking
+
     def __repr__(self):
         return f'{type(self).__name__}(access_token=...{self.access_token[-5:]})'
 
@@ -172,6 +288,37 @@ class DiscordClient:
             keys=[str(name)], args=[str(value), int(px)]
         )
 
+    def _redis_set_if_lower(self, name: str, value: int, px: int) -> int:
+        """Like set, but only goes through if either key doesn't exist
+        or value would be lowered. Returns the resulting value.
+
+        Implemented as Lua script to ensure atomicity.
+        """
+        return self.__redis_script_set_if_lower(
+            keys=[str(name)], args=[int(value), int(px)]
+        )
+
+    def _redis_decr_route_bucket(
+        self, route_key: str, major_parameter: str
+    ) -> Optional[Tuple[int, int]]:
+        """Decrease the remaining requests of the bucket a route belongs to.
+
+        Returns:
+            - remaining requests and ms until reset
+            - None if the bucket or its rate limit is not known
+        """
+        bucket = self._redis_decode(
+            self._redis.get(f'{self._KEYPREFIX_ROUTE_BUCKET}__{route_key}')
+        )
+        if not bucket:
+            return None
+        result = self.__redis_script_decr_if_exists(
+            keys=[self._bucket_key(bucket, major_parameter)]
+        )
+        if not result:
+            return None
+        return int(result[0]), int(result[1])
+
     # users
 
     def current_user(self) -> User:
@@ -436,29 +583,88 @@ class DiscordClient:
             data['nick'] = GuildMember.sanitize_nick(nick)
         r = self._api_request(method='put', route=route, data=data)
         r.raise_for_status()
+        self._invalidate_guild_member_cache(guild_id, user_id)
         if r.status_code == 201:
             return True
         elif r.status_code == 204:
             return None
         return False
 
-    def guild_member(self, guild_id: int, user_id: int) -> Optional[GuildMember]:
+    def guild_member(
+        self, guild_id: int, user_id: int, use_cache: bool = False
+    ) -> Optional[GuildMember]:
         """Fetch info for a guild member.
 
         Args:
             guild_id: Discord ID of the guild
             user_id: Discord ID of the user
+            use_cache: When True will return the member from the local mirror
+                if available.
 
         Returns:
             guild member or ``None`` if the user is not a member of the guild
         """
+        if use_cache:
+            member = self.guild_member_from_cache(guild_id, user_id)
+            if member:
+                logger.debug('Returning member %s from cache', user_id)
+                return member
         route = f'guilds/{guild_id}/members/{user_id}'
         r = self._api_request(method='get', route=route, raise_for_status=False)
         if self._is_member_unknown_error(r):
             logger.warning("Discord user ID %s could not be found on server.", user_id)
+            self._invalidate_guild_member_cache(guild_id, user_id)
             return None
         r.raise_for_status()
-        return GuildMember.from_dict(r.json())
+        member = GuildMember.from_dict(r.json())
+        self._update_guild_members_cache(guild_id, [member])
+        return member
+
+    def guild_member_from_cache(
+        self, guild_id: int, user_id: int
+    ) -> Optional[GuildMember]:
+        """Return a guild member from the local mirror without calling the API.
+
+        Args:
+            guild_id: Discord ID of the guild
+            user_id: Discord ID of the user
+
+        Returns:
+            guild member or ``None`` if the member is not in the mirror
+        """
+        member_raw = self._redis.get(
+            name=self._guild_member_cache_key(guild_id, user_id)
+        )
+        if not member_raw:
+            return None
+        return GuildMember.from_dict(json.loads(self._redis_decode(member_raw)))
+
+    def guild_members(
+        self, guild_id: int, page_size: int = GUILD_MEMBERS_PAGE_SIZE, after: int = 0
+    ) -> Iterator[GuildMember]:
+        """Fetch all members of a guild, one page at a time.
+
+        Args:
+            guild_id: Discord ID of the guild
+            page_size: Number of members to fetch per request (max. 1000)
+            after: Only fetch members with a higher user ID than this one
+
+        Returns:
+            Iterator over all guild members ordered by user ID
+        """
+        page_size = max(1, min(int(page_size), GUILD_MEMBERS_PAGE_SIZE))
+        after = int(after)
+        while True:
+            route = f"guilds/{guild_id}/members?limit={page_size}&after={after}"
+            r = self._api_request(method='get', route=route)
+            data = r.json()
+            members = [GuildMember.from_dict(member_data) for member_data in data]
+            self._update_guild_members_cache(guild_id, members)
+            for member in members:
+                after = max(after, member.user.id)
+                yield member
+            if len(data) < page_size:
+                break
 
     def modify_guild_member(
         self, guild_id: int, user_id: int, role_ids: List[int] = None, nick: str = None
@@ -495,9 +701,13 @@ class DiscordClient:
         )
         if self._is_member_unknown_error(r):
             logger.warning('User ID %s is not a member of this guild', user_id)
+            self._invalidate_guild_member_cache(guild_id, user_id)
             return None
         r.raise_for_status()
         if r.status_code == 204:
+            self._modify_guild_member_cache(
+                guild_id, user_id, roles=data.get('roles'), nick=data.get('nick')
+            )
             return True
         return False
 
@@ -519,9 +729,11 @@ class DiscordClient:
         )
         if self._is_member_unknown_error(r):
             logger.warning('User ID %s is not a member of this guild', user_id)
+            self._invalidate_guild_member_cache(guild_id, user_id)
             return None
         r.raise_for_status()
         if r.status_code == 204:
+            self._invalidate_guild_member_cache(guild_id, user_id)
             return True
         return False
 
@@ -541,9 +753,15 @@ class DiscordClient:
         r = self._api_request(method='put', route=route, raise_for_status=False)
         if self._is_member_unknown_error(r):
             logger.warning('User ID %s is not a member of this guild', user_id)
+            self._invalidate_guild_member_cache(guild_id, user_id)
             return None
         r.raise_for_status()
         if r.status_code == 204:
+            member = self.guild_member_from_cache(guild_id, user_id)
+            if member:
+                self._modify_guild_member_cache(
+                    guild_id, user_id, roles=member.roles.union({int(role_id)})
+                )
             return True
         return False
 
@@ -566,40 +784,105 @@ class DiscordClient:
         r = self._api_request(method='delete', route=route, raise_for_status=False)
         if self._is_member_unknown_error(r):
             logger.warning('User ID %s is not a member of this guild', user_id)
+            self._invalidate_guild_member_cache(guild_id, user_id)
             return None
         r.raise_for_status()
         if r.status_code == 204:
+            member = self.guild_member_from_cache(guild_id, user_id)
+            if member:
+                self._modify_guild_member_cache(
+                    guild_id, user_id, roles=member.roles.difference({int(role_id)})
+                )
             return True
         return False
 
-    def guild_member_roles(self, guild_id: int, user_id: int) -> Optional[RolesSet]:
+    def guild_member_roles(
+        self, guild_id: int, user_id: int, use_cache: bool = False
+    ) -> Optional[RolesSet]:
         """Fetch the current guild roles of a guild member.
 
         Args:
         - guild_id: Discord guild ID
         - user_id: Discord user ID
+        - use_cache: When True will use the local mirror of the member if available
 
         Returns:
         - Member roles
         - None if user is not a member of the guild
         """
-        member_info = self.guild_member(guild_id=guild_id, user_id=user_id)
+        member_info = self.guild_member(
+            guild_id=guild_id, user_id=user_id, use_cache=use_cache
+        )
         if member_info is None:
             return None  # User is no longer a member
+        return self.member_roles(guild_id=guild_id, member=member_info)
+
+    def member_roles(self, guild_id: int, member: GuildMember) -> RolesSet:
+        """Resolve the current guild roles of a guild member
+        that has already been fetched, e.g. with ``guild_members()``.
+
+        Args:
+        - guild_id: Discord guild ID
+        - member: Guild member
+
+        Returns:
+        - Member roles
+        """
         guild_roles = RolesSet(self.guild_roles(guild_id=guild_id))
         logger.debug('Current guild roles: %s', guild_roles.ids())
-        _roles = set(member_info.roles)
-        if not guild_roles.has_roles(member_info.roles):
+        _roles = set(member.roles)
+        if not guild_roles.has_roles(member.roles):
             guild_roles = RolesSet(
                 self.guild_roles(guild_id=guild_id, use_cache=False)
             )
-            if not guild_roles.has_roles(member_info.roles):
-                role_ids = set(member_info.roles).difference(guild_roles.ids())
+            if not guild_roles.has_roles(member.roles):
+                role_ids = set(member.roles).difference(guild_roles.ids())
+                user_id = member.user.id if member.user else None
                 logger.warning(f'Discord user {user_id} has unknown roles: {role_ids}')
                 for _r in role_ids:
                     _roles.remove(_r)
         return guild_roles.subset(_roles)
 
+    def _update_guild_members_cache(
+        self, guild_id: int, members: Iterable[GuildMember]
+    ) -> None:
+        """Store guild members in the local mirror."""
+        with self._redis.pipeline() as pipe:
+            for member in members:
+                if not member.user:
+                    continue
+                pipe.set(
+                    name=self._guild_member_cache_key(guild_id, member.user.id),
+                    value=json.dumps(member.asdict()),
+                    ex=DISCORD_GUILD_MEMBERS_CACHE_MAX_AGE
+                )
+            pipe.execute()
+
+    def _modify_guild_member_cache(
+        self,
+        guild_id: int,
+        user_id: int,
+        roles: Iterable[int] = None,
+        nick: str = None
+    ) -> None:
+        """Write changes of a guild member through to the local mirror."""
+        member = self.guild_member_from_cache(guild_id, user_id)
+        if not member:
+            return
+        params = member.asdict()
+        if roles is not None:
+            params["roles"] = [str(role_id) for role_id in roles]
+        if nick is not None:
+            params["nick"] = nick
+        self._update_guild_members_cache(guild_id, [GuildMember.from_dict(params)])
+
+    def _invalidate_guild_member_cache(self, guild_id: int, user_id: int) -> None:
+        self._redis.delete(self._guild_member_cache_key(guild_id, user_id))
+
+    @classmethod
+    def _guild_member_cache_key(cls, guild_id: int, user_id: int) -> str:
+        return f'{cls._KEYPREFIX_GUILD_MEMBER}__{guild_id}__{user_id}'
+
     @classmethod
     def _is_member_unknown_error(cls, r: requests.Response) -> bool:
         try:
@@ -643,9 +926,11 @@ class DiscordClient:
         if not authorization:
             authorization = f'Bot {self.access_token}'
 
+        route_key, major_parameter = self._route_key(method, route)
         self._handle_ongoing_api_backoff(uid)
         if self.is_rate_limited:
             self._ensure_rate_limed_not_exhausted(uid)
+            self._ensure_route_bucket_not_exhausted(route_key, major_parameter, uid)
         headers = {
             'User-Agent': f'{AUTH_TITLE} ({__url__}, {__version__})',
             'accept': 'application/json',
@@ -666,7 +951,7 @@ class DiscordClient:
 
         logger.info('%s: sending %s request to url \'%s\'', uid, method.upper(), url)
         logger.debug('%s: request headers: %s', uid, headers)
-        r = getattr(requests, method)(**args)
+        r = getattr(self._session or requests, method)(**args)
         logger.debug(
             '%s: returned status code %d with headers: %s',
             uid,
@@ -682,8 +967,11 @@ class DiscordClient:
                 r.text
             )
 
+        if self.is_rate_limited:
+            self._update_route_bucket(r, route_key, major_parameter)
+
         if r.status_code == HTTPStatus.TOO_MANY_REQUESTS:
-            self._handle_new_api_backoff(r, uid)
+            self._handle_new_api_backoff(r, uid, route_key, major_parameter)
 
         self._report_rate_limit_from_api(r, uid)
 
@@ -700,7 +988,15 @@ class DiscordClient:
         """
         global_backoff_duration = self._redis.pttl(self._KEY_GLOBAL_BACKOFF_UNTIL)
         if global_backoff_duration > 0:
-            if global_backoff_duration < WAIT_THRESHOLD:
+            if global_backoff_duration < WAIT_THRESHOLD and self.is_non_blocking:
+                logger.info(
+                    '%s: Global API backoff still ongoing for %s ms. '
+                    'Raising retry time.',
+                    uid,
+                    global_backoff_duration
+                )
+                raise DiscordRetryAt(retry_after=global_backoff_duration)
+            elif global_backoff_duration < WAIT_THRESHOLD:
                 logger.info(
                     '%s: Global API backoff still ongoing for %s ms. Waiting.',
                     uid,
@@ -716,23 +1012,49 @@ class DiscordClient:
                 raise DiscordTooManyRequestsError(retry_after=global_backoff_duration)
 
     def _ensure_rate_limed_not_exhausted(self, uid: str) -> int:
-        """Ensures that the rate limit is not exhausted.
+        """Ensures that the global rate limit is not exhausted.
 
         If exhausted: will do a blocking wait if rate limit resets soon,
         else raises exception
 
         returns requests remaining on success
         """
-        for _ in range(RATE_LIMIT_RETRIES):
+        def acquire_request() -> Tuple[int, int]:
             requests_remaining = self._redis_decr_or_set(
                 name=self._KEY_GLOBAL_RATE_LIMIT_REMAINING,
                 value=RATE_LIMIT_MAX_REQUESTS,
                 px=RATE_LIMIT_RESETS_AFTER + DURATION_CONTINGENCY
             )
-            resets_in = max(
-                MINIMUM_BLOCKING_WAIT,
-                self._redis.pttl(self._KEY_GLOBAL_RATE_LIMIT_REMAINING)
-            )
+            resets_in = self._redis.pttl(self._KEY_GLOBAL_RATE_LIMIT_REMAINING)
+            return requests_remaining, resets_in
+
+        return self._wait_for_rate_limit(acquire_request, uid)
+
+    def _ensure_route_bucket_not_exhausted(
+        self, route_key: str, major_parameter: str, uid: str
+    ) -> Optional[int]:
+        """Ensures that the rate limit of the bucket for a route is not exhausted.
+
+        If exhausted: will do a blocking wait if rate limit resets soon,
+        else raises exception
+
+        returns requests remaining on success
+        or None if the rate limit of the bucket is not known yet
+        """
+        return self._wait_for_rate_limit(
+            lambda: self._redis_decr_route_bucket(route_key, major_parameter), uid
+        )
+
+    def _wait_for_rate_limit(
+        self, acquire_request: Callable[[], Optional[Tuple[int, int]]], uid: str
+    ) -> Optional[int]:
+        """Acquire a request from a rate limit, waiting for short resets."""
+        for _ in range(RATE_LIMIT_RETRIES):
+            result = acquire_request()
+            if result is None:
+                return None
+            requests_remaining, resets_in = result
+            resets_in = max(MINIMUM_BLOCKING_WAIT, resets_in)
             if requests_remaining >= 0:
                 logger.debug(
                     '%s: Got one of %d remaining requests until reset in %s ms',
@@ -742,6 +1064,15 @@ class DiscordClient:
                 )
                 return requests_remaining
 
+            elif resets_in < WAIT_THRESHOLD and self.is_non_blocking:
+                logger.debug(
+                    '%s: No requests remaining until reset in %d ms. '
+                    'Raising retry time.',
+                    uid,
+                    resets_in
+                )
+                raise DiscordRetryAt(resets_in)
+
             elif resets_in < WAIT_THRESHOLD:
                 sleep(resets_in / 1000)
                 logger.debug(
@@ -763,8 +1094,41 @@ class DiscordClient:
 
         raise RuntimeError('Failed to handle rate limit after after too many tries.')
 
-    def _handle_new_api_backoff(self, r: requests.Response, uid: str) -> None:
-        """Raise exception for new API backoff error."""
+    def _update_route_bucket(
+        self, r: requests.Response, route_key: str, major_parameter: str
+    ) -> None:
+        """Learn the bucket of a route and its rate limit from the response headers."""
+        bucket = r.headers.get('x-ratelimit-bucket')
+        if not bucket:
+            return
+        self._redis.set(
+            name=f'{self._KEYPREFIX_ROUTE_BUCKET}__{route_key}',
+            value=bucket,
+            ex=ROUTE_BUCKET_CACHE_MAX_AGE
+        )
+        try:
+            remaining = int(r.headers['x-ratelimit-remaining'])
+            reset_after = float(r.headers['x-ratelimit-reset-after']) * 1000
+        except (KeyError, ValueError):
+            return
+        self._redis_set_if_lower(
+            name=self._bucket_key(bucket, major_parameter),
+            value=remaining,
+            px=int(reset_after) + DURATION_CONTINGENCY
+        )
+
+    def _handle_new_api_backoff(
+        self,
+        r: requests.Response,
+        uid: str,
+        route_key: str = None,
+        major_parameter: str = None
+    ) -> None:
+        """Raise exception for new API backoff error.
+
+        Backs off only the bucket of the route if the API reports
+        that the per-route rate limit was violated, else all requests.
+        """
         response = r.json()
         if 'retry_after' in response:
             try:
@@ -774,16 +1138,35 @@ class DiscordClient:
                 retry_after = DEFAULT_BACKOFF_DELAY
         else:
             retry_after = DEFAULT_BACKOFF_DELAY
-        self._redis_set_if_longer(
-            name=self._KEY_GLOBAL_BACKOFF_UNTIL,
-            value='GLOBAL_API_BACKOFF',
-            px=retry_after
-        )
-        logger.warning(
-            "%s: Rate limit violated. Need to back off for at least %d ms",
-            uid,
-            retry_after
+        bucket = r.headers.get('x-ratelimit-bucket')
+        is_global = (
+            response.get('global')
+            or r.headers.get('x-ratelimit-scope') == 'global'
         )
+        if self.is_rate_limited and bucket and not is_global:
+            self._redis.set(
+                name=self._bucket_key(bucket, major_parameter),
+                value=0,
+                px=retry_after
+            )
+            logger.warning(
+                "%s: Rate limit of route %s violated. "
+                "Need to back off for at least %d ms",
+                uid,
+                route_key,
+                retry_after
+            )
+        else:
+            self._redis_set_if_longer(
+                name=self._KEY_GLOBAL_BACKOFF_UNTIL,
+                value='GLOBAL_API_BACKOFF',
+                px=retry_after
+            )
+            logger.warning(
+                "%s: Rate limit violated. Need to back off for at least %d ms",
+                uid,
+                retry_after
+            )
         raise DiscordTooManyRequestsError(retry_after=retry_after)
 
     def _report_rate_limit_from_api(self, r, uid) -> None:
@@ -808,6 +1191,26 @@ class DiscordClient:
             except ValueError:
                 pass
 
+    @staticmethod
+    def _route_key(method: str, route: str) -> Tuple[str, str]:
+        """Identify a route for rate limiting.
+
+        Returns:
+            - route key, i.e. method and route without query and minor IDs
+            - major parameter of the route, e.g. "guilds/123"
+        """
+        path = route.split('?', 1)[0].strip('/')
+        match = _MAJOR_PARAMETER_REGEX.match(path)
+        major_parameter = match.group(0) if match else ''
+        path = major_parameter + _MINOR_PARAMETER_REGEX.sub(
+            '/{id}', path[len(major_parameter):]
+        )
+        return f'{method.upper()} {path}', major_parameter
+
+    @classmethod
+    def _bucket_key(cls, bucket: str, major_parameter: str) -> str:
+        return f'{cls._KEYPREFIX_BUCKET_REMAINING}__{bucket}__{major_parameter}'
+
     @staticmethod
     def _redis_decode(value: str) -> str:
         """Decode a string from Redis and passes through None and Booleans."""
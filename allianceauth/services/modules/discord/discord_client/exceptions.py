@@ -1,6 +1,7 @@
 """Custom exceptions for the Discord Client package."""
 
 import math
+from datetime import datetime, timedelta, timezone
 
 
 class DiscordClientException(Exception):
@@ -30,6 +31,21 @@ class DiscordRateLimitExhausted(DiscordApiBackoff):
     """
 
 
+class DiscordRetryAt(DiscordApiBackoff):
+    """Exception signaling that a request can be retried once a rate limit
+    or backoff has expired. Raised by non-blocking clients instead of waiting.
+
+    Args:
+        retry_after: time to retry after in milliseconds
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(retry_after)
+        self.retry_at = datetime.now(timezone.utc) + timedelta(
+            milliseconds=self.retry_after
+        )
+
+
 class DiscordTooManyRequestsError(DiscordApiBackoff):
     """API has responded with a 429 Too Many Requests Error.
     Need to backoff for now.
@@ -109,6 +109,19 @@ class GuildMember:
                 raise TypeError("roles can only contain ints")
         object.__setattr__(self, "roles", frozenset(self.roles))
 
+    def asdict(self) -> dict:
+        """Convert object into a dictionary as received from the API."""
+        data = {"roles": sorted(str(obj) for obj in self.roles)}
+        if self.nick:
+            data["nick"] = self.nick
+        if self.user:
+            data["user"] = {
+                "id": str(self.user.id),
+                "username": self.user.username,
+                "discriminator": self.user.discriminator,
+            }
+        return data
+
     @classmethod
     def from_dict(cls, data: dict) -> "GuildMember":
         """Create object from dictionary as received from the API."""
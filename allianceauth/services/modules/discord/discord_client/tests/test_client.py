@@ -17,8 +17,14 @@ from ..client import (
     DURATION_CONTINGENCY,
     DiscordClient,
     RolesSet,
+    create_session,
+    get_session,
+)
+from ..exceptions import (
+    DiscordRateLimitExhausted,
+    DiscordRetryAt,
+    DiscordTooManyRequestsError,
 )
-from ..exceptions import DiscordRateLimitExhausted, DiscordTooManyRequestsError
 from .factories import (
     TEST_BOT_TOKEN,
     TEST_GUILD_ID,
@@ -28,6 +34,7 @@ from .factories import (
     create_discord_error_response_unknown_member,
     create_discord_guild_member_object,
     create_discord_guild_object,
+    create_discord_user_object,
     create_discord_role_object,
     create_guild,
     create_guild_member,
@@ -73,6 +80,9 @@ class DiscordClientStub(DiscordClient):
     def _redis_decr_or_set(self, name: str, value: str, px: int):
         return 5
 
+    def _redis_decr_route_bucket(self, route_key: str, major_parameter: str):
+        return None
+
 
 class TestBasicsAndHelpers(NoSocketsTestCase):
 
@@ -272,6 +282,186 @@ class TestGuildMember(NoSocketsTestCase):
             self.client.guild_member(TEST_GUILD_ID, TEST_USER_ID)
 
 
+def create_guild_member_object_for(user_id: int) -> dict:
+    return {
+        **create_discord_guild_member_object(),
+        "user": create_discord_user_object(id=user_id),
+    }
+
+
+@requests_mock.Mocker()
+class TestGuildMembers(NoSocketsTestCase):
+
+    def setUp(self):
+        self.client = DiscordClientStub(TEST_BOT_TOKEN, mock_redis)
+        self.headers = DEFAULT_REQUEST_HEADERS
+
+    def test_should_return_members_from_all_pages(self, requests_mocker):
+        # given
+        requests_mocker.get(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/members?limit=2&after=0',
+            request_headers=self.headers,
+            json=[
+                create_guild_member_object_for(1001),
+                create_guild_member_object_for(1002),
+            ]
+        )
+        requests_mocker.get(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/members?limit=2&after=1002',
+            request_headers=self.headers,
+            json=[create_guild_member_object_for(1003)]
+        )
+        # when
+        result = self.client.guild_members(TEST_GUILD_ID, page_size=2)
+        # then
+        self.assertListEqual(
+            [member.user.id for member in result], [1001, 1002, 1003]
+        )
+        self.assertEqual(requests_mocker.call_count, 2)
+
+    def test_should_stop_after_empty_page(self, requests_mocker):
+        # given
+        requests_mocker.get(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/members?limit=2&after=0',
+            request_headers=self.headers,
+            json=[
+                create_guild_member_object_for(1001),
+                create_guild_member_object_for(1002),
+            ]
+        )
+        requests_mocker.get(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/members?limit=2&after=1002',
+            request_headers=self.headers,
+            json=[]
+        )
+        # when
+        result = list(self.client.guild_members(TEST_GUILD_ID, page_size=2))
+        # then
+        self.assertEqual(len(result), 2)
+        self.assertEqual(requests_mocker.call_count, 2)
+
+    def test_should_start_after_given_member(self, requests_mocker):
+        # given
+        requests_mocker.get(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/members?limit=2&after=1002',
+            request_headers=self.headers,
+            json=[create_guild_member_object_for(1003)]
+        )
+        # when
+        result = list(self.client.guild_members(TEST_GUILD_ID, page_size=2, after=1002))
+        # then
+        self.assertListEqual([member.user.id for member in result], [1003])
+
+    def test_raise_exception_on_error(self, requests_mocker):
+        requests_mocker.get(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/members?limit=1000&after=0',
+            request_headers=self.headers,
+            status_code=500
+        )
+        with self.assertRaises(HTTPError):
+            list(self.client.guild_members(TEST_GUILD_ID))
+
+
+@requests_mock.Mocker()
+class TestGuildMemberMirror(NoSocketsTestCase):
+
+    def setUp(self):
+        self.client = DiscordClientStub(TEST_BOT_TOKEN, mock_redis)
+        self.headers = DEFAULT_REQUEST_HEADERS
+
+    @patch(MODULE_PATH + '.DiscordClient.guild_member_from_cache', spec=True)
+    def test_should_return_member_from_mirror(
+        self, requests_mocker, mock_guild_member_from_cache
+    ):
+        # given
+        mock_guild_member_from_cache.return_value = create_guild_member()
+        # when
+        result = self.client.guild_member(
+            TEST_GUILD_ID, TEST_USER_ID, use_cache=True
+        )
+        # then
+        self.assertEqual(result, create_guild_member())
+        self.assertFalse(requests_mocker.called)
+
+    @patch(MODULE_PATH + '.DiscordClient._update_guild_members_cache', spec=True)
+    @patch(MODULE_PATH + '.DiscordClient.guild_member_from_cache', spec=True)
+    def test_should_fetch_member_and_update_mirror_if_not_mirrored(
+        self,
+        requests_mocker,
+        mock_guild_member_from_cache,
+        mock_update_guild_members_cache
+    ):
+        # given
+        mock_guild_member_from_cache.return_value = None
+        requests_mocker.get(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/members/{TEST_USER_ID}',
+            request_headers=self.headers,
+            json=create_discord_guild_member_object()
+        )
+        # when
+        result = self.client.guild_member(
+            TEST_GUILD_ID, TEST_USER_ID, use_cache=True
+        )
+        # then
+        self.assertEqual(result, create_guild_member())
+        args, _ = mock_update_guild_members_cache.call_args
+        self.assertEqual(args[-2:], (TEST_GUILD_ID, [create_guild_member()]))
+
+    def test_should_read_member_from_mirror(self, requests_mocker):
+        # given
+        my_mock_redis = MagicMock(**{
+            'get.return_value': json.dumps(create_guild_member().asdict()).encode()
+        })
+        client = DiscordClientStub(TEST_BOT_TOKEN, my_mock_redis)
+        # when
+        result = client.guild_member_from_cache(TEST_GUILD_ID, TEST_USER_ID)
+        # then
+        self.assertEqual(result, create_guild_member())
+
+    @patch(MODULE_PATH + '.DiscordClient._update_guild_members_cache', spec=True)
+    @patch(MODULE_PATH + '.DiscordClient.guild_member_from_cache', spec=True)
+    def test_should_write_modified_member_through_to_mirror(
+        self,
+        requests_mocker,
+        mock_guild_member_from_cache,
+        mock_update_guild_members_cache
+    ):
+        # given
+        mock_guild_member_from_cache.return_value = create_guild_member(
+            roles=[1], nick="Old"
+        )
+        requests_mocker.patch(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/members/{TEST_USER_ID}',
+            status_code=204
+        )
+        # when
+        self.client.modify_guild_member(
+            TEST_GUILD_ID, TEST_USER_ID, role_ids=[1, 2], nick="New"
+        )
+        # then
+        args, _ = mock_update_guild_members_cache.call_args
+        self.assertEqual(
+            args[-2:],
+            (TEST_GUILD_ID, [create_guild_member(roles=[1, 2], nick="New")])
+        )
+
+    @patch(MODULE_PATH + '.DiscordClient._invalidate_guild_member_cache', spec=True)
+    def test_should_remove_unknown_member_from_mirror(
+        self, requests_mocker, mock_invalidate_guild_member_cache
+    ):
+        # given
+        requests_mocker.patch(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/members/{TEST_USER_ID}',
+            status_code=404,
+            json=create_discord_error_response_unknown_member()
+        )
+        # when
+        self.client.modify_guild_member(TEST_GUILD_ID, TEST_USER_ID, nick="New")
+        # then
+        args, _ = mock_invalidate_guild_member_cache.call_args
+        self.assertEqual(args[-2:], (TEST_GUILD_ID, TEST_USER_ID))
+
+
 class TestGuildGetName(NoSocketsTestCase):
 
     @patch(MODULE_PATH + '.DiscordClient.guild_infos', spec=True)
@@ -1196,6 +1386,43 @@ class TestApiRequestBasics(NoSocketsTestCase):
             self.client._api_request('xxx', 'users/@me')
 
 
+class TestSessions(NoSocketsTestCase):
+
+    def test_create_session_with_pool_and_retries(self):
+        session = create_session(pool_size=7, max_retries=2)
+        adapter = session.get_adapter(API_BASE_URL)
+        self.assertEqual(adapter._pool_maxsize, 7)
+        self.assertEqual(adapter.max_retries.connect, 2)
+        self.assertEqual(adapter.max_retries.read, 0)
+
+    def test_get_session_returns_same_session_in_process(self):
+        self.assertIs(get_session(), get_session())
+
+    @patch(MODULE_PATH + '.os.getpid', spec=True)
+    def test_get_session_returns_new_session_after_fork(self, mock_getpid):
+        mock_getpid.return_value = 1
+        session_1 = get_session()
+        mock_getpid.return_value = 2
+        session_2 = get_session()
+        self.assertIsNot(session_1, session_2)
+
+    @patch(MODULE_PATH + '.DiscordClient._redis_decr_or_set', spec=True)
+    def test_client_sends_requests_with_session(self, mock_redis_decr_or_set):
+        mock_redis_decr_or_set.return_value = 5
+        session = MagicMock(spec=requests.Session)
+        session.get.return_value.status_code = 200
+        session.get.return_value.json.return_value = create_discord_user_object()
+        session.get.return_value.headers = {}
+        client = DiscordClient(
+            TEST_BOT_TOKEN,
+            MagicMock(**{'pttl.return_value': -1, 'get.return_value': None}),
+            session=session
+        )
+        result = client.current_user()
+        self.assertEqual(result.id, TEST_USER_ID)
+        self.assertTrue(session.get.called)
+
+
 @patch(MODULE_PATH + '.DiscordClient._redis_decr_or_set', spec=True)
 @requests_mock.Mocker()
 class TestRateLimitMechanic(NoSocketsTestCase):
@@ -1414,6 +1641,176 @@ class TestRateLimitMechanic(NoSocketsTestCase):
         self.assertFalse(mock_ensure_rate_limed_not_exhausted.called)
 
 
+class TestRouteKey(NoSocketsTestCase):
+
+    def test_route_key_should_replace_minor_parameters(self):
+        self.assertEqual(
+            DiscordClient._route_key(
+                'patch', f'guilds/{TEST_GUILD_ID}/members/{TEST_USER_ID}'
+            ),
+            (f'PATCH guilds/{TEST_GUILD_ID}/members/{{id}}', f'guilds/{TEST_GUILD_ID}')
+        )
+
+    def test_route_key_should_ignore_query(self):
+        self.assertEqual(
+            DiscordClient._route_key(
+                'get', f'guilds/{TEST_GUILD_ID}/members?limit=1000&after=0'
+            ),
+            (f'GET guilds/{TEST_GUILD_ID}/members', f'guilds/{TEST_GUILD_ID}')
+        )
+
+    def test_route_key_without_major_parameter(self):
+        self.assertEqual(
+            DiscordClient._route_key('get', 'users/@me'), ('GET users/@me', '')
+        )
+
+
+@patch(MODULE_PATH + '.DiscordClient._redis_decr_or_set', spec=True)
+@requests_mock.Mocker()
+class TestRouteBuckets(NoSocketsTestCase):
+
+    my_role_api = create_discord_role_object(1, "alpha")
+
+    @patch(MODULE_PATH + '.DiscordClient._redis_set_if_lower', spec=True)
+    def test_should_learn_bucket_from_response(
+        self, requests_mocker, mock_redis_set_if_lower, mock_redis_decr_or_set
+    ):
+        # given
+        requests_mocker.post(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/roles',
+            json=self.my_role_api,
+            headers={
+                'x-ratelimit-bucket': 'abc123',
+                'x-ratelimit-remaining': '9',
+                'x-ratelimit-reset-after': '2.5',
+            }
+        )
+        my_mock_redis = MagicMock(**{'pttl.return_value': -1, 'get.return_value': None})
+        mock_redis_decr_or_set.return_value = 5
+        client = DiscordClient(TEST_BOT_TOKEN, my_mock_redis)
+        # when
+        client.create_guild_role(guild_id=TEST_GUILD_ID, role_name='alpha')
+        # then
+        _, kwargs = my_mock_redis.set.call_args
+        self.assertEqual(
+            kwargs['name'], f'DISCORD_ROUTE_BUCKET__POST guilds/{TEST_GUILD_ID}/roles'
+        )
+        self.assertEqual(kwargs['value'], 'abc123')
+        _, kwargs = mock_redis_set_if_lower.call_args
+        self.assertEqual(
+            kwargs['name'],
+            f'DISCORD_BUCKET_REMAINING__abc123__guilds/{TEST_GUILD_ID}'
+        )
+        self.assertEqual(kwargs['value'], 9)
+        self.assertEqual(kwargs['px'], 2500 + DURATION_CONTINGENCY)
+
+    @patch(MODULE_PATH + '.DiscordClient._redis_decr_route_bucket', spec=True)
+    def test_should_raise_exception_if_bucket_exhausted(
+        self, requests_mocker, mock_redis_decr_route_bucket, mock_redis_decr_or_set
+    ):
+        # given
+        requests_mocker.post(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/roles', json=self.my_role_api
+        )
+        my_mock_redis = MagicMock(**{'pttl.return_value': -1})
+        mock_redis_decr_or_set.return_value = 5
+        mock_redis_decr_route_bucket.return_value = (-1, TEST_RETRY_AFTER)
+        client = DiscordClient(TEST_BOT_TOKEN, my_mock_redis)
+        # when/then
+        with self.assertRaises(DiscordRateLimitExhausted) as cm:
+            client.create_guild_role(guild_id=TEST_GUILD_ID, role_name='alpha')
+        self.assertEqual(cm.exception.retry_after, TEST_RETRY_AFTER)
+        self.assertFalse(requests_mocker.called)
+
+    @patch(MODULE_PATH + '.sleep', spec=True)
+    @patch(MODULE_PATH + '.DiscordClient._redis_decr_route_bucket', spec=True)
+    def test_should_raise_retry_at_if_bucket_resets_soon_and_non_blocking(
+        self,
+        requests_mocker,
+        mock_redis_decr_route_bucket,
+        mock_sleep,
+        mock_redis_decr_or_set
+    ):
+        # given
+        requests_mocker.post(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/roles', json=self.my_role_api
+        )
+        my_mock_redis = MagicMock(**{'pttl.return_value': -1})
+        mock_redis_decr_or_set.return_value = 5
+        mock_redis_decr_route_bucket.return_value = (-1, 100)
+        client = DiscordClient(TEST_BOT_TOKEN, my_mock_redis, is_non_blocking=True)
+        # when/then
+        with self.assertRaises(DiscordRetryAt) as cm:
+            client.create_guild_role(guild_id=TEST_GUILD_ID, role_name='alpha')
+        self.assertEqual(cm.exception.retry_after, 100)
+        self.assertFalse(mock_sleep.called)
+        self.assertFalse(requests_mocker.called)
+
+    @patch(MODULE_PATH + '.DiscordClient._redis_decr_route_bucket', spec=True)
+    def test_should_proceed_if_bucket_not_known(
+        self, requests_mocker, mock_redis_decr_route_bucket, mock_redis_decr_or_set
+    ):
+        # given
+        requests_mocker.post(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/roles', json=self.my_role_api
+        )
+        my_mock_redis = MagicMock(**{'pttl.return_value': -1})
+        mock_redis_decr_or_set.return_value = 5
+        mock_redis_decr_route_bucket.return_value = None
+        client = DiscordClient(TEST_BOT_TOKEN, my_mock_redis)
+        # when
+        result = client.create_guild_role(guild_id=TEST_GUILD_ID, role_name='alpha')
+        # then
+        self.assertEqual(result, create_role(id=1, name="alpha"))
+
+    @patch(MODULE_PATH + '.DiscordClient._redis_set_if_longer', spec=True)
+    def test_should_only_back_off_bucket_if_route_limit_violated(
+        self, requests_mocker, mock_redis_set_if_longer, mock_redis_decr_or_set
+    ):
+        # given
+        requests_mocker.post(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/roles',
+            status_code=429,
+            json={'retry_after': 2000, 'global': False},
+            headers={'x-ratelimit-bucket': 'abc123', 'x-ratelimit-scope': 'user'}
+        )
+        my_mock_redis = MagicMock(**{'pttl.return_value': -1, 'get.return_value': None})
+        mock_redis_decr_or_set.return_value = 5
+        client = DiscordClient(TEST_BOT_TOKEN, my_mock_redis)
+        # when
+        with self.assertRaises(DiscordTooManyRequestsError):
+            client.create_guild_role(guild_id=TEST_GUILD_ID, role_name='alpha')
+        # then
+        self.assertFalse(mock_redis_set_if_longer.called)
+        _, kwargs = my_mock_redis.set.call_args
+        self.assertEqual(
+            kwargs['name'],
+            f'DISCORD_BUCKET_REMAINING__abc123__guilds/{TEST_GUILD_ID}'
+        )
+        self.assertEqual(kwargs['value'], 0)
+        self.assertEqual(kwargs['px'], 2000 + DURATION_CONTINGENCY)
+
+    @patch(MODULE_PATH + '.DiscordClient._redis_set_if_longer', spec=True)
+    def test_should_back_off_globally_if_global_limit_violated(
+        self, requests_mocker, mock_redis_set_if_longer, mock_redis_decr_or_set
+    ):
+        # given
+        requests_mocker.post(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/roles',
+            status_code=429,
+            json={'retry_after': 2000, 'global': True},
+            headers={'x-ratelimit-bucket': 'abc123', 'x-ratelimit-scope': 'global'}
+        )
+        my_mock_redis = MagicMock(**{'pttl.return_value': -1, 'get.return_value': None})
+        mock_redis_decr_or_set.return_value = 5
+        client = DiscordClient(TEST_BOT_TOKEN, my_mock_redis)
+        # when
+        with self.assertRaises(DiscordTooManyRequestsError):
+            client.create_guild_role(guild_id=TEST_GUILD_ID, role_name='alpha')
+        # then
+        self.assertTrue(mock_redis_set_if_longer.called)
+
+
 @patch(MODULE_PATH + '.DiscordClient._redis_decr_or_set', spec=True)
 @requests_mock.Mocker()
 class TestBackoffHandling(NoSocketsTestCase):
@@ -1470,6 +1867,23 @@ class TestBackoffHandling(NoSocketsTestCase):
         self.assertEqual(result, self.my_role_obj)
         self.assertTrue(mock_sleep.called)
 
+    @patch(MODULE_PATH + '.sleep', spec=True)
+    def test_raise_retry_at_if_global_backoff_ends_soon_and_non_blocking(
+        self, requests_mocker, mock_sleep, mock_redis_decr_or_set,
+    ):
+        requests_mocker.post(
+            f'{API_BASE_URL}guilds/{TEST_GUILD_ID}/roles', json=self.my_role_api
+        )
+        retry_after = 50
+        my_mock_redis = MagicMock(**{'pttl.return_value': retry_after})
+        mock_redis_decr_or_set.return_value = 5
+        client = DiscordClient(TEST_BOT_TOKEN, my_mock_redis, is_non_blocking=True)
+        with self.assertRaises(DiscordRetryAt) as cm:
+            client.create_guild_role(guild_id=TEST_GUILD_ID, role_name='dummy')
+        self.assertEqual(cm.exception.retry_after, retry_after)
+        self.assertFalse(mock_sleep.called)
+        self.assertFalse(requests_mocker.called)
+
     @patch(MODULE_PATH + '.DiscordClient._redis_set_if_longer', spec=True)
     def test_raise_exception_if_api_returns_429(
         self, requests_mocker, mock_redis_set_if_longer, mock_redis_decr_or_set,
@@ -1574,3 +1988,11 @@ class TestTouchLuaScripts(NoSocketsTestCase):
     def test_redis_set_if_longer(self):
         client = DiscordClient(TEST_BOT_TOKEN, mock_redis)
         client._redis_set_if_longer(name='dummy', value=5, px=1000)
+
+    def test_redis_set_if_lower(self):
+        client = DiscordClient(TEST_BOT_TOKEN, mock_redis)
+        client._redis_set_if_lower(name='dummy', value=5, px=1000)
+
+    def test_redis_decr_route_bucket(self):
+        client = DiscordClient(TEST_BOT_TOKEN, mock_redis)
+        client._redis_decr_route_bucket(route_key='GET users/@me', major_parameter='')
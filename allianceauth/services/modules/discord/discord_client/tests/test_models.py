@@ -135,6 +135,14 @@ class TestGuildMember(TestCase):
         self.assertSetEqual(obj.roles, {197150972374548480, 41771983423143936})
         self.assertEqual(obj.nick, "Nelly the great")
 
+    def test_should_convert_to_dict_and_back(self):
+        # given
+        obj = GuildMember(user=create_user(), nick="Bruce", roles=[1, 2])
+        # when
+        result = GuildMember.from_dict(obj.asdict())
+        # then
+        self.assertEqual(result, obj)
+
     def test_should_raise_error_when_user_type_is_wrong(self):
         with self.assertRaises(TypeError):
             create_guild_member(user="invalid")
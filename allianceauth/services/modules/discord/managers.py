@@ -1,4 +1,5 @@
 import logging
+from typing import List, Tuple
 from urllib.parse import urlencode
 
 from requests.exceptions import HTTPError
@@ -8,6 +9,8 @@ from django.contrib.auth.models import Group, User
 from django.db import models
 from django.utils.timezone import now
 
+from allianceauth.groupmanagement.models import ReservedGroupName
+
 from . import __title__
 from .app_settings import (
     DISCORD_APP_ID,
@@ -147,6 +150,113 @@ class DiscordUserManager(models.Manager):
         })
         return f'{DISCORD_OAUTH_BASE_URL}?{params}'
 
+    def refresh_guild_members(self) -> int:
+        """Refresh the local mirror of all guild members with a paginated snapshot.
+
+        Returns:
+        - Number of guild members
+        """
+        bot_client = create_bot_client()
+        member_count = 0
+        for _ in bot_client.guild_members(guild_id=DISCORD_GUILD_ID):
+            member_count += 1
+        logger.info("Refreshed mirror of %d discord guild members", member_count)
+        return member_count
+
+    def reconcile_roles(
+        self, user_pks: List[int] = None, progress: dict = None
+    ) -> Tuple[int, List[int]]:
+        """Reconcile the roles of all guild members in one pass over the member list.
+
+        Roles are calculated locally for every member with a Discord account
+        and only members whose roles differ are updated on Discord.
+        So the number of API calls scales with the number of changes,
+        not with the number of members.
+
+        Params:
+        - user_pks: Only reconcile roles of these users. Their members are taken
+        from the local mirror and only fetched from the API when not mirrored.
+        - progress: Resumes after the Discord user ID in its key "after"
+        and updates it with every member reconciled, so an interrupted pass
+        can be continued from there.
+
+        Returns:
+        - Number of members whose roles have been updated
+        - PKs of users who are no longer members of the guild
+        """
+        bot_client = create_bot_client()
+        if progress is None:
+            progress = {}
+        after = progress.get('after', 0)
+        discord_users_qs = self.all() if user_pks is None \
+            else self.filter(user__pk__in=user_pks)
+        if after:
+            # members up to here have been reconciled by an earlier attempt
+            discord_users_qs = discord_users_qs.filter(uid__gt=after)
+        discord_users = {
+            discord_user.uid: discord_user
+            for discord_user in discord_users_qs.select_related(
+                'user__profile__state'
+            ).prefetch_related('user__groups')
+        }
+        reserved_role_names = list(
+            ReservedGroupName.objects.values_list("name", flat=True)
+        )
+        logger.info(
+            "Starting to reconcile discord roles for %d users", len(discord_users)
+        )
+        if user_pks is None:
+            members = bot_client.guild_members(guild_id=DISCORD_GUILD_ID, after=after)
+        else:
+            members = self._mirrored_guild_members(bot_client, sorted(discord_users))
+        updated_count = 0
+        for member in members:
+            discord_user = discord_users.pop(member.user.id, None)
+            if not discord_user:
+                progress['after'] = member.user.id
+                continue
+            roles, changed = calculate_roles_for_user(
+                user=discord_user.user,
+                client=bot_client,
+                discord_uid=discord_user.uid,
+                member=member,
+                reserved_role_names=reserved_role_names,
+            )
+            if not changed:
+                progress['after'] = member.user.id
+                continue
+            try:
+                success = bot_client.modify_guild_member(
+                    guild_id=DISCORD_GUILD_ID,
+                    user_id=discord_user.uid,
+                    role_ids=list(roles.ids())
+                )
+            except ValueError:
+                logger.warning(
+                    'Failed to update roles for %s', discord_user.user, exc_info=True
+                )
+            else:
+                if success:
+                    logger.debug('Roles for %s have been updated', discord_user.user)
+                    updated_count += 1
+                else:
+                    logger.warning('Failed to update roles for %s', discord_user.user)
+            progress['after'] = member.user.id
+
+        logger.info("Updated discord roles for %d users", updated_count)
+        return updated_count, [
+            discord_user.user_id for discord_user in discord_users.values()
+        ]
+
+    @staticmethod
+    def _mirrored_guild_members(bot_client, uids: List[int]):
+        for uid in uids:
+            member = bot_client.guild_member(
+                guild_id=DISCORD_GUILD_ID, user_id=uid, use_cache=True
+            )
+            if member:
+                yield member
+
     @classmethod
     def generate_oauth_redirect_url(cls) -> str:
         oauth = OAuth2Session(
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('discord', '0003_big_overhaul'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='discorduser',
+            name='nickname',
+            field=models.CharField(blank=True, default='', help_text='nickname last set for this user on Discord by Auth', max_length=32),
+        ),
+    ]
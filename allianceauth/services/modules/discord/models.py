@@ -17,7 +17,7 @@ from .core import (
     calculate_roles_for_user,
     user_formatted_nick
 )
-from .discord_client import DiscordApiBackoff
+from .discord_client import DiscordApiBackoff, GuildMember
 from .managers import DiscordUserManager
 from .utils import LoggerAddTag
 
@@ -58,6 +58,12 @@ class DiscordUser(models.Model):
         blank=True,
         help_text='Date & time this service account was activated'
     )
+    nickname = models.CharField(
+        max_length=32,
+        default='',
+        blank=True,
+        help_text='nickname last set for this user on Discord by Auth'
+    )
 
     objects = DiscordUserManager()
 
@@ -87,6 +93,17 @@ class DiscordUser(models.Model):
             nickname = user_formatted_nick(self.user)
         if not nickname:
             return False
+        nickname = GuildMember.sanitize_nick(nickname)
+        if nickname == self.nickname:
+            logger.info('No need to update nickname for user %s', self.user)
+            return True
+        member = default_bot_client.guild_member_from_cache(
+            guild_id=DISCORD_GUILD_ID, user_id=self.uid
+        )
+        if member and member.nick == nickname:
+            logger.info('No need to update nickname for user %s', self.user)
+            self._save_nickname(nickname)
+            return True
         success = default_bot_client.modify_guild_member(
             guild_id=DISCORD_GUILD_ID,
             user_id=self.uid,
@@ -94,10 +111,23 @@ class DiscordUser(models.Model):
         )
         if success:
             logger.info('Nickname for %s has been updated', self.user)
+            self._save_nickname(nickname)
         else:
             logger.warning('Failed to update nickname for %s', self.user)
         return success
 
+    def is_nickname_outdated(self, nickname: str = None) -> bool:
+        """Whether the nickname last set on Discord differs from the given nickname
+        or the formatted name of the user's main.
+        """
+        if not nickname:
+            nickname = user_formatted_nick(self.user)
+        return bool(nickname) and GuildMember.sanitize_nick(nickname) != self.nickname
+
+    def _save_nickname(self, nickname: str) -> None:
+        self.nickname = nickname
+        self.save(update_fields=['nickname'])
+
     def update_groups(self, state_name: str = None) -> Optional[bool]:
         """update groups for a user based on his current group memberships.
         Will add or remove roles of a user as needed.
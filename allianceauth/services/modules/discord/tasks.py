@@ -1,4 +1,5 @@
 import logging
+from http import HTTPStatus
 from typing import Any
 
 from celery import shared_task, chain
@@ -13,7 +14,7 @@ from . import __title__
 from .app_settings import (
     DISCORD_TASKS_MAX_RETRIES, DISCORD_TASKS_RETRY_PAUSE, DISCORD_SYNC_NAMES
 )
-from .discord_client import DiscordApiBackoff
+from .discord_client import DiscordApiBackoff, DiscordRetryAt
 from .models import DiscordUser
 from .utils import LoggerAddTag
 
@@ -84,6 +85,16 @@ def _task_perform_user_action(self, user_pk: int, method: str, **kwargs) -> None
         try:
             success = getattr(user.discord, method)(**kwargs)
 
+        except DiscordRetryAt as bo:
+            logger.info(
+                "API back off for %s wth user %s due to %r, retrying at %s",
+                method,
+                user,
+                bo,
+                bo.retry_at
+            )
+            raise self.retry(eta=bo.retry_at)
+
         except DiscordApiBackoff as bo:
             logger.info(
                 "API back off for %s wth user %s due to %r, retrying in %s seconds",
@@ -135,17 +146,86 @@ def _task_perform_user_action(self, user_pk: int, method: str, **kwargs) -> None
 @shared_task(name='discord.update_all_groups')
 def update_all_groups() -> None:
     """Update roles for all known users with a Discord account."""
-    discord_users_qs = DiscordUser.objects.all()
-    _bulk_update_groups_for_users(discord_users_qs)
+    reconcile_all_groups.apply_async(priority=BULK_TASK_PRIORITY)
 
 
-@shared_task(name='discord.update_groups_bulk')
-def update_groups_bulk(user_pks: list) -> None:
-    """Update roles for list of users with a Discord account in bulk."""
-    discord_users_qs = DiscordUser.objects\
-        .filter(user__pk__in=user_pks)\
-        .select_related()
-    _bulk_update_groups_for_users(discord_users_qs)
+@shared_task(
+    bind=True,
+    name='discord.reconcile_all_groups',
+    base=QueueOnce,
+    once={'graceful': True, 'keys': []},
+    max_retries=None
+)
+def reconcile_all_groups(self, after: int = 0, error_retries: int = 0) -> None:
+    """Reconcile roles of all guild members with one pass over the member list.
+
+    Only members whose roles need to change are updated on Discord.
+    Users who are no longer members of the guild are deleted.
+    Falls back to updating all users one by one when the bot is not allowed
+    to list guild members, i.e. it lacks the privileged server members intent.
+
+    Params:
+    - after: Discord user ID of the last member reconciled by an earlier attempt
+    - error_retries: Number of retries after errors so far
+    """
+    retry_state = {'after': after, 'error_retries': error_retries}
+    try:
+        result = _task_perform_users_action(
+            self, method='reconcile_roles', retry_state=retry_state, progress=retry_state
+        )
+    except HTTPError:
+        logger.warning(
+            "Not allowed to fetch the members of the Discord server. "
+            "Please enable the server members intent for your bot. "
+            "Falling back to updating roles of each user separately."
+        )
+        _bulk_update_groups_for_users(DiscordUser.objects.all())
+        return
+    _delete_missing_users(result)
+
+
+@shared_task(
+    bind=True, name='discord.update_groups_bulk', max_retries=None
+)
+def update_groups_bulk(self, user_pks: list, after: int = 0, error_retries: int = 0) -> None:
+    """Update roles for list of users with a Discord account in bulk.
+
+    Roles are reconciled in one task from the local mirror of guild members
+    and only members whose roles need to change are updated on Discord.
+
+    Params:
+    - user_pks: PKs of the users
+    - after: Discord user ID of the last member reconciled by an earlier attempt
+    - error_retries: Number of retries after errors so far
+    """
+    retry_state = {'user_pks': user_pks, 'after': after, 'error_retries': error_retries}
+    try:
+        result = _task_perform_users_action(
+            self,
+            method='reconcile_roles',
+            retry_state=retry_state,
+            user_pks=user_pks,
+            progress=retry_state,
+        )
+    except HTTPError:
+        discord_users_qs = DiscordUser.objects.filter(user__pk__in=user_pks)
+        _bulk_update_groups_for_users(discord_users_qs)
+        return
+    _delete_missing_users(result)
+
+
+def _delete_missing_users(result) -> None:
+    """Delete users who are no longer members of the guild after reconciling roles."""
+    if not result:
+        return
+    updated_count, missing_user_pks = result
+    if missing_user_pks:
+        logger.info(
+            "%d users are no longer members of the Discord server",
+            len(missing_user_pks)
+        )
+    for user_pk in missing_user_pks:
+        delete_user.delay(user_pk, notify_user=True)
 
 
 def _bulk_update_groups_for_users(discord_users_qs: QuerySet) -> None:
@@ -176,20 +256,41 @@ def update_nicknames_bulk(user_pks: list) -> None:
 
 
 def _bulk_update_nicknames_for_users(discord_users_qs: QuerySet) -> None:
+    user_pks = _user_pks_with_outdated_nicknames(discord_users_qs)
     logger.info(
-        "Starting to bulk update discord nicknames for %d users",
-        discord_users_qs.count()
+        "Starting to bulk update discord nicknames for %d users", len(user_pks)
     )
+    if not user_pks:
+        return
     update_nicknames_chain = list()
-    for discord_user in discord_users_qs:
-        update_nicknames_chain.append(update_nickname.si(discord_user.user.pk))
+    for user_pk in user_pks:
+        update_nicknames_chain.append(update_nickname.si(user_pk))
 
     chain(update_nicknames_chain).apply_async(priority=BULK_TASK_PRIORITY)
 
 
-def _task_perform_users_action(self, method: str, **kwargs) -> Any:
+def _user_pks_with_outdated_nicknames(discord_users_qs: QuerySet) -> set:
+    """PKs of users whose nickname on Discord differs from their formatted name."""
+    discord_users_qs = discord_users_qs.select_related(
+        'user__profile__main_character'
+    )
+    return {
+        discord_user.user_id
+        for discord_user in discord_users_qs
+        if discord_user.is_nickname_outdated()
+    }
+
+
+def _task_perform_users_action(
+    self, method: str, retry_state: dict = None, **kwargs
+) -> Any:
     """Perform an action that concerns a group of users or the whole server
     and that hits the API
+
+    Params:
+    - retry_state: kwargs to retry the task with. Its key "error_retries" counts
+    retries after errors, so back offs of the API do not count against
+    the max retries. The action may update it with its progress.
     """
     result = None
     try:
@@ -198,6 +299,12 @@ def _task_perform_users_action(self, method: str, **kwargs) -> Any:
     except AttributeError:
         raise ValueError(f'{method} not a valid method for DiscordUser.objects')
 
+    except DiscordRetryAt as bo:
+        logger.info(
+            "API back off for %s due to %r, retrying at %s", method, bo, bo.retry_at
+        )
+        raise self.retry(eta=bo.retry_at, **_retry_options(retry_state))
+
     except DiscordApiBackoff as bo:
         logger.info(
             "API back off for %s due to %r, retrying in %s seconds",
@@ -205,17 +312,30 @@ def _task_perform_users_action(self, method: str, **kwargs) -> Any:
             bo,
             bo.retry_after_seconds
         )
-        raise self.retry(countdown=bo.retry_after_seconds)
+        raise self.retry(
+            countdown=bo.retry_after_seconds, **_retry_options(retry_state)
+        )
 
-    except (HTTPError, ConnectionError):
+    except (HTTPError, ConnectionError) as ex:
+        if _is_forbidden(ex):
+            # retrying will not help, e.g. when a privileged intent is missing
+            logger.error('%s is not allowed for the bot', method, exc_info=True)
+            raise
         logger.warning(
             '%s failed, retrying in %d secs',
             method,
             DISCORD_TASKS_RETRY_PAUSE,
             exc_info=True
         )
-        if self.request.retries < DISCORD_TASKS_MAX_RETRIES:
-            raise self.retry(countdown=DISCORD_TASKS_RETRY_PAUSE)
+        if retry_state is None:
+            error_retries = self.request.retries
+        else:
+            error_retries = retry_state['error_retries']
+        if error_retries < DISCORD_TASKS_MAX_RETRIES:
+            raise self.retry(
+                countdown=DISCORD_TASKS_RETRY_PAUSE,
+                **_retry_options(retry_state, error_retries=error_retries + 1)
+            )
         else:
             logger.error('%s failed after max retries', method, exc_info=True)
 
@@ -225,6 +345,30 @@ def _task_perform_users_action(self, method: str, **kwargs) -> Any:
     return result
 
 
+def _retry_options(retry_state: dict = None, **changes) -> dict:
+    """Options for retrying a task with its current state."""
+    if retry_state is None:
+        return {}
+    return {'args': (), 'kwargs': {**retry_state, **changes}}
+
+
+def _is_forbidden(ex: Exception) -> bool:
+    """Whether an exception is a 403 from the API, e.g. with code 50001 Missing Access"""
+    response = getattr(ex, 'response', None)
+    return response is not None and response.status_code == HTTPStatus.FORBIDDEN
+
+
+@shared_task(
+    bind=True,
+    name='discord.refresh_guild_members',
+    base=QueueOnce,
+    max_retries=None
+)
+def refresh_guild_members(self) -> None:
+    """Refresh the local mirror of all guild members incl. roles and nicknames."""
+    _task_perform_users_action(self, method='refresh_guild_members')
+
+
 @shared_task(
     bind=True, name='discord.update_servername', base=QueueOnce, max_retries=None
 )
@@ -271,11 +415,14 @@ def update_all() -> None:
     logger.info(
         'Starting to bulk update all for %s Discord users', discord_users_qs.count()
     )
-    update_all_chain = list()
+    update_all_chain = [reconcile_all_groups.si()]
+    if DISCORD_SYNC_NAMES:
+        nickname_user_pks = _user_pks_with_outdated_nicknames(discord_users_qs)
+    else:
+        nickname_user_pks = set()
     for discord_user in discord_users_qs:
-        update_all_chain.append(update_groups.si(discord_user.user.pk))
         update_all_chain.append(update_username.si(discord_user.user.pk))
-        if DISCORD_SYNC_NAMES:
+        if discord_user.user_id in nickname_user_pks:
             update_all_chain.append(update_nickname.si(discord_user.user.pk))
 
     chain(update_all_chain).apply_async(priority=BULK_TASK_PRIORITY)
@@ -8,6 +8,7 @@ from allianceauth.tests.auth_utils import AuthUtils
 from allianceauth.utils.testing import NoSocketsTestCase
 
 from ..auth_hooks import DiscordService
+from ..core import user_formatted_nick
 from ..discord_client.tests.factories import TEST_USER_ID, TEST_USER_NAME
 from ..models import DiscordUser
 from ..utils import set_logger_to_file
@@ -80,13 +81,43 @@ class TestDiscordService(NoSocketsTestCase):
         service.validate_user(self.none_member)
         self.assertFalse(DiscordUser.objects.filter(user=self.none_member).exists())
 
+    @patch(MODULE_PATH + '.models.notify')
+    @patch(MODULE_PATH + '.tasks.DiscordUser')
+    @patch(MODULE_PATH + '.models.create_bot_client')
+    def test_validate_users_bulk(
+        self, mock_create_bot_client, mock_DiscordUser, mock_notify
+    ):
+        mock_create_bot_client.return_value.remove_guild_member.return_value = True
+        DiscordUser.objects.create(user=self.none_member, uid=TEST_USER_ID + 1)
+
+        service = self.service()
+        service.validate_users_bulk([self.member, self.none_member])
+
+        self.assertTrue(DiscordUser.objects.filter(user=self.member).exists())
+        self.assertFalse(DiscordUser.objects.filter(user=self.none_member).exists())
+
     @patch(MODULE_PATH + '.tasks.update_nickname')
     @patch(MODULE_PATH + '.auth_hooks.DISCORD_SYNC_NAMES', True)
     def test_sync_nickname(self, mock_update_nickname):
+        AuthUtils.add_main_character_2(
+            self.member, 'Bruce Wayne', 1001, disconnect_signals=True
+        )
         service = self.service()
         service.sync_nickname(self.member)
         self.assertTrue(mock_update_nickname.apply_async.called)
 
+    @patch(MODULE_PATH + '.auth_hooks.DISCORD_SYNC_NAMES', True)
+    @patch(MODULE_PATH + '.tasks.update_nickname')
+    def test_sync_nickname_unchanged(self, mock_update_nickname):
+        AuthUtils.add_main_character_2(
+            self.member, 'Bruce Wayne', 1001, disconnect_signals=True
+        )
+        self.member.discord.nickname = user_formatted_nick(self.member)
+        self.member.discord.save()
+        service = self.service()
+        service.sync_nickname(self.member)
+        self.assertFalse(mock_update_nickname.apply_async.called)
+
     @patch(MODULE_PATH + '.tasks.update_nickname')
     def test_sync_nickname_no_setting(self, mock_update_nickname):
         service = self.service()
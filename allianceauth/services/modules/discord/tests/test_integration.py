@@ -117,6 +117,7 @@ def reset_testdata():
 
 
 @patch(MODULE_PATH + '.core.DISCORD_GUILD_ID', TEST_GUILD_ID)
+@patch(MODULE_PATH + '.managers.DISCORD_GUILD_ID', TEST_GUILD_ID)
 @patch(MODULE_PATH + '.models.DISCORD_GUILD_ID', TEST_GUILD_ID)
 @override_settings(CELERY_ALWAYS_EAGER=True, CELERY_EAGER_PROPAGATES_EXCEPTIONS=False)
 @requests_mock.Mocker()
@@ -424,12 +425,14 @@ class StateTestCase(NoSocketsTestCase):
             priority=200,
         )
         self.assertIsNotNone(self.user.discord)
-        higher_state.member_characters.add(self.test_character)
+        with self.captureOnCommitCallbacks(execute=True):
+            higher_state.member_characters.add(self.test_character)
         self._refresh_user()
         self.assertEqual(higher_state, self.user.profile.state)
         with self.assertRaises(DiscordUser.DoesNotExist):
             self.user.discord
-        higher_state.member_characters.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            higher_state.member_characters.clear()
         self._refresh_user()
         self.assertEqual(self.member_state, self.user.profile.state)
         with self.assertRaises(DiscordUser.DoesNotExist):
@@ -448,15 +451,18 @@ class StateTestCase(NoSocketsTestCase):
             priority=125,
         )
         self.assertIsNotNone(self.user.discord)
-        lower_state.member_characters.add(self.test_character)
+        with self.captureOnCommitCallbacks(execute=True):
+            lower_state.member_characters.add(self.test_character)
         self._refresh_user()
         self.assertEqual(self.member_state, self.user.profile.state)
-        self.member_state.member_characters.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member_state.member_characters.clear()
         self._refresh_user()
         self.assertEqual(lower_state, self.user.profile.state)
         with self.assertRaises(DiscordUser.DoesNotExist):
             self.user.discord
-        self.member_state.member_characters.add(self.test_character)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.member_state.member_characters.add(self.test_character)
         self._refresh_user()
         self.assertEqual(self.member_state, self.user.profile.state)
         with self.assertRaises(DiscordUser.DoesNotExist):
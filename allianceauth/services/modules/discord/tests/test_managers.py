@@ -20,6 +20,7 @@ from ..discord_client.tests.factories import (
     TEST_GUILD_ID,
     TEST_USER_ID,
     TEST_USER_NAME,
+    create_guild_member,
     create_role,
     create_user,
 )
@@ -445,6 +446,179 @@ class TestUserHasAccount(NoSocketsTestCase):
         self.assertFalse(DiscordUser.objects.user_has_account('abc'))
 
 
+@patch(MODULE_PATH + '.managers.DISCORD_GUILD_ID', TEST_GUILD_ID)
+@patch(MODULE_PATH + '.managers.create_bot_client', spec=True)
+@patch(MODULE_PATH + '.managers.calculate_roles_for_user', spec=True)
+class TestReconcileRoles(NoSocketsTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_1 = AuthUtils.create_user('Peter Parker')
+        cls.user_2 = AuthUtils.create_user('Kara Danvers')
+        cls.user_3 = AuthUtils.create_user('Clark Kent')
+
+    def setUp(self):
+        DiscordUser.objects.create(user=self.user_1, uid=1001)
+        DiscordUser.objects.create(user=self.user_2, uid=1002)
+        DiscordUser.objects.create(user=self.user_3, uid=1003)
+
+    def test_should_only_update_members_with_changed_roles(
+        self, mock_calculate_roles_for_user, mock_create_bot_client
+    ):
+        # given
+        roles = RolesSet([create_role(id=1)])
+        client = mock_create_bot_client.return_value
+        client.guild_members.return_value = [
+            create_guild_member(user=create_user(id=1001)),
+            create_guild_member(user=create_user(id=1002)),
+            create_guild_member(user=create_user(id=9999)),
+        ]
+        client.modify_guild_member.return_value = True
+
+        def my_calculate_roles_for_user(user, client, discord_uid, **kwargs):
+            return roles, discord_uid == 1002
+
+        mock_calculate_roles_for_user.side_effect = my_calculate_roles_for_user
+        # when
+        updated_count, missing_user_pks = DiscordUser.objects.reconcile_roles()
+        # then
+        self.assertEqual(updated_count, 1)
+        self.assertListEqual(missing_user_pks, [self.user_3.pk])
+        self.assertEqual(mock_calculate_roles_for_user.call_count, 2)
+        client.modify_guild_member.assert_called_once_with(
+            guild_id=TEST_GUILD_ID, user_id=1002, role_ids=[1]
+        )
+        _, kwargs = mock_calculate_roles_for_user.call_args
+        self.assertEqual(kwargs['member'].user.id, 1002)
+
+    def test_should_not_count_failed_updates(
+        self, mock_calculate_roles_for_user, mock_create_bot_client
+    ):
+        # given
+        client = mock_create_bot_client.return_value
+        client.guild_members.return_value = [
+            create_guild_member(user=create_user(id=1001)),
+        ]
+        client.modify_guild_member.return_value = False
+        mock_calculate_roles_for_user.return_value = RolesSet([create_role(id=1)]), True
+        # when
+        updated_count, missing_user_pks = DiscordUser.objects.reconcile_roles()
+        # then
+        self.assertEqual(updated_count, 0)
+        self.assertSetEqual(set(missing_user_pks), {self.user_2.pk, self.user_3.pk})
+
+    def test_should_reconcile_given_users_from_mirror(
+        self, mock_calculate_roles_for_user, mock_create_bot_client
+    ):
+        # given
+        client = mock_create_bot_client.return_value
+        members = {1001: create_guild_member(user=create_user(id=1001))}
+        client.guild_member.side_effect = \
+            lambda guild_id, user_id, use_cache: members.get(user_id)
+        client.modify_guild_member.return_value = True
+        mock_calculate_roles_for_user.return_value = RolesSet([create_role(id=1)]), True
+        # when
+        updated_count, missing_user_pks = DiscordUser.objects.reconcile_roles(
+            user_pks=[self.user_1.pk, self.user_2.pk]
+        )
+        # then
+        self.assertEqual(updated_count, 1)
+        self.assertListEqual(missing_user_pks, [self.user_2.pk])
+        self.assertFalse(client.guild_members.called)
+        for _, kwargs in client.guild_member.call_args_list:
+            self.assertTrue(kwargs['use_cache'])
+        client.modify_guild_member.assert_called_once_with(
+            guild_id=TEST_GUILD_ID, user_id=1001, role_ids=[1]
+        )
+
+    def test_should_continue_after_invalid_roles(
+        self, mock_calculate_roles_for_user, mock_create_bot_client
+    ):
+        # given
+        client = mock_create_bot_client.return_value
+        client.guild_members.return_value = [
+            create_guild_member(user=create_user(id=1001)),
+            create_guild_member(user=create_user(id=1002)),
+        ]
+
+        def my_modify_guild_member(guild_id, user_id, role_ids):
+            if user_id == 1001:
+                raise ValueError('Must specify role_ids or nick')
+            return True
+
+        client.modify_guild_member.side_effect = my_modify_guild_member
+        mock_calculate_roles_for_user.return_value = RolesSet([create_role(id=1)]), True
+        # when
+        updated_count, missing_user_pks = DiscordUser.objects.reconcile_roles()
+        # then
+        self.assertEqual(updated_count, 1)
+        self.assertEqual(client.modify_guild_member.call_count, 2)
+
+    def test_should_record_progress_when_interrupted(
+        self, mock_calculate_roles_for_user, mock_create_bot_client
+    ):
+        # given
+        client = mock_create_bot_client.return_value
+        client.guild_members.return_value = [
+            create_guild_member(user=create_user(id=1001)),
+            create_guild_member(user=create_user(id=1002)),
+        ]
+
+        def my_modify_guild_member(guild_id, user_id, role_ids):
+            if user_id == 1002:
+                raise DiscordApiBackoff(999)
+            return True
+
+        client.modify_guild_member.side_effect = my_modify_guild_member
+        mock_calculate_roles_for_user.return_value = RolesSet([create_role(id=1)]), True
+        progress = {}
+        # when
+        with self.assertRaises(DiscordApiBackoff):
+            DiscordUser.objects.reconcile_roles(progress=progress)
+        # then
+        self.assertDictEqual(progress, {'after': 1001})
+
+    def test_should_resume_after_reconciled_members(
+        self, mock_calculate_roles_for_user, mock_create_bot_client
+    ):
+        # given
+        client = mock_create_bot_client.return_value
+        client.guild_members.return_value = [
+            create_guild_member(user=create_user(id=1002)),
+        ]
+        client.modify_guild_member.return_value = True
+        mock_calculate_roles_for_user.return_value = RolesSet([create_role(id=1)]), True
+        progress = {'after': 1001}
+        # when
+        updated_count, missing_user_pks = DiscordUser.objects.reconcile_roles(
+            progress=progress
+        )
+        # then
+        client.guild_members.assert_called_once_with(guild_id=TEST_GUILD_ID, after=1001)
+        self.assertEqual(updated_count, 1)
+        self.assertListEqual(missing_user_pks, [self.user_3.pk])
+        self.assertDictEqual(progress, {'after': 1002})
+
+
+@patch(MODULE_PATH + '.managers.DISCORD_GUILD_ID', TEST_GUILD_ID)
+@patch(MODULE_PATH + '.managers.create_bot_client', spec=True)
+class TestRefreshGuildMembers(NoSocketsTestCase):
+
+    def test_should_page_through_all_members(self, mock_create_bot_client):
+        # given
+        client = mock_create_bot_client.return_value
+        client.guild_members.return_value = iter([
+            create_guild_member(user=create_user(id=1001)),
+            create_guild_member(user=create_user(id=1002)),
+        ])
+        # when
+        result = DiscordUser.objects.refresh_guild_members()
+        # then
+        self.assertEqual(result, 2)
+        client.guild_members.assert_called_once_with(guild_id=TEST_GUILD_ID)
+
+
 class TestOtherMethods(NoSocketsTestCase):
     @patch(MODULE_PATH + '.managers.core_group_to_role', spec=True)
     def test_should_call_group_to_role(self, mock_core_group_to_role):
@@ -50,12 +50,42 @@ class TestUpdateNick(NoSocketsTestCase):
         AuthUtils.add_main_character_2(
             self.user, TEST_MAIN_NAME, TEST_MAIN_ID, disconnect_signals=True
         )
+        mock_default_bot_client.guild_member_from_cache.return_value = None
         mock_default_bot_client.modify_guild_member.return_value = True
         # when
         result = self.discord_user.update_nickname()
         # then
         self.assertTrue(result)
         self.assertTrue(mock_default_bot_client.modify_guild_member.called)
+        self.discord_user.refresh_from_db()
+        self.assertEqual(self.discord_user.nickname, TEST_MAIN_NAME)
+
+    def test_dont_update_if_persisted_nick_is_unchanged(self, mock_default_bot_client):
+        # given
+        AuthUtils.add_main_character_2(
+            self.user, TEST_MAIN_NAME, TEST_MAIN_ID, disconnect_signals=True
+        )
+        self.discord_user.nickname = TEST_MAIN_NAME
+        self.discord_user.save()
+        # when
+        result = self.discord_user.update_nickname()
+        # then
+        self.assertTrue(result)
+        self.assertFalse(mock_default_bot_client.guild_member_from_cache.called)
+        self.assertFalse(mock_default_bot_client.modify_guild_member.called)
+
+    def test_dont_update_if_mirrored_nick_is_unchanged(self, mock_default_bot_client):
+        # given
+        AuthUtils.add_main_character_2(
+            self.user, TEST_MAIN_NAME, TEST_MAIN_ID, disconnect_signals=True
+        )
+        mock_default_bot_client.guild_member_from_cache.return_value = \
+            create_guild_member(nick=TEST_MAIN_NAME)
+        # when
+        result = self.discord_user.update_nickname()
+        # then
+        self.assertTrue(result)
+        self.assertFalse(mock_default_bot_client.modify_guild_member.called)
 
     def test_dont_update_if_user_has_no_main(self, mock_default_bot_client):
         # given
@@ -71,6 +101,7 @@ class TestUpdateNick(NoSocketsTestCase):
         AuthUtils.add_main_character_2(
             self.user, TEST_MAIN_NAME, TEST_MAIN_ID, disconnect_signals=True
         )
+        mock_default_bot_client.guild_member_from_cache.return_value = None
         mock_default_bot_client.modify_guild_member.return_value = None
         # when
         result = self.discord_user.update_nickname()
@@ -83,6 +114,7 @@ class TestUpdateNick(NoSocketsTestCase):
         AuthUtils.add_main_character_2(
             self.user, TEST_MAIN_NAME, TEST_MAIN_ID, disconnect_signals=True
         )
+        mock_default_bot_client.guild_member_from_cache.return_value = None
         mock_default_bot_client.modify_guild_member.return_value = False
         # when
         result = self.discord_user.update_nickname()
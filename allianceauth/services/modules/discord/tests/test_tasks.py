@@ -10,7 +10,8 @@ from allianceauth.tests.auth_utils import AuthUtils
 from allianceauth.utils.testing import NoSocketsTestCase
 
 from .. import tasks
-from ..discord_client import DiscordApiBackoff
+from ..app_settings import DISCORD_TASKS_MAX_RETRIES
+from ..discord_client import DiscordApiBackoff, DiscordRetryAt
 from ..discord_client.tests.factories import TEST_USER_ID, TEST_USER_NAME
 from ..models import DiscordUser
 from ..utils import set_logger_to_file
@@ -52,6 +53,19 @@ class TestUpdateGroups(NoSocketsTestCase):
         with self.assertRaises(Retry):
             tasks.update_groups(self.user.pk)
 
+    @patch(MODULE_PATH + '.update_groups.retry')
+    def test_retries_at_reset_time_when_non_blocking(
+        self, mock_retry, mock_logger, mock_update_groups
+    ):
+        DiscordUser.objects.create(user=self.user, uid=TEST_USER_ID)
+        mock_exception = DiscordRetryAt(999)
+        mock_update_groups.side_effect = mock_exception
+        mock_retry.side_effect = Retry
+
+        with self.assertRaises(Retry):
+            tasks.update_groups(self.user.pk)
+        mock_retry.assert_called_once_with(eta=mock_exception.retry_at)
+
     def test_retry_on_http_error_except_404(self, mock_logger, mock_update_groups):
         DiscordUser.objects.create(user=self.user, uid=TEST_USER_ID)
         mock_exception = HTTPError('error')
@@ -309,32 +323,128 @@ class TestBulkTasks(NoSocketsTestCase):
         cls.user_1 = AuthUtils.create_user('Peter Parker')
         cls.user_2 = AuthUtils.create_user('Kara Danvers')
         cls.user_3 = AuthUtils.create_user('Clark Kent')
+        AuthUtils.add_main_character_2(cls.user_1, 'Peter Parker', 1001)
+        AuthUtils.add_main_character_2(cls.user_2, 'Kara Danvers', 1002)
+        AuthUtils.add_main_character_2(cls.user_3, 'Clark Kent', 1003)
         DiscordUser.objects.all().delete()
 
+    @patch(MODULE_PATH + '.delete_user')
     @patch(MODULE_PATH + '.update_groups.si')
-    def test_can_update_groups_for_multiple_users(self, mock_update_groups):
-        du_1 = DiscordUser.objects.create(user=self.user_1, uid=123)
-        du_2 = DiscordUser.objects.create(user=self.user_2, uid=456)
-        DiscordUser.objects.create(user=self.user_3, uid=789)
-        expected_pks = [du_1.pk, du_2.pk]
+    @patch(MODULE_PATH + '.DiscordUser.objects.reconcile_roles')
+    def test_can_update_groups_for_multiple_users(
+        self, mock_reconcile_roles, mock_update_groups, mock_delete_user
+    ):
+        mock_reconcile_roles.return_value = (1, [self.user_2.pk])
+        expected_pks = [self.user_1.pk, self.user_2.pk]
 
         tasks.update_groups_bulk(expected_pks)
-        self.assertEqual(mock_update_groups.call_count, 2)
-        current_pks = [args[0][0] for args in mock_update_groups.call_args_list]
 
-        self.assertSetEqual(set(current_pks), set(expected_pks))
+        mock_reconcile_roles.assert_called_once_with(
+            user_pks=expected_pks,
+            progress={'user_pks': expected_pks, 'after': 0, 'error_retries': 0}
+        )
+        self.assertFalse(mock_update_groups.called)
+        mock_delete_user.delay.assert_called_once_with(
+            self.user_2.pk, notify_user=True
+        )
+
+    @patch(MODULE_PATH + '.reconcile_all_groups')
+    def test_can_update_all_groups(self, mock_reconcile_all_groups):
+        tasks.update_all_groups()
+        self.assertTrue(mock_reconcile_all_groups.apply_async.called)
+
+    @patch(MODULE_PATH + '.delete_user')
+    @patch(MODULE_PATH + '.DiscordUser.objects.reconcile_roles')
+    def test_can_reconcile_all_groups(self, mock_reconcile_roles, mock_delete_user):
+        mock_reconcile_roles.return_value = (2, [self.user_2.pk])
+
+        tasks.reconcile_all_groups()
+        self.assertTrue(mock_reconcile_roles.called)
+        mock_delete_user.delay.assert_called_once_with(
+            self.user_2.pk, notify_user=True
+        )
+
+    @patch(MODULE_PATH + '.delete_user')
+    @patch(MODULE_PATH + '.DiscordUser.objects.reconcile_roles')
+    def test_reconcile_all_groups_retries_on_api_backoff(
+        self, mock_reconcile_roles, mock_delete_user
+    ):
+        mock_reconcile_roles.side_effect = DiscordApiBackoff(999)
+
+        with self.assertRaises(Retry):
+            tasks.reconcile_all_groups()
+        self.assertFalse(mock_delete_user.delay.called)
+
+    @patch(MODULE_PATH + '.DiscordUser.objects.reconcile_roles')
+    def test_reconcile_all_groups_resumes_after_reconciled_members_on_retry(
+        self, mock_reconcile_roles
+    ):
+        def reconcile_roles(progress, **kwargs):
+            progress['after'] = 123
+            raise DiscordRetryAt(999)
+
+        mock_reconcile_roles.side_effect = reconcile_roles
+        mock_task = MagicMock(**{'request.retries': 0, 'retry.return_value': Retry()})
+
+        with self.assertRaises(Retry):
+            tasks.reconcile_all_groups.__wrapped__.__func__(mock_task)
+
+        _, kwargs = mock_task.retry.call_args
+        self.assertDictEqual(kwargs['kwargs'], {'after': 123, 'error_retries': 0})
+
+    @patch(MODULE_PATH + '.DiscordUser.objects.reconcile_roles')
+    def test_reconcile_all_groups_does_not_count_back_offs_as_error_retries(
+        self, mock_reconcile_roles
+    ):
+        mock_exception = HTTPError('Internal Server Error')
+        mock_exception.response = MagicMock(status_code=500)
+        mock_reconcile_roles.side_effect = mock_exception
+        mock_task = MagicMock(**{'request.retries': 10, 'retry.return_value': Retry()})
+
+        with self.assertRaises(Retry):
+            tasks.reconcile_all_groups.__wrapped__.__func__(
+                mock_task, after=123, error_retries=1
+            )
+
+        _, kwargs = mock_task.retry.call_args
+        self.assertDictEqual(kwargs['kwargs'], {'after': 123, 'error_retries': 2})
+
+    @patch(MODULE_PATH + '.DiscordUser.objects.reconcile_roles')
+    def test_reconcile_all_groups_gives_up_after_max_error_retries(
+        self, mock_reconcile_roles
+    ):
+        mock_exception = HTTPError('Internal Server Error')
+        mock_exception.response = MagicMock(status_code=500)
+        mock_reconcile_roles.side_effect = mock_exception
+        mock_task = MagicMock(**{'request.retries': 0})
+
+        tasks.reconcile_all_groups.__wrapped__.__func__(
+            mock_task, error_retries=DISCORD_TASKS_MAX_RETRIES
+        )
+
+        self.assertFalse(mock_task.retry.called)
 
     @patch(MODULE_PATH + '.update_groups.si')
-    def test_can_update_all_groups(self, mock_update_groups):
-        du_1 = DiscordUser.objects.create(user=self.user_1, uid=123)
-        du_2 = DiscordUser.objects.create(user=self.user_2, uid=456)
-        du_3 = DiscordUser.objects.create(user=self.user_3, uid=789)
+    @patch(MODULE_PATH + '.DiscordUser.objects.reconcile_roles')
+    def test_reconcile_all_groups_falls_back_when_forbidden(
+        self, mock_reconcile_roles, mock_update_groups
+    ):
+        DiscordUser.objects.create(user=self.user_1, uid=123)
+        DiscordUser.objects.create(user=self.user_2, uid=456)
+        mock_exception = HTTPError('Missing Access')
+        mock_exception.response = MagicMock(status_code=403)
+        mock_reconcile_roles.side_effect = mock_exception
 
-        tasks.update_all_groups()
-        self.assertEqual(mock_update_groups.call_count, 3)
-        current_pks = [args[0][0] for args in mock_update_groups.call_args_list]
-        expected_pks = [du_1.pk, du_2.pk, du_3.pk]
-        self.assertSetEqual(set(current_pks), set(expected_pks))
+        tasks.reconcile_all_groups()
+
+        self.assertEqual(mock_reconcile_roles.call_count, 1)
+        current_pks = {args[0][0] for args in mock_update_groups.call_args_list}
+        self.assertSetEqual(current_pks, {self.user_1.pk, self.user_2.pk})
+
+    @patch(MODULE_PATH + '.DiscordUser.objects.refresh_guild_members')
+    def test_can_refresh_guild_members(self, mock_refresh_guild_members):
+        tasks.refresh_guild_members()
+        self.assertTrue(mock_refresh_guild_members.called)
 
     @patch(MODULE_PATH + '.update_nickname.si')
     def test_can_update_nicknames_for_multiple_users(self, mock_update_nickname):
@@ -364,6 +474,20 @@ class TestBulkTasks(NoSocketsTestCase):
         expected_pks = [du_1.pk, du_2.pk, du_3.pk]
         self.assertSetEqual(set(current_pks), set(expected_pks))
 
+    @patch(MODULE_PATH + '.update_nickname.si')
+    def test_update_nicknames_only_for_users_with_changed_names(
+        self, mock_update_nickname
+    ):
+        du_1 = DiscordUser.objects.create(user=self.user_1, uid='123')
+        DiscordUser.objects.create(user=self.user_2, uid='456', nickname='Kara Danvers')
+        du_3 = DiscordUser.objects.create(user=self.user_3, uid='789', nickname='Clark')
+
+        tasks.update_all_nicknames()
+        current_pks = [
+            args[0][0] for args in mock_update_nickname.call_args_list
+        ]
+        self.assertSetEqual(set(current_pks), {du_1.pk, du_3.pk})
+
     @patch(MODULE_PATH + '.update_username.si')
     def test_can_update_username_for_multiple_users(self, mock_update_username):
         du_1 = DiscordUser.objects.create(user=self.user_1, uid=123)
@@ -395,20 +519,17 @@ class TestBulkTasks(NoSocketsTestCase):
 
     @patch(MODULE_PATH + '.DISCORD_SYNC_NAMES', True)
     @patch(MODULE_PATH + '.update_nickname')
-    @patch(MODULE_PATH + '.update_groups')
+    @patch(MODULE_PATH + '.reconcile_all_groups')
     @patch(MODULE_PATH + '.update_username')
     def test_can_update_all_incl_nicknames(
-        self, mock_update_usernames, mock_update_groups, mock_update_nickname
+        self, mock_update_usernames, mock_reconcile_all_groups, mock_update_nickname
     ):
         du_1 = DiscordUser.objects.create(user=self.user_1, uid=123)
         du_2 = DiscordUser.objects.create(user=self.user_2, uid=456)
         du_3 = DiscordUser.objects.create(user=self.user_3, uid=789)
 
         tasks.update_all()
-        self.assertEqual(mock_update_groups.si.call_count, 3)
-        current_pks = [args[0][0] for args in mock_update_groups.si.call_args_list]
-        expected_pks = [du_1.pk, du_2.pk, du_3.pk]
-        self.assertSetEqual(set(current_pks), set(expected_pks))
+        self.assertEqual(mock_reconcile_all_groups.si.call_count, 1)
 
         self.assertEqual(mock_update_nickname.si.call_count, 3)
         current_pks = [args[0][0] for args in mock_update_nickname.si.call_args_list]
@@ -422,20 +543,17 @@ class TestBulkTasks(NoSocketsTestCase):
 
     @patch(MODULE_PATH + '.DISCORD_SYNC_NAMES', False)
     @patch(MODULE_PATH + '.update_nickname')
-    @patch(MODULE_PATH + '.update_groups')
+    @patch(MODULE_PATH + '.reconcile_all_groups')
     @patch(MODULE_PATH + '.update_username')
     def test_can_update_all_excl_nicknames(
-        self, mock_update_usernames, mock_update_groups, mock_update_nickname
+        self, mock_update_usernames, mock_reconcile_all_groups, mock_update_nickname
     ):
         du_1 = DiscordUser.objects.create(user=self.user_1, uid=123)
         du_2 = DiscordUser.objects.create(user=self.user_2, uid=456)
         du_3 = DiscordUser.objects.create(user=self.user_3, uid=789)
 
         tasks.update_all()
-        self.assertEqual(mock_update_groups.si.call_count, 3)
-        current_pks = [args[0][0] for args in mock_update_groups.si.call_args_list]
-        expected_pks = [du_1.pk, du_2.pk, du_3.pk]
-        self.assertSetEqual(set(current_pks), set(expected_pks))
+        self.assertEqual(mock_reconcile_all_groups.si.call_count, 1)
 
         self.assertEqual(mock_update_nickname.si.call_count, 0)
 
@@ -29,11 +29,23 @@ class DiscourseService(ServicesHook):
         if DiscourseTasks.has_account(user):
             DiscourseTasks.update_groups.delay(user.pk)
 
+    def update_groups_bulk(self, users):
+        logger.debug(f'Processing {self.name} groups for {len(users)} users')
+        user_pks = list(DiscourseTasks.users_with_account([user.pk for user in users]).values_list('pk', flat=True))
+        if user_pks:
+            DiscourseTasks.update_groups_bulk.delay(user_pks)
+
     def validate_user(self, user):
         logger.debug(f'Validating user {user} {self.name} account')
         if DiscourseTasks.has_account(user) and not self.service_active_for_user(user):
             self.delete_user(user, notify_user=True)
 
+    def validate_users_bulk(self, users):
+        logger.debug(f'Validating {len(users)} users {self.name} accounts')
+        users_with_account = DiscourseTasks.users_with_account([user.pk for user in users])
+        for user in self.users_without_access(users_with_account):
+            self.delete_user(user, notify_user=True)
+
     def update_all_groups(self):
         logger.debug('Update all %s groups called' % self.name)
         DiscourseTasks.update_all_groups.delay()
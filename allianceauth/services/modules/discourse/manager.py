@@ -1,14 +1,20 @@
 import logging
 import requests
 import re
+from collections import defaultdict
 from django.conf import settings
 from django.core.cache import cache
-from hashlib import md5
+from pydiscourse.exceptions import DiscourseClientError
 from . import providers
 logger = logging.getLogger(__name__)
 
 GROUP_CACHE_MAX_AGE = getattr(settings, 'DISCOURSE_GROUP_CACHE_MAX_AGE', 2 * 60 * 60)  # default 2 hours
 
+GROUP_DIRECTORY_CACHE_KEY = 'DISCOURSE_GROUP_DIRECTORY'
+
+# max usernames Discourse accepts per call to change group members
+GROUP_MEMBERS_BATCH_SIZE = 1000
+
 
 class DiscourseError(Exception):
     def __init__(self, endpoint, errors):
@@ -38,53 +44,66 @@ class DiscourseManager:
         return providers.discourse.client.create_group(name=name[:20], visible=True)['basic_group']
 
     @staticmethod
-    def _generate_cache_group_name_key(name):
-        return 'DISCOURSE_GROUP_NAME__%s' % md5(name.encode('utf-8')).hexdigest()
+    def _get_group_directory(refresh=False):
+        """
+        Get the ids of all Discourse groups by lower case group name.
+        The directory is cached as a single entry, so it is always replaced as a whole.
+        :param refresh: fetch the groups from Discourse even if the directory is cached
+        :return: dict
+        """
+        directory = None if refresh else cache.get(GROUP_DIRECTORY_CACHE_KEY)
+        if directory is None:
+            directory = {g['name'].lower(): g['id'] for g in DiscourseManager._get_groups()}
+            cache.set(GROUP_DIRECTORY_CACHE_KEY, directory, GROUP_CACHE_MAX_AGE)
+        return directory
 
     @staticmethod
-    def _generate_cache_group_id_key(g_id):
-        return 'DISCOURSE_GROUP_ID__%s' % g_id
-
-    @staticmethod
-    def __group_name_to_id(name):
-        name = DiscourseManager._sanitize_groupname(name)
-
-        def get_or_create_group():
-            groups = DiscourseManager._get_groups()
-            for g in groups:
-                if g['name'].lower() == name.lower():
-                    return g['id']
-            return DiscourseManager._create_group(name)['id']
-
-        return cache.get_or_set(DiscourseManager._generate_cache_group_name_key(name), get_or_create_group,
-                                GROUP_CACHE_MAX_AGE)
-
-    @staticmethod
-    def __group_id_to_name(g_id):
-        def get_group_name():
-            groups = DiscourseManager._get_groups()
-            for g in groups:
-                if g['id'] == g_id:
-                    return g['name']
-            raise KeyError("Group ID %s not found on Discourse" % g_id)
-
-        return cache.get_or_set(DiscourseManager._generate_cache_group_id_key(g_id), get_group_name,
-                                GROUP_CACHE_MAX_AGE)
+    def _group_names_to_ids(names):
+        """
+        Resolve group names to Discourse group ids, creating missing groups.
+        The group list is only fetched from Discourse when a name is not in the cached directory.
+        :param names: sanitized group names
+        :return: dict of group ids by name
+        """
+        directory = DiscourseManager._get_group_directory()
+        if any(name.lower() not in directory for name in names):
+            directory = DiscourseManager._get_group_directory(refresh=True)
+            missing = {name for name in names if name.lower() not in directory}
+            if missing:
+                directory = dict(directory)
+                for name in sorted(missing):
+                    logger.info(f"Creating discourse group {name}")
+                    directory[name.lower()] = DiscourseManager._create_group(name)['id']
+                cache.set(GROUP_DIRECTORY_CACHE_KEY, directory, GROUP_CACHE_MAX_AGE)
+        return {name: directory[name.lower()] for name in names}
 
     @staticmethod
-    def __add_user_to_group(g_id, username):
-        providers.discourse.client.add_group_member(g_id, username)
+    def __add_users_to_group(g_id, usernames):
+        """
+        Add users to a group and return the exceptions by username of those which could not be added
+        """
+        failed = {}
+        for i in range(0, len(usernames), GROUP_MEMBERS_BATCH_SIZE):
+            chunk = usernames[i:i + GROUP_MEMBERS_BATCH_SIZE]
+            try:
+                providers.discourse.client.add_group_members(g_id, chunk)
+            except DiscourseClientError:
+                # the whole call fails if any of the users already is a member, so retry them one by one
+                logger.warning(f"Failed to add users to discourse group {g_id} in bulk, adding them one by one")
+                for username in chunk:
+                    try:
+                        providers.discourse.client.add_group_member(g_id, username)
+                    except DiscourseClientError as e:
+                        failed[username] = e
+        return failed
 
     @staticmethod
-    def __remove_user_from_group(g_id, uid):
-        providers.discourse.client.delete_group_member(g_id, uid)
-
-    @staticmethod
-    def __generate_group_dict(names):
-        group_dict = {}
-        for name in names:
-            group_dict[name] = DiscourseManager.__group_name_to_id(name)
-        return group_dict
+    def __remove_users_from_group(g_id, usernames):
+        for i in range(0, len(usernames), GROUP_MEMBERS_BATCH_SIZE):
+            # the endpoint takes a comma separated list of usernames
+            providers.discourse.client.delete_group_member(
+                g_id, ','.join(usernames[i:i + GROUP_MEMBERS_BATCH_SIZE])
+            )
 
     @staticmethod
     def __get_user_groups(username):
@@ -172,29 +191,65 @@ class DiscourseManager:
         return name
 
     @staticmethod
-    def update_groups(user):
+    def _get_group_names(user):
         groups = [DiscourseManager._sanitize_groupname(user.profile.state.name)]
         for g in user.groups.all():
             groups.append(DiscourseManager._sanitize_groupname(str(g)))
-        logger.debug(f"Updating discourse user {user} groups to {groups}")
-        group_dict = DiscourseManager.__generate_group_dict(groups)
-        inv_group_dict = {v: k for k, v in group_dict.items()}
-        discord_user = DiscourseManager.__get_user_by_external(user.pk)
-        username = discord_user['username']
-        uid = discord_user['id']
-        user_groups = DiscourseManager.__get_user_groups(username)
-        add_groups = [group_dict[x] for x in group_dict if not group_dict[x] in user_groups]
-        rem_groups = [x for x in user_groups if x not in inv_group_dict]
-        if add_groups:
-            logger.info(
-                f"Updating discourse user {username} groups: adding {add_groups}")
+        return groups
+
+    @staticmethod
+    def update_groups(user):
+        failed = DiscourseManager.update_groups_bulk([user])
+        if failed:
+            raise failed[user]
+
+    @staticmethod
+    def update_groups_bulk(users):
+        """
+        Update the Discourse groups of many users.
+        Group memberships are changed with one call per group for all users at once.
+        :param users: django.contrib.auth.models.User with discourse accounts
+        :return: dict of the exceptions by user for users whose groups could not be fetched or added
+        """
+        groups_by_user = {user: DiscourseManager._get_group_names(user) for user in users}
+        group_dict = DiscourseManager._group_names_to_ids(
+            {name for groups in groups_by_user.values() for name in groups}
+        )
+        add_usernames = defaultdict(list)
+        rem_usernames = defaultdict(list)
+        users_by_username = {}
+        failed = {}
+        for user, groups in groups_by_user.items():
+            logger.debug(f"Updating discourse user {user} groups to {groups}")
+            try:
+                discourse_user = DiscourseManager.__get_user_by_external(user.pk)
+                username = discourse_user['username']
+                if 'groups' in discourse_user:
+                    user_groups = [g['id'] for g in discourse_user['groups'] if not g['automatic']]
+                else:
+                    user_groups = DiscourseManager.__get_user_groups(username)
+            except Exception as e:
+                failed[user] = e
+                continue
+            users_by_username[username] = user
+            act_groups = {group_dict[name] for name in groups}
+            add_groups = act_groups - set(user_groups)
+            rem_groups = set(user_groups) - act_groups
+            if add_groups:
+                logger.info(f"Updating discourse user {username} groups: adding {add_groups}")
+            if rem_groups:
+                logger.info(f"Updating discourse user {username} groups: removing {rem_groups}")
             for g in add_groups:
-                DiscourseManager.__add_user_to_group(g, username)
-        if rem_groups:
-            logger.info(
-                f"Updating discourse user {username} groups: removing {rem_groups}")
+                add_usernames[g].append(username)
             for g in rem_groups:
-                DiscourseManager.__remove_user_from_group(g, uid)
+                rem_usernames[g].append(username)
+
+        for g, usernames in add_usernames.items():
+            for username, e in DiscourseManager.__add_users_to_group(g, usernames).items():
+                failed[users_by_username[username]] = e
+        for g, usernames in rem_usernames.items():
+            DiscourseManager.__remove_users_from_group(g, usernames)
+        return failed
 
     @staticmethod
     def disable_user(user):
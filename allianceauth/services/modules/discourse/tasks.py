@@ -40,6 +40,15 @@ class DiscourseTasks:
         except ObjectDoesNotExist:
             return False
 
+    @staticmethod
+    def users_with_account(user_pks):
+        """
+        Return the users of the given pks who have a discourse account
+        :param user_pks: list of django.contrib.auth.models.User pks
+        :return: QuerySet of django.contrib.auth.models.User
+        """
+        return User.objects.filter(pk__in=user_pks, discourse__enabled=True)
+
     @staticmethod
     @shared_task(bind=True, name='discourse.update_groups', base=QueueOnce)
     def update_groups(self, pk):
@@ -53,6 +62,25 @@ class DiscourseTasks:
             raise self.retry(countdown=60 * 10)
         logger.debug("Updated user %s discourse groups." % user)
 
+    @staticmethod
+    @shared_task(name='discourse.update_groups_bulk')
+    def update_groups_bulk(pks):
+        logger.debug("Updating discourse groups for %d users", len(pks))
+        users = DiscourseTasks.users_with_account(pks)\
+            .select_related('profile__state', 'discourse')\
+            .prefetch_related('groups')
+        users = list(users)
+        if not users:
+            return
+        try:
+            failed = DiscourseManager.update_groups_bulk(users)
+        except Exception as e:
+            logger.exception(e)
+            failed = {user: e for user in users}
+        for user, e in failed.items():
+            logger.warning("Discourse group sync failed for %s, retrying in 10 mins: %s" % (user, e))
+            DiscourseTasks.update_groups.apply_async(args=[user.pk], countdown=60 * 10)
+
     @staticmethod
     @shared_task(name='discourse.update_all_groups')
     def update_all_groups():
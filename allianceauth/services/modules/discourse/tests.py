@@ -4,10 +4,13 @@ from django.test import TestCase, RequestFactory
 from django.contrib.auth.models import User, Group, Permission
 from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
+from django.core.cache import cache
+from pydiscourse.exceptions import DiscourseClientError
 
 from allianceauth.tests.auth_utils import AuthUtils
 
 from .auth_hooks import DiscourseService
+from .manager import GROUP_DIRECTORY_CACHE_KEY
 from .models import DiscourseUser
 from .tasks import DiscourseTasks
 
@@ -71,6 +74,28 @@ class DiscourseHooksTestCase(TestCase):
             service.update_groups(none_user)
             self.assertFalse(manager.update_groups.called)
 
+    @mock.patch(MODULE_PATH + '.tasks.DiscourseManager')
+    def test_update_groups_bulk(self, manager):
+        manager.update_groups_bulk.return_value = {}
+        service = self.service()
+        member = User.objects.get(username=self.member)
+        none_user = User.objects.get(username=self.none_user)
+
+        service.update_groups_bulk([member, none_user])
+
+        manager.update_groups_bulk.assert_called_once_with([member])
+        self.assertFalse(manager.update_groups.called)
+
+    @mock.patch(MODULE_PATH + '.tasks.DiscourseTasks.update_groups')
+    @mock.patch(MODULE_PATH + '.tasks.DiscourseManager')
+    def test_update_groups_bulk_retries_failed_users(self, manager, update_groups):
+        member = User.objects.get(username=self.member)
+        manager.update_groups_bulk.return_value = {member: Exception('not found')}
+
+        self.service().update_groups_bulk([member])
+
+        update_groups.apply_async.assert_called_once_with(args=[member.pk], countdown=600)
+
     @mock.patch(MODULE_PATH + '.tasks.DiscourseManager')
     def test_validate_user(self, manager):
         service = self.service()
@@ -124,3 +149,90 @@ class DiscourseViewsTestCase(TestCase):
         response = self.client.get('/discourse/sso', data=data, follow=False)
         self.assertEqual(response.status_code, 302)
         self.assertEqual(response.url[:37], 'https://example.com/session/sso_login')
+
+
+@mock.patch(MODULE_PATH + '.manager.providers')
+class DiscourseManagerTestCase(TestCase):
+    def setUp(self):
+        from .manager import DiscourseManager
+        self.manager = DiscourseManager
+        cache.delete(GROUP_DIRECTORY_CACHE_KEY)
+        self.member = AuthUtils.create_member('member_user')
+        self.member_2 = AuthUtils.create_member('member_user_2')
+
+    @staticmethod
+    def _raise(error):
+        raise error
+
+    @staticmethod
+    def _groups(*groups):
+        return [{'id': g_id, 'name': name, 'automatic': False} for g_id, name in groups]
+
+    def test_group_names_to_ids_uses_cached_directory(self, providers):
+        client = providers.discourse.client
+        client.groups.return_value = self._groups((1, 'Member'), (2, 'Other'))
+
+        self.manager._group_names_to_ids({'Member'})
+        result = self.manager._group_names_to_ids({'Member', 'Other'})
+
+        self.assertDictEqual(result, {'Member': 1, 'Other': 2})
+        self.assertEqual(client.groups.call_count, 1)
+
+    def test_group_names_to_ids_creates_missing_groups(self, providers):
+        client = providers.discourse.client
+        client.groups.return_value = self._groups((1, 'Member'))
+        client.create_group.return_value = {'basic_group': {'id': 3}}
+
+        result = self.manager._group_names_to_ids({'Member', 'New_Group'})
+
+        self.assertDictEqual(result, {'Member': 1, 'New_Group': 3})
+        client.create_group.assert_called_once_with(name='New_Group', visible=True)
+        self.assertEqual(self.manager._get_group_directory(), {'member': 1, 'new_group': 3})
+
+    def test_update_groups_bulk_changes_members_per_group(self, providers):
+        client = providers.discourse.client
+        client.groups.return_value = self._groups((1, 'Member'), (2, 'Old'))
+        client.user_by_external_id.side_effect = lambda pk: {
+            self.member.pk: {'username': 'member_user', 'groups': self._groups((2, 'Old'))},
+            self.member_2.pk: {'username': 'member_user_2', 'groups': self._groups((2, 'Old'))},
+        }[pk]
+
+        failed = self.manager.update_groups_bulk([self.member, self.member_2])
+
+        self.assertDictEqual(failed, {})
+        client.add_group_members.assert_called_once_with(1, ['member_user', 'member_user_2'])
+        client.delete_group_member.assert_called_once_with(2, 'member_user,member_user_2')
+
+    def test_update_groups_bulk_retries_failed_group_one_by_one(self, providers):
+        client = providers.discourse.client
+        client.groups.return_value = self._groups((1, 'Member'), (2, 'Other'))
+        client.user_by_external_id.side_effect = lambda pk: {
+            self.member.pk: {'username': 'member_user', 'groups': []},
+            self.member_2.pk: {'username': 'member_user_2', 'groups': []},
+        }[pk]
+        self.member.groups.add(Group.objects.create(name='Other'))
+        self.member_2.groups.add(Group.objects.get(name='Other'))
+        error = DiscourseClientError('member_user_2 is already a member')
+        client.add_group_members.side_effect = lambda g_id, usernames: (
+            self._raise(error) if g_id == 1 else None
+        )
+        client.add_group_member.side_effect = lambda g_id, username: (
+            self._raise(error) if username == 'member_user_2' else None
+        )
+
+        failed = self.manager.update_groups_bulk([self.member, self.member_2])
+
+        self.assertDictEqual(failed, {self.member_2: error})
+        self.assertEqual(client.add_group_members.call_count, 2)
+        client.add_group_member.assert_has_calls(
+            [mock.call(1, 'member_user'), mock.call(1, 'member_user_2')]
+        )
+
+    def test_update_groups_raises_for_failed_user(self, providers):
+        client = providers.discourse.client
+        client.groups.return_value = self._groups((1, 'Member'))
+        client.user_by_external_id.side_effect = KeyError('user')
+
+        with self.assertRaises(KeyError):
+            self.manager.update_groups(self.member)
+        self.assertFalse(client.add_group_members.called)
@@ -2,7 +2,7 @@ import logging
 import random
 import string
 import re
-from django.db import connections
+from django.db import connections, transaction
 from passlib.hash import bcrypt
 from django.conf import settings
 
@@ -28,14 +28,15 @@ class Ips4Manager:
         hash = cls._gen_pwhash(plain_password)
         salt = cls._get_salt(hash)
         group = cls.MEMBER_GROUP_ID
-        cursor = connections['ips4'].cursor()
-        cursor.execute(cls.SQL_ADD_USER, [username, email, hash, salt, group])
-        member_id = cls.get_user_id(username)
+        with transaction.atomic(using='ips4'):
+            cursor = connections['ips4'].cursor()
+            cursor.execute(cls.SQL_ADD_USER, [username, email, hash, salt, group])
+            member_id = cls.get_user_id(username, cursor)
         return username, plain_password, member_id
 
     @staticmethod
-    def get_user_id(username):
-        cursor = connections['ips4'].cursor()
+    def get_user_id(username, cursor=None):
+        cursor = cursor or connections['ips4'].cursor()
         cursor.execute(Ips4Manager.SQL_GET_ID, [username])
         row = cursor.fetchone()
         if row is not None:
@@ -74,11 +75,11 @@ class Ips4Manager:
     @classmethod
     def update_user_password(cls, username):
         logger.debug("Updating IPS4 user id %s password" % id)
-        if cls.check_user(username):
+        cursor = connections['ips4'].cursor()
+        if cls.check_user(username, cursor):
             plain_password = Ips4Manager.__generate_random_pass()
             hash = cls._gen_pwhash(plain_password)
             salt = cls._get_salt(hash)
-            cursor = connections['ips4'].cursor()
             cursor.execute(cls.SQL_UPDATE_PASSWORD, [hash, salt, username])
             return plain_password
         else:
@@ -86,9 +87,9 @@ class Ips4Manager:
             return ""
 
     @staticmethod
-    def check_user(username):
+    def check_user(username, cursor=None):
         logger.debug("Checking IPS4 username %s" % username)
-        cursor = connections['ips4'].cursor()
+        cursor = cursor or connections['ips4'].cursor()
         cursor.execute(Ips4Manager.SQL_GET_ID, [username])
         row = cursor.fetchone()
         if row:
@@ -100,10 +101,10 @@ class Ips4Manager:
     @classmethod
     def update_custom_password(cls, username, plain_password):
         logger.debug("Updating IPS4 user id %s password" % id)
-        if cls.check_user(username):
+        cursor = connections['ips4'].cursor()
+        if cls.check_user(username, cursor):
             hash = cls._gen_pwhash(plain_password)
             salt = cls._get_salt(hash)
-            cursor = connections['ips4'].cursor()
             cursor.execute(cls.SQL_UPDATE_PASSWORD, [hash, salt, username])
             return plain_password
         else:
@@ -40,15 +40,29 @@ class MumbleService(ServicesHook):
         if MumbleTasks.has_account(user):
             MumbleTasks.update_groups.delay(user.pk)
 
+    def update_groups_bulk(self, users):
+        logger.debug(f"Updating {self.name} groups for {len(users)} users")
+        user_pks = list(MumbleTasks.users_with_account([user.pk for user in users]).values_list('pk', flat=True))
+        if user_pks:
+            MumbleTasks.update_groups_bulk.delay(user_pks)
+
     def sync_nickname(self, user):
         logger.debug(f"Updating {self.name} nickname for {user}")
         if MumbleTasks.has_account(user):
+            if not user.mumble.is_display_name_outdated():
+                logger.debug(f"{self.name} nickname for {user} is unchanged")
+                return
             MumbleTasks.update_display_name.apply_async(args=[user.pk], countdown=5) # cooldown on this task to ensure DB clean when syncing
 
     def validate_user(self, user):
         if MumbleTasks.has_account(user) and not self.service_active_for_user(user):
             self.delete_user(user, notify_user=True)
 
+    def validate_users_bulk(self, users):
+        users_with_account = MumbleTasks.users_with_account([user.pk for user in users])
+        for user in self.users_without_access(users_with_account):
+            self.delete_user(user, notify_user=True)
+
     def update_all_groups(self):
         logger.debug("Updating all %s groups" % self.name)
         MumbleTasks.update_all_groups.delay()
@@ -138,21 +138,31 @@ class MumbleUser(AbstractServiceModel):
     def reset_password(self):
         self.update_password()
 
-    def update_groups(self, groups: Group=None):
+    def format_groups(self, groups: Group=None) -> str:
         if groups is None:
             groups = self.user.groups.all()
         groups_str = [self.user.profile.state.name]
         for group in groups:
             groups_str.append(str(group.name))
-        safe_groups = ','.join({g.replace(' ', '-') for g in groups_str})
+        return ','.join({g.replace(' ', '-') for g in groups_str})
+
+    def update_groups(self, groups: Group=None):
+        safe_groups = self.format_groups(groups)
         logger.info(f"Updating mumble user {self.user} groups to {safe_groups}")
         self.groups = safe_groups
         self.save()
         return True
 
+    def is_display_name_outdated(self) -> bool:
+        return self.display_name != MumbleManager.get_display_name(self.user)
+
     def update_display_name(self):
+        display_name = MumbleManager.get_display_name(self.user)
+        if display_name == self.display_name:
+            logger.debug(f"Mumble user {self.user} display name is unchanged")
+            return True
         logger.info(f"Updating mumble user {self.user} display name")
-        self.display_name = MumbleManager.get_display_name(self.user)
+        self.display_name = display_name
         self.save()
         return True
 
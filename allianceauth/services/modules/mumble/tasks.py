@@ -20,6 +20,13 @@ class MumbleTasks:
         except ObjectDoesNotExist:
             return False
 
+    @staticmethod
+    def users_with_account(user_pks):
+        """Return the users of the given pks who have a mumble account"""
+        return User.objects\
+            .filter(pk__in=user_pks, mumble__isnull=False)\
+            .exclude(mumble__username='')
+
     @staticmethod
     def disable_mumble():
         logger.info("Deleting all MumbleUser models")
@@ -65,6 +72,22 @@ class MumbleTasks:
             logger.debug("User %s does not have a mumble account, skipping" % user)
         return False
 
+    @staticmethod
+    @shared_task(name="mumble.update_groups_bulk")
+    def update_groups_bulk(pks):
+        logger.debug("Updating mumble groups for %d users", len(pks))
+        mumble_users = list(
+            MumbleUser.objects
+            .filter(user__pk__in=pks)
+            .exclude(username__exact='')
+            .select_related('user__profile__state')
+            .prefetch_related('user__groups')
+        )
+        for mumble_user in mumble_users:
+            mumble_user.groups = mumble_user.format_groups()
+        MumbleUser.objects.bulk_update(mumble_users, ['groups'], batch_size=500)
+        logger.info("Updated mumble groups for %d users", len(mumble_users))
+
     @staticmethod
     @shared_task(name="mumble.update_all_groups")
     def update_all_groups():
@@ -76,5 +99,9 @@ class MumbleTasks:
     @shared_task(name="mumble.update_all_display_names")
     def update_all_display_names():
         logger.debug("Updating ALL mumble display names")
-        for mumble_user in MumbleUser.objects.exclude(username__exact=''):
-            MumbleTasks.update_display_name.delay(mumble_user.user.pk)
+        mumble_users = MumbleUser.objects.exclude(username__exact='').select_related(
+            'user__profile__main_character'
+        )
+        for mumble_user in mumble_users:
+            if mumble_user.is_display_name_outdated():
+                MumbleTasks.update_display_name.delay(mumble_user.user.pk)
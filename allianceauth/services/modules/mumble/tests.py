@@ -73,6 +73,30 @@ class MumbleHooksTestCase(TestCase):
         result = service.update_groups(none_user)
         self.assertFalse(result)
 
+    def test_update_groups_bulk(self):
+        service = self.service()
+        member = User.objects.get(username=self.member)
+        member.mumble.groups = ''
+        member.mumble.save()
+        none_user = User.objects.get(username=self.none_user)
+
+        service.update_groups_bulk([member, none_user])
+
+        mumble_user = MumbleUser.objects.get(user=member)
+        self.assertIn(DEFAULT_AUTH_GROUP, mumble_user.groups)
+
+    def test_validate_users_bulk(self):
+        service = self.service()
+        member = User.objects.get(username=self.member)
+        none_user = User.objects.get(username=self.none_user)
+        MumbleUser.objects.create(user=none_user)
+
+        service.validate_users_bulk([member, none_user])
+
+        self.assertTrue(User.objects.get(username=self.member).mumble)
+        with self.assertRaises(ObjectDoesNotExist):
+            User.objects.get(username=self.none_user).mumble
+
     def test_validate_user(self):
         service = self.service()
         # Test member is not deleted
@@ -97,6 +121,42 @@ class MumbleHooksTestCase(TestCase):
         with self.assertRaises(ObjectDoesNotExist):
             mumble_user = User.objects.get(username=self.member).mumble
 
+    @mock.patch(MODULE_PATH + '.tasks.MumbleTasks.update_display_name')
+    def test_sync_nickname(self, update_display_name):
+        member = User.objects.get(username=self.member)
+        member.mumble.display_name = 'outdated'
+        member.mumble.save()
+
+        service = self.service()
+        service.sync_nickname(member)
+
+        self.assertTrue(update_display_name.apply_async.called)
+
+    @mock.patch(MODULE_PATH + '.tasks.MumbleTasks.update_display_name')
+    def test_sync_nickname_unchanged(self, update_display_name):
+        member = User.objects.get(username=self.member)
+        member.mumble.update_display_name()
+
+        service = self.service()
+        service.sync_nickname(member)
+
+        self.assertFalse(update_display_name.apply_async.called)
+
+    @mock.patch(MODULE_PATH + '.tasks.MumbleTasks.update_display_name')
+    def test_update_all_display_names_only_for_changed_names(self, update_display_name):
+        member = User.objects.get(username=self.member)
+        member.mumble.username = self.member
+        member.mumble.display_name = 'outdated'
+        member.mumble.save()
+
+        MumbleTasks.update_all_display_names()
+        self.assertEqual(update_display_name.delay.call_count, 1)
+
+        update_display_name.reset_mock()
+        member.mumble.update_display_name()
+        MumbleTasks.update_all_display_names()
+        self.assertFalse(update_display_name.delay.called)
+
     def test_render_services_ctrl(self):
         service = self.service()
         member = User.objects.get(username=self.member)
@@ -35,6 +35,12 @@ class OpenfireService(ServicesHook):
         if OpenfireTasks.has_account(user) and not self.service_active_for_user(user):
             self.delete_user(user, notify_user=True)
 
+    def validate_users_bulk(self, users):
+        logger.debug(f'Validating {len(users)} users {self.name} accounts')
+        users_with_account = OpenfireTasks.users_with_account([user.pk for user in users])
+        for user in self.users_without_access(users_with_account):
+            self.delete_user(user, notify_user=True)
+
     def update_groups(self, user):
         logger.debug(f'Updating {self.name} groups for {user}')
         if OpenfireTasks.has_account(user):
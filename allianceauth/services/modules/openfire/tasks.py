@@ -34,6 +34,13 @@ class OpenfireTasks:
         except ObjectDoesNotExist:
             return False
 
+    @staticmethod
+    def users_with_account(user_pks):
+        """Return the users of the given pks who have a jabber account"""
+        return User.objects\
+            .filter(pk__in=user_pks, openfire__isnull=False)\
+            .exclude(openfire__username='')
+
     @staticmethod
     def disable_jabber():
         logging.debug("Deleting all Openfire users")
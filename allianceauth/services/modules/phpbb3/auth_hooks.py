@@ -33,11 +33,23 @@ class Phpbb3Service(ServicesHook):
         if Phpbb3Tasks.has_account(user) and not self.service_active_for_user(user):
             self.delete_user(user, notify_user=True)
 
+    def validate_users_bulk(self, users):
+        logger.debug(f'Validating {len(users)} users {self.name} accounts')
+        users_with_account = Phpbb3Tasks.users_with_account([user.pk for user in users])
+        for user in self.users_without_access(users_with_account):
+            self.delete_user(user, notify_user=True)
+
     def update_groups(self, user):
         logger.debug(f'Updating {self.name} groups for {user}')
         if Phpbb3Tasks.has_account(user):
             Phpbb3Tasks.update_groups.delay(user.pk)
 
+    def update_groups_bulk(self, users):
+        logger.debug(f'Updating {self.name} groups for {len(users)} users')
+        user_pks = list(Phpbb3Tasks.users_with_account([user.pk for user in users]).values_list('pk', flat=True))
+        if user_pks:
+            Phpbb3Tasks.update_groups_bulk.delay(user_pks)
+
     def update_all_groups(self):
         logger.debug('Update all %s groups called' % self.name)
         Phpbb3Tasks.update_all_groups.delay()
@@ -5,7 +5,7 @@ import re
 from datetime import datetime
 
 from passlib.apps import phpbb3_context
-from django.db import connections
+from django.db import connections, transaction
 from allianceauth.eveonline.models import EveCharacter
 
 import logging
@@ -33,6 +33,10 @@ class Phpbb3Manager:
 
     SQL_GET_GROUP_ID = r"SELECT group_id from %sgroups WHERE group_name = %%s" % TABLE_PREFIX
 
+    SQL_GET_GROUP_IDS = r"SELECT group_name, group_id from %sgroups WHERE group_name IN (%%s)" % TABLE_PREFIX
+
+    SQL_USER_IDS_FROM_USERNAMES = r"SELECT username, user_id from %susers WHERE username IN (%%s)" % TABLE_PREFIX
+
     SQL_ADD_GROUP = r"INSERT INTO %sgroups (group_name,group_desc,group_legend) VALUES (%%s,%%s,0)" % TABLE_PREFIX
 
     SQL_UPDATE_USER_PASSWORD = r"UPDATE %susers SET user_password = %%s WHERE username = %%s" % TABLE_PREFIX
@@ -41,8 +45,9 @@ class Phpbb3Manager:
 
     SQL_GET_ALL_GROUPS = r"SELECT group_id, group_name FROM %sgroups" % TABLE_PREFIX
 
-    SQL_GET_USER_GROUPS = r"SELECT %(prefix)sgroups.group_name FROM %(prefix)sgroups , %(prefix)suser_group WHERE " \
-                        r"%(prefix)suser_group.group_id = %(prefix)sgroups.group_id AND user_id=%%s" % {'prefix': TABLE_PREFIX}
+    SQL_GET_USERS_GROUPS = r"SELECT %(prefix)suser_group.user_id, %(prefix)sgroups.group_name, %(prefix)sgroups.group_id " \
+                        r"FROM %(prefix)sgroups , %(prefix)suser_group WHERE " \
+                        r"%(prefix)suser_group.group_id = %(prefix)sgroups.group_id AND user_id IN (%%s)" % {'prefix': TABLE_PREFIX}
 
     SQL_ADD_USER_AVATAR = r"UPDATE %susers SET user_avatar_type=2, user_avatar_width=64, user_avatar_height=64, " \
                         "user_avatar=%%s WHERE user_id = %%s" % TABLE_PREFIX
@@ -106,24 +111,36 @@ class Phpbb3Manager:
             return None
 
     @staticmethod
-    def __get_all_groups():
-        logger.debug("Getting all phpbb3 groups.")
-        cursor = connections['phpbb3'].cursor()
-        cursor.execute(Phpbb3Manager.SQL_GET_ALL_GROUPS)
-        rows = cursor.fetchall()
-        out = {}
-        for row in rows:
-            out[row[1]] = row[0]
-        logger.debug("Got phpbb groups %s" % out)
+    def __in_clause(sql, values):
+        return sql % ', '.join(['%s'] * len(values))
+
+    @staticmethod
+    def __get_user_ids(cursor, usernames):
+        logger.debug("Getting phpbb3 user ids for %d usernames" % len(usernames))
+        cursor.execute(Phpbb3Manager.__in_clause(Phpbb3Manager.SQL_USER_IDS_FROM_USERNAMES, usernames), usernames)
+        out = {row[0]: row[1] for row in cursor.fetchall()}
+        for username in set(usernames) - set(out):
+            logger.error("Username %s not found on phpbb. Unable to determine user id." % username)
         return out
 
     @staticmethod
-    def __get_user_groups(userid):
-        logger.debug("Getting phpbb3 user id %s groups" % userid)
-        cursor = connections['phpbb3'].cursor()
-        cursor.execute(Phpbb3Manager.SQL_GET_USER_GROUPS, [userid])
-        out = [row[0] for row in cursor.fetchall()]
-        logger.debug(f"Got user {userid} phpbb groups {out}")
+    def __get_group_ids(cursor, groupnames):
+        if not groupnames:
+            return {}
+        logger.debug("Getting phpbb3 group ids for groupnames %s" % groupnames)
+        cursor.execute(Phpbb3Manager.__in_clause(Phpbb3Manager.SQL_GET_GROUP_IDS, groupnames), groupnames)
+        out = {row[0]: row[1] for row in cursor.fetchall()}
+        logger.debug("Got phpbb group ids %s" % out)
+        return out
+
+    @staticmethod
+    def __get_users_groups(cursor, userids):
+        logger.debug("Getting phpbb3 groups of user ids %s" % userids)
+        cursor.execute(Phpbb3Manager.__in_clause(Phpbb3Manager.SQL_GET_USERS_GROUPS, userids), userids)
+        out = {userid: {} for userid in userids}
+        for userid, group_name, group_id in cursor.fetchall():
+            out[userid][group_name] = group_id
+        logger.debug("Got phpbb groups of users %s" % out)
         return out
 
     @staticmethod
@@ -132,38 +149,6 @@ class Phpbb3Manager:
         unixtime = calendar.timegm(d.utctimetuple())
         return unixtime
 
-    @staticmethod
-    def __create_group(groupname):
-        logger.debug("Creating phpbb3 group %s" % groupname)
-        cursor = connections['phpbb3'].cursor()
-        cursor.execute(Phpbb3Manager.SQL_ADD_GROUP, [groupname, groupname])
-        logger.info("Created phpbb group %s" % groupname)
-        return Phpbb3Manager.__get_group_id(groupname)
-
-    @staticmethod
-    def __add_user_to_group(userid, groupid):
-        logger.debug(f"Adding phpbb3 user id {userid} to group id {groupid}")
-        try:
-            cursor = connections['phpbb3'].cursor()
-            cursor.execute(Phpbb3Manager.SQL_ADD_USER_GROUP, [groupid, userid, 0])
-            cursor.execute(Phpbb3Manager.SQL_CLEAR_USER_PERMISSIONS, [userid])
-            logger.info(f"Added phpbb user id {userid} to group id {groupid}")
-        except:
-            logger.exception(f"Unable to add phpbb user id {userid} to group id {groupid}")
-            pass
-
-    @staticmethod
-    def __remove_user_from_group(userid, groupid):
-        logger.debug(f"Removing phpbb3 user id {userid} from group id {groupid}")
-        try:
-            cursor = connections['phpbb3'].cursor()
-            cursor.execute(Phpbb3Manager.SQL_REMOVE_USER_GROUP, [userid, groupid])
-            cursor.execute(Phpbb3Manager.SQL_CLEAR_USER_PERMISSIONS, [userid])
-            logger.info(f"Removed phpbb user id {userid} from group id {groupid}")
-        except:
-            logger.exception(f"Unable to remove phpbb user id {userid} from group id {groupid}")
-            pass
-
     @staticmethod
     def add_user(username, email, groups, characterid):
         logger.debug("Adding phpbb user with username {}, email {}, groups {}, characterid {}".format(
@@ -227,22 +212,58 @@ class Phpbb3Manager:
 
     @staticmethod
     def update_groups(username, groups):
-        userid = Phpbb3Manager.__get_user_id(username)
-        logger.debug(f"Updating phpbb user {username} with id {userid} groups {groups}")
-        if userid is not None:
-            forum_groups = Phpbb3Manager.__get_all_groups()
-            user_groups = set(Phpbb3Manager.__get_user_groups(userid))
-            act_groups = {Phpbb3Manager._sanitize_groupname(g) for g in groups}
-            addgroups = act_groups - user_groups
-            remgroups = user_groups - act_groups
-            logger.info(f"Updating phpbb user {username} groups - adding {addgroups}, removing {remgroups}")
-            for g in addgroups:
-                if not g in forum_groups:
-                    forum_groups[g] = Phpbb3Manager.__create_group(g)
-                Phpbb3Manager.__add_user_to_group(userid, forum_groups[g])
-
-            for g in remgroups:
-                Phpbb3Manager.__remove_user_from_group(userid, forum_groups[g])
+        Phpbb3Manager.update_groups_bulk({username: groups})
+
+    @staticmethod
+    def update_groups_bulk(groups_by_username):
+        """
+        Update the groups of many users in one transaction.
+        Group names are resolved with a single query and memberships are changed with one
+        statement per kind of change, so the costs do not grow with the number of groups.
+        :param groups_by_username: names of the groups each phpbb username should have
+        """
+        logger.debug("Updating phpbb groups of %d users" % len(groups_by_username))
+        with transaction.atomic(using='phpbb3'):
+            cursor = connections['phpbb3'].cursor()
+            userids = Phpbb3Manager.__get_user_ids(cursor, list(groups_by_username))
+            if not userids:
+                return
+            users_groups = Phpbb3Manager.__get_users_groups(cursor, list(userids.values()))
+            act_groups = {
+                username: {Phpbb3Manager._sanitize_groupname(g) for g in groups_by_username[username]}
+                for username in userids
+            }
+            all_groups = sorted(set().union(*act_groups.values()))
+            forum_groups = Phpbb3Manager.__get_group_ids(cursor, all_groups)
+            new_groups = [g for g in all_groups if g not in forum_groups]
+            if new_groups:
+                logger.debug("Creating phpbb3 groups %s" % new_groups)
+                cursor.executemany(Phpbb3Manager.SQL_ADD_GROUP, [(g, g) for g in new_groups])
+                forum_groups.update(Phpbb3Manager.__get_group_ids(cursor, new_groups))
+                logger.info("Created phpbb groups %s" % new_groups)
+
+            add_rows = []
+            remove_rows = []
+            changed_userids = []
+            for username, userid in userids.items():
+                user_groups = users_groups[userid]
+                addgroups = act_groups[username] - set(user_groups)
+                remgroups = set(user_groups) - act_groups[username]
+                if not addgroups and not remgroups:
+                    continue
+                logger.info(f"Updating phpbb user {username} groups - adding {addgroups}, removing {remgroups}")
+                add_rows += [(forum_groups[g], userid, 0) for g in addgroups]
+                remove_rows += [(userid, user_groups[g]) for g in remgroups]
+                changed_userids.append(userid)
+
+            if add_rows:
+                cursor.executemany(Phpbb3Manager.SQL_ADD_USER_GROUP, add_rows)
+            if remove_rows:
+                cursor.executemany(Phpbb3Manager.SQL_REMOVE_USER_GROUP, remove_rows)
+            if changed_userids:
+                cursor.executemany(
+                    Phpbb3Manager.SQL_CLEAR_USER_PERMISSIONS, [(userid,) for userid in changed_userids]
+                )
 
     @staticmethod
     def remove_group(username, group):
@@ -34,6 +34,13 @@ class Phpbb3Tasks:
         except ObjectDoesNotExist:
             return False
 
+    @staticmethod
+    def users_with_account(user_pks):
+        """Return the users of the given pks who have a phpbb3 account"""
+        return User.objects\
+            .filter(pk__in=user_pks, phpbb3__isnull=False)\
+            .exclude(phpbb3__username='')
+
     @staticmethod
     @shared_task(bind=True, name="phpbb3.update_groups", base=QueueOnce)
     def update_groups(self, pk):
@@ -53,6 +60,28 @@ class Phpbb3Tasks:
         else:
             logger.debug("User does not have a Phpbb3 account")
 
+    @staticmethod
+    @shared_task(name="phpbb3.update_groups_bulk")
+    def update_groups_bulk(pks):
+        logger.debug("Updating phpbb3 groups for %d users", len(pks))
+        users = Phpbb3Tasks.users_with_account(pks)\
+            .select_related('profile__state', 'phpbb3')\
+            .prefetch_related('groups')
+        groups_by_username = {}
+        for user in users:
+            groups = [user.profile.state.name]
+            groups += [str(group.name) for group in user.groups.all()]
+            logger.debug(f"Updating user {user} phpbb3 groups to {groups}")
+            groups_by_username[user.phpbb3.username] = groups
+        if not groups_by_username:
+            return
+        try:
+            Phpbb3Manager.update_groups_bulk(groups_by_username)
+        except Exception:
+            logger.exception("Phpbb group sync failed for %d users, retrying in 10 mins", len(users))
+            for user in users:
+                Phpbb3Tasks.update_groups.apply_async(args=[user.pk], countdown=60 * 10)
+
     @staticmethod
     @shared_task(name="phpbb3.update_all_groups")
     def update_all_groups():
@@ -72,6 +72,44 @@ class Phpbb3HooksTestCase(TestCase):
             service.update_groups(none_user)
             self.assertFalse(manager.update_groups.called)
 
+    @mock.patch(MODULE_PATH + '.tasks.Phpbb3Manager')
+    def test_update_groups_bulk(self, manager):
+        service = self.service()
+        member = User.objects.get(username=self.member)
+        none_user = User.objects.get(username=self.none_user)
+
+        service.update_groups_bulk([member, none_user])
+
+        self.assertEqual(manager.update_groups_bulk.call_count, 1)
+        groups_by_username = manager.update_groups_bulk.call_args[0][0]
+        self.assertEqual(list(groups_by_username), [self.member])
+        self.assertIn(DEFAULT_AUTH_GROUP, groups_by_username[self.member])
+
+    @mock.patch(MODULE_PATH + '.tasks.Phpbb3Tasks.update_groups')
+    @mock.patch(MODULE_PATH + '.tasks.Phpbb3Manager')
+    def test_update_groups_bulk_retries_users_on_failure(self, manager, update_groups):
+        manager.update_groups_bulk.side_effect = Exception('database gone')
+        service = self.service()
+        member = User.objects.get(username=self.member)
+
+        service.update_groups_bulk([member])
+
+        update_groups.apply_async.assert_called_once_with(args=[member.pk], countdown=600)
+
+    @mock.patch(MODULE_PATH + '.tasks.Phpbb3Manager')
+    def test_validate_users_bulk(self, manager):
+        service = self.service()
+        member = User.objects.get(username=self.member)
+        none_user = User.objects.get(username=self.none_user)
+        Phpbb3User.objects.create(user=none_user, username='abc123')
+
+        service.validate_users_bulk([member, none_user])
+
+        manager.disable_user.assert_called_once_with('abc123')
+        self.assertTrue(User.objects.get(username=self.member).phpbb3)
+        with self.assertRaises(ObjectDoesNotExist):
+            User.objects.get(username=self.none_user).phpbb3
+
     @mock.patch(MODULE_PATH + '.tasks.Phpbb3Manager')
     def test_validate_user(self, manager):
         service = self.service()
@@ -201,3 +239,42 @@ class Phpbb3ManagerTestCase(TestCase):
         pwhash = self.manager._Phpbb3Manager__gen_hash('test')
 
         self.assertIsInstance(pwhash, str)
+
+    @mock.patch(MODULE_PATH + '.manager.transaction')
+    @mock.patch(MODULE_PATH + '.manager.connections')
+    def test_update_groups_bulk(self, connections, transaction):
+        cursor = connections['phpbb3'].cursor.return_value
+        cursor.fetchall.side_effect = [
+            [('alice', 1), ('bob', 2)],
+            [(1, 'Member', 10), (1, 'Old', 11)],
+            [('Member', 10)],
+            [('New', 12)],
+        ]
+
+        self.manager.update_groups_bulk({
+            'alice': ['Member'],
+            'bob': ['Member', 'New'],
+            'carol': ['Member'],
+        })
+
+        self.assertEqual(cursor.execute.call_count, 4)
+        executemany = {call[0][0]: call[0][1] for call in cursor.executemany.call_args_list}
+        self.assertEqual(executemany[self.manager.SQL_ADD_GROUP], [('New', 'New')])
+        self.assertCountEqual(executemany[self.manager.SQL_ADD_USER_GROUP], [(10, 2, 0), (12, 2, 0)])
+        self.assertEqual(executemany[self.manager.SQL_REMOVE_USER_GROUP], [(1, 11)])
+        self.assertEqual(executemany[self.manager.SQL_CLEAR_USER_PERMISSIONS], [(1,), (2,)])
+        transaction.atomic.assert_called_once_with(using='phpbb3')
+
+    @mock.patch(MODULE_PATH + '.manager.transaction')
+    @mock.patch(MODULE_PATH + '.manager.connections')
+    def test_update_groups_bulk_unchanged(self, connections, transaction):
+        cursor = connections['phpbb3'].cursor.return_value
+        cursor.fetchall.side_effect = [
+            [('alice', 1)],
+            [(1, 'Member', 10)],
+            [('Member', 10)],
+        ]
+
+        self.manager.update_groups('alice', ['Member'])
+
+        self.assertFalse(cursor.executemany.called)
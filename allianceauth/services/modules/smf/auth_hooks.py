@@ -5,6 +5,7 @@ from django.template.loader import render_to_string
 
 from allianceauth import hooks
 from allianceauth.services.hooks import ServicesHook
+from .manager import SmfManager
 from .tasks import SmfTasks
 from .urls import urlpatterns
 
@@ -33,15 +34,30 @@ class SmfService(ServicesHook):
         if SmfTasks.has_account(user) and not self.service_active_for_user(user):
             self.delete_user(user)
 
+    def validate_users_bulk(self, users):
+        logger.debug(f'Validating {len(users)} users {self.name} accounts')
+        users_with_account = SmfTasks.users_with_account([user.pk for user in users])
+        for user in self.users_without_access(users_with_account):
+            self.delete_user(user)
+
     def update_groups(self, user):
         logger.debug(f'Updating {self.name} groups for {user}')
         if SmfTasks.has_account(user):
             SmfTasks.update_groups.delay(user.pk)
 
+    def update_groups_bulk(self, users):
+        logger.debug(f'Updating {self.name} groups for {len(users)} users')
+        user_pks = list(SmfTasks.users_with_account([user.pk for user in users]).values_list('pk', flat=True))
+        if user_pks:
+            SmfTasks.update_groups_bulk.delay(user_pks)
+
     def sync_nickname(self, user):
         logger.debug(f"Updating {self.name} displayed name for {user}")
 
         if SmfTasks.has_account(user):
+            if SmfManager.get_display_name(user) == user.smf.display_name:
+                logger.debug(f"{self.name} displayed name for {user} is unchanged")
+                return
             SmfTasks.update_display_name.apply_async(args=[user.pk], countdown=5) # cooldown on this task to ensure DB clean when syncing
 
     def update_all_groups(self):
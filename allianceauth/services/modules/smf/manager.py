@@ -9,7 +9,7 @@ from typing import Tuple
 
 from packaging import version
 
-from django.db import connections
+from django.db import connections, transaction
 from django.conf import settings
 from django.contrib.auth.models import User
 
@@ -52,6 +52,11 @@ class SmfManager:
 
     SQL_GET_GROUP_ID = r"SELECT id_group from %smembergroups WHERE group_name = %%s" % TABLE_PREFIX
 
+    SQL_GET_GROUP_IDS = r"SELECT group_name, id_group from %smembergroups WHERE group_name IN (%%s)" % TABLE_PREFIX
+
+    SQL_GET_MEMBERS_GROUPS = r"SELECT member_name, id_member, additional_groups from %smembers " \
+                            r"WHERE member_name IN (%%s)" % TABLE_PREFIX
+
     SQL_ADD_GROUP = r"INSERT INTO %smembergroups (group_name,description) VALUES (%%s,%%s)" % TABLE_PREFIX
 
     SQL_UPDATE_USER_PASSWORD = r"UPDATE %smembers SET passwd = %%s WHERE member_name = %%s" % TABLE_PREFIX
@@ -278,44 +283,100 @@ class SmfManager:
         return False
 
     @classmethod
-    def update_display_name(cls, user: User):
-        logger.debug(f"Updating SMF displayed name for user {user}")
-        cursor = connections['smf'].cursor()
-        smf_username = user.smf.username
-
+    def get_display_name(cls, user: User) -> str:
         try:
-            display_name = user.profile.main_character.character_name
+            return user.profile.main_character.character_name
         except Exception as exc:
             logger.exception(
                 f"Unable to find a main character name for {user}, skipping... ({exc})"
             )
-            display_name = smf_username
+            return user.smf.username
 
+    @classmethod
+    def update_display_name(cls, user: User):
+        logger.debug(f"Updating SMF displayed name for user {user}")
+        smf_user = user.smf
+        smf_username = smf_user.username
+        display_name = cls.get_display_name(user)
+        if display_name == smf_user.display_name:
+            logger.debug(f"Displayed name for smf user {smf_username} is unchanged")
+            return True
+
+        cursor = connections['smf'].cursor()
         if cls.check_user(smf_username):
             cursor.execute(cls.SQL_UPD_DISPLAY_NAME, [display_name, smf_username])
+            smf_user.display_name = display_name
+            smf_user.save(update_fields=['display_name'])
             logger.info(f"Updated displayed name for smf user {smf_username}")
             return True
         logger.error(f"Unable to update smf user {smf_username} - user not found on smf.")
         return False
 
+    @staticmethod
+    def _in_clause(sql, values):
+        return sql % ', '.join(['%s'] * len(values))
+
+    @classmethod
+    def get_group_ids(cls, cursor, groupnames) -> dict:
+        """
+        Get the ids of many smf groups with a single query
+        :param cursor: cursor of the smf database
+        :param groupnames: names of the groups
+        :return: group ids by group name, without the groups not found on smf
+        """
+        if not groupnames:
+            return {}
+        logger.debug(f"Getting smf group ids for groupnames {groupnames}")
+        cursor.execute(cls._in_clause(cls.SQL_GET_GROUP_IDS, groupnames), groupnames)
+        out = {row[0]: row[1] for row in cursor.fetchall()}
+        logger.debug(f"Got smf group ids {out}")
+        return out
+
     @classmethod
     def update_groups(cls, username, groups):
-        userid = cls.get_user_id(username)
-        logger.debug(f"Updating smf user {username} with id {userid} groups {groups}")
-        if userid is not None:
-            forum_groups = cls.get_all_groups()
-            user_groups = set(cls.get_user_groups(userid))
-            act_groups = {cls._sanitize_groupname(g) for g in groups}
-            addgroups = act_groups - user_groups
-            remgroups = user_groups - act_groups
-            logger.info(f"Updating smf user {username} groups - adding {addgroups}, removing {remgroups}")
-            act_group_id = set()
-            for g in addgroups:
-                if g not in forum_groups:
-                    forum_groups[g] = cls.create_group(g)
-                act_group_id.add(str(cls.get_group_id(g)))
-            string_groups = ','.join(act_group_id)
-            cls.add_user_to_group(userid, string_groups)
+        cls.update_groups_bulk({username: groups})
+
+    @classmethod
+    def update_groups_bulk(cls, groups_by_username):
+        """
+        Update the groups of many users in one transaction
+        :param groups_by_username: names of the groups each smf member name should have
+        """
+        logger.debug(f"Updating smf groups of {len(groups_by_username)} users")
+        with transaction.atomic(using='smf'):
+            cursor = connections['smf'].cursor()
+            usernames = list(groups_by_username)
+            cursor.execute(cls._in_clause(cls.SQL_GET_MEMBERS_GROUPS, usernames), usernames)
+            members = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+            for username in set(usernames) - set(members):
+                logger.error(f"username {username} not found on smf. Unable to determine user id .")
+            if not members:
+                return
+
+            act_groups = {
+                username: {cls._sanitize_groupname(g) for g in groups_by_username[username]}
+                for username in members
+            }
+            all_groups = sorted(set().union(*act_groups.values()))
+            forum_groups = cls.get_group_ids(cursor, all_groups)
+            new_groups = [g for g in all_groups if g not in forum_groups]
+            if new_groups:
+                logger.debug(f"Creating smf groups {new_groups}")
+                cursor.executemany(cls.SQL_ADD_GROUP, [(g, g) for g in new_groups])
+                forum_groups.update(cls.get_group_ids(cursor, new_groups))
+                logger.info(f"Created smf groups {new_groups}")
+
+            rows = []
+            for username, (userid, user_groups) in members.items():
+                string_groups = ','.join(
+                    str(group_id) for group_id in sorted(forum_groups[g] for g in act_groups[username])
+                )
+                if string_groups == (user_groups or ''):
+                    continue
+                logger.info(f"Updating smf user {username} groups to {act_groups[username]}")
+                rows.append((string_groups, userid))
+            if rows:
+                cursor.executemany(cls.SQL_ADD_USER_GROUP, rows)
 
     @classmethod
     def add_user_to_group(cls, userid, groupid):
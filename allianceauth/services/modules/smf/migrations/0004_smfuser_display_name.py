@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 04:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('smf', '0003_set_smf_displayed_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='smfuser',
+            name='display_name',
+            field=models.CharField(blank=True, default='', help_text='Display name last set on SMF by Auth', max_length=254),
+        ),
+    ]
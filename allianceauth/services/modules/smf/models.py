@@ -7,6 +7,12 @@ class SmfUser(models.Model):
                                 on_delete=models.CASCADE,
                                 related_name='smf')
     username = models.CharField(max_length=254)
+    display_name = models.CharField(
+        max_length=254,
+        blank=True,
+        default='',
+        help_text='Display name last set on SMF by Auth'
+    )
 
     def __str__(self):
         return self.username
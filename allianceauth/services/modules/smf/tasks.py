@@ -34,6 +34,13 @@ class SmfTasks:
         except ObjectDoesNotExist:
             return False
 
+    @staticmethod
+    def users_with_account(user_pks):
+        """Return the users of the given pks who have an smf account"""
+        return User.objects\
+            .filter(pk__in=user_pks, smf__isnull=False)\
+            .exclude(smf__username='')
+
     @classmethod
     def disable(cls):
         SmfUser.objects.all().delete()
@@ -88,8 +95,34 @@ class SmfTasks:
     @shared_task(name="smf.update_all_display_names")
     def update_all_display_names():
         logger.debug("Updating ALL SMF display names")
-        for smf_user in SmfUser.objects.exclude(username__exact=''):
-            SmfTasks.update_display_name.delay(smf_user)
+        smf_users = SmfUser.objects.exclude(username__exact='').select_related(
+            'user__profile__main_character'
+        )
+        for smf_user in smf_users:
+            if SmfManager.get_display_name(smf_user.user) != smf_user.display_name:
+                SmfTasks.update_display_name.delay(smf_user.user_id)
+
+    @staticmethod
+    @shared_task(name="smf.update_groups_bulk")
+    def update_groups_bulk(pks):
+        logger.debug("Updating smf groups for %d users", len(pks))
+        users = SmfTasks.users_with_account(pks)\
+            .select_related('profile__state', 'smf')\
+            .prefetch_related('groups')
+        groups_by_username = {}
+        for user in users:
+            groups = [user.profile.state.name]
+            groups += [str(group.name) for group in user.groups.all()]
+            logger.debug(f"Updating user {user} smf groups to {groups}")
+            groups_by_username[user.smf.username] = groups
+        if not groups_by_username:
+            return
+        try:
+            SmfManager.update_groups_bulk(groups_by_username)
+        except Exception:
+            logger.exception("smf group sync failed for %d users, retrying in 10 mins", len(users))
+            for user in users:
+                SmfTasks.update_groups.apply_async(args=[user.pk], countdown=60 * 10)
 
     @staticmethod
     @shared_task(name="smf.update_all_groups")
@@ -8,6 +8,7 @@ from django.core.exceptions import ObjectDoesNotExist
 from allianceauth.tests.auth_utils import AuthUtils
 
 from .auth_hooks import SmfService
+from .manager import SmfManager
 from .models import SmfUser
 from .tasks import SmfTasks
 
@@ -100,6 +101,46 @@ class SmfHooksTestCase(TestCase):
         with self.assertRaises(ObjectDoesNotExist):
             smf_user = User.objects.get(username=self.member).smf
 
+    @mock.patch(MODULE_PATH + '.tasks.SmfTasks.update_display_name')
+    def test_sync_nickname(self, update_display_name):
+        member = User.objects.get(username=self.member)
+
+        service = self.service()
+        service.sync_nickname(member)
+
+        self.assertTrue(update_display_name.apply_async.called)
+
+    @mock.patch(MODULE_PATH + '.tasks.SmfTasks.update_display_name')
+    def test_sync_nickname_unchanged(self, update_display_name):
+        member = User.objects.get(username=self.member)
+        member.smf.display_name = self.member
+        member.smf.save()
+
+        service = self.service()
+        service.sync_nickname(member)
+
+        self.assertFalse(update_display_name.apply_async.called)
+
+    @mock.patch(MODULE_PATH + '.tasks.SmfTasks.update_display_name')
+    def test_update_all_display_names_only_for_changed_names(self, update_display_name):
+        none_user = User.objects.get(username=self.none_user)
+        SmfUser.objects.create(user=none_user, username=self.none_user, display_name=self.none_user)
+
+        SmfTasks.update_all_display_names()
+
+        update_display_name.delay.assert_called_once_with(
+            User.objects.get(username=self.member).pk
+        )
+
+    @mock.patch(MODULE_PATH + '.manager.connections')
+    def test_update_display_name_unchanged(self, connections):
+        member = User.objects.get(username=self.member)
+        member.smf.display_name = self.member
+        member.smf.save()
+
+        self.assertTrue(SmfManager.update_display_name(member))
+        self.assertFalse(connections.__getitem__.called)
+
     def test_render_services_ctrl(self):
         service = self.service()
         member = User.objects.get(username=self.member)
@@ -201,3 +242,36 @@ class SmfManagerTestCase(TestCase):
         pwhash = self.manager.gen_hash('username', 'test')
 
         self.assertEqual(pwhash, 'b6d21d37de84db76746b1c45696a00f9ce4f86fd')
+
+    @mock.patch(MODULE_PATH + '.manager.transaction')
+    @mock.patch(MODULE_PATH + '.manager.connections')
+    def test_update_groups_bulk(self, connections, transaction):
+        cursor = connections['smf'].cursor.return_value
+        cursor.fetchall.side_effect = [
+            [('alice', 1, '10,11'), ('bob', 2, '10')],
+            [('Member', 10)],
+            [('New', 12)],
+        ]
+
+        self.manager.update_groups_bulk({
+            'alice': ['Member', 'New'],
+            'bob': ['Member'],
+        })
+
+        self.assertEqual(cursor.execute.call_count, 3)
+        cursor.executemany.assert_has_calls([
+            mock.call(self.manager.SQL_ADD_GROUP, [('New', 'New')]),
+            mock.call(self.manager.SQL_ADD_USER_GROUP, [('10,12', 1)]),
+        ])
+        transaction.atomic.assert_called_once_with(using='smf')
+
+    @mock.patch(MODULE_PATH + '.manager.transaction')
+    @mock.patch(MODULE_PATH + '.manager.connections')
+    def test_update_groups_bulk_unknown_user(self, connections, transaction):
+        cursor = connections['smf'].cursor.return_value
+        cursor.fetchall.return_value = []
+
+        self.manager.update_groups('alice', ['Member'])
+
+        self.assertEqual(cursor.execute.call_count, 1)
+        self.assertFalse(cursor.executemany.called)
@@ -1,8 +1,9 @@
 import logging
+import time
 
 from django.conf import settings
 
-from .util.ts3 import TS3Server, TeamspeakError
+from .util.ts3 import TeamspeakError, get_pool
 from .models import TSgroup
 from allianceauth.groupmanagement.models import ReservedGroupName
 
@@ -10,6 +11,9 @@ logger = logging.getLogger(__name__)
 
 
 class Teamspeak3Manager:
+    # seconds before the cached server groups of a connection are retrieved again
+    GROUP_CACHE_MAX_AGE = 300
+
     def __init__(self):
         self._server = None
 
@@ -21,11 +25,11 @@ class Teamspeak3Manager:
             raise ValueError("Teamspeak not connected")
 
     def connect(self):
-        self._server = self.__get_created_server()
+        self._server = self._get_pool().acquire()
         return self
 
     def disconnect(self):
-        self._server.disconnect()
+        self._get_pool().release(self._server)
         self._server = None
 
     def __enter__(self):
@@ -38,12 +42,18 @@ class Teamspeak3Manager:
         self.disconnect()
 
     @staticmethod
-    def __get_created_server():
-        server = TS3Server(settings.TEAMSPEAK3_SERVER_IP, settings.TEAMSPEAK3_SERVER_PORT)
-        server.login(settings.TEAMSPEAK3_SERVERQUERY_USER, settings.TEAMSPEAK3_SERVERQUERY_PASSWORD)
-        server.use(settings.TEAMSPEAK3_VIRTUAL_SERVER)
-        logger.debug("Got TS3 server instance based on settings.")
-        return server
+    def _get_pool():
+        return get_pool(
+            settings.TEAMSPEAK3_SERVER_IP,
+            settings.TEAMSPEAK3_SERVER_PORT,
+            settings.TEAMSPEAK3_SERVERQUERY_USER,
+            settings.TEAMSPEAK3_SERVERQUERY_PASSWORD,
+            settings.TEAMSPEAK3_VIRTUAL_SERVER,
+            size=getattr(settings, 'TEAMSPEAK3_POOL_SIZE', 5),
+            keepalive_interval=getattr(settings, 'TEAMSPEAK3_KEEPALIVE_INTERVAL', 240),
+            flood_commands=getattr(settings, 'TEAMSPEAK3_FLOOD_COMMANDS', 10),
+            flood_time=getattr(settings, 'TEAMSPEAK3_FLOOD_TIME', 3),
+        )
 
     @staticmethod
     def __santatize_username(username):
@@ -52,30 +62,51 @@ class Teamspeak3Manager:
         return sanatized
 
     def _get_userid(self, uid):
-        logger.debug("Looking for uid %s on TS3 server." % uid)
-        try:
-            ret = self.server.send_command('customsearch', {'ident': 'sso_uid', 'pattern': uid})
-            if ret and 'keys' in ret and 'cldbid' in ret['keys']:
+        return self._get_userids([uid]).get(uid)
+
+    def _get_userids(self, uids):
+        """Look up the database ids of many uids in one round trip"""
+        logger.debug("Looking for %d uids on TS3 server." % len(uids))
+        results = self.server.send_commands(
+            [('customsearch', {'ident': 'sso_uid', 'pattern': uid}) for uid in uids]
+        )
+        userids = {}
+        for uid, ret in zip(uids, results):
+            if isinstance(ret, TeamspeakError):
+                if not ret.code == '1281':
+                    raise ret
+            elif ret and 'keys' in ret and 'cldbid' in ret['keys']:
                 logger.debug("Got userid {} for uid {}".format(ret['keys']['cldbid'], uid))
-                return ret['keys']['cldbid']
-        except TeamspeakError as e:
-            if not e.code == '1281':
-                raise e
-        return None
+                userids[uid] = ret['keys']['cldbid']
+        return userids
+
+    def _group_table(self, refresh=False):
+        """Name/id pairing of the server groups, cached for the current connection"""
+        server = self.server
+        if server.group_cache is not None and not refresh:
+            fetched_at, table = server.group_cache
+            if time.monotonic() - fetched_at < self.GROUP_CACHE_MAX_AGE:
+                return table
+        logger.debug("Retrieving group list on TS3 server.")
+        table = {}
+        received = False
+        for group in server.iter_command('servergrouplist'):
+            received = True
+            if group['keys']['type'] != '1':
+                continue
+            table[group['keys']['name']] = group['keys']['sgid']
+        if not received:
+            logger.error("Received empty group cache while retrieving group cache from TS3 server. 1024 error.")
+        logger.debug("Received group table from server: %s" % table)
+        server.group_cache = (time.monotonic(), table)
+        return table
 
     def _group_id_by_name(self, groupname):
         logger.debug("Looking for group %s on TS3 server." % groupname)
-        group_cache = self.server.send_command('servergrouplist')
-        logger.debug("Received group cache from server: %s" % group_cache)
-        for group in group_cache:
-            if group['keys']['type'] != '1':
-                continue
-            logger.debug("Checking group %s" % group)
-            if group['keys']['name'] == groupname:
-                logger.debug("Found group {}, returning id {}".format(groupname, group['keys']['sgid']))
-                return group['keys']['sgid']
-        logger.debug("Group %s not found on server." % groupname)
-        return None
+        sgid = self._group_table().get(groupname)
+        if sgid is None:
+            logger.debug("Group %s not found on server." % groupname)
+        return sgid
 
     def _create_group(self, groupname):
         logger.debug("Creating group %s on TS3 server." % groupname)
@@ -83,58 +114,45 @@ class Teamspeak3Manager:
         if not sgid:
             logger.debug("Group does not yet exist. Proceeding with creation.")
             ret = self.server.send_command('servergroupadd', {'name': groupname})
-            self.__group_cache = None
             sgid = ret['keys']['sgid']
-            self.server.send_command('servergroupaddperm',
-                                        {'sgid': sgid, 'permsid': 'i_group_needed_modify_power', 'permvalue': 75,
-                                            'permnegated': 0, 'permskip': 0})
-            self.server.send_command('servergroupaddperm',
-                                        {'sgid': sgid, 'permsid': 'i_group_needed_member_add_power', 'permvalue': 100,
-                                            'permnegated': 0, 'permskip': 0})
-            self.server.send_command('servergroupaddperm',
-                                        {'sgid': sgid, 'permsid': 'i_group_needed_member_remove_power', 'permvalue': 100,
-                                            'permnegated': 0, 'permskip': 0})
+            self.server.send_commands([
+                ('servergroupaddperm',
+                    {'sgid': sgid, 'permsid': 'i_group_needed_modify_power', 'permvalue': 75,
+                        'permnegated': 0, 'permskip': 0}),
+                ('servergroupaddperm',
+                    {'sgid': sgid, 'permsid': 'i_group_needed_member_add_power', 'permvalue': 100,
+                        'permnegated': 0, 'permskip': 0}),
+                ('servergroupaddperm',
+                    {'sgid': sgid, 'permsid': 'i_group_needed_member_remove_power', 'permvalue': 100,
+                        'permnegated': 0, 'permskip': 0}),
+            ])
         logger.info(f"Created group on TS3 server with name {groupname} and id {sgid}")
         return sgid
 
     def _user_group_list(self, cldbid):
-        logger.debug("Retrieving group list for user with id %s" % cldbid)
-        server = Teamspeak3Manager.__get_created_server()
-        try:
-            groups = self.server.send_command('servergroupsbyclientid', {'cldbid': cldbid})
-        except TeamspeakError as e:
-            if e.code == '1281': # no groups
-                groups = []
-            else:
-                raise e
-        logger.debug("Retrieved group list: %s" % groups)
-        outlist = {}
-
-        if type(groups) == list:
-            logger.debug("Recieved multiple groups. Iterating.")
-            for group in groups:
-                outlist[group['keys']['name']] = group['keys']['sgid']
-        elif type(groups) == dict:
-            logger.debug("Recieved single group.")
-            outlist[groups['keys']['name']] = groups['keys']['sgid']
-        logger.debug("Returning name/id pairing: %s" % outlist)
-        return outlist
-
-    def _group_list(self):
-        logger.debug("Retrieving group list on TS3 server.")
-        group_cache = self.server.send_command('servergrouplist')
-        logger.debug("Received group cache from server: %s" % group_cache)
-        outlist = {}
-        if group_cache:
-            for group in group_cache:
-                if group['keys']['type'] != '1':
-                    continue
-                logger.debug("Assigning name/id dict: {} = {}".format(group['keys']['name'], group['keys']['sgid']))
-                outlist[group['keys']['name']] = group['keys']['sgid']
-        else:
-            logger.error("Received empty group cache while retrieving group cache from TS3 server. 1024 error.")
-        logger.debug("Returning name/id pairing: %s" % outlist)
-        return outlist
+        return self._user_group_lists([cldbid])[cldbid]
+
+    def _user_group_lists(self, cldbids):
+        """Retrieve the name/id pairings of the groups of many users in one round trip"""
+        logger.debug("Retrieving group lists for %d users" % len(cldbids))
+        results = self.server.send_commands(
+            [('servergroupsbyclientid', {'cldbid': cldbid}) for cldbid in cldbids]
+        )
+        group_lists = {}
+        for cldbid, groups in zip(cldbids, results):
+            if isinstance(groups, TeamspeakError):
+                if groups.code == '1281': # no groups
+                    groups = []
+                else:
+                    raise groups
+            if isinstance(groups, dict):
+                groups = [groups]
+            group_lists[cldbid] = {group['keys']['name']: group['keys']['sgid'] for group in groups}
+            logger.debug("Group list of user %s: %s" % (cldbid, group_lists[cldbid]))
+        return group_lists
+
+    def _group_list(self, refresh=False):
+        return dict(self._group_table(refresh=refresh))
 
     def _add_user_to_group(self, uid, groupid):
         logger.debug(f"Adding group id {groupid} to TS3 user id {uid}")
@@ -158,7 +176,7 @@ class Teamspeak3Manager:
 
     def _sync_ts_group_db(self):
         try:
-            remote_groups = self._group_list()
+            remote_groups = self._group_list(refresh=True)
             managed_groups = {g:int(remote_groups[g]) for g in remote_groups if g in set(remote_groups.keys()) - set(ReservedGroupName.objects.values_list('name', flat=True))}
             remove = TSgroup.objects.exclude(ts_group_id__in=managed_groups.values())
 
@@ -208,20 +226,19 @@ class Teamspeak3Manager:
         user = self._get_userid(uid)
         logger.debug(f"Deleting user {user} with id {uid} from TS3 server.")
         if user:
-            clients = self.server.send_command('clientlist')
-            if isinstance(clients, dict):
-                # Rewrap list
-                clients = [clients]
-
-            for client in clients:
+            clids = []
+            for client in self.server.iter_command('clientlist'):
                 try:
                     if client['keys']['client_database_id'] == user:
-                        logger.debug("Found user %s on TS3 server - issuing deletion command." % user)
-                        self.server.send_command('clientkick', {'clid': client['keys']['clid'], 'reasonid': 5,
-                                                                'reasonmsg': 'Auth service deleted'})
+                        clids.append(client['keys']['clid'])
                 except:
                     logger.exception(f"Failed to delete user id {uid} from TS3 - received response {client}")
                     return False
+
+            for clid in clids:
+                logger.debug("Found user %s on TS3 server - issuing deletion command." % user)
+                self.server.send_command('clientkick', {'clid': clid, 'reasonid': 5,
+                                                        'reasonmsg': 'Auth service deleted'})
             try:
                 ret = self.server.send_command('clientdbdelete', {'cldbid': user})
             except TeamspeakError as e:
@@ -249,28 +266,56 @@ class Teamspeak3Manager:
         return self.add_user(user, username)
 
     def update_groups(self, uid, ts_groups):
-        logger.debug(f"Updating uid {uid} TS3 groups {ts_groups}")
-        userid = self._get_userid(uid)
-        addgroups = []
-        remgroups = []
-        if userid is not None:
-            user_ts_groups = self._user_group_list(userid)
-            logger.debug("User has groups on TS3 server: %s" % user_ts_groups)
-            for key in user_ts_groups:
-                user_ts_groups[key] = int(user_ts_groups[key])
-            for ts_group_key in ts_groups:
-                logger.debug("Checking if user has group %s on TS3 server." % ts_group_key)
-                if ts_groups[ts_group_key] not in user_ts_groups.values():
-                    addgroups.append(ts_groups[ts_group_key])
-            for user_ts_group_key in user_ts_groups:
-                if user_ts_groups[user_ts_group_key] not in ts_groups.values():
-                    if not ReservedGroupName.objects.filter(name=user_ts_group_key).exists():
-                        remgroups.append(user_ts_groups[user_ts_group_key])
-
-            for g in addgroups:
-                logger.info(f"Adding Teamspeak user {userid} into group {g}")
-                self._add_user_to_group(userid, g)
-
-            for g in remgroups:
-                logger.info(f"Removing Teamspeak user {userid} from group {g}")
-                self._remove_user_from_group(userid, g)
+        self.update_groups_bulk({uid: ts_groups})
+
+    def update_groups_bulk(self, ts_groups_by_uid):
+        """Update the groups of many users with a few round trips
+
+        :param ts_groups_by_uid: name/id pairing of the groups each uid should have
+        """
+        logger.debug(f"Updating TS3 groups of {len(ts_groups_by_uid)} uids")
+        userids = self._get_userids(list(ts_groups_by_uid.keys()))
+        if not userids:
+            return
+        user_group_lists = self._user_group_lists(list(userids.values()))
+        reserved_names = set(ReservedGroupName.objects.values_list('name', flat=True))
+        addgroups = {}
+        remgroups = {}
+        for uid, userid in userids.items():
+            groups = {int(sgid) for sgid in ts_groups_by_uid[uid].values()}
+            user_ts_groups = {name: int(sgid) for name, sgid in user_group_lists[userid].items()}
+            logger.debug("User %s has groups on TS3 server: %s" % (userid, user_ts_groups))
+            for sgid in groups - set(user_ts_groups.values()):
+                addgroups.setdefault(sgid, []).append(userid)
+            for name, sgid in user_ts_groups.items():
+                if sgid not in groups and name not in reserved_names:
+                    remgroups.setdefault(sgid, []).append(userid)
+        self._update_group_memberships(addgroups, remgroups)
+
+    def _update_group_memberships(self, addgroups, remgroups):
+        """Add and remove users to groups in one round trip,
+        with one pipe separated command for all users of a group
+
+        :param addgroups: users to add by group id
+        :param remgroups: users to remove by group id
+        """
+        commands = [
+            ('servergroupaddclient', {'sgid': sgid, 'cldbid': userids})
+            for sgid, userids in addgroups.items()
+        ] + [
+            ('servergroupdelclient', {'sgid': sgid, 'cldbid': userids})
+            for sgid, userids in remgroups.items()
+        ]
+        if not commands:
+            return
+        results = self.server.send_commands(commands)
+        errors = []
+        for (command, keys), result in zip(commands, results):
+            action = 'Added' if command == 'servergroupaddclient' else 'Removed'
+            if isinstance(result, TeamspeakError):
+                logger.error(f"Failed to update group id {keys['sgid']} of TS3 users {keys['cldbid']}: {result}")
+                errors.append(result)
+            else:
+                logger.info(f"{action} TS3 users {keys['cldbid']} for group id {keys['sgid']}")
+        if errors:
+            raise errors[0]
@@ -7,7 +7,7 @@ from allianceauth.services.tasks import QueueOnce
 from allianceauth.notifications import notify
 from allianceauth.services.hooks import NameFormatter
 from .manager import Teamspeak3Manager
-from .models import AuthTS, TSgroup, UserTSgroup, Teamspeak3User
+from .models import AuthTS, StateGroup, TSgroup, UserTSgroup, Teamspeak3User
 from .util.ts3 import TeamspeakError
 
 logger = logging.getLogger(__name__)
@@ -36,6 +36,13 @@ class Teamspeak3Tasks:
         except ObjectDoesNotExist:
             return False
 
+    @staticmethod
+    def users_with_account(user_pks):
+        """Return the users of the given pks who have a teamspeak3 account"""
+        return User.objects\
+            .filter(pk__in=user_pks, teamspeak3__isnull=False)\
+            .exclude(teamspeak3__uid='')
+
     @staticmethod
     @shared_task
     def run_ts3_group_update():
@@ -82,6 +89,40 @@ class Teamspeak3Tasks:
         else:
             logger.debug("User does not have a teamspeak3 account")
 
+    @staticmethod
+    @shared_task(bind=True, name="teamspeak3.update_groups_bulk")
+    def update_groups_bulk(self, pks):
+        logger.debug("Updating teamspeak3 groups for %d users", len(pks))
+        users = Teamspeak3Tasks.users_with_account(pks)\
+            .select_related('profile', 'teamspeak3')\
+            .prefetch_related('groups')
+        # resolve the group mappings once for all users
+        auth_groups = {}
+        for auth_ts in AuthTS.objects.prefetch_related('ts_group'):
+            auth_groups.setdefault(auth_ts.auth_group_id, []).extend(auth_ts.ts_group.all())
+        state_groups = {}
+        for stategroup in StateGroup.objects.select_related('ts_group'):
+            state_groups.setdefault(stategroup.state_id, []).append(stategroup.ts_group)
+        groups_by_uid = {}
+        for user in users:
+            ts_groups = [
+                ts_group
+                for usergroup in user.groups.all()
+                for ts_group in auth_groups.get(usergroup.pk, [])
+            ]
+            ts_groups += state_groups.get(user.profile.state_id, [])
+            groups = {ts_group.ts_group_name: ts_group.ts_group_id for ts_group in ts_groups}
+            logger.debug(f"Updating user {user} teamspeak3 groups to {groups}")
+            groups_by_uid[user.teamspeak3.uid] = groups
+        if not groups_by_uid:
+            return
+        try:
+            with Teamspeak3Manager() as ts3man:
+                ts3man.update_groups_bulk(groups_by_uid)
+        except TeamspeakError as e:
+            logger.error(f"Error occured while syncing TS groups in bulk: {str(e)}")
+            raise self.retry(countdown=60*10)
+
     @staticmethod
     @shared_task(name="teamspeak3.update_all_groups")
     def update_all_groups():
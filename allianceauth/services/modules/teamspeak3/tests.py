@@ -15,7 +15,7 @@ from .signals import m2m_changed_authts_group, post_save_authts, post_delete_aut
 from .admin import AuthTSgroupAdmin
 
 from .manager import Teamspeak3Manager
-from .util.ts3 import TeamspeakError
+from .util.ts3 import CommandPacer, TS3ConnectionPool, TS3Server, TeamspeakError, get_pool
 from allianceauth.groupmanagement.models import ReservedGroupName
 
 MODULE_PATH = 'allianceauth.services.modules.teamspeak3'
@@ -90,6 +90,32 @@ class Teamspeak3HooksTestCase(TestCase):
             service.update_groups(none_user)
             self.assertFalse(manager.return_value.__enter__.return_value.update_user_groups.called)
 
+    @mock.patch(MODULE_PATH + '.tasks.Teamspeak3Manager')
+    def test_update_groups_bulk(self, manager):
+        instance = manager.return_value.__enter__.return_value
+        service = self.service()
+        member = User.objects.get(username=self.member)
+        none_user = User.objects.get(username=self.none_user)
+
+        service.update_groups_bulk([member, none_user])
+
+        # one connection for all users
+        self.assertEqual(manager.call_count, 1)
+        instance.update_groups_bulk.assert_called_once_with({self.member: {'Member': 1, 'State': 2}})
+
+    @mock.patch(MODULE_PATH + '.tasks.Teamspeak3Manager')
+    def test_validate_users_bulk(self, manager):
+        service = self.service()
+        member = User.objects.get(username=self.member)
+        none_user = User.objects.get(username=self.none_user)
+        Teamspeak3User.objects.create(user=none_user, uid='abc123', perm_key='132ACB')
+
+        service.validate_users_bulk([member, none_user])
+
+        self.assertTrue(User.objects.get(username=self.member).teamspeak3)
+        with self.assertRaises(ObjectDoesNotExist):
+            User.objects.get(username=self.none_user).teamspeak3
+
     @mock.patch(MODULE_PATH + '.tasks.Teamspeak3Manager')
     def test_validate_user(self, manager):
         service = self.service()
@@ -345,47 +371,87 @@ class Teamspeak3ManagerTestCase(TestCase):
         # perform test
         manager.add_user(user, "Dummy User")
 
-    @mock.patch.object(Teamspeak3Manager, '_get_userid')
-    @mock.patch.object(Teamspeak3Manager, '_user_group_list')
-    @mock.patch.object(Teamspeak3Manager, '_add_user_to_group')
-    @mock.patch.object(Teamspeak3Manager, '_remove_user_from_group')
-    def test_update_groups_add(self, remove, add, groups, userid):
+    @mock.patch.object(Teamspeak3Manager, '_get_userids')
+    @mock.patch.object(Teamspeak3Manager, '_user_group_lists')
+    @mock.patch.object(Teamspeak3Manager, '_update_group_memberships')
+    def test_update_groups_add(self, update, groups, userids):
         """Add to one group"""
-        userid.return_value = 1
-        groups.return_value = {'test': 1}
+        userids.return_value = {1: '1'}
+        groups.return_value = {'1': {'test': '1'}}
 
         Teamspeak3Manager().update_groups(1, {'test': 1, 'dummy': 2})
-        self.assertEqual(add.call_count, 1)
-        self.assertEqual(remove.call_count, 0)
-        self.assertEqual(add.call_args[0][1], 2)
-
-    @mock.patch.object(Teamspeak3Manager, '_get_userid')
-    @mock.patch.object(Teamspeak3Manager, '_user_group_list')
-    @mock.patch.object(Teamspeak3Manager, '_add_user_to_group')
-    @mock.patch.object(Teamspeak3Manager, '_remove_user_from_group')
-    def test_update_groups_remove(self, remove, add, groups, userid):
+        update.assert_called_once_with({2: ['1']}, {})
+
+    @mock.patch.object(Teamspeak3Manager, '_get_userids')
+    @mock.patch.object(Teamspeak3Manager, '_user_group_lists')
+    @mock.patch.object(Teamspeak3Manager, '_update_group_memberships')
+    def test_update_groups_remove(self, update, groups, userids):
         """Remove from one group"""
-        userid.return_value = 1
-        groups.return_value = {'test': '1', 'dummy': '2'}
+        userids.return_value = {1: '1'}
+        groups.return_value = {'1': {'test': '1', 'dummy': '2'}}
 
         Teamspeak3Manager().update_groups(1, {'test': 1})
-        self.assertEqual(add.call_count, 0)
-        self.assertEqual(remove.call_count, 1)
-        self.assertEqual(remove.call_args[0][1], 2)
-
-    @mock.patch.object(Teamspeak3Manager, '_get_userid')
-    @mock.patch.object(Teamspeak3Manager, '_user_group_list')
-    @mock.patch.object(Teamspeak3Manager, '_add_user_to_group')
-    @mock.patch.object(Teamspeak3Manager, '_remove_user_from_group')
-    def test_update_groups_remove_reserved(self, remove, add, groups, userid):
+        update.assert_called_once_with({}, {2: ['1']})
+
+    @mock.patch.object(Teamspeak3Manager, '_get_userids')
+    @mock.patch.object(Teamspeak3Manager, '_user_group_lists')
+    @mock.patch.object(Teamspeak3Manager, '_update_group_memberships')
+    def test_update_groups_remove_reserved(self, update, groups, userids):
         """Remove from one group, but do not touch reserved group"""
-        userid.return_value = 1
-        groups.return_value = {'test': 1, 'dummy': 2, self.reserved.name: 3}
+        userids.return_value = {1: '1'}
+        groups.return_value = {'1': {'test': '1', 'dummy': '2', self.reserved.name: '3'}}
 
         Teamspeak3Manager().update_groups(1, {'test': 1})
-        self.assertEqual(add.call_count, 0)
-        self.assertEqual(remove.call_count, 1)
-        self.assertEqual(remove.call_args[0][1], 2)
+        update.assert_called_once_with({}, {2: ['1']})
+
+    @mock.patch.object(Teamspeak3Manager, '_get_userids')
+    @mock.patch.object(Teamspeak3Manager, '_user_group_lists')
+    @mock.patch.object(Teamspeak3Manager, '_update_group_memberships')
+    def test_update_groups_bulk_by_group(self, update, groups, userids):
+        """Changes of many users to the same group are combined"""
+        userids.return_value = {'a': '1', 'b': '2'}
+        groups.return_value = {'1': {'old': '3'}, '2': {'old': '3'}}
+
+        Teamspeak3Manager().update_groups_bulk(
+            {'a': {'new': 4}, 'b': {'new': 4}, 'unknown': {'new': 4}}
+        )
+        update.assert_called_once_with({4: ['1', '2']}, {3: ['1', '2']})
+
+    def test_update_group_memberships_in_one_round_trip(self):
+        manager = Teamspeak3Manager()
+        manager._server = mock.MagicMock()
+        manager._server.send_commands.return_value = ['0', '0']
+
+        manager._update_group_memberships({4: ['1', '2']}, {3: ['1']})
+
+        manager._server.send_commands.assert_called_once_with([
+            ('servergroupaddclient', {'sgid': 4, 'cldbid': ['1', '2']}),
+            ('servergroupdelclient', {'sgid': 3, 'cldbid': ['1']}),
+        ])
+
+    def test_update_group_memberships_raise_error(self):
+        manager = Teamspeak3Manager()
+        manager._server = mock.MagicMock()
+        manager._server.send_commands.return_value = ['0', TeamspeakError(2560)]
+
+        with self.assertRaises(TeamspeakError):
+            manager._update_group_memberships({4: ['1']}, {3: ['1']})
+
+    def test_group_table_is_cached_per_connection(self):
+        manager = Teamspeak3Manager()
+        manager._server = mock.MagicMock(group_cache=None)
+        manager._server.iter_command.side_effect = lambda command: iter([
+            {'keys': {'name': 'Member', 'sgid': '1', 'type': '1'}},
+            {'keys': {'name': 'Template', 'sgid': '2', 'type': '0'}},
+        ])
+
+        self.assertEqual(manager._group_id_by_name('Member'), '1')
+        self.assertEqual(manager._group_list(), {'Member': '1'})
+        self.assertIsNone(manager._group_id_by_name('Template'))
+        self.assertEqual(manager._server.iter_command.call_count, 1)
+
+        manager._group_list(refresh=True)
+        self.assertEqual(manager._server.iter_command.call_count, 2)
 
     @mock.patch.object(Teamspeak3Manager, '_group_list')
     def test_sync_group_db_create(self, group_list):
@@ -438,6 +504,292 @@ class Teamspeak3ManagerTestCase(TestCase):
         self.assertEqual(TSgroup.objects.all().count(), 1)
 
 
+class FakeTelnet:
+    """Telnet connection to a TS3 server answering every command with success"""
+
+    def __init__(self, host=None, port=None, timeout=None):
+        self.sent = []
+        self.closed = False
+        self.responses = []
+
+    def read_until(self, match, timeout=None):
+        return b'TS3\n\r'
+
+    def read_some(self):
+        if self.closed:
+            return b''
+        if self.responses:
+            return self.responses.pop(0)
+        return b'error id=0 msg=ok\n\r'
+
+    def read_very_eager(self):
+        if self.closed:
+            raise EOFError
+        return b''
+
+    def write(self, buffer):
+        if self.closed:
+            raise OSError
+        self.sent.append(buffer.decode('utf-8').strip())
+
+    def close(self):
+        self.closed = True
+
+
+@mock.patch(MODULE_PATH + '.util.ts3.telnetlib.Telnet', FakeTelnet)
+class TS3ServerTestCase(TestCase):
+    def test_reconnect_when_connection_was_closed(self):
+        server = TS3Server('127.0.0.1', 10011)
+        server.login('serveradmin', 'password')
+        server.use(1)
+        server._conn.closed = True
+
+        server.send_command('servergrouplist')
+
+        self.assertTrue(server._connected)
+        self.assertEqual(
+            server._conn.sent,
+            [
+                'login client_login_name=serveradmin client_login_password=password',
+                'use sid=1',
+                'servergrouplist',
+            ]
+        )
+
+    def test_raise_connection_lost_while_sending(self):
+        server = TS3Server('127.0.0.1', 10011)
+        server._conn.write = mock.Mock(side_effect=OSError)
+
+        with self.assertRaises(TeamspeakError) as cm:
+            server.send_command('servergrouplist')
+
+        self.assertEqual(cm.exception.code, '1793')
+        self.assertFalse(server._connected)
+
+    def test_send_commands_in_one_round_trip(self):
+        server = TS3Server('127.0.0.1', 10011)
+        server._conn.responses = [
+            b'error id=0 msg=ok\n\r',
+            b'error id=2560 msg=invalid\\sgroupID\n\r',
+        ]
+
+        results = server.send_commands([
+            ('servergroupaddclient', {'sgid': 1, 'cldbid': ['2', '3']}),
+            ('servergroupdelclient', {'sgid': 4, 'cldbid': ['2']}),
+        ])
+
+        self.assertEqual(
+            server._conn.sent,
+            ['servergroupaddclient sgid=1 cldbid=2|cldbid=3\nservergroupdelclient sgid=4 cldbid=2']
+        )
+        self.assertEqual(results[0], '0')
+        self.assertIsInstance(results[1], TeamspeakError)
+        self.assertEqual(results[1].code, '2560')
+
+    @mock.patch(MODULE_PATH + '.util.ts3.time')
+    def test_send_commands_in_batches_within_flood_limit(self, mock_time):
+        mock_time.monotonic.return_value = 100.0
+        server = TS3Server('127.0.0.1', 10011)
+        server.pacer = CommandPacer(2, 3)
+        server._conn.sent = []
+
+        results = server.send_commands([('version',)] * 3)
+
+        self.assertEqual(server._conn.sent, ['version\nversion', 'version'])
+        self.assertEqual(results, ['0', '0', '0'])
+
+    def test_invalidate_group_cache_when_adding_groups(self):
+        server = TS3Server('127.0.0.1', 10011)
+        server.group_cache = (0, {'Member': '1'})
+        server._conn.responses = [b'sgid=2\n\r', b'error id=0 msg=ok\n\r']
+
+        server.send_command('servergroupadd', {'name': 'New'})
+
+        self.assertIsNone(server.group_cache)
+
+    def test_iter_command_yields_records_as_they_arrive(self):
+        server = TS3Server('127.0.0.1', 10011)
+        server._conn.responses = [
+            b'cldbid=1 client_nickname=Bruce\\sWayne|cld',
+            b'bid=2 client_nickname=Clark\\pKent\n\rcldbid=3\n\r',
+            b'error id=0 msg=ok\n\r',
+        ]
+
+        records = server.iter_command('clientdblist')
+        first = next(records)
+
+        self.assertEqual(first['keys'], {'cldbid': '1', 'client_nickname': 'Bruce Wayne'})
+        self.assertEqual(len(server._conn.responses), 2)
+        self.assertEqual(
+            [record['keys'] for record in records],
+            [{'cldbid': '2', 'client_nickname': 'Clark|Kent'}, {'cldbid': '3'}]
+        )
+
+    def test_iter_command_reconnects_when_connection_was_closed(self):
+        server = TS3Server('127.0.0.1', 10011)
+        server.login('serveradmin', 'password')
+        server.use(1)
+        server._conn.closed = True
+        server._conn.responses = []
+
+        records = list(server.iter_command('clientdblist'))
+
+        self.assertTrue(server._connected)
+        self.assertEqual(records, [])
+        self.assertEqual(
+            server._conn.sent,
+            [
+                'login client_login_name=serveradmin client_login_password=password',
+                'use sid=1',
+                'clientdblist',
+            ]
+        )
+
+    def test_iter_command_invalidates_group_cache(self):
+        server = TS3Server('127.0.0.1', 10011)
+        server.group_cache = (0, {'Member': '1'})
+        server._conn.responses = [b'sgid=2\n\r', b'error id=0 msg=ok\n\r']
+
+        list(server.iter_command('servergroupadd', {'name': 'New'}))
+
+        self.assertIsNone(server.group_cache)
+
+    def test_iter_command_raises_error(self):
+        server = TS3Server('127.0.0.1', 10011)
+        server._conn.responses = [b'error id=1281 msg=database\\sempty\\sresult\\sset\n\r']
+
+        with self.assertRaises(TeamspeakError) as cm:
+            list(server.iter_command('clientdblist'))
+
+        self.assertEqual(cm.exception.code, '1281')
+
+    def test_iter_command_consumes_rest_when_closed_early(self):
+        server = TS3Server('127.0.0.1', 10011)
+        server._conn.responses = [
+            b'cldbid=1|cldbid=2\n\rerror id=0 msg=ok\n\r',
+            b'version=3.13.7 build=1 platform=Linux\n\rerror id=0 msg=ok\n\r',
+        ]
+
+        records = server.iter_command('clientdblist')
+        next(records)
+        records.close()
+
+        self.assertEqual(server.send_command('version')['keys']['version'], '3.13.7')
+
+    def test_send_command_keeps_lines_and_records(self):
+        server = TS3Server('127.0.0.1', 10011)
+        server._conn.responses = [b'sgid=1|sgid=2\n\rsgid=3\n\rerror id=0 msg=ok\n\r']
+
+        result = server.send_command('servergrouplist')
+
+        self.assertEqual(
+            result, [[{'keys': {'sgid': '1'}, 'opts': []}, {'keys': {'sgid': '2'}, 'opts': []}], {'keys': {'sgid': '3'}, 'opts': []}]
+        )
+
+    def test_escape_roundtrip(self):
+        value = 'a b|c/d\\s\n'
+
+        escaped = TS3Server._escape_str(value)
+
+        self.assertEqual(escaped, 'a\\sb\\pc\\/d\\\\s\\n')
+        self.assertEqual(TS3Server._unescape_str(escaped), value)
+
+    def test_keepalive_reconnects_lost_connection(self):
+        server = TS3Server('127.0.0.1', 10011)
+        server.login('serveradmin', 'password')
+        old_conn = server._conn
+        old_conn.write = mock.Mock(side_effect=OSError)
+
+        server.keepalive()
+
+        self.assertTrue(server._connected)
+        self.assertIsNot(server._conn, old_conn)
+
+
+@mock.patch(MODULE_PATH + '.util.ts3.telnetlib.Telnet', FakeTelnet)
+class TS3ConnectionPoolTestCase(TestCase):
+    def setUp(self):
+        self.pool = TS3ConnectionPool('127.0.0.1', 10011, 'serveradmin', 'password', 1, size=1)
+
+    def test_reuse_released_connection(self):
+        server = self.pool.acquire()
+        self.pool.release(server)
+
+        self.assertIs(self.pool.acquire(), server)
+        self.assertEqual(server._conn.sent[:2], ['login client_login_name=serveradmin client_login_password=password', 'use sid=1'])
+
+    def test_open_new_connection_when_all_are_in_use(self):
+        server_1 = self.pool.acquire()
+        server_2 = self.pool.acquire()
+
+        self.assertIsNot(server_1, server_2)
+
+    def test_close_connections_exceeding_size(self):
+        server_1 = self.pool.acquire()
+        server_2 = self.pool.acquire()
+        self.pool.release(server_1)
+        self.pool.release(server_2)
+
+        self.assertTrue(server_1._connected)
+        self.assertFalse(server_2._connected)
+
+    def test_do_not_reuse_lost_connection(self):
+        server = self.pool.acquire()
+        server._connected = False
+        self.pool.release(server)
+
+        self.assertIsNot(self.pool.acquire(), server)
+
+    def test_send_keepalive_for_idle_connection(self):
+        server = self.pool.acquire()
+        self.pool.release(server)
+        server.last_used -= self.pool.keepalive_interval + 1
+
+        self.pool.acquire()
+
+        self.assertEqual(server._conn.sent[-1], 'version')
+
+    def test_pool_per_process(self):
+        args = ('127.0.0.1', 10011, 'serveradmin', 'password', 1)
+        pool = get_pool(*args)
+        self.assertIs(get_pool(*args), pool)
+        with mock.patch(MODULE_PATH + '.util.ts3.os.getpid', return_value=-1):
+            self.assertIsNot(get_pool(*args), pool)
+
+    @mock.patch(MODULE_PATH + '.manager.get_pool')
+    def test_manager_uses_pool(self, get_pool):
+        with Teamspeak3Manager() as ts3man:
+            server = ts3man.server
+
+        get_pool.return_value.acquire.assert_called_once_with()
+        get_pool.return_value.release.assert_called_once_with(server)
+
+
+class CommandPacerTestCase(TestCase):
+    @mock.patch(MODULE_PATH + '.util.ts3.time')
+    def test_wait_when_flood_limit_is_reached(self, mock_time):
+        mock_time.monotonic.return_value = 100.0
+        pacer = CommandPacer(2, 3)
+
+        pacer.wait()
+        pacer.wait()
+        self.assertFalse(mock_time.sleep.called)
+
+        mock_time.monotonic.return_value = 101.0
+        pacer.wait()
+        mock_time.sleep.assert_called_once_with(2.0)
+
+    @mock.patch(MODULE_PATH + '.util.ts3.time')
+    def test_do_not_wait_when_disabled(self, mock_time):
+        mock_time.monotonic.return_value = 100.0
+        pacer = CommandPacer(0, 3)
+
+        for _ in range(100):
+            pacer.wait()
+
+        self.assertFalse(mock_time.sleep.called)
+
+
 class MockRequest:
     pass
 
@@ -1,5 +1,10 @@
-import telnetlib
 import logging
+import os
+import re
+import telnetlib
+import threading
+import time
+from collections import deque
 
 
 class ConnectionError:
@@ -25,20 +30,111 @@ ts3_escape = {
 }
 
 
+# single pass translations between strings and their TS3 escaped form
+ts3_escape_table = str.maketrans({'\\': r'\\', **ts3_escape})
+ts3_unescape = {escaped[1]: char for char, escaped in ts3_escape.items()}
+ts3_unescape['\\'] = '\\'
+ts3_unescape_pattern = re.compile(r'\\(.)')
+
+
+class ResponseReader:
+    """
+    Buffered reader splitting the byte stream of a ServerQuery connection into records.
+    Records are separated by pipes and lines end with a newline,
+    so each record can be handed out as soon as it has arrived,
+    without waiting for the rest of its line.
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._buffer = bytearray()
+        self._scanned = 0
+
+    def clear(self):
+        """
+        Discard any buffered bytes
+        """
+        self._buffer.clear()
+        self._scanned = 0
+        self._conn.read_very_eager()
+
+    def read_record(self):
+        """
+        Return the next record and whether it is the last record of its line.
+        Raises EOFError if the connection has been closed.
+        """
+        while True:
+            pipe = self._buffer.find(b'|', self._scanned)
+            newline = self._buffer.find(
+                b'\n', self._scanned, pipe if pipe >= 0 else len(self._buffer)
+            )
+            pos = newline if newline >= 0 else pipe
+            if pos >= 0:
+                record = bytes(self._buffer[:pos]).lstrip(b'\r')
+                end_of_line = self._buffer[pos] == ord('\n')
+                del self._buffer[:pos + 1]
+                self._scanned = 0
+                return record, end_of_line
+            self._scanned = len(self._buffer)
+            chunk = self._conn.read_some()
+            if not chunk:
+                raise EOFError('Connection closed by TS3 server')
+            self._buffer += chunk
+
+
+class CommandPacer:
+    """Paces commands to stay under the flood protection of a TS3 server,
+    which allows a number of commands within a time window per client IP.
+
+    The budget is only shared by the threads of one process,
+    so with several worker processes it has to be divided between them.
+
+    Args:
+        - commands: max number of commands per time window, 0 disables pacing
+        - seconds: length of the time window in seconds
+    """
+
+    def __init__(self, commands: int, seconds: float):
+        self.commands = commands
+        self.seconds = seconds
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """Block until the next command can be sent."""
+        if not self.commands:
+            return
+        with self._lock:
+            now = time.monotonic()
+            while self._sent and now - self._sent[0] >= self.seconds:
+                self._sent.popleft()
+            if len(self._sent) >= self.commands:
+                time.sleep(self.seconds - (now - self._sent[0]))
+                self._sent.popleft()
+                now = time.monotonic()
+            self._sent.append(now)
+
+
 class TS3Proto:
     bytesin = 0
     bytesout = 0
 
     EOL = b'\n\r'
 
+    # max number of commands written before their responses are read
+    PIPELINE_SIZE = 100
+
     def __init__(self):
         self._log = logging.getLogger(f'{__name__}.{self.__class__.__name__}')
         self._conn = None
         self._connected = False
+        self.pacer = None
+        self.last_used = time.monotonic()
 
     def connect(self, ip, port):
         try:
             self._conn = telnetlib.Telnet(host=ip, port=port, timeout=5)
+            self._reader = ResponseReader(self._conn)
             self._connected = True
         except:
             # raise ConnectionError(ip, port)
@@ -63,32 +159,112 @@ class TS3Proto:
             self._log.info("Not connected")
 
     def send_command(self, command, keys=None, opts=None):
-        cmd = self.construct_command(command, keys=keys, opts=opts)
+        result = self.send_commands([(command, keys, opts)])[0]
+        if isinstance(result, TeamspeakError):
+            raise result
+        return result
 
-        # Clear read buffer of any stray bytes
-        self._conn.read_very_eager()
+    def send_commands(self, commands):
+        """
+        Sends several commands in one round trip and returns their results in order.
+        Commands failing on the server do not stop the others,
+        their result is the TeamspeakError instead.
+        @param commands: Commands as tuples of command and optionally keys and opts
+        @type commands: list
+        """
+        # never write more commands at once than the flood protection allows
+        size = self.PIPELINE_SIZE
+        if self.pacer and self.pacer.commands:
+            size = min(size, self.pacer.commands)
+        results = []
+        for i in range(0, len(commands), size):
+            results += self._send_pipelined(commands[i:i + size])
+        return results
+
+    def _send_pipelined(self, commands):
+        cmds = [self.construct_command(*command) for command in commands]
+        if self.pacer:
+            for _ in cmds:
+                self.pacer.wait()
 
-        # Send command
-        self.send('%s\n' % cmd)
+        try:
+            # Clear read buffer of any stray bytes
+            self._reader.clear()
 
-        data = []
+            # Send commands
+            self.send(''.join('%s\n' % cmd for cmd in cmds))
+
+            results = [self._read_response() for _ in cmds]
+        except (EOFError, OSError) as e:
+            self._connected = False
+            raise TeamspeakError('1793') from e
+        self.last_used = time.monotonic()
+        return results
+
+    def iter_command(self, command, keys=None, opts=None):
+        """
+        Sends a command and yields the records of its result as they arrive,
+        so that large results do not have to be held in memory.
+        No other commands can be sent before the generator has been exhausted or closed.
+        @param command: Command
+        @type command: string
+        @param keys: Key/Value pairs
+        @type keys: dict
+        @param opts: Options
+        @type opts: list
+        """
+        cmd = self.construct_command(command, keys=keys, opts=opts)
+        if self.pacer:
+            self.pacer.wait()
 
-        max_loop = 10000
+        records = self._iter_response()
+        try:
+            self._reader.clear()
+            self.send('%s\n' % cmd)
+            for record, _ in records:
+                if record.get('command') == 'error':
+                    if record['keys']['id'] != '0':
+                        raise TeamspeakError(record['keys']['id'])
+                    break
+                yield record
+        except (EOFError, OSError) as e:
+            self._connected = False
+            raise TeamspeakError('1793') from e
+        finally:
+            if self._connected:
+                # consume the rest of the response when the caller stopped early
+                try:
+                    for record, _ in records:
+                        pass
+                except (EOFError, OSError):
+                    self._connected = False
+        self.last_used = time.monotonic()
+
+    def _iter_response(self):
+        """
+        Yields the records of the next response with whether they end their line,
+        up to and including the closing error record
+        """
+        start_of_line = True
         while True:
-            resp = self._conn.read_until(self.EOL)
-            resp = self.parse_command(resp.decode('utf-8'))
-            if 'command' in resp:
-                break
-            else:
-                data.append(resp)
-            max_loop -= 1
-            # Prevent infinite loops
-            if max_loop <= 0:
-                self._log.error("Maximum loop counter reached, aborting to prevent infinite loop.")
-                break
+            record, end_of_line = self._reader.read_record()
+            if start_of_line and record.startswith(b'error '):
+                yield self.parse_command(record.decode('utf-8')), True
+                return
+            start_of_line = end_of_line
+            yield self.parse_command(record.decode('utf-8')), end_of_line
+
+    def _read_response(self):
+        data = []
+        line = []
 
-        # Clear read buffer of any stray bytes
-        self._conn.read_very_eager()
+        for resp, end_of_line in self._iter_response():
+            if resp.get('command') == 'error':
+                break
+            line.append(resp)
+            if end_of_line:
+                data.append(line[0] if len(line) == 1 else line)
+                line = []
 
         if resp['command'] == 'error':
             if resp['keys']['id'] == '0':
@@ -100,7 +276,7 @@ class TS3Proto:
                 else:
                     return resp['keys']['id']
             else:
-                raise TeamspeakError(resp['keys']['id'])
+                return TeamspeakError(resp['keys']['id'])
 
     def construct_command(self, command, keys=None, opts=None):
         """
@@ -183,10 +359,7 @@ class TS3Proto:
 
         if isinstance(value, int):
             return "%d" % value
-        value = value.replace("\\", r'\\')
-        for i, j in ts3_escape.items():
-            value = value.replace(i, j)
-        return value
+        return value.translate(ts3_escape_table)
 
     @staticmethod
     def _unescape_str(value):
@@ -198,10 +371,9 @@ class TS3Proto:
 
         if isinstance(value, int):
             return "%d" % value
-        value = value.replace(r"\\", "\\")
-        for i, j in ts3_escape.items():
-            value = value.replace(j, i)
-        return value
+        return ts3_unescape_pattern.sub(
+            lambda match: ts3_unescape.get(match.group(1), match.group(0)), value
+        )
 
     def send(self, payload):
         if self._connected:
@@ -210,6 +382,9 @@ class TS3Proto:
 
 
 class TS3Server(TS3Proto):
+    # commands changing the server groups
+    GROUP_COMMANDS = {'servergroupadd', 'servergroupdel', 'servergrouprename', 'servergroupcopy'}
+
     def __init__(self, ip, port, id=0):
         """
         Abstraction class for TS3 Servers
@@ -219,9 +394,76 @@ class TS3Server(TS3Proto):
         @type port: int
         """
         TS3Proto.__init__(self)
+        self._ip = ip
+        self._port = port
+        self._login = None
+        self._sid = None
+        self._reconnecting = False
+        self.group_cache = None
 
         self.connect(ip, port)
 
+    def send_commands(self, commands):
+        if self._login and not self._reconnecting and not self.is_alive():
+            self.reconnect()
+        if any(command[0] in self.GROUP_COMMANDS for command in commands):
+            self.group_cache = None
+        return super().send_commands(commands)
+
+    def iter_command(self, command, keys=None, opts=None):
+        if self._login and not self._reconnecting and not self.is_alive():
+            self.reconnect()
+        if command in self.GROUP_COMMANDS:
+            self.group_cache = None
+        return super().iter_command(command, keys=keys, opts=opts)
+
+    def is_alive(self):
+        """
+        Check without a round trip whether the connection is still open.
+        Connections closed by the server are only noticed here.
+        """
+        if not self._connected:
+            return False
+        try:
+            self._conn.read_very_eager()
+        except (EOFError, OSError):
+            self._connected = False
+        return self._connected
+
+    def keepalive(self):
+        """
+        Send a cheap command to keep the connection from idling out
+        and reconnect if it has been lost.
+        """
+        try:
+            self.send_command('version')
+        except TeamspeakError as e:
+            if e.code != '1793':
+                raise
+            self._log.info('Lost connection to TS3 server, reconnecting')
+            self.reconnect()
+
+    def reconnect(self):
+        """
+        Open a new connection and restore the login and selected virtual server.
+        """
+        self._log.info('Reconnecting to %s port %s', self._ip, self._port)
+        if self._conn:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._connected = False
+        self._reconnecting = True
+        try:
+            self.connect(self._ip, self._port)
+            if self._login:
+                self.login(*self._login)
+            if self._sid:
+                self.use(self._sid)
+        finally:
+            self._reconnecting = False
+
     def login(self, username, password):
         """
         Login to the TS3 Server
@@ -231,6 +473,7 @@ class TS3Server(TS3Proto):
         @type password: str
         """
         d = self.send_command('login', keys={'client_login_name': username, 'client_login_password': password})
+        self._login = (username, password)
         if d == 0:
             self._log.info('Login Successful')
             return True
@@ -260,6 +503,120 @@ class TS3Server(TS3Proto):
         """
         if self._connected and id > 0:
             self.send_command('use', keys={'sid': id})
+            self._sid = id
+
+
+class TS3ConnectionPool:
+    """
+    Pool of logged in ServerQuery connections to one virtual server.
+
+    Connections are kept open between operations and handed out again,
+    so that not every operation pays for connecting, login and selecting the server.
+    Connections that have been idle for longer than the keepalive interval
+    are checked with a keepalive command and reconnected if needed before they are handed out.
+    All connections of a pool share one pacer, because TS3 applies its flood protection per IP.
+
+    Args:
+        - size: max number of idle connections to keep
+        - keepalive_interval: seconds after which idle connections are checked
+        - flood_commands: max number of commands per flood time, 0 disables pacing
+        - flood_time: length of the flood protection window in seconds
+    """
+
+    def __init__(
+        self,
+        ip,
+        port,
+        username,
+        password,
+        virtual_server,
+        size=5,
+        keepalive_interval=240,
+        flood_commands=10,
+        flood_time=3
+    ):
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.password = password
+        self.virtual_server = virtual_server
+        self.size = size
+        self.keepalive_interval = keepalive_interval
+        self.pacer = CommandPacer(flood_commands, flood_time)
+        self._idle = []
+        self._lock = threading.Lock()
+        self._log = logging.getLogger(f'{__name__}.{self.__class__.__name__}')
+
+    def acquire(self):
+        """
+        Return an idle connection or open a new one
+        """
+        while True:
+            with self._lock:
+                server = self._idle.pop() if self._idle else None
+            if server is None:
+                return self._create_connection()
+            try:
+                if time.monotonic() - server.last_used > self.keepalive_interval:
+                    server.keepalive()
+                elif not server.is_alive():
+                    server.reconnect()
+                return server
+            except Exception:
+                self._log.warning('Discarding broken TS3 connection', exc_info=True)
+                self._close(server)
+
+    def release(self, server):
+        """
+        Hand a connection back to the pool. Lost connections and connections
+        exceeding the size of the pool are closed.
+        """
+        if server._connected:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(server)
+                    return
+        self._close(server)
+
+    def close(self):
+        """
+        Close all idle connections
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server in idle:
+            self._close(server)
+
+    def _create_connection(self):
+        self._log.debug('Opening new connection to %s port %s', self.ip, self.port)
+        server = TS3Server(self.ip, self.port)
+        server.pacer = self.pacer
+        server.login(self.username, self.password)
+        server.use(self.virtual_server)
+        return server
+
+    @staticmethod
+    def _close(server):
+        if server._connected:
+            server.disconnect()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(ip, port, username, password, virtual_server, **kwargs):
+    """
+    Return the connection pool for a virtual server.
+    Each process has its own pools, because connections can not be shared with forked processes.
+    """
+    key = (os.getpid(), ip, port, username, password, virtual_server)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = TS3ConnectionPool(ip, port, username, password, virtual_server, **kwargs)
+            _pools[key] = pool
+    return pool
 
 
 class TeamspeakError(Exception):
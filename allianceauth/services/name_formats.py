@@ -0,0 +1,114 @@
+"""Process-level table of the name formats configured for services."""
+
+import logging
+import threading
+from functools import lru_cache
+from string import Formatter
+from typing import Optional, Tuple
+
+from django.core.cache import cache as default_cache
+
+from allianceauth.utils.cache import CacheGeneration
+
+from .models import NameFormatConfig
+
+logger = logging.getLogger(__name__)
+
+
+class NameFormatIndex:
+    """Maps service names and state PKs to the name format configured for them.
+
+    The table is built from the database in one pass and kept in the memory of
+    each process. A generation counter shared through Django's cache tells processes
+    to rebuild it whenever a name format config or its states change.
+    Until an invalidation has been committed, the invalidating thread does not use
+    the table, so formats are never resolved from data of another transaction.
+
+    Args:
+        - cache: A Django cache backend. Will use the default cache by default
+    """
+
+    CACHE_KEY = "allianceauth-services-name-format-index-generation"
+
+    def __init__(self, cache=None) -> None:
+        self._generation_counter = CacheGeneration(self.CACHE_KEY, cache=cache or default_cache)
+        self._lock = threading.Lock()
+        self._table = None
+        self._generation = None
+
+    @property
+    def available(self) -> bool:
+        """Whether the table can be used by the current thread."""
+        return not self._generation_counter.pending
+
+    def invalidate(self):
+        """Discard the table. To be called whenever name format configs change."""
+        with self._lock:
+            self._table = None
+        self._generation_counter.invalidate()
+
+    def get(self) -> Optional[dict]:
+        """Return the current table or None when it can not be used."""
+        if not self.available:
+            return None
+        generation = self._generation_counter.get()
+        with self._lock:
+            if self._table is not None and self._generation == generation:
+                return self._table
+        logger.debug("Rebuilding name format index")
+        table = self.build()
+        with self._lock:
+            self._table = table
+            self._generation = generation
+        return table
+
+    def lookup(self, service_name: str, state_pk: int) -> Optional[NameFormatConfig]:
+        """Return the name format config of a service for a state
+        or None if there is none.
+        """
+        table = self.get()
+        if table is None:
+            return NameFormatConfig.objects.filter(
+                service_name=service_name, states__pk=state_pk
+            ).order_by('pk').first()
+        return table.get((service_name, state_pk))
+
+    @staticmethod
+    def build() -> dict:
+        """Build the table from the database."""
+        configs = {config.pk: config for config in NameFormatConfig.objects.all()}
+        table = {}
+        rows = (
+            NameFormatConfig.states.through.objects
+            .order_by("nameformatconfig_id")
+            .values_list("nameformatconfig_id", "state_id")
+        )
+        for config_pk, state_pk in rows:
+            config = configs[config_pk]
+            table.setdefault((config.service_name, state_pk), config)
+        return table
+
+
+name_format_index = NameFormatIndex()
+
+
+@lru_cache(maxsize=None)
+def parse_format(format_string: str) -> Tuple[tuple, ...]:
+    """Parse a name format into its literal text and replacement fields once."""
+    return tuple(Formatter().parse(format_string))
+
+
+def render_format(format_string: str, format_data: dict) -> str:
+    """Render a name format with the given data. Same result as ``str.format``."""
+    formatter = Formatter()
+    parts = []
+    for literal_text, field_name, format_spec, conversion in parse_format(format_string):
+        parts.append(literal_text)
+        if field_name is None:
+            continue
+        obj, _ = formatter.get_field(field_name, [], format_data)
+        obj = formatter.convert_field(obj, conversion)
+        if format_spec and "{" in format_spec:
+            format_spec = formatter.vformat(format_spec, [], format_data)
+        parts.append(formatter.format_field(obj, format_spec))
+    return "".join(parts)
@@ -0,0 +1,156 @@
+"""Progress tracking for revalidating service accounts in the background."""
+
+from typing import Dict, Optional, Tuple
+
+from django.contrib import messages
+from django.db import models
+from redis import Redis, RedisError
+
+from allianceauth.utils.cache import get_redis_client
+
+
+class RevalidationProgress:
+    """Tracks how many users are still waiting for their service accounts
+    to be revalidated after a change to an object, e.g. a group or state.
+
+    Progress is shared between processes through Redis and expires
+    when a revalidation is not advanced for some time, e.g. after a worker died.
+
+    Args:
+        - redis: A Redis client. Will use AA's cache client by default
+    """
+
+    CACHE_KEY_BASE = "allianceauth-services-revalidation"
+    TIMEOUT = 3600
+
+    def __init__(self, redis: Optional[Redis] = None) -> None:
+        self._redis = get_redis_client() if not redis else redis
+
+    @staticmethod
+    def label_for(obj: models.Model) -> str:
+        """Return the label identifying the revalidation of an object."""
+        return f"{obj._meta.concrete_model._meta.label_lower}-{obj.pk}"
+
+    @property
+    def _active_key(self) -> str:
+        return f"{self.CACHE_KEY_BASE}-active"
+
+    def _key(self, label: str) -> str:
+        return f"{self.CACHE_KEY_BASE}-{label}"
+
+    def start(self, label: str, total: int):
+        """Record that a revalidation of total users has been started."""
+        key = self._key(label)
+        with self._redis.pipeline() as pipe:
+            pipe.hincrby(key, "total", total)
+            pipe.hincrby(key, "remaining", total)
+            pipe.expire(key, self.TIMEOUT)
+            pipe.sadd(self._active_key, label)
+            pipe.execute()
+
+    def advance(self, label: str, count: int):
+        """Record that count users have been revalidated."""
+        key = self._key(label)
+        remaining = self._redis.hincrby(key, "remaining", -count)
+        if remaining > 0:
+            self._redis.expire(key, self.TIMEOUT)
+        else:
+            with self._redis.pipeline() as pipe:
+                pipe.delete(key)
+                pipe.srem(self._active_key, label)
+                pipe.execute()
+
+    def get(self, label: str) -> Optional[Tuple[int, int]]:
+        """Return remaining and total users of a running revalidation
+        or None if there is none.
+        """
+        return self._parse(self._redis.hgetall(self._key(label)))
+
+    def active(self) -> Dict[str, Tuple[int, int]]:
+        """Return remaining and total users of all running revalidations by label."""
+        labels = sorted(
+            label.decode() if isinstance(label, bytes) else label
+            for label in self._redis.smembers(self._active_key)
+        )
+        if not labels:
+            return {}
+        with self._redis.pipeline() as pipe:
+            for label in labels:
+                pipe.hgetall(self._key(label))
+            entries = pipe.execute()
+        result = {}
+        expired = []
+        for label, entry in zip(labels, entries):
+            progress = self._parse(entry)
+            if progress:
+                result[label] = progress
+            else:
+                expired.append(label)
+        if expired:
+            self._redis.srem(self._active_key, *expired)
+        return result
+
+    def clear(self):
+        """Remove all progress."""
+        labels = self._redis.smembers(self._active_key)
+        keys = [
+            self._key(label.decode() if isinstance(label, bytes) else label)
+            for label in labels
+        ]
+        self._redis.delete(self._active_key, *keys)
+
+    @staticmethod
+    def _parse(entry: dict) -> Optional[Tuple[int, int]]:
+        if not entry:
+            return None
+        entry = {
+            (key.decode() if isinstance(key, bytes) else key): int(value)
+            for key, value in entry.items()
+        }
+        if entry.get("remaining", 0) <= 0:
+            return None
+        return entry["remaining"], entry.get("total", entry["remaining"])
+
+
+class ServiceRevalidationAdminMixin:
+    """Shows the progress of running service revalidations
+    for the objects of a ModelAdmin.
+    """
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method == "GET":
+            self._message_revalidation_progress(request)
+        return super().changelist_view(request, extra_context=extra_context)
+
+    def change_view(self, request, object_id, form_url="", extra_context=None):
+        if request.method == "GET":
+            self._message_revalidation_progress(request, object_id)
+        return super().change_view(
+            request, object_id, form_url=form_url, extra_context=extra_context
+        )
+
+    def _message_revalidation_progress(self, request, object_id=None):
+        try:
+            progress = RevalidationProgress().active()
+        except RedisError:
+            return
+        prefix = f"{self.model._meta.concrete_model._meta.label_lower}-"
+        progress_by_pk = {
+            label[len(prefix):]: value
+            for label, value in progress.items()
+            if label.startswith(prefix)
+        }
+        if object_id is not None:
+            progress_by_pk = {
+                pk: value for pk, value in progress_by_pk.items() if pk == str(object_id)
+            }
+        if not progress_by_pk:
+            return
+        objs = self.model._default_manager.in_bulk(list(progress_by_pk.keys()))
+        for pk, obj in sorted(objs.items(), key=lambda item: str(item[1])):
+            remaining, total = progress_by_pk[str(pk)]
+            messages.info(
+                request,
+                f"Service revalidation in progress for {obj}: "
+                f"{total - remaining} of {total} users done."
+            )
@@ -5,18 +5,36 @@ from django.contrib.auth.models import User, Group, Permission
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
 from django.db.models.signals import m2m_changed
+from django.db.models.signals import post_delete
+from django.db.models.signals import post_migrate
+from django.db.models.signals import post_save
 from django.db.models.signals import pre_delete
 from django.db.models.signals import pre_save
 from django.dispatch import receiver
 from .hooks import ServicesHook
-from .tasks import disable_user, update_groups_for_user
+from .models import NameFormatConfig
+from .name_formats import name_format_index
+from .revalidation import RevalidationProgress
+from .tasks import disable_user, queue_update_groups, queue_validate_services
 
 from allianceauth.authentication.models import State, UserProfile
-from allianceauth.authentication.signals import state_changed
+from allianceauth.authentication.signals import state_changed, users_groups_changed
 from allianceauth.eveonline.models import EveCharacter
+from allianceauth.eveonline.signals import characters_changed
 
 logger = logging.getLogger(__name__)
 
+# character fields service nicknames can be formatted from
+NICKNAME_FIELDS = {
+    'character_name',
+    'corporation_id',
+    'corporation_name',
+    'corporation_ticker',
+    'alliance_id',
+    'alliance_name',
+    'alliance_ticker',
+}
+
 
 @receiver(m2m_changed, sender=User.groups.through)
 def m2m_changed_user_groups(sender, instance, action, *args, **kwargs):
@@ -30,17 +48,24 @@ def m2m_changed_user_groups(sender, instance, action, *args, **kwargs):
             logger.debug(
                 "Waiting for commit to trigger service group update for %s", instance
             )
-            transaction.on_commit(partial(update_groups_for_user.delay, instance.pk))
+            transaction.on_commit(partial(queue_update_groups, [instance.pk]))
         elif (
             isinstance(instance, Group)
             and kwargs.get("model") is User
             and "pk_set" in kwargs
         ):
-            for user_pk in kwargs["pk_set"]:
-                logger.debug(
-                    "%s: Waiting for commit to trigger service group update for user", user_pk
-                )
-                transaction.on_commit(partial(update_groups_for_user.delay, user_pk))
+            logger.debug(
+                "%s: Waiting for commit to trigger service group update for %d users",
+                instance,
+                len(kwargs["pk_set"])
+            )
+            transaction.on_commit(partial(queue_update_groups, list(kwargs["pk_set"])))
+
+
+@receiver(users_groups_changed)
+def users_groups_changed_in_bulk(sender, user_pks, *args, **kwargs):
+    logger.debug("Received users_groups_changed from %s for %d users", sender, len(user_pks))
+    transaction.on_commit(partial(queue_update_groups, list(user_pks)))
 
 
 @receiver(m2m_changed, sender=User.user_permissions.through)
@@ -83,13 +108,15 @@ def m2m_changed_group_permissions(sender, instance, action, pk_set, *args, **kwa
             for svc in ServicesHook.get_services():
                 if svc.access_perm == path_perm:
                     logger.debug(f"Permissions changed for group {instance} on service {svc}, re-validating services for groups users")
-
-                    def validate_all_groups_users_for_service():
-                        logger.debug(f"Performing validation for service {svc}")
-                        for user in instance.user_set.all():
-                            svc.validate_user(user)
-
-                    transaction.on_commit(validate_all_groups_users_for_service)
+                    user_pks = list(instance.user_set.values_list('pk', flat=True))
+                    transaction.on_commit(
+                        partial(
+                            queue_validate_services,
+                            user_pks,
+                            svc.access_perm,
+                            RevalidationProgress.label_for(instance)
+                        )
+                    )
                     got_change = True
                     break  # Found service, break out of services iteration and go back to permission iteration
         if not got_change:
@@ -115,13 +142,15 @@ def m2m_changed_state_permissions(sender, instance, action, pk_set, *args, **kwa
             for svc in ServicesHook.get_services():
                 if svc.access_perm == path_perm:
                     logger.debug(f"Permissions changed for state {instance} on service {svc}, re-validating services for state users")
-
-                    def validate_all_state_users_for_service():
-                        logger.debug(f"Performing validation for service {svc}")
-                        for profile in instance.userprofile_set.all():
-                            svc.validate_user(profile.user)
-
-                    transaction.on_commit(validate_all_state_users_for_service)
+                    user_pks = list(instance.userprofile_set.values_list('user_id', flat=True))
+                    transaction.on_commit(
+                        partial(
+                            queue_validate_services,
+                            user_pks,
+                            svc.access_perm,
+                            RevalidationProgress.label_for(instance)
+                        )
+                    )
                     got_change = True
                     break  # Found service, break out of services iteration and go back to permission iteration
         if not got_change:
@@ -218,3 +247,43 @@ def process_main_character_update(sender, instance, *args, **kwargs):
 
     except ObjectDoesNotExist:  # not a main char ignore
         pass
+
+
+@receiver(characters_changed, sender=EveCharacter)
+def process_main_characters_update(sender, characters, changed_fields=None, *args, **kwargs):
+    if changed_fields is not None:
+        # e.g. a faction change does not affect nicknames
+        characters = [
+            character for character in characters
+            if changed_fields.get(character.pk, NICKNAME_FIELDS) & NICKNAME_FIELDS
+        ]
+        if not characters:
+            return
+    users = User.objects.filter(profile__main_character__in=characters)
+    for user in users:
+        logger.info(f"syncing service nickname for user {user}")
+        for svc in ServicesHook.get_services():
+            try:
+                svc.validate_user(user)
+                svc.sync_nickname(user)
+            except:
+                logger.exception(f'Exception running sync_nickname for services module {svc} on user {user}')
+
+
+@receiver(post_save, sender=NameFormatConfig)
+@receiver(post_delete, sender=NameFormatConfig)
+@receiver(post_delete, sender=State)
+def invalidate_name_format_index(sender, instance, *args, **kwargs):
+    name_format_index.invalidate()
+
+
+@receiver(m2m_changed, sender=NameFormatConfig.states.through)
+def name_format_config_states_changed(sender, instance, action, *args, **kwargs):
+    if action.startswith('post_'):
+        name_format_index.invalidate()
+
+
+@receiver(post_migrate)
+def invalidate_name_format_index_on_migrate(sender, *args, **kwargs):
+    # configs may have been changed by migrations or a database flush
+    name_format_index.invalidate()
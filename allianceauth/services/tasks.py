@@ -2,7 +2,14 @@ import logging
 
 from celery import shared_task
 from django.contrib.auth.models import User
+from .app_settings import (
+    SERVICES_GROUP_SYNC_BATCH_SIZE,
+    SERVICES_GROUP_SYNC_DEBOUNCE,
+    SERVICES_REVALIDATION_BATCH_SIZE,
+)
+from .group_sync import GroupSyncQueue
 from .hooks import ServicesHook
+from .revalidation import RevalidationProgress
 from celery_once import QueueOnce as BaseTask, AlreadyQueued
 from django.core.cache import cache
 
@@ -53,6 +60,10 @@ def disable_user(user):
 def update_groups_for_user(user_pk: int) -> None:
     """Update groups for all services registered to a user."""
     user = User.objects.get(pk=user_pk)
+    _update_groups_for_user(user)
+
+
+def _update_groups_for_user(user: User) -> None:
     logger.debug("%s: Triggering service group update for user", user)
     for svc in ServicesHook.get_services():
         try:
@@ -64,3 +75,102 @@ def update_groups_for_user(user_pk: int) -> None:
                 svc,
                 user
             )
+
+
+@shared_task
+def update_groups_for_users(user_pks: list) -> None:
+    """Update groups for all services registered to many users."""
+    users = list(User.objects.filter(pk__in=user_pks).select_related('profile__state'))
+    logger.debug("Triggering service group update for %d users", len(users))
+    for svc in ServicesHook.get_services():
+        try:
+            svc.validate_users_bulk(users)
+            svc.update_groups_bulk(users)
+        except Exception:
+            logger.exception(
+                'Exception running update_groups_bulk for services module %s on %d users',
+                svc,
+                len(users)
+            )
+
+
+@shared_task
+def validate_services_for_users(
+    user_pks: list, access_perm: str = None, progress_label: str = None
+) -> None:
+    """Validate service accounts of many users.
+
+    Args:
+        - user_pks: pks of the users to validate
+        - access_perm: only validate services with this access permission
+        - progress_label: label of the revalidation progress to advance
+    """
+    users = list(User.objects.filter(pk__in=user_pks))
+    try:
+        for svc in ServicesHook.get_services():
+            if access_perm and svc.access_perm != access_perm:
+                continue
+            logger.debug("Validating service %s for %d users", svc, len(users))
+            try:
+                svc.validate_users_bulk(users)
+            except Exception:
+                logger.exception(
+                    'Exception running validate_users_bulk for services module %s on %d users',
+                    svc,
+                    len(users)
+                )
+    finally:
+        if progress_label:
+            RevalidationProgress().advance(progress_label, len(user_pks))
+
+
+def queue_validate_services(
+    user_pks: list, access_perm: str = None, progress_label: str = None
+) -> None:
+    """Validate service accounts of many users in chunks with background tasks.
+
+    Args:
+        - user_pks: pks of the users to validate
+        - access_perm: only validate services with this access permission
+        - progress_label: label for tracking progress,
+            e.g. from :meth:`RevalidationProgress.label_for`
+    """
+    user_pks = list(user_pks)
+    if not user_pks:
+        return
+    logger.info(
+        "Scheduling service revalidation for %d users in chunks of %d",
+        len(user_pks),
+        SERVICES_REVALIDATION_BATCH_SIZE
+    )
+    if progress_label:
+        RevalidationProgress().start(progress_label, len(user_pks))
+    for i in range(0, len(user_pks), SERVICES_REVALIDATION_BATCH_SIZE):
+        validate_services_for_users.delay(
+            user_pks[i:i + SERVICES_REVALIDATION_BATCH_SIZE],
+            access_perm,
+            progress_label
+        )
+
+
+def queue_update_groups(user_pks) -> None:
+    """Queue a service group update for users.
+
+    Updates requested within the debounce window are coalesced,
+    so every user is updated only once per window.
+    """
+    if GroupSyncQueue(SERVICES_GROUP_SYNC_DEBOUNCE).add(user_pks):
+        process_group_sync_queue.apply_async(countdown=SERVICES_GROUP_SYNC_DEBOUNCE)
+
+
+@shared_task
+def process_group_sync_queue() -> None:
+    """Update groups for all queued users in batches."""
+    queue = GroupSyncQueue(SERVICES_GROUP_SYNC_DEBOUNCE)
+    queue.start_drain()
+    while True:
+        user_pks = queue.pop(SERVICES_GROUP_SYNC_BATCH_SIZE)
+        if not user_pks:
+            break
+        logger.debug("Scheduling service group update for %d users", len(user_pks))
+        update_groups_for_users.delay(user_pks)
@@ -1,7 +1,12 @@
 from unittest import TestCase
 
-from allianceauth.services.hooks import UrlHook
+from django.contrib.auth.models import Group, Permission
+from django.test import TestCase as DjangoTestCase
+
+from allianceauth.authentication.models import State
+from allianceauth.services.hooks import ServicesHook, UrlHook
 from allianceauth.groupmanagement import urls
+from allianceauth.tests.auth_utils import AuthUtils
 
 
 class TestUrlHook(TestCase):
@@ -28,3 +33,53 @@ class TestUrlHook(TestCase):
         # when/then
         with self.assertRaises(TypeError):
             UrlHook(urls, "groupmanagement", r"^groupmanagement/", 99)
+
+
+class TestServicesHookUsersWithoutAccess(DjangoTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        permission = Permission.objects.get(codename='access_phpbb3')
+        cls.user_perm = AuthUtils.create_user('user_perm', disconnect_signals=True)
+        AuthUtils.add_permissions_to_user([permission], cls.user_perm)
+        cls.group_perm = AuthUtils.create_user('group_perm', disconnect_signals=True)
+        group = Group.objects.create(name='Test Group')
+        AuthUtils.add_permissions_to_groups([permission], [group])
+        AuthUtils.disconnect_signals()
+        cls.group_perm.groups.add(group)
+        AuthUtils.connect_signals()
+        cls.state_perm = AuthUtils.create_user('state_perm', disconnect_signals=True)
+        AuthUtils.disconnect_signals()
+        state = State.objects.create(name='Test State', priority=150)
+        state.permissions.add(permission)
+        AuthUtils.connect_signals()
+        AuthUtils.assign_state(cls.state_perm, state, disconnect_signals=True)
+        cls.superuser = AuthUtils.create_user('superuser', disconnect_signals=True)
+        cls.superuser.is_superuser = True
+        cls.superuser.save()
+        cls.inactive = AuthUtils.create_user('inactive', disconnect_signals=True)
+        AuthUtils.add_permissions_to_user([permission], cls.inactive)
+        AuthUtils.disconnect_signals()
+        cls.inactive.is_active = False
+        cls.inactive.save()
+        AuthUtils.connect_signals()
+        cls.no_perm = AuthUtils.create_user('no_perm', disconnect_signals=True)
+
+    def test_should_match_has_perm(self):
+        # given
+        service = ServicesHook()
+        service.access_perm = 'phpbb3.access_phpbb3'
+        users = [
+            self.user_perm,
+            self.group_perm,
+            self.state_perm,
+            self.superuser,
+            self.inactive,
+            self.no_perm,
+        ]
+        # when
+        with self.assertNumQueries(1):
+            result = set(service.users_without_access(users))
+        # then
+        self.assertSetEqual(result, {self.inactive, self.no_perm})
+        for user in users:
+            self.assertEqual(user in result, not user.has_perm(service.access_perm))
@@ -0,0 +1,161 @@
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from allianceauth.authentication.models import State
+from allianceauth.tests.auth_utils import AuthUtils
+
+from ..models import NameFormatConfig
+from ..name_formats import NameFormatIndex, parse_format, render_format
+
+
+class TestNameFormatIndex(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.state = State.objects.create(name='Test State', priority=150)
+        cls.state_2 = State.objects.create(name='Test State 2', priority=160)
+        cls.config = NameFormatConfig.objects.create(
+            service_name='example', format='{character_name}', default_to_username=False
+        )
+        cls.config.states.add(cls.state, cls.state_2)
+        cls.config_2 = NameFormatConfig.objects.create(
+            service_name='other', format='[{corp_ticker}]'
+        )
+        cls.config_2.states.add(cls.state)
+
+    def setUp(self):
+        self.cache = LocMemCache('name-format-index-test', {})
+        self.cache.clear()
+
+    def test_should_map_services_and_states_to_configs(self):
+        table = NameFormatIndex.build()
+
+        self.assertDictEqual(
+            table,
+            {
+                ('example', self.state.pk): self.config,
+                ('example', self.state_2.pk): self.config,
+                ('other', self.state.pk): self.config_2,
+            }
+        )
+
+    def test_should_return_first_config_for_duplicates(self):
+        config_3 = NameFormatConfig.objects.create(service_name='example', format='{username}')
+        config_3.states.add(self.state)
+
+        table = NameFormatIndex.build()
+
+        self.assertEqual(table[('example', self.state.pk)], self.config)
+
+    def test_should_lookup_without_queries(self):
+        name_format_index = NameFormatIndex(cache=self.cache)
+        name_format_index.lookup('example', self.state.pk)
+
+        with self.assertNumQueries(0):
+            config = name_format_index.lookup('example', self.state.pk)
+            no_config = name_format_index.lookup('example', 0)
+
+        self.assertEqual(config, self.config)
+        self.assertIsNone(no_config)
+
+    def test_should_rebuild_after_invalidation(self):
+        name_format_index = NameFormatIndex(cache=self.cache)
+        name_format_index.lookup('example', self.state.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.config.states.remove(self.state)
+            name_format_index.invalidate()
+            # uses the database until the invalidation is committed
+            self.assertIsNone(name_format_index.lookup('example', self.state.pk))
+
+        self.assertTrue(name_format_index.available)
+        self.assertIsNone(name_format_index.lookup('example', self.state.pk))
+
+    def test_should_rebuild_after_invalidation_by_another_process(self):
+        name_format_index = NameFormatIndex(cache=self.cache)
+        other_index = NameFormatIndex(cache=self.cache)
+        name_format_index.lookup('example', self.state.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.config.states.remove(self.state)
+            other_index.invalidate()
+
+        self.assertIsNone(name_format_index.lookup('example', self.state.pk))
+
+
+class TestNameFormatIndexTransactions(TransactionTestCase):
+    def setUp(self):
+        self.cache = LocMemCache('name-format-index-test', {})
+        self.cache.clear()
+
+    def test_should_use_table_again_after_rollback(self):
+        name_format_index = NameFormatIndex(cache=self.cache)
+
+        try:
+            with transaction.atomic():
+                name_format_index.invalidate()
+                self.assertFalse(name_format_index.available)
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertTrue(name_format_index.available)
+        name_format_index.lookup('example', 1)
+        with self.assertNumQueries(0):
+            name_format_index.lookup('example', 1)
+
+
+class TestNameFormatIndexSignals(TestCase):
+    def setUp(self):
+        self.user = AuthUtils.create_user('test_user', disconnect_signals=True)
+        self.cache = LocMemCache('name-format-index-test', {})
+        self.cache.clear()
+
+    def test_should_invalidate_on_config_changes(self):
+        from .. import signals
+
+        name_format_index = NameFormatIndex(cache=self.cache)
+        name_format_index.get()
+        original = signals.name_format_index
+        signals.name_format_index = name_format_index
+        try:
+            with self.captureOnCommitCallbacks(execute=True):
+                config = NameFormatConfig.objects.create(
+                    service_name='example', format='{username}'
+                )
+                config.states.add(self.user.profile.state)
+        finally:
+            signals.name_format_index = original
+
+        self.assertEqual(
+            name_format_index.lookup('example', self.user.profile.state.pk), config
+        )
+
+
+class TestRenderFormat(TestCase):
+    def test_should_render_like_str_format(self):
+        format_data = {'character_name': 'Bruce Wayne', 'corp_ticker': 'WYNE', 'width': 8}
+        for format_string in [
+            '{character_name}',
+            '[{corp_ticker}] {character_name}',
+            '{corp_ticker!r:>10} {{literal}}',
+            '{character_name:.5}',
+            '{corp_ticker:>{width}}',
+            'no fields',
+        ]:
+            with self.subTest(format_string=format_string):
+                self.assertEqual(
+                    render_format(format_string, format_data),
+                    format_string.format(**format_data)
+                )
+
+    def test_should_raise_for_unknown_fields(self):
+        with self.assertRaises(KeyError):
+            render_format('{unknown}', {})
+
+    def test_should_parse_formats_once(self):
+        parse_format.cache_clear()
+        render_format('{character_name}', {'character_name': 'Bruce Wayne'})
+        render_format('{character_name}', {'character_name': 'Clark Kent'})
+
+        self.assertEqual(parse_format.cache_info().hits, 1)
@@ -0,0 +1,92 @@
+from django.contrib.auth.models import Group
+from django.test import TestCase
+from django.urls import reverse
+
+from allianceauth.tests.auth_utils import AuthUtils
+
+from ..revalidation import RevalidationProgress
+
+
+class TestRevalidationProgress(TestCase):
+    def setUp(self):
+        self.progress = RevalidationProgress()
+        self.progress.clear()
+
+    def tearDown(self):
+        self.progress.clear()
+
+    def test_label_for(self):
+        group = Group.objects.create(name='Test Group')
+
+        self.assertEqual(RevalidationProgress.label_for(group), f'auth.group-{group.pk}')
+
+    def test_should_track_progress(self):
+        # when
+        self.progress.start('auth.group-1', 5)
+        self.progress.advance('auth.group-1', 2)
+        # then
+        self.assertEqual(self.progress.get('auth.group-1'), (3, 5))
+        self.assertDictEqual(self.progress.active(), {'auth.group-1': (3, 5)})
+
+    def test_should_add_up_revalidations_of_same_object(self):
+        # when
+        self.progress.start('auth.group-1', 5)
+        self.progress.start('auth.group-1', 3)
+        # then
+        self.assertEqual(self.progress.get('auth.group-1'), (8, 8))
+
+    def test_should_remove_finished_revalidations(self):
+        # given
+        self.progress.start('auth.group-1', 2)
+        # when
+        self.progress.advance('auth.group-1', 2)
+        # then
+        self.assertIsNone(self.progress.get('auth.group-1'))
+        self.assertDictEqual(self.progress.active(), {})
+
+    def test_should_drop_expired_revalidations(self):
+        # given
+        self.progress.start('auth.group-1', 2)
+        self.progress._redis.delete(self.progress._key('auth.group-1'))
+        # when/then
+        self.assertDictEqual(self.progress.active(), {})
+        self.assertFalse(self.progress._redis.smembers(self.progress._active_key))
+
+
+class TestServiceRevalidationAdminMixin(TestCase):
+    def setUp(self):
+        self.progress = RevalidationProgress()
+        self.progress.clear()
+        self.superuser = AuthUtils.create_user('superuser', disconnect_signals=True)
+        self.superuser.is_staff = True
+        self.superuser.is_superuser = True
+        self.superuser.save()
+        self.group = Group.objects.create(name='Test Group')
+        self.other_group = Group.objects.create(name='Other Group')
+        self.client.force_login(self.superuser)
+
+    def tearDown(self):
+        self.progress.clear()
+
+    def test_should_show_progress_on_changelist(self):
+        # given
+        self.progress.start(RevalidationProgress.label_for(self.group), 5)
+        self.progress.advance(RevalidationProgress.label_for(self.group), 2)
+        # when
+        response = self.client.get(reverse('admin:groupmanagement_group_changelist'))
+        # then
+        messages = [str(message) for message in response.context['messages']]
+        self.assertListEqual(
+            messages,
+            ['Service revalidation in progress for Test Group: 2 of 5 users done.']
+        )
+
+    def test_should_show_progress_of_object_only_on_change_view(self):
+        # given
+        self.progress.start(RevalidationProgress.label_for(self.group), 5)
+        # when
+        response = self.client.get(
+            reverse('admin:groupmanagement_group_change', args=[self.other_group.pk])
+        )
+        # then
+        self.assertFalse(list(response.context['messages']))
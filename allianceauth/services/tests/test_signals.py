@@ -5,7 +5,9 @@ from django.test import override_settings, TestCase, TransactionTestCase
 from django.contrib.auth.models import Group, Permission
 
 from allianceauth.authentication.models import State
+from allianceauth.authentication.signals import users_groups_changed
 from allianceauth.eveonline.models import EveCharacter
+from allianceauth.eveonline.signals import characters_changed
 from allianceauth.tests.auth_utils import AuthUtils
 
 
@@ -21,10 +23,10 @@ class ServicesSignalsTestCase(TestCase):
         self.none_user = AuthUtils.create_user('none_user', disconnect_signals=True)
 
     @mock.patch(MODULE_PATH + '.transaction', spec=True)
-    @mock.patch(MODULE_PATH + '.update_groups_for_user', spec=True)
-    def test_m2m_changed_user_groups(self, update_groups_for_user, transaction):
+    @mock.patch(MODULE_PATH + '.queue_update_groups', spec=True)
+    def test_m2m_changed_user_groups(self, queue_update_groups, transaction):
         """
-        Test that update_groups hook function is called on user groups change
+        Test that an update_groups is queued on user groups change
         """
 
         # Overload transaction.on_commit so everything happens synchronously
@@ -37,9 +39,30 @@ class ServicesSignalsTestCase(TestCase):
         self.member.save()
 
         # Assert
-        self.assertTrue(update_groups_for_user.delay.called)
-        args, _ = update_groups_for_user.delay.call_args
-        self.assertEqual(self.member.pk, args[0])
+        self.assertTrue(queue_update_groups.called)
+        args, _ = queue_update_groups.call_args
+        self.assertListEqual([self.member.pk], args[0])
+
+    @mock.patch(MODULE_PATH + '.transaction', spec=True)
+    @mock.patch(MODULE_PATH + '.queue_update_groups', spec=True)
+    def test_users_groups_changed(self, queue_update_groups, transaction):
+        """
+        Test that an update_groups is queued once for all users
+        after group memberships changed in bulk
+        """
+
+        # Overload transaction.on_commit so everything happens synchronously
+        transaction.on_commit = lambda fn: fn()
+
+        # Act
+        users_groups_changed.send(
+            sender=Group, user_pks={self.member.pk, self.none_user.pk}
+        )
+
+        # Assert
+        self.assertEqual(queue_update_groups.call_count, 1)
+        args, _ = queue_update_groups.call_args
+        self.assertSetEqual(set(args[0]), {self.member.pk, self.none_user.pk})
 
     @mock.patch(MODULE_PATH + '.disable_user')
     def test_pre_delete_user(self, disable_user):
@@ -76,12 +99,12 @@ class ServicesSignalsTestCase(TestCase):
         args, kwargs = disable_user.call_args
         self.assertEqual(self.member, args[0])
 
+    @mock.patch(MODULE_PATH + '.queue_validate_services')
     @mock.patch(MODULE_PATH + '.transaction')
     @mock.patch(MODULE_PATH + '.ServicesHook')
-    def test_m2m_changed_group_permissions(self, services_hook, transaction):
+    def test_m2m_changed_group_permissions(self, services_hook, transaction, queue_validate_services):
         from django.contrib.contenttypes.models import ContentType
         svc = mock.Mock()
-        svc.validate_user.return_value = None
         svc.access_perm = 'auth.access_testsvc'
 
         services_hook.get_services.return_value = [svc]
@@ -104,9 +127,9 @@ class ServicesSignalsTestCase(TestCase):
         # Assert
         self.assertTrue(services_hook.get_services.called)
 
-        self.assertTrue(svc.validate_user.called)
-        args, kwargs = svc.validate_user.call_args
-        self.assertEqual(self.member, args[0])
+        queue_validate_services.assert_called_once_with(
+            [self.member.pk], 'auth.access_testsvc', f'auth.group-{test_group.pk}'
+        )
 
     @mock.patch(MODULE_PATH + '.transaction')
     @mock.patch(MODULE_PATH + '.ServicesHook')
@@ -137,12 +160,12 @@ class ServicesSignalsTestCase(TestCase):
         args, kwargs = svc.validate_user.call_args
         self.assertEqual(self.member, args[0])
 
+    @mock.patch(MODULE_PATH + '.queue_validate_services')
     @mock.patch(MODULE_PATH + '.transaction')
     @mock.patch(MODULE_PATH + '.ServicesHook')
-    def test_m2m_changed_user_state_permissions(self, services_hook, transaction):
+    def test_m2m_changed_user_state_permissions(self, services_hook, transaction, queue_validate_services):
         from django.contrib.contenttypes.models import ContentType
         svc = mock.Mock()
-        svc.validate_user.return_value = None
         svc.access_perm = 'auth.access_testsvc'
 
         services_hook.get_services.return_value = [svc]
@@ -168,9 +191,9 @@ class ServicesSignalsTestCase(TestCase):
         # Assert
         self.assertTrue(services_hook.get_services.called)
 
-        self.assertTrue(svc.validate_user.called)
-        args, kwargs = svc.validate_user.call_args
-        self.assertEqual(self.member, args[0])
+        queue_validate_services.assert_called_once_with(
+            [self.member.pk], 'auth.access_testsvc', f'authentication.state-{test_state.pk}'
+        )
 
     @mock.patch(MODULE_PATH + '.ServicesHook')
     def test_state_changed_services_validation_and_groups_update(self, services_hook):
@@ -183,7 +206,8 @@ class ServicesSignalsTestCase(TestCase):
 
         services_hook.get_services.return_value = [svc]
 
-        test_state = State.objects.create(name="Test state", priority=150, public=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            test_state = State.objects.create(name="Test state", priority=150, public=True)
         self.member.profile.state = test_state
         self.member.profile.save()
 
@@ -198,6 +222,42 @@ class ServicesSignalsTestCase(TestCase):
         args, kwargs = svc.update_groups.call_args
         self.assertEqual(self.member, args[0])
 
+    @mock.patch(MODULE_PATH + '.ServicesHook')
+    def test_characters_changed_services_validation_and_nickname_sync(self, services_hook):
+        """Test users whose main was updated in bulk have service accounts validated and nickname synced
+        """
+        svc = mock.Mock()
+        services_hook.get_services.return_value = [svc]
+
+        characters_changed.send(
+            sender=EveCharacter, characters=[self.member.profile.main_character]
+        )
+
+        svc.validate_user.assert_called_once_with(self.member)
+        svc.sync_nickname.assert_called_once_with(self.member)
+
+    @mock.patch(MODULE_PATH + '.ServicesHook')
+    def test_characters_changed_only_syncs_nicknames_for_relevant_changes(self, services_hook):
+        """Test nicknames are not synced when only fields not used in nicknames changed
+        """
+        svc = mock.Mock()
+        services_hook.get_services.return_value = [svc]
+        character = self.member.profile.main_character
+
+        characters_changed.send(
+            sender=EveCharacter,
+            characters=[character],
+            changed_fields={character.pk: {'faction_id', 'faction_name'}},
+        )
+        self.assertFalse(svc.sync_nickname.called)
+
+        characters_changed.send(
+            sender=EveCharacter,
+            characters=[character],
+            changed_fields={character.pk: {'faction_id', 'corporation_ticker'}},
+        )
+        svc.sync_nickname.assert_called_once_with(self.member)
+
     @mock.patch(MODULE_PATH + '.ServicesHook')
     def test_state_changed_services_validation_and_groups_update_1(self, services_hook):
         """Test a user changing main has service accounts validated and sync updated
@@ -254,7 +314,7 @@ class ServicesSignalsTestCase(TestCase):
 
 
 @mock.patch(
-    "allianceauth.services.modules.mumble.auth_hooks.MumbleService.update_groups"
+    "allianceauth.services.modules.mumble.auth_hooks.MumbleService.update_groups_bulk"
 )
 @override_settings(CELERY_ALWAYS_EAGER=True, CELERY_EAGER_PROPAGATES_EXCEPTIONS=True)
 class TestUserGroupBulkUpdate(TransactionTestCase):
@@ -269,7 +329,7 @@ class TestUserGroupBulkUpdate(TransactionTestCase):
         # when
         user.groups.add(group)
         # then
-        users_updated = {obj[0][0] for obj in mock_update_groups.call_args_list}
+        users_updated = {user for obj in mock_update_groups.call_args_list for user in obj[0][0]}
         self.assertSetEqual(users_updated, {user})
 
     def test_should_run_user_service_check_when_multiple_groups_are_added_to_user(
@@ -284,7 +344,7 @@ class TestUserGroupBulkUpdate(TransactionTestCase):
         # when
         user.groups.add(group_1, group_2)
         # then
-        users_updated = {obj[0][0] for obj in mock_update_groups.call_args_list}
+        users_updated = {user for obj in mock_update_groups.call_args_list for user in obj[0][0]}
         self.assertSetEqual(users_updated, {user})
 
     def test_should_run_user_service_check_when_user_added_to_group(
@@ -298,7 +358,7 @@ class TestUserGroupBulkUpdate(TransactionTestCase):
         # when
         group.user_set.add(user)
         # then
-        users_updated = {obj[0][0] for obj in mock_update_groups.call_args_list}
+        users_updated = {user for obj in mock_update_groups.call_args_list for user in obj[0][0]}
         self.assertSetEqual(users_updated, {user})
 
     def test_should_run_user_service_check_when_multiple_users_are_added_to_group(
@@ -317,5 +377,5 @@ class TestUserGroupBulkUpdate(TransactionTestCase):
         # when
         group.user_set.add(user_2, user_3)
         # then
-        users_updated = {obj[0][0] for obj in mock_update_groups.call_args_list}
+        users_updated = {user for obj in mock_update_groups.call_args_list for user in obj[0][0]}
         self.assertSetEqual(users_updated, {user_2, user_3})
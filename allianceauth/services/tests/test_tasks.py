@@ -6,8 +6,18 @@ from django.core.cache import cache
 from django.test import override_settings, TestCase
 
 from allianceauth.tests.auth_utils import AuthUtils
-from allianceauth.services.tasks import validate_services, update_groups_for_user
-
+from allianceauth.services.tasks import (
+    process_group_sync_queue,
+    queue_update_groups,
+    queue_validate_services,
+    update_groups_for_user,
+    update_groups_for_users,
+    validate_services,
+    validate_services_for_users,
+)
+
+from ..group_sync import GroupSyncQueue
+from ..revalidation import RevalidationProgress
 from ..tasks import DjangoBackend
 
 
@@ -48,6 +58,78 @@ class ServicesTasksTestCase(TestCase):
         self.assertEqual(self.member, args[0])  # Assert correct user
 
 
+    @mock.patch('allianceauth.services.tasks.ServicesHook')
+    def test_update_groups_for_users(self, services_hook):
+        # given
+        other_member = AuthUtils.create_user('other_member')
+        svc = mock.Mock()
+        services_hook.get_services.return_value = [svc]
+        # when
+        update_groups_for_users.delay([self.member.pk, other_member.pk])
+        # then
+        args, _ = svc.validate_users_bulk.call_args
+        self.assertSetEqual(set(args[0]), {self.member, other_member})
+        args, _ = svc.update_groups_bulk.call_args
+        self.assertSetEqual(set(args[0]), {self.member, other_member})
+
+    @mock.patch('allianceauth.services.tasks.ServicesHook')
+    def test_validate_services_for_users(self, services_hook):
+        # given
+        svc = mock.Mock(access_perm='app.access_svc')
+        other_svc = mock.Mock(access_perm='app.access_other_svc')
+        services_hook.get_services.return_value = [svc, other_svc]
+        # when
+        validate_services_for_users.delay([self.member.pk], 'app.access_svc')
+        # then
+        svc.validate_users_bulk.assert_called_once_with([self.member])
+        self.assertFalse(other_svc.validate_users_bulk.called)
+
+
+@mock.patch('allianceauth.services.tasks.SERVICES_GROUP_SYNC_BATCH_SIZE', 2)
+@mock.patch('allianceauth.services.tasks.update_groups_for_users')
+class TestGroupSyncQueue(TestCase):
+    def setUp(self):
+        self.queue = GroupSyncQueue(5)
+        self.queue.clear()
+
+    def tearDown(self):
+        self.queue.clear()
+
+    @mock.patch('allianceauth.services.tasks.process_group_sync_queue')
+    def test_should_schedule_drain_once_per_window(self, process_group_sync_queue, update_groups_for_users):
+        # when
+        queue_update_groups([1, 2])
+        queue_update_groups([2, 3])
+        queue_update_groups([1])
+        # then
+        self.assertEqual(process_group_sync_queue.apply_async.call_count, 1)
+        self.assertEqual(self.queue.size(), 3)
+
+    def test_should_process_each_user_once_in_batches(self, update_groups_for_users):
+        # given
+        for user_pks in ([1, 2], [2, 3], [1, 4, 5]):
+            self.queue.add(user_pks)
+        # when
+        process_group_sync_queue()
+        # then
+        self.assertEqual(update_groups_for_users.delay.call_count, 3)
+        user_pks = [
+            pk for args, _ in update_groups_for_users.delay.call_args_list for pk in args[0]
+        ]
+        self.assertListEqual(sorted(user_pks), [1, 2, 3, 4, 5])
+        self.assertEqual(self.queue.size(), 0)
+
+    @mock.patch('allianceauth.services.tasks.process_group_sync_queue')
+    def test_should_schedule_new_drain_after_draining(self, process_group_sync_queue, update_groups_for_users):
+        # given
+        queue_update_groups([1])
+        self.queue.start_drain()
+        # when
+        queue_update_groups([2])
+        # then
+        self.assertEqual(process_group_sync_queue.apply_async.call_count, 2)
+
+
 class TestDjangoBackend(TestCase):
 
     TEST_KEY = "my-django-backend-test-key"
@@ -89,3 +171,38 @@ class TestDjangoBackend(TestCase):
         self.backend.clear_lock(self.TEST_KEY)
         self.backend.raise_or_lock(self.TEST_KEY, self.TIMEOUT)
         self.assertIsNotNone(cache.get(self.TEST_KEY))
+
+
+@mock.patch('allianceauth.services.tasks.SERVICES_REVALIDATION_BATCH_SIZE', 2)
+class TestQueueValidateServices(TestCase):
+    def setUp(self):
+        self.progress = RevalidationProgress()
+        self.progress.clear()
+
+    def tearDown(self):
+        self.progress.clear()
+
+    @mock.patch('allianceauth.services.tasks.validate_services_for_users')
+    def test_should_validate_in_chunks(self, validate_services_for_users):
+        # when
+        queue_validate_services([1, 2, 3, 4, 5], 'app.access_svc', 'auth.group-1')
+        # then
+        self.assertEqual(validate_services_for_users.delay.call_count, 3)
+        self.assertEqual(
+            validate_services_for_users.delay.call_args_list[-1][0],
+            ([5], 'app.access_svc', 'auth.group-1')
+        )
+        self.assertEqual(self.progress.get('auth.group-1'), (5, 5))
+
+    @mock.patch('allianceauth.services.tasks.ServicesHook')
+    def test_should_track_progress(self, services_hook):
+        # given
+        member = AuthUtils.create_user('auth_member')
+        svc = mock.Mock(access_perm='app.access_svc')
+        services_hook.get_services.return_value = [svc]
+        self.progress.start('auth.group-1', 3)
+        # when
+        validate_services_for_users.delay([member.pk, 998, 999], 'app.access_svc', 'auth.group-1')
+        # then
+        self.assertIsNone(self.progress.get('auth.group-1'))
+        self.assertDictEqual(self.progress.active(), {})
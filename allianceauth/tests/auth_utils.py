@@ -19,6 +19,7 @@ from allianceauth.authentication.signals import (
     assign_state_on_active_change,
     check_state_on_character_update
 )
+from allianceauth.authentication.state_index import state_index
 from allianceauth.services.signals import (
     m2m_changed_group_permissions,
     m2m_changed_user_permissions,
@@ -141,6 +142,8 @@ class AuthUtils:
         pre_save.connect(process_main_character_change, sender=UserProfile)
         pre_save.connect(process_main_character_update, sender=EveCharacter)
         post_save.connect(check_state_on_character_update, sender=EveCharacter)
+        # states may have been changed while the signals were disconnected
+        state_index.invalidate()
 
     @classmethod
     def add_main_character(cls, user, name, character_id, corp_id=2345, corp_name='', corp_ticker='', alliance_id=None,
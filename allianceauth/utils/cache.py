@@ -1,6 +1,9 @@
+import threading
+
 from redis import Redis
 
-from django.core.cache import caches
+from django.core.cache import cache as default_cache, caches
+from django.db import DEFAULT_DB_ALIAS, transaction
 
 try:
     import django_redis
@@ -19,3 +22,65 @@ def get_redis_client() -> Redis:
     except AttributeError:
         default_cache = caches["default"]
         return default_cache.get_master_client()
+
+
+class CacheGeneration:
+    """A generation number shared between processes through Django's cache.
+
+    It is increased whenever data derived from the database becomes invalid,
+    so processes know when to rebuild their copies of that data.
+
+    Invalidations made inside a transaction are pending for the current thread
+    until the transaction is committed, so data of another transaction is never
+    mixed with the committed data. Invalidations of a rolled back transaction
+    stay pending until the thread is checked outside of a transaction,
+    e.g. after the rollback of a savepoint they are pending until the outer transaction ends.
+
+    Args:
+        - key: Cache key of the generation number
+        - cache: A Django cache backend. Will use the default cache by default
+        - using: Alias of the database whose transactions are tracked
+    """
+
+    def __init__(self, key: str, cache=None, using: str = DEFAULT_DB_ALIAS) -> None:
+        self.key = key
+        self._cache = cache or default_cache
+        self._using = using
+        self._local = threading.local()
+
+    @property
+    def pending(self) -> bool:
+        """Whether this thread has invalidated the data in a running transaction."""
+        if not getattr(self._local, "pending", False):
+            return False
+        if not transaction.get_connection(self._using).in_atomic_block:
+            # the transaction has been rolled back, otherwise _committed had cleared it
+            self._local.pending = False
+        return self._local.pending
+
+    def invalidate(self):
+        """Increase the generation now and again when the current transaction is committed."""
+        self._increase()
+        if transaction.get_connection(self._using).in_atomic_block:
+            self._local.pending = True
+        transaction.on_commit(self._committed, using=self._using)
+
+    def _committed(self):
+        self._local.pending = False
+        self._increase()
+
+    def get(self) -> int:
+        """Return the current generation."""
+        generation = self._cache.get(self.key)
+        if generation is None:
+            self._cache.add(self.key, 0, None)
+            generation = self._cache.get(self.key, 0)
+        return generation
+
+    def _increase(self):
+        self._cache.add(self.key, 0, None)
+        try:
+            self._cache.incr(self.key)
+        except ValueError:
+            # key has been evicted in the meantime
+            self._cache.set(self.key, 1, None)
@@ -1,8 +1,10 @@
 from unittest.mock import MagicMock, patch
 
-from django.test import TestCase
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
 
-from allianceauth.utils.cache import get_redis_client
+from allianceauth.utils.cache import CacheGeneration, get_redis_client
 
 MODULE_PATH = "allianceauth.utils.cache"
 
@@ -37,3 +39,46 @@ class TestGetRedisClient(TestCase):
             client = get_redis_client()
         # then
         self.assertIsInstance(client, RedisClientStub)
+
+
+class TestCacheGeneration(TransactionTestCase):
+    def setUp(self):
+        self.cache = LocMemCache("cache-generation-test", {})
+        self.cache.clear()
+        self.generation = CacheGeneration("test-generation", cache=self.cache)
+
+    def test_should_start_at_zero(self):
+        self.assertEqual(self.generation.get(), 0)
+
+    def test_should_increase_now_and_on_commit(self):
+        with transaction.atomic():
+            self.generation.invalidate()
+            self.assertEqual(self.generation.get(), 1)
+            self.assertTrue(self.generation.pending)
+
+        self.assertEqual(self.generation.get(), 2)
+        self.assertFalse(self.generation.pending)
+
+    def test_should_drop_pending_invalidation_on_rollback(self):
+        try:
+            with transaction.atomic():
+                self.generation.invalidate()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+        self.assertFalse(self.generation.pending)
+        self.assertEqual(self.generation.get(), 1)
+
+    def test_should_increase_immediately_without_transaction(self):
+        self.generation.invalidate()
+
+        self.assertFalse(self.generation.pending)
+        self.assertEqual(self.generation.get(), 2)
+
+    def test_should_recover_from_evicted_key(self):
+        with transaction.atomic():
+            self.generation.invalidate()
+            self.cache.delete("test-generation")
+
+        self.assertEqual(self.generation.get(), 1)